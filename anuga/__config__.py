@@ -1,8 +1,19 @@
-# This file is generated by /home/steve/anuga/anuga_core/setup.py
+# This file is generated by numpy's setup.py
 # It contains system_info results at the time of building this package.
 __all__ = ["get_info","show"]
 
 
+
+import os
+import sys
+
+extra_dll_dir = os.path.join(os.path.dirname(__file__), '.libs')
+
+if sys.platform == 'win32' and os.path.isdir(extra_dll_dir):
+    os.environ.setdefault('PATH', '')
+    os.environ['PATH'] += os.pathsep + extra_dll_dir
+
+
 def get_info(name):
     g = globals()
     return g.get(name, g.get(name + "_info", {}))
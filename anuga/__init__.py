@@ -146,6 +146,9 @@ else:
     if pypar_available:
         from anuga.parallel.parallel_api import sequential_distribute_dump
         from anuga.parallel.parallel_api import sequential_distribute_load
+        from anuga.parallel.parallel_api import concurrent_distribute
+        from anuga.parallel.parallel_api import repartition
+        from anuga.parallel.parallel_api import wet_triangle_weights
 
     # -----------------------------
     # Checkpointing
@@ -205,7 +208,7 @@ else:
     from anuga.file_conversion.urs2sts import urs2sts
     from anuga.file_conversion.dem2pts import dem2pts
     from anuga.file_conversion.esri2sww import esri2sww
-    from anuga.file_conversion.sww2dem import sww2dem, sww2dem_batch
+    from anuga.file_conversion.sww2dem import sww2dem, sww2dem_batch, sww2dem_multi
     from anuga.file_conversion.asc2dem import asc2dem
     from anuga.file_conversion.xya2pts import xya2pts
     from anuga.file_conversion.ferret2sww import ferret2sww
@@ -253,6 +256,7 @@ else:
     from anuga.operators.kinematic_viscosity_operator import Kinematic_viscosity_operator
 
     from anuga.operators.rate_operators import Rate_operator
+    from anuga.operators.rate_operators import Grouped_rate_operator
     from anuga.operators.set_friction_operators import Depth_friction_operator
 
     from anuga.operators.set_elevation_operator import Set_elevation_operator
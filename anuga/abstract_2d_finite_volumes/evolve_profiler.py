@@ -0,0 +1,212 @@
+"""Wall clock profiling of the phases of evolve
+
+Switch on with
+
+    domain.set_profiling()
+
+and then, e.g. at each yieldstep,
+
+    domain.print_profile_statistics()
+
+The phase methods of the domain (distribute_to_vertices_and_edges,
+compute_fluxes, ...) are wrapped by timed versions on the domain instance
+only while profiling is switched on, so there is no overhead when it is off.
+The wrappers call the methods of the domain's own class, so overrides
+(e.g. in Parallel_domain) are timed as they are.
+
+Within update_boundary and apply_fractional_steps, Generic_Domain also
+records the time of each boundary tag (update_boundary[tag]) and each
+fractional step operator (operator[label]) using time_call. These are
+parts of their phase, so they are not added to the total.
+"""
+
+from time import time as walltime
+
+
+# Domain methods which are timed as a whole
+phase_methods = ['distribute_to_vertices_and_edges',
+                 'update_boundary',
+                 'compute_fluxes',
+                 'compute_forcing_terms',
+                 'update_timestep',
+                 'update_conserved_quantities',
+                 'update_ghosts',
+                 'update_extrema',
+                 'apply_fractional_steps',
+                 'store_timestep']
+
+
+class Evolve_profiler:
+    """Accumulate wall clock time spent in each phase of evolve, both
+    for the current yieldstep and over the whole run.
+    """
+
+    def __init__(self, domain):
+
+        self.domain = domain
+
+        # Phase names in order of first use
+        self.phases = []
+
+        self.cumulative = {}
+        self.yieldstep = {}
+        self.last_yieldstep = {}
+
+        self.number_of_yieldsteps = 0
+
+
+    def install(self):
+        """Replace the phase methods of the domain by timed versions
+        """
+
+        domain = self.domain
+
+        for name in phase_methods:
+            if hasattr(domain, name):
+                setattr(domain, name, self.timed(name, getattr(domain, name)))
+
+
+    def uninstall(self):
+        """Restore the original methods of the domain
+        """
+
+        for name in phase_methods:
+            if name in self.domain.__dict__:
+                del self.domain.__dict__[name]
+
+
+    def add_time(self, phase, t):
+
+        if phase not in self.cumulative:
+            self.phases.append(phase)
+            self.cumulative[phase] = 0.0
+
+        self.cumulative[phase] += t
+        self.yieldstep[phase] = self.yieldstep.get(phase, 0.0) + t
+
+
+    def timed(self, phase, method):
+        """Return method wrapped to add its wall clock time to phase
+        """
+
+        def timed_method(*args, **kwargs):
+            t0 = walltime()
+            result = method(*args, **kwargs)
+            self.add_time(phase, walltime() - t0)
+            return result
+
+        return timed_method
+
+
+    def time_call(self, phase, function, *args):
+        """Call function(*args) and add its wall clock time to phase
+        """
+
+        t0 = walltime()
+        result = function(*args)
+        self.add_time(phase, walltime() - t0)
+
+        return result
+
+
+    def end_yieldstep(self):
+        """Called by evolve just before yielding
+        """
+
+        self.last_yieldstep = self.yieldstep
+        self.yieldstep = {}
+        self.number_of_yieldsteps += 1
+
+
+    def get_profile(self, cumulative=True):
+        """Return dictionary of wall clock time for each phase, either
+        over the whole run or for the last yieldstep
+        """
+
+        if cumulative:
+            return self.cumulative.copy()
+        else:
+            return self.last_yieldstep.copy()
+
+
+    def get_parallel_profile(self, cumulative=True):
+        """Return dictionary of (min, mean, max) wall clock time over all
+        processors for each phase. Must be called by all processors.
+        """
+
+        from anuga.utilities.parallel_abstraction import size, rank
+        from anuga.utilities.parallel_abstraction import send, receive
+
+        profile = self.get_profile(cumulative)
+
+        numprocs = size()
+        myid = rank()
+
+        if numprocs == 1:
+            return dict((phase, (t, t, t)) for phase, t in profile.items())
+
+        if myid == 0:
+            profiles = [profile]
+            for cpu in range(1, numprocs):
+                profiles.append(receive(cpu))
+
+            phases = []
+            for p in profiles:
+                for phase in p:
+                    if phase not in phases:
+                        phases.append(phase)
+
+            result = {}
+            for phase in phases:
+                times = [p.get(phase, 0.0) for p in profiles]
+                result[phase] = (min(times), sum(times)/numprocs, max(times))
+
+            for cpu in range(1, numprocs):
+                send(result, cpu)
+        else:
+            send(profile, 0)
+            result = receive(0)
+
+        return result
+
+
+    def profile_statistics(self, cumulative=True):
+        """Return string with table of wall clock time for each phase,
+        giving min, mean and max over all processors and the percentage
+        of the total mean time. Must be called by all processors.
+        """
+
+        profile = self.get_parallel_profile(cumulative)
+
+        phases = [phase for phase in self.phases if phase in profile]
+        phases += [phase for phase in profile if phase not in phases]
+
+        # Parts of phases (e.g. update_boundary[tag]) are already
+        # included in their phase
+        total = sum(profile[phase][1] for phase in phases if '[' not in phase)
+
+        if cumulative:
+            title = 'Evolve profile (cumulative, %d yieldsteps)' \
+                    % self.number_of_yieldsteps
+        else:
+            title = 'Evolve profile (last yieldstep)'
+
+        width = max([len(phase) for phase in phases] + [len('Phase')])
+
+        msg = title + '\n'
+        msg += '%-*s %12s %12s %12s %7s\n' % (width, 'Phase',
+                                             'min (s)', 'mean (s)',
+                                             'max (s)', '%')
+        for phase in phases:
+            tmin, tmean, tmax = profile[phase]
+            if total > 0.0:
+                percentage = 100.0*tmean/total
+            else:
+                percentage = 0.0
+            msg += '%-*s %12.6f %12.6f %12.6f %7.2f\n' % (width, phase,
+                                                         tmin, tmean, tmax,
+                                                         percentage)
+
+        msg += '%-*s %12s %12.6f\n' % (width, 'Total', '', total)
+
+        return msg
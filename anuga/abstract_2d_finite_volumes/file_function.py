@@ -31,7 +31,8 @@ def file_function(filename,
                   verbose=False,
                   use_cache=False,
                   boundary_polygon=None,
-                  output_centroids=False):
+                  output_centroids=False,
+                  time_window=None):
     """Read time history of spatial data from NetCDF file and return
     a callable object.
 
@@ -76,6 +77,13 @@ def file_function(filename,
 
     boundary_polygon - 
 
+    time_window - If specified (and interpolation_points are given) the file
+                  is kept open and only blocks of time_window time slices
+                  are read and interpolated as they are needed, rather than
+                  the whole time series up front. Useful for long sts or
+                  sww files. Call close() of the returned function (or of
+                  the boundary using it) when it is no longer needed to
+                  close the file.
     
     See Interpolation function in anuga.fit_interpolate.interpolation for
     further documentation
@@ -117,10 +125,12 @@ def file_function(filename,
               'time_limit': time_limit,                                 
               'verbose': verbose,
               'boundary_polygon': boundary_polygon,
-              'output_centroids': output_centroids}
+              'output_centroids': output_centroids,
+              'time_window': time_window}
 
     # Call underlying engine with or without caching
-    if use_cache is True:
+    # (a file kept open for time_window can't be cached)
+    if use_cache is True and time_window is None:
         try:
             from anuga.caching import cache
         except:
@@ -169,7 +179,8 @@ def _file_function(filename,
                    time_limit=None,
                    verbose=False,
                    boundary_polygon=None,
-                   output_centroids=False):
+                   output_centroids=False,
+                   time_window=None):
     """Internal function
     
     See file_function for documentatiton
@@ -203,7 +214,8 @@ def _file_function(filename,
                                         time_limit=time_limit,
                                         verbose=verbose,
                                         boundary_polygon=boundary_polygon,
-                                        output_centroids=output_centroids)
+                                        output_centroids=output_centroids,
+                                        time_window=time_window)
     elif ext in [".csv"]:
         # FIXME (Ole): Could add csv file here to address Ted Rigby's
         # suggestion about reading hydrographs.
@@ -222,7 +234,8 @@ def get_netcdf_file_function(filename,
                              time_limit=None,            
                              verbose=False,
                              boundary_polygon=None,
-                             output_centroids=False):
+                             output_centroids=False,
+                             time_window=None):
     """Read time history of spatial data from NetCDF sww file and
     return a callable object f(t,x,y)
     which will return interpolated values based on the input file.
@@ -443,17 +456,30 @@ def get_netcdf_file_function(filename,
         log.critical('    Start time:   %f' % starttime)
         
     
+    if boundary_polygon is None:
+        gauge_id = None
+
+    # Only read time slices when they are needed if requested
+    lazy = time_window is not None and spatial \
+           and interpolation_points is not None
+
     # Produce values for desired data points at
     # each timestep for each quantity
     quantities = {}
+    open_files = [fid]
     for i, name in enumerate(quantity_names):
-        quantities[name] = fid.variables[name][:]
-        if boundary_polygon is not None:
-            #removes sts points that do not lie on boundary
-            quantities[name] = num.take(quantities[name], gauge_id, axis=1)
+        if lazy:
+            quantities[name] = File_quantity(fid.variables[name], gauge_id,
+                                             open_files)
+        else:
+            quantities[name] = fid.variables[name][:]
+            if boundary_polygon is not None:
+                #removes sts points that do not lie on boundary
+                quantities[name] = num.take(quantities[name], gauge_id, axis=1)
             
     # Close sww, tms or sts netcdf file         
-    fid.close()
+    if not lazy:
+        fid.close()
 
     from anuga.fit_interpolate.interpolate import Interpolation_function
 
@@ -477,8 +503,56 @@ def get_netcdf_file_function(filename,
                                    time_thinning=time_thinning,
                                    verbose=verbose,
                                    gauge_neighbour_id=gauge_neighbour_id,
-                                   output_centroids=output_centroids),
+                                   output_centroids=output_centroids,
+                                   time_window=time_window),
             starttime)
 
     # NOTE (Ole): Caching Interpolation function is too slow as
     # the very long parameters need to be hashed.
+
+
+class File_quantity:
+    """Quantity stored in an open NetCDF file.
+
+    Values are only read from the file when the object is sliced, e.g.
+    Q[i0:i1] reads time slices i0 to i1-1. If point_ids is given only
+    those points (columns) of the quantity are returned.
+
+    open_files is a list of the open files the variable is read from,
+    shared by the quantities read from the same file, so that close()
+    closes each file once.
+    """
+
+    def __init__(self, variable, point_ids=None, open_files=None):
+
+        self.variable = variable
+        self.point_ids = point_ids
+
+        if open_files is None:
+            open_files = []
+        self.open_files = open_files
+
+        shape = tuple(variable.shape)
+        if point_ids is not None:
+            shape = shape[:-1] + (len(point_ids),)
+        self.shape = shape
+
+    def __getitem__(self, key):
+
+        msg = 'File quantity has been closed'
+        assert self.variable is not None, msg
+
+        values = num.array(self.variable[key])
+        if self.point_ids is not None:
+            values = num.take(values, self.point_ids, axis=-1)
+
+        return values
+
+    def close(self):
+        """Close the file the quantity is read from
+        """
+
+        while self.open_files:
+            self.open_files.pop().close()
+
+        self.variable = None
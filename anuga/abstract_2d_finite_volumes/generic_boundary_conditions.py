@@ -536,6 +536,11 @@ class File_boundary(Boundary):
     an instance of class descending from class Boundary.
     This will be used in case model time exceeds that available in the 
     underlying data.
+
+    Optional keyword argument time_window makes the boundary read and
+    interpolate the file in blocks of time_window time slices as the model
+    time progresses instead of all at once (see file_function). The file
+    is then kept open until close() is called.
        
     """
 
@@ -548,7 +553,8 @@ class File_boundary(Boundary):
                  boundary_polygon=None,    
                  default_boundary=None,
                  use_cache=False, 
-                 verbose=False): 
+                 verbose=False,
+                 time_window=None): 
 
         import time
         from anuga.config import time_format
@@ -597,7 +603,8 @@ class File_boundary(Boundary):
                                time_limit=time_limit,
                                use_cache=use_cache, 
                                verbose=verbose,
-                               boundary_polygon=boundary_polygon)
+                               boundary_polygon=boundary_polygon,
+                               time_window=time_window)
                              
         # Check and store default_boundary
         msg = 'Keyword argument default_boundary must be either None '
@@ -611,6 +618,10 @@ class File_boundary(Boundary):
         self.domain = domain
         self.verbose = verbose
 
+        # Index of file function point for each domain boundary edge,
+        # set up when first used by evaluate_segment
+        self.point_ids = None
+
 
         # Here we'll flag indices outside the mesh as a warning
         # as suggested by Joaquim Luis in sourceforge posting
@@ -643,6 +654,13 @@ class File_boundary(Boundary):
         return 'File boundary'
 
 
+    def close(self):
+        """Close the file kept open by the time_window mode
+        """
+
+        self.F.close()
+
+
     def evaluate(self, vol_id=None, edge_id=None):
         """Return linearly interpolated values based on domain.time
         at midpoint of segment defined by vol_id and edge_id.
@@ -671,42 +689,10 @@ class File_boundary(Boundary):
                     # for instance. 
                     res = res.copy() 
                     
-                    if self.default_boundary_invoked is False:
-                        # Issue warning the first time
-                        if self.verbose:
-                            msg = '%s' %str(e)
-                            msg += 'Instead I will use the default boundary: %s\n'\
-                                %str(self.default_boundary) 
-                            msg += 'Note: Further warnings will be supressed'
-                            log.critical(msg)
-                   
-                        # FIXME (Ole): Replace this crude flag with
-                        # Python's ability to print warnings only once.
-                        # See http://docs.python.org/lib/warning-filter.html
-                        self.default_boundary_invoked = True
+                    self.warn_default_boundary_invoked(e)
             
             if num.any(res == NAN):
-                x,y=self.midpoint_coordinates[i,:]
-                msg = 'NAN value found in file_boundary at '
-                msg += 'point id #%d: (%.2f, %.2f).\n' %(i, x, y)
-
-                if hasattr(self.F, 'indices_outside_mesh') and\
-                       len(self.F.indices_outside_mesh) > 0:
-                    # Check if NAN point is due it being outside
-                    # boundary defined in sww file.
-
-                    if i in self.F.indices_outside_mesh:
-                        msg += 'This point refers to one outside the '
-                        msg += 'mesh defined by the file %s.\n'\
-                               %self.F.filename
-                        msg += 'Make sure that the file covers '
-                        msg += 'the boundary segment it is assigned to '
-                        msg += 'in set_boundary.'
-                    else:
-                        msg += 'This point is inside the mesh defined '
-                        msg += 'the file %s.\n' %self.F.filename
-                        msg += 'Check this file for NANs.'
-                raise Exception(msg)
+                raise Exception(self.nan_message(i))
             
             return res 
         else:
@@ -714,6 +700,131 @@ class File_boundary(Boundary):
             msg += 'vol_id=%s, edge_id=%s' %(str(vol_id), str(edge_id))
             raise Exception(msg)
 
+
+    def evaluate_segment(self, domain, segment_edges):
+        """Evaluate boundary at all edges listed in segment_edges,
+        interpolating at all the edge midpoints at once.
+        """
+
+        if segment_edges is None:
+            return
+        if domain is None:
+            return
+
+        ids = segment_edges
+
+        vol_ids  = domain.boundary_cells[ids]
+        edge_ids = domain.boundary_edges[ids]
+
+        point_ids = self.get_point_ids(domain)[ids]
+
+        # FIXME (Ole): I think this should be get_time(), see ticket:306
+        t = self.domain.time
+
+        try:
+            q_bdry = self.F(t, point_id=point_ids)
+        except Modeltime_too_early, e:
+            raise Modeltime_too_early(e)
+        except Modeltime_too_late, e:
+            if self.default_boundary is None:
+                raise Exception(e) # Reraise exception
+            else:
+                # Pass control to default boundary
+                self.default_boundary.evaluate_segment(domain, segment_edges)
+                self.warn_default_boundary_invoked(e)
+                return
+
+        nan_points = num.any(q_bdry == NAN, axis=0)
+        if num.any(nan_points):
+            i = point_ids[num.nonzero(nan_points)[0][0]]
+            raise Exception(self.nan_message(i))
+
+        conserved_quantities = True
+        if len(q_bdry) == len(domain.evolved_quantities):
+            # enough values to set evolved quantities
+            conserved_quantities = False
+
+        #--------------------------------------------------
+        # First populate all the boundary values with
+        # interior edge values
+        #--------------------------------------------------
+        if  conserved_quantities:
+            for j, name in enumerate(domain.evolved_quantities):
+                Q = domain.quantities[name]
+                Q.boundary_values[ids] = Q.edge_values[vol_ids,edge_ids]
+
+        #--------------------------------------------------
+        # Now over write with values from file
+        #--------------------------------------------------
+        if conserved_quantities:
+            quantities = domain.conserved_quantities
+        else:
+            quantities = domain.evolved_quantities
+
+        for j, name in enumerate(quantities):
+            Q = domain.quantities[name]
+            Q.boundary_values[ids] = q_bdry[j]
+
+
+    def get_point_ids(self, domain):
+        """Return array of file function point indices for each
+        boundary edge of domain, i.e. indexed like domain.boundary_cells
+        """
+
+        if self.point_ids is None:
+            self.point_ids = num.array([self.boundary_indices[vol_id, edge_id]
+                                        for vol_id, edge_id in
+                                        zip(domain.boundary_cells,
+                                            domain.boundary_edges)], num.int)
+
+        return self.point_ids
+
+
+    def warn_default_boundary_invoked(self, e):
+        """Issue warning the first time the default boundary is used
+        """
+
+        if self.default_boundary_invoked is False:
+            if self.verbose:
+                msg = '%s' %str(e)
+                msg += 'Instead I will use the default boundary: %s\n'\
+                    %str(self.default_boundary) 
+                msg += 'Note: Further warnings will be supressed'
+                log.critical(msg)
+       
+            # FIXME (Ole): Replace this crude flag with
+            # Python's ability to print warnings only once.
+            # See http://docs.python.org/lib/warning-filter.html
+            self.default_boundary_invoked = True
+
+
+    def nan_message(self, i):
+        """Return error message for NAN value at file function point i
+        """
+
+        x,y=self.midpoint_coordinates[i,:]
+        msg = 'NAN value found in file_boundary at '
+        msg += 'point id #%d: (%.2f, %.2f).\n' %(i, x, y)
+
+        if hasattr(self.F, 'indices_outside_mesh') and\
+               len(self.F.indices_outside_mesh) > 0:
+            # Check if NAN point is due it being outside
+            # boundary defined in sww file.
+
+            if i in self.F.indices_outside_mesh:
+                msg += 'This point refers to one outside the '
+                msg += 'mesh defined by the file %s.\n'\
+                       %self.F.filename
+                msg += 'Make sure that the file covers '
+                msg += 'the boundary segment it is assigned to '
+                msg += 'in set_boundary.'
+            else:
+                msg += 'This point is inside the mesh defined '
+                msg += 'the file %s.\n' %self.F.filename
+                msg += 'Check this file for NANs.'
+
+        return msg
+
 class AWI_boundary(Boundary):
     """The AWI_boundary reads values for the conserved
     quantities (only STAGE) from an sww NetCDF file, and returns interpolated values
@@ -824,6 +935,10 @@ class AWI_boundary(Boundary):
         msg += 'a list or an array of length %d' % d
         assert len(q) == d, msg
 
+        # Index of file function point for each domain boundary edge,
+        # set up when first used by evaluate_segment
+        self.point_ids = None
+
 
     def __repr__(self):
         return 'File boundary'
@@ -841,7 +956,7 @@ class AWI_boundary(Boundary):
             i = self.boundary_indices[vol_id, edge_id]
             res = self.F(t, point_id=i)
 
-            if res == NAN:
+            if num.any(res == NAN):
                 x,y = self.midpoint_coordinates[i,:]
                 msg = 'NAN value found in file_boundary at '
                 msg += 'point id #%d: (%.2f, %.2f).\n' % (i, x, y)
@@ -872,4 +987,48 @@ class AWI_boundary(Boundary):
             return self.F(t)
 
 
+    def evaluate_segment(self, domain, segment_edges):
+        """Evaluate boundary at all edges listed in segment_edges, taking
+        stage interpolated at all edge midpoints at once and the other
+        quantities from the interior edge values.
+        """
+
+        if segment_edges is None:
+            return
+        if domain is None:
+            return
+
+        ids = segment_edges
+
+        vol_ids  = domain.boundary_cells[ids]
+        edge_ids = domain.boundary_edges[ids]
+
+        if self.point_ids is None:
+            self.point_ids = num.array([self.boundary_indices[vol_id, edge_id]
+                                        for vol_id, edge_id in
+                                        zip(domain.boundary_cells,
+                                            domain.boundary_edges)], num.int)
+
+        point_ids = self.point_ids[ids]
+
+        t = self.domain.time
+        res = self.F(t, point_id=point_ids)
+
+        nan_points = res[0] == NAN
+        if num.any(nan_points):
+            i = point_ids[num.nonzero(nan_points)[0][0]]
+            x,y = self.midpoint_coordinates[i,:]
+            msg = 'NAN value found in file_boundary at '
+            msg += 'point id #%d: (%.2f, %.2f).\n' % (i, x, y)
+            raise Exception(msg)
+
+        for j, name in enumerate(domain.evolved_quantities):
+            Q = domain.quantities[name]
+            Q.boundary_values[ids] = Q.edge_values[vol_ids,edge_ids]
+
+        # Take stage, leave momentum alone
+        Q = domain.quantities[domain.conserved_quantities[0]]
+        Q.boundary_values[ids] = res[0]
+
+
 
@@ -324,6 +324,9 @@ class Generic_Domain:
 
         self.last_walltime = walltime()
 
+        # Profiling of evolve phases (see set_profiling)
+        self.profiler = None
+
         # Monitoring
         self.quantities_to_be_monitored = None
         self.monitor_polygon = None
@@ -434,6 +437,18 @@ class Generic_Domain:
     def get_interpolation_object(self, *args, **kwargs):
         return self.mesh.get_interpolation_object(*args, **kwargs)
 
+    def get_spatial_index(self, *args, **kwargs):
+        return self.mesh.get_spatial_index(*args, **kwargs)
+
+    def get_triangles_inside_polygon(self, *args, **kwargs):
+        return self.mesh.get_triangles_inside_polygon(*args, **kwargs)
+
+    def get_triangles_inside_circle(self, *args, **kwargs):
+        return self.mesh.get_triangles_inside_circle(*args, **kwargs)
+
+    def get_triangles_intersecting_line(self, *args, **kwargs):
+        return self.mesh.get_triangles_intersecting_line(*args, **kwargs)
+
     def get_tagged_elements(self, *args, **kwargs):
         return self.mesh.get_tagged_elements(*args, **kwargs)
 
@@ -1052,8 +1067,7 @@ class Generic_Domain:
                 raise Exception(msg)
 
             # Get indices for centroids that are inside polygon
-            points = self.get_centroid_coordinates(absolute=True)
-            self.monitor_indices = inside_polygon(points, polygon)
+            self.monitor_indices = self.get_triangles_inside_polygon(polygon)
 
         if time_interval is not None:
             assert len(time_interval) == 2
@@ -1215,6 +1229,91 @@ class Generic_Domain:
     def print_boundary_statistics(self, quantities=None, tags=None):
         print self.boundary_statistics(quantities, tags)
 
+    def set_profiling(self, flag=True):
+        """Switch on (or off) wall clock profiling of the phases of evolve.
+
+        The time spent in distribute_to_vertices_and_edges, each boundary
+        tag, compute_fluxes, compute_forcing_terms, each fractional step
+        operator, update_ghosts, update_extrema, store_timestep etc is
+        recorded per yieldstep and cumulatively. There is no overhead
+        when profiling is off.
+        """
+
+        from evolve_profiler import Evolve_profiler
+
+        if self.profiler is not None:
+            self.profiler.uninstall()
+            self.profiler = None
+
+        if flag:
+            self.profiler = Evolve_profiler(self)
+            self.profiler.install()
+
+    def get_profiling(self):
+
+        return self.profiler is not None
+
+    def __getstate__(self):
+        """Pickle (e.g. checkpoint) the domain without the timed methods
+        installed by the profiler, which can't be pickled.
+        """
+
+        state = self.__dict__.copy()
+
+        if self.profiler is not None:
+            from evolve_profiler import phase_methods
+            for name in phase_methods:
+                state.pop(name, None)
+
+        return state
+
+    def __setstate__(self, state):
+
+        self.__dict__.update(state)
+
+        if self.profiler is not None:
+            self.profiler.install()
+
+    def get_profile(self, cumulative=True):
+        """Return dictionary of wall clock time (s) spent in each phase
+        of evolve, over the whole run or, if cumulative is False, the
+        last yieldstep. Requires set_profiling.
+        """
+
+        msg = 'Profiling must be switched on using domain.set_profiling()'
+        assert self.profiler is not None, msg
+
+        return self.profiler.get_profile(cumulative)
+
+    def get_parallel_profile(self, cumulative=True):
+        """Return dictionary of (min, mean, max) over all processors of
+        the wall clock time spent in each phase of evolve. Needs to be
+        called by all processors.
+        """
+
+        msg = 'Profiling must be switched on using domain.set_profiling()'
+        assert self.profiler is not None, msg
+
+        return self.profiler.get_parallel_profile(cumulative)
+
+    def profile_statistics(self, cumulative=True):
+        """Return string with table of wall clock time spent in each
+        phase of evolve (min, mean, max over all processors). Needs to
+        be called by all processors.
+        """
+
+        msg = 'Profiling must be switched on using domain.set_profiling()'
+        assert self.profiler is not None, msg
+
+        return self.profiler.profile_statistics(cumulative)
+
+    def print_profile_statistics(self, cumulative=True):
+
+        msg = self.profile_statistics(cumulative)
+
+        if self.processor == 0:
+            print msg
+
     def write_boundary_statistics(self, quantities=None, tags=None):
         log.critical(self.boundary_statistics(quantities, tags))
 
@@ -1548,7 +1647,10 @@ class Generic_Domain:
         for t in self._evolve_base(yieldstep=yieldstep,
                                    finaltime=finaltime, duration=duration,
                                    skip_initial_step=skip_initial_step):
-            
+
+            if self.profiler is not None:
+                self.profiler.end_yieldstep()
+
             # Pass control on to outer loop for more specific actions
             yield(t)
         
@@ -2143,7 +2245,12 @@ class Generic_Domain:
 
             boundary_segment_edges = self.tag_boundary_cells[tag]
 
-            B.evaluate_segment(self, boundary_segment_edges)
+            if self.profiler is None:
+                B.evaluate_segment(self, boundary_segment_edges)
+            else:
+                self.profiler.time_call('update_boundary[%s]' % tag,
+                                        B.evaluate_segment,
+                                        self, boundary_segment_edges)
         
 
     def compute_fluxes(self):
@@ -2154,7 +2261,11 @@ class Generic_Domain:
     def apply_fractional_steps(self):
 
         for operator in self.fractional_step_operators:
-            operator()
+            if self.profiler is None:
+                operator()
+            else:
+                self.profiler.time_call('operator[%s]' % operator.label,
+                                        operator)
 
 
     def log_operator_timestepping_statistics(self):
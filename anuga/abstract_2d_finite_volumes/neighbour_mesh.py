@@ -1243,6 +1243,99 @@ class Mesh(General_mesh):
         return I
 
 
+    def get_spatial_index(self):
+        """Get spatial index of the (absolute) centroids of the triangles.
+
+        This is built once for the mesh and used to find the triangles
+        inside polygons and circles or intersecting lines.
+        """
+
+        if hasattr(self, 'spatial_index'):
+            return self.spatial_index
+
+        from anuga.geometry.point_index import Point_index
+
+        centroids = self.get_centroid_coordinates(absolute=True)
+        self.spatial_index = Point_index(centroids)
+
+        # Largest distance from a centroid to the vertices of its triangle,
+        # so that triangles overlapping a box have their centroid in the
+        # box grown by this amount
+        if len(centroids) > 0:
+            V = self.get_vertex_coordinates(absolute=True).reshape((-1, 3, 2))
+            d = V - centroids[:, num.newaxis, :]
+            self.triangle_extent = num.sqrt((d**2).sum(axis=2).max())
+        else:
+            self.triangle_extent = 0.0
+
+        self.region_index_cache = {}
+
+        return self.spatial_index
+
+
+    def get_triangles_inside_polygon(self, polygon, closed=True):
+        """Return indices of triangles with centroids inside polygon.
+
+        Same as inside_polygon(centroids, polygon, closed) with absolute
+        centroids, but using the spatial index of the mesh. Results are
+        cached by polygon geometry so repeated polygons are free.
+        """
+
+        index = self.get_spatial_index()
+
+        polygon = num.array(polygon, num.float)
+        key = ('polygon', closed, polygon.tostring())
+
+        if key not in self.region_index_cache:
+            self.region_index_cache[key] = index.inside_polygon(polygon, closed)
+
+        return self.region_index_cache[key].copy()
+
+
+    def get_triangles_inside_circle(self, center, radius):
+        """Return indices of triangles with centroids strictly inside
+        circle (absolute coordinates).
+        """
+
+        index = self.get_spatial_index()
+
+        key = ('circle', float(center[0]), float(center[1]), float(radius))
+
+        if key not in self.region_index_cache:
+            self.region_index_cache[key] = index.query_circle(center, radius)
+
+        return self.region_index_cache[key].copy()
+
+
+    def get_triangles_intersecting_line(self, line):
+        """Return indices of triangles intersecting line segment.
+
+        Same as line_intersect(vertex_coordinates, line) with absolute
+        vertex coordinates but only testing triangles near the line.
+        """
+
+        from anuga.geometry.polygon import line_intersect
+
+        index = self.get_spatial_index()
+
+        line = num.array(line, num.float)
+        key = ('line', line.tostring())
+
+        if key not in self.region_index_cache:
+            e = self.triangle_extent
+            candidates = index.query_box(line[:, 0].min()-e, line[:, 0].max()+e,
+                                         line[:, 1].min()-e, line[:, 1].max()+e)
+
+            if len(candidates) > 0:
+                V = self.get_vertex_coordinates(absolute=True)
+                rows = (3*candidates[:, num.newaxis] + num.arange(3)).ravel()
+                candidates = candidates[num.sort(line_intersect(V[rows], line))]
+
+            self.region_index_cache[key] = candidates
+
+        return self.region_index_cache[key].copy()
+
+
 class Triangle_intersection:
     """Store information about line segments intersecting a triangle
 
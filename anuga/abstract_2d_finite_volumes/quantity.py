@@ -834,8 +834,7 @@ class Quantity:
 
             location = 'centroids'
 
-            points = self.domain.get_centroid_coordinates(absolute=True)
-            indices = inside_polygon(points, polygon)
+            indices = self.domain.get_triangles_inside_polygon(polygon)
 
             self.set_values_from_constant(numeric, location, indices, verbose)
 
@@ -913,13 +912,18 @@ class Quantity:
                 max_read_lines = self.domain.points_file_block_line_size
             else:
                 max_read_lines = default_block_line_size
+            if hasattr(self.domain, 'fit_processes'):
+                processes = self.domain.fit_processes
+            else:
+                processes = None
             filename_ext = os.path.splitext(filename)[1]
             # pts file in the format of .txt or .pts
             if filename_ext in ['.txt', '.pts', '.csv']:
                 self.set_values_from_file(filename, attribute_name, alpha, location,
                                       indices, verbose=verbose,
                                       max_read_lines=max_read_lines,
-                                      use_cache=use_cache)
+                                      use_cache=use_cache,
+                                      processes=processes)
             # dem file in the format of .asc, .grd or .dem
             elif filename_ext in ['.asc', '.grd', '.dem']:
                 self.set_values_from_utm_grid_file(filename, location,
@@ -1236,11 +1240,15 @@ class Quantity:
                              indices,
                              verbose=False,
                              use_cache=False,
-                             max_read_lines=None):
+                             max_read_lines=None,
+                             processes=None):
         """Set quantity based on arbitrary points in a points file using
         attribute_name selects name of attribute present in file.
         If attribute_name is not specified, use first available attribute
         as defined in geospatial_data.
+
+        processes is the number of worker processes used to build the
+        fit (see Fit.fit).
         """
 
 
@@ -1268,7 +1276,8 @@ class Quantity:
                                             attribute_name=attribute_name,
                                             use_cache=use_cache,
                                             verbose=verbose,
-                                            max_read_lines=max_read_lines)
+                                            max_read_lines=max_read_lines,
+                                            processes=processes)
         else:
             # This variant will cause Mesh object to be recreated
             # in fit_to_mesh thus doubling up on the neighbour structure
@@ -191,25 +191,14 @@ class Region(object):
     def setup_indices_circle(self):
 
         # Determine indices in circular region
-        N = self.domain.get_number_of_triangles()
-        points = self.domain.get_centroid_coordinates(absolute=True)
-
-        indices = []
-
         c = self.center
         r = self.radius
 
-
-        intersect = False
-        for k in range(N):
-            x, y = points[k,:]    # Centroid
-
-            if ((x-c[0])**2+(y-c[1])**2) < r**2:
-                intersect = True
-                indices.append(k)
+        indices = self.domain.get_triangles_inside_circle(c, r)
+        intersect = len(indices) > 0
 
         if len(indices) is 0:
-            self.indices = indices
+            self.indices = []
         else:
             self.indices = num.asarray(indices)
 
@@ -221,15 +210,12 @@ class Region(object):
     def setup_indices_polygon(self):
 
         # Determine indices for polygonal region
-        points = self.domain.get_centroid_coordinates(absolute=True)
-        vertex_coordinates = self.domain.get_vertex_coordinates(absolute=True)
-        
-        indices = inside_polygon(points, self.polygon)
+        indices = self.domain.get_triangles_inside_polygon(self.polygon)
 
         if self.expand_polygon :
             n = len(self.polygon)
             for j in range(n):
-                tris_0 = line_intersect(vertex_coordinates,
+                tris_0 = self.domain.get_triangles_intersecting_line(
                                         [self.polygon[j],self.polygon[(j+1)%n]])
                 indices = num.union1d(tris_0, indices)            
 
@@ -252,9 +238,7 @@ class Region(object):
 
         # Determine indices for triangles intersecting a line  region
         
-        vertex_coordinates = self.domain.get_vertex_coordinates(absolute=True)
-        
-        indices = line_intersect(vertex_coordinates, self.line) 
+        indices = self.domain.get_triangles_intersecting_line(self.line)
         
         if len(indices) is 0:
             self.indices = indices
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+
+import unittest
+import os
+
+import anuga
+
+
+class Test_evolve_profiler(unittest.TestCase):
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        if os.path.exists('profile_test.sww'):
+            os.remove('profile_test.sww')
+
+    def create_domain(self):
+
+        domain = anuga.rectangular_cross_domain(4, 4)
+        domain.set_name('profile_test')
+        domain.set_quantity('elevation', lambda x, y: -x)
+        domain.set_quantity('stage', 0.0)
+
+        Br = anuga.Reflective_boundary(domain)
+        Bd = anuga.Dirichlet_boundary([0.1, 0.0, 0.0])
+        domain.set_boundary({'left': Bd, 'right': Br, 'top': Br, 'bottom': Br})
+
+        anuga.Rate_operator(domain, rate=0.01, label='rain')
+
+        return domain
+
+    def test_profiling_off(self):
+
+        domain = self.create_domain()
+
+        assert not domain.get_profiling()
+        assert 'compute_fluxes' not in domain.__dict__
+
+        for t in domain.evolve(yieldstep=0.1, finaltime=0.2):
+            pass
+
+        self.assertRaises(AssertionError, domain.get_profile)
+
+    def test_profiling(self):
+
+        domain = self.create_domain()
+        domain.set_profiling()
+
+        assert domain.get_profiling()
+
+        for t in domain.evolve(yieldstep=0.1, finaltime=0.3):
+            last = domain.get_profile(cumulative=False)
+
+        profile = domain.get_profile()
+
+        for phase in ['distribute_to_vertices_and_edges',
+                      'update_boundary',
+                      'apply_fractional_steps',
+                      'compute_fluxes',
+                      'compute_forcing_terms',
+                      'update_conserved_quantities',
+                      'update_ghosts',
+                      'store_timestep',
+                      'update_boundary[left]',
+                      'update_boundary[right]']:
+            assert phase in profile, phase
+            assert profile[phase] >= 0.0
+
+        operator_phases = [p for p in profile if p.startswith('operator[rain')]
+        assert len(operator_phases) == 1
+
+        # The last yieldstep is part of the cumulative time
+        for phase in last:
+            assert last[phase] <= profile[phase]
+
+        parallel_profile = domain.get_parallel_profile()
+        tmin, tmean, tmax = parallel_profile['compute_fluxes']
+        assert tmin == tmean == tmax == profile['compute_fluxes']
+
+        msg = domain.profile_statistics()
+        assert 'compute_fluxes' in msg
+        assert 'update_boundary[left]' in msg
+
+        # Switching off restores the original methods
+        domain.set_profiling(False)
+        assert not domain.get_profiling()
+        assert 'compute_fluxes' not in domain.__dict__
+        assert 'update_boundary' not in domain.__dict__
+
+    def test_profiling_overrides(self):
+        """The timed methods call the methods of the domain's class
+        """
+
+        domain = self.create_domain()
+
+        calls = []
+
+        class Domain(domain.__class__):
+            def update_boundary(self):
+                calls.append('update_boundary')
+
+        domain.__class__ = Domain
+        domain.set_profiling()
+
+        domain.update_boundary()
+
+        assert calls == ['update_boundary']
+        assert 'update_boundary' in domain.get_profile()
+        assert 'update_boundary[left]' not in domain.get_profile()
+
+    def test_profiling_checkpoint(self):
+        """A profiled domain can be pickled, e.g. for checkpointing
+        """
+
+        import cPickle
+        import shutil
+        import tempfile
+
+        from anuga.shallow_water.checkpoint import load_checkpoint_file
+
+        # The default rate of a Rate_operator can't be pickled
+        domain = self.create_domain()
+        domain.fractional_step_operators = []
+
+        checkpoint_dir = tempfile.mkdtemp()
+        try:
+            domain.set_checkpointing(checkpoint_dir=checkpoint_dir,
+                                     checkpoint_step=1)
+            domain.set_profiling()
+
+            for t in domain.evolve(yieldstep=0.1, finaltime=0.2):
+                pass
+
+            new_domain = load_checkpoint_file(domain_name='profile_test',
+                                              checkpoint_dir=checkpoint_dir)
+
+            assert new_domain.get_time() == 0.2
+            assert new_domain.get_profiling()
+            assert new_domain.profiler.domain is new_domain
+            assert 'compute_fluxes' in new_domain.__dict__
+
+            new_domain = cPickle.loads(cPickle.dumps(new_domain, protocol=-1))
+
+            for t in new_domain.evolve(yieldstep=0.1, finaltime=0.3):
+                last = new_domain.get_profile(cumulative=False)
+        finally:
+            shutil.rmtree(checkpoint_dir)
+
+        assert 'compute_fluxes' in last
+
+        new_domain.set_profiling(False)
+        assert 'compute_fluxes' not in new_domain.__dict__
+
+
+#-------------------------------------------------------------
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(Test_evolve_profiler, 'test')
+    runner = unittest.TextTestRunner()
+    runner.run(suite)
@@ -346,6 +346,10 @@ class Test_Generic_Boundary_Conditions(unittest.TestCase):
         #assert allclose(F.midpoint_coordinates[(2,0)], [3.0, 0.0])
         #assert allclose(F.midpoint_coordinates[(2,1)], [3.0, 1.0])
 
+        # Nothing is kept open without time_window, close does no harm
+        F.close()
+        assert F.F.quantities is None
+
 
         #Check time interpolation
         from anuga.config import default_boundary_tag
@@ -1846,6 +1846,48 @@ class Test_Mesh(unittest.TestCase):
             assert num.allclose(total_length, ref_length)
 
 
+    def test_get_triangles_inside_polygon(self):
+        """Compare spatial index queries with brute force search
+        """
+
+        from anuga.geometry.polygon import inside_polygon, line_intersect
+
+        points, vertices, boundary = rectangular(20, 15, len1=20.0, len2=15.0)
+        geo = Geo_reference(56, 1000.0, 2000.0)
+        mesh = Mesh(points, vertices, boundary, geo_reference=geo)
+
+        C = mesh.get_centroid_coordinates(absolute=True)
+        V = mesh.get_vertex_coordinates(absolute=True)
+
+        num.random.seed(17)
+        for i in range(20):
+            polygon = num.random.rand(5, 2)*[25.0, 20.0] + [997.0, 1997.0]
+            indices = mesh.get_triangles_inside_polygon(polygon)
+            assert num.alltrue(indices == num.sort(inside_polygon(C, polygon)))
+
+            line = num.random.rand(2, 2)*[25.0, 20.0] + [997.0, 1997.0]
+            indices = mesh.get_triangles_intersecting_line(line)
+            assert num.alltrue(indices == num.sort(line_intersect(V, line)))
+
+            center = num.random.rand(2)*[20.0, 15.0] + [1000.0, 2000.0]
+            radius = 5.0*num.random.rand()
+            indices = mesh.get_triangles_inside_circle(center, radius)
+            d2 = num.sum((C - center)**2, axis=1)
+            assert num.alltrue(indices == num.where(d2 < radius**2)[0])
+
+        # Boundary of the mesh is included
+        polygon = [[1000.0, 2000.0], [1020.0, 2000.0],
+                   [1020.0, 2015.0], [1000.0, 2015.0]]
+        assert len(mesh.get_triangles_inside_polygon(polygon)) == len(mesh)
+
+        # Repeated polygons come from the cache, but changing the
+        # result does not change the cache
+        indices = mesh.get_triangles_inside_polygon(polygon)
+        indices[:] = 0
+        assert num.alltrue(mesh.get_triangles_inside_polygon(polygon) ==
+                           num.arange(len(mesh)))
+
+
 #-------------------------------------------------------------
 
 if __name__ == "__main__":
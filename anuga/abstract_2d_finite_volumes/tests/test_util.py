@@ -969,6 +969,84 @@ class Test_Util(unittest.TestCase):
 
         os.remove(filename + '.sww')
 
+    def test_spatio_temporal_file_function_time_window(self):
+        """File function reading the sww file in blocks of time_window
+        time slices gives the same values as reading it all at once,
+        also when time goes backwards.
+        """
+
+        from anuga.abstract_2d_finite_volumes.mesh_factory import rectangular
+        from anuga.shallow_water.shallow_water_domain import Domain
+
+        filename = 'test_file_function_time_window'
+
+        points, vertices, boundary =\
+                rectangular(4, 4, 15, 30, origin = (0, -20))
+
+        domain = Domain(points, vertices, boundary)
+        domain.set_datadir('.')
+        domain.set_name(filename)
+        domain.initialise_storage()
+
+        for i in range(21):
+            t = 60.0*i
+            domain.set_quantity('stage', lambda x,y: 3*x - y**2 + 2*t)
+            domain.set_quantity('xmomentum', lambda x,y: x + y + t**2)
+            domain.set_quantity('ymomentum',
+                                lambda x,y: x**2 + y**2*num.sin(t*num.pi/600))
+            domain.set_time(t)
+            domain.store_timestep()
+
+        interpolation_points = [[0,-20], [1,0], [0,1], [1.1, 3.14], [10,-12.5]]
+
+        for time_thinning in [1, 2]:
+            F = file_function(filename + '.sww',
+                              quantities=domain.conserved_quantities,
+                              interpolation_points=interpolation_points,
+                              time_thinning=time_thinning)
+
+            G = file_function(filename + '.sww',
+                              quantities=domain.conserved_quantities,
+                              interpolation_points=interpolation_points,
+                              time_thinning=time_thinning,
+                              time_window=3)
+
+            assert num.allclose(F.get_time(), G.get_time())
+            assert G.precomputed_values['stage'].shape == (3, 5)
+
+            times = range(0, 1201, 25) + [1200, 310, 0, 1000, 605]
+            for t in times:
+                assert num.allclose(F(t, point_id=range(5)),
+                                    G(t, point_id=range(5)))
+                for id in range(5):
+                    assert num.allclose(F(t, point_id=id), G(t, point_id=id))
+
+            # Only one block is kept
+            assert G.precomputed_values['stage'].shape[0] <= 3
+
+            # Closing keeps the current block
+            stage = G.quantities['stage']
+            assert len(stage.open_files) == 1
+
+            G(0.0, point_id=0)
+            G.close()
+
+            assert G.quantities is None
+            assert len(stage.open_files) == 0
+            assert num.allclose(F(0.0, point_id=0), G(0.0, point_id=0))
+
+            try:
+                G(1200.0, point_id=0)
+            except AssertionError:
+                pass
+            else:
+                raise Exception('Closed file function should fail')
+
+            G.close()
+
+        os.remove(filename + '.sww')
+
+
     def test_file_function_time_with_domain(self):
         """Test that File function interpolates correctly
         between given times. No x,y dependency here.
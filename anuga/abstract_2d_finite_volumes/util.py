@@ -37,11 +37,12 @@ def file_function(filename,
                   verbose=False,
                   use_cache=False,
                   boundary_polygon=None,
-                  output_centroids=False):
+                  output_centroids=False,
+                  time_window=None):
     from file_function import file_function as file_function_new
     return file_function_new(filename, domain, quantities, interpolation_points,
                       time_thinning, time_limit, verbose, use_cache,
-                      boundary_polygon, output_centroids)
+                      boundary_polygon, output_centroids, time_window)
 
 
 
@@ -4,7 +4,9 @@
    Geoscience Australia, 2006
 """
 import os
+import csv
 from math import sqrt
+from tempfile import mkstemp
 
 
 try:
@@ -14,7 +16,7 @@ except:
     from Scientific.Functions.Interpolation import InterpolatingFunction
     scipy_available = False
 
-from random import choice
+from random import sample
 
 import numpy as num
 
@@ -37,7 +39,9 @@ except ImportError:
     
 
 from anuga.utilities.numerical_tools import ensure_numeric
-from exposure import Exposure
+from exposure import Exposure, LAT_TITLE, LONG_TITLE, X_TITLE, Y_TITLE
+from anuga.anuga_exceptions import TitleValueError, DataMissingValuesError
+from anuga.geospatial_data.geospatial_data import Geospatial_data
 from anuga.abstract_2d_finite_volumes.util import file_function
 from anuga.geospatial_data.geospatial_data import ensure_absolute
 from anuga.utilities.numerical_tools import NAN
@@ -56,7 +60,8 @@ def inundation_damage(sww_base_name, exposure_files_in,
                       exposure_file_out_marker=None,
                       ground_floor_height=0.3,
                       overwrite=False, verbose=True,
-                                 use_cache = True):
+                                 use_cache = True,
+                      chunk_size=None, processes=None):
     """
     This is the main function for calculating tsunami damage due to
     inundation.  It gets the location of structures from the exposure
@@ -74,12 +79,37 @@ def inundation_damage(sww_base_name, exposure_files_in,
     exposure_files_in - a file or a list of files to input from
     exposure_file_out_marker -  this string will be added to the input file
                                 name to get the output file name
+    chunk_size - if given the exposure files are streamed chunk_size rows
+                 at a time and only the columns needed by the damage model
+                 are kept in memory, see _exposure_damage_chunked
+    processes - number of processes reading the sww files, see
+                calc_max_depth_and_momentum
     """
     if isinstance(exposure_files_in, basestring):
         exposure_files_in = [exposure_files_in]
 
 
     for exposure_file_in in exposure_files_in:
+        # Save info back to csv file
+        if exposure_file_out_marker is None:
+            exposure_file_out = exposure_file_in
+        else:
+            # split off extension, in such a way to deal with more than one '.' in the name of file
+            split_name = exposure_file_in.split('.')
+            exposure_file_out =  '.'.join(split_name[:-1]) + exposure_file_out_marker + \
+                                '.' + split_name[-1]
+
+        if chunk_size is not None:
+            _exposure_damage_chunked(sww_base_name, exposure_file_in,
+                                     exposure_file_out, chunk_size,
+                                     ground_floor_height=ground_floor_height,
+                                     overwrite=overwrite, verbose=verbose,
+                                     use_cache=use_cache,
+                                     processes=processes)
+            if verbose: log.critical('Augmented building file written to %s'
+                                     % exposure_file_out)
+            continue
+
         csv = Exposure(exposure_file_in,
                            title_check_list=[SHORE_DIST_LABEL,WALL_TYPE_LABEL,
                                              STR_VALUE_LABEL,CONT_VALUE_LABEL])
@@ -89,7 +119,8 @@ def inundation_damage(sww_base_name, exposure_files_in,
                         geospatial,
                         ground_floor_height=ground_floor_height,
                         verbose=verbose,
-                        use_cache=use_cache)
+                        use_cache=use_cache,
+                        processes=processes)
         edm = EventDamageModel(max_depths,
                                csv.get_column(SHORE_DIST_LABEL),
                                csv.get_column(WALL_TYPE_LABEL),
@@ -101,18 +132,183 @@ def inundation_damage(sww_base_name, exposure_files_in,
         for title, value in results_dic.iteritems():
             csv.set_column(title, value, overwrite=overwrite)
     
-        # Save info back to csv file
-        if exposure_file_out_marker is None:
-            exposure_file_out = exposure_file_in
-        else:
-            # split off extension, in such a way to deal with more than one '.' in the name of file
-            split_name = exposure_file_in.split('.')
-            exposure_file_out =  '.'.join(split_name[:-1]) + exposure_file_out_marker + \
-                                '.' + split_name[-1]
         csv.save(exposure_file_out)
         if verbose: log.critical('Augmented building file written to %s'
                                  % exposure_file_out)
-    
+
+
+def _read_csv_chunks(file_name, chunk_size):
+    """
+    Generator returning the stripped titles of a csv file, then the rows
+    of the file in lists of at most chunk_size rows.
+
+    Rows are cut to the number of titles, an IOError is raised for rows
+    with less entries than titles (as in load_csv_as_dict).
+    """
+
+    fd = open(file_name, 'rb')
+    try:
+        reader = csv.reader(fd)
+        titles = [title.strip() for title in reader.next()]
+        title_count = len(titles)
+        yield titles
+
+        chunk = []
+        for line in reader:
+            n = len(line)
+            if n < title_count:
+                msg = 'Entry in file %s had %d columns ' % (file_name, n)
+                msg += 'although there were %d headers' % title_count
+                raise IOError, msg
+            chunk.append(line[:title_count])  # skip trailing data
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if len(chunk) > 0:
+            yield chunk
+    finally:
+        fd.close()
+
+
+def _exposure_damage_chunked(sww_base_name, exposure_file_in,
+                             exposure_file_out, chunk_size,
+                             ground_floor_height=0.3,
+                             overwrite=False, verbose=True,
+                             use_cache=True, processes=None):
+    """
+    Calculate the damage of the structures in an exposure file without
+    loading the whole file, see inundation_damage.
+
+    The file is read twice, chunk_size rows at a time. The first pass
+    keeps only the location, shore distance, wall type and value columns,
+    as numeric arrays (wall types as indices into a list of names). The
+    damage model is evaluated for all structures at once and the second
+    pass writes each chunk of rows with the result columns added, so at
+    most chunk_size rows of strings are held in memory.
+
+    The output file is the same as Exposure.save would write.
+    """
+
+    chunks = _read_csv_chunks(exposure_file_in, chunk_size)
+    titles = chunks.next()
+    title_index = dict([(title, i) for i, title in enumerate(titles)])
+
+    for title in [SHORE_DIST_LABEL, WALL_TYPE_LABEL,
+                  STR_VALUE_LABEL, CONT_VALUE_LABEL]:
+        if not title_index.has_key(title):
+            msg = 'Reading error. This row is not present %s' % title
+            raise IOError, msg
+
+    if title_index.has_key(LAT_TITLE) and title_index.has_key(LONG_TITLE):
+        location_titles = [LAT_TITLE, LONG_TITLE]
+    elif title_index.has_key(X_TITLE) and title_index.has_key(Y_TITLE):
+        location_titles = [X_TITLE, Y_TITLE]
+    else:
+        msg = "Could not find location information."
+        raise TitleValueError, msg
+
+    float_titles = location_titles + [SHORE_DIST_LABEL, STR_VALUE_LABEL,
+                                      CONT_VALUE_LABEL]
+    float_columns = [title_index[title] for title in float_titles]
+    wall_column = title_index[WALL_TYPE_LABEL]
+
+    # Pass 1, the columns of the damage model
+    float_blocks = []
+    wall_blocks = []
+    wall_names = []
+    wall_codes = {}
+    for rows in chunks:
+        float_blocks.append(num.array([[float(row[j]) for j in float_columns]
+                                       for row in rows], num.float))
+        codes = []
+        for row in rows:
+            wall = row[wall_column]
+            if not wall_codes.has_key(wall):
+                wall_codes[wall] = len(wall_names)
+                wall_names.append(wall)
+            codes.append(wall_codes[wall])
+        wall_blocks.append(num.array(codes, num.int))
+
+    if len(float_blocks) == 0:
+        msg = 'Exposure file %s has no structures' % exposure_file_in
+        raise DataMissingValuesError, msg
+
+    values = num.concatenate(float_blocks)
+    del float_blocks
+    walls = num.empty(len(wall_names), object)
+    walls[:] = wall_names
+    walls = walls[num.concatenate(wall_blocks)]
+    del wall_blocks
+
+    if location_titles[0] == LAT_TITLE:
+        geospatial = Geospatial_data(latitudes=values[:,0],
+                                     longitudes=values[:,1])
+    else:
+        geospatial = Geospatial_data(data_points=values[:,:2])
+    geospatial = ensure_absolute(geospatial)
+
+    max_depths, max_momentums = calc_max_depth_and_momentum(sww_base_name,
+                        geospatial,
+                        ground_floor_height=ground_floor_height,
+                        verbose=verbose,
+                        use_cache=use_cache,
+                        processes=processes)
+    edm = EventDamageModel(max_depths, values[:,2], walls,
+                           values[:,3], values[:,4])
+    del values, walls
+    results_dic = edm.calc_damage_and_costs(verbose_csv=True,
+                                            verbose=verbose)
+
+    # Position of each result column, in the order Exposure.set_column
+    # would add them
+    out_titles = list(titles)
+    result_columns = []
+    for title, value in results_dic.iteritems():
+        if title_index.has_key(title):
+            if not overwrite:
+                msg = 'Column name %s already in use!' % title
+                raise TitleValueError, msg
+            result_columns.append((title_index[title], value))
+        else:
+            title_index[title] = len(out_titles)
+            out_titles.append(title)
+            result_columns.append((len(out_titles)-1, value))
+
+    # Pass 2, write the rows with the results
+    if os.path.abspath(exposure_file_out) == \
+           os.path.abspath(exposure_file_in):
+        fd, file_name = mkstemp(suffix='.csv',
+                                dir=os.path.dirname(exposure_file_out))
+        os.close(fd)
+    else:
+        file_name = exposure_file_out
+
+    fd = open(file_name, 'wb')
+    try:
+        writer = csv.writer(fd)
+        writer.writerow(out_titles)
+
+        chunks = _read_csv_chunks(exposure_file_in, chunk_size)
+        chunks.next()
+        first = 0
+        for rows in chunks:
+            last = first + len(rows)
+            extra = len(out_titles) - len(titles)
+            for row in rows:
+                row.extend([None]*extra)
+            for j, value in result_columns:
+                for row, x in zip(rows, value[first:last]):
+                    row[j] = x
+            writer.writerows(rows)
+            first = last
+    finally:
+        fd.close()
+
+    if file_name != exposure_file_out:
+        if os.path.exists(exposure_file_out):
+            os.remove(exposure_file_out)
+        os.rename(file_name, exposure_file_out)
+
 def add_depth_and_momentum2csv(sww_base_name, exposure_file_in,
                       exposure_file_out=None,
                       overwrite=False, verbose=True,
@@ -138,7 +334,9 @@ def add_depth_and_momentum2csv(sww_base_name, exposure_file_in,
 def calc_max_depth_and_momentum(sww_base_name, points,
                                 ground_floor_height=0.0,
                                 verbose=True,
-                                 use_cache = True):
+                                 use_cache = True,
+                                time_block=20,
+                                processes=None):
     """
     Calculate the maximum inundation height above ground floor for a list
     of locations.
@@ -148,16 +346,15 @@ def calc_max_depth_and_momentum(sww_base_name, points,
 
     These calculations are done over all the sww files with the sww_base_name
     in the specified directory.
+
+    Each sww file is read time_block timesteps at a time, see
+    calc_sww_max_depth_and_momentum. If processes is greater than 1 the
+    sww files are shared between a pool of worker processes.
     """
 
-    quantities =  ['stage', 'elevation', 'xmomentum', 'ymomentum']
     points = ensure_absolute(points)
     point_count = len(points)
 
-    # initialise the max lists
-    max_depths = [-ground_floor_height]*point_count
-    max_momentums = [-ground_floor_height]*point_count
-    
     # How many sww files are there?
     dir, base = os.path.split(sww_base_name)
     if base[-4:] == '.sww':
@@ -171,38 +368,192 @@ def calc_max_depth_and_momentum(sww_base_name, points,
         raise IOError, msg
     from os import sep
 
-    for this_sww_file in interate_over:
-        callable_sww = file_function(dir+sep+this_sww_file,
-                                     quantities=quantities,
-                                     interpolation_points=points,
-                                     verbose=verbose,
-                                     use_cache=use_cache)
-
-        for point_i, point in enumerate(points):
-            for time in callable_sww.get_time():
-                quantity_values = callable_sww(time,point_i)
-                w = quantity_values[0]
-                z = quantity_values[1]
-                uh = quantity_values[2] 
-                vh = quantity_values[3]
-
-                #print w,z,uh,vh
-                if w == NAN or z == NAN or uh == NAN or vh == NAN:
-                    continue
-                    
+    tasks = [(dir+sep+this_sww_file, points, ground_floor_height,
+              time_block, verbose, use_cache)
+             for this_sww_file in interate_over]
+
+    # initialise the max arrays
+    max_depths = -ground_floor_height*num.ones(point_count, num.float)
+    max_momentums = -ground_floor_height*num.ones(point_count, num.float)
+
+    if processes is not None and processes > 1:
+        from multiprocessing import Pool
+
+        pool = Pool(processes)
+        try:
+            results = pool.imap_unordered(_max_depth_and_momentum_worker,
+                                          tasks)
+            for depths, momentums in results:
+                max_depths = num.maximum(max_depths, depths)
+                max_momentums = num.maximum(max_momentums, momentums)
+        finally:
+            pool.terminate()
+    else:
+        for task in tasks:
+            depths, momentums = _max_depth_and_momentum_worker(task)
+            max_depths = num.maximum(max_depths, depths)
+            max_momentums = num.maximum(max_momentums, momentums)
+
+    return max_depths.tolist(), max_momentums.tolist()
+
+
+def calc_sww_max_depth_and_momentum(filename, points,
+                                    ground_floor_height=0.0,
+                                    time_block=20,
+                                    verbose=False,
+                                    use_cache=False):
+    """Calculate the maximum inundation height above ground floor and the
+    maximum momentum over all timesteps of one sww file.
+
+    points are absolute coordinates. The interpolation weights of the points
+    are computed once, then the stage, elevation and momentum of time_block
+    timesteps at a time are read from the file and interpolated to all
+    points together. Values and the running maxima are as computed with
+    file_function: points outside the mesh and timesteps with missing
+    values (NAN) are skipped, the minimum value is -ground_floor_height.
+
+    Return arrays of maximum depths and momentums.
+    """
+
+    from anuga.file.netcdf import NetCDFFile
+    from anuga.config import netcdf_mode_r
+
+    points = ensure_absolute(points)
+    point_count = len(points)
+
+    max_depths = -ground_floor_height*num.ones(point_count, num.float)
+    max_momentums = -ground_floor_height*num.ones(point_count, num.float)
+
+    if verbose: log.critical('Reading %s' % filename)
+
+    fid = NetCDFFile(filename, netcdf_mode_r)
+    try:
+        x = fid.variables['x'][:]
+        y = fid.variables['y'][:]
+        vertex_coordinates = num.zeros((len(x), 2), num.float)
+        vertex_coordinates[:,0] = x
+        vertex_coordinates[:,1] = y
+        triangles = num.array(fid.variables['volumes'][:], num.int)
+
+        # Points relative to the georeference of the file
+        relative_points = num.array(points, num.float)
+        relative_points[:,0] -= fid.xllcorner
+        relative_points[:,1] -= fid.yllcorner
+
+        if use_cache is True:
+            from anuga.caching.caching import cache
+            X = cache(_get_interpolation_weights,
+                      args=(vertex_coordinates, triangles, relative_points),
+                      verbose=verbose)
+        else:
+            X = _get_interpolation_weights(vertex_coordinates, triangles,
+                                           relative_points)
+        inside, vertices, weights = X
+
+        def interpolate(values):
+            # Values at the inside points of each timestep (row)
+            return values[:,vertices[:,0]]*weights[:,0] + \
+                   values[:,vertices[:,1]]*weights[:,1] + \
+                   values[:,vertices[:,2]]*weights[:,2]
+
+        max_depth = max_depths[inside]
+        max_momentum = max_momentums[inside]
+
+        elevation = fid.variables['elevation']
+        time_count = len(fid.variables['time'])
+        if len(elevation.shape) == 1:
+            z_values = interpolate(num.array(elevation[:],
+                                             num.float).reshape(1, -1))
+
+        for start in range(0, time_count, time_block):
+            stop = min(start + time_block, time_count)
+
+            if verbose:
+                log.critical('  timesteps %d to %d of %d'
+                             % (start, stop, time_count))
+
+            w_block = interpolate(num.array(fid.variables['stage'][start:stop],
+                                            num.float))
+            uh_block = interpolate(num.array(fid.variables['xmomentum'][start:stop],
+                                             num.float))
+            vh_block = interpolate(num.array(fid.variables['ymomentum'][start:stop],
+                                             num.float))
+            if len(elevation.shape) == 2:
+                z_block = interpolate(num.array(elevation[start:stop],
+                                                num.float))
+
+            for i in range(stop - start):
+                w = w_block[i]
+                uh = uh_block[i]
+                vh = vh_block[i]
+                if len(elevation.shape) == 2:
+                    z = z_block[i]
+                else:
+                    z = z_values[0]
+
+                valid = (w != NAN) & (z != NAN) & (uh != NAN) & (vh != NAN)
+
                 #  -ground_floor_height is the minimum value.
                 depth = w - z - ground_floor_height
-              
-                if depth > max_depths[point_i]:
-                    max_depths[point_i] = depth
-                
-                momentum = sqrt(uh*uh + vh*vh)
-                if momentum > max_momentums[point_i]:
-                    max_momentums[point_i] = momentum
+                update = valid & (depth > max_depth)
+                max_depth[update] = depth[update]
 
+                momentum = num.sqrt(uh*uh + vh*vh)
+                update = valid & (momentum > max_momentum)
+                max_momentum[update] = momentum[update]
+    finally:
+        fid.close()
+
+    max_depths[inside] = max_depth
+    max_momentums[inside] = max_momentum
 
     return max_depths, max_momentums
 
+
+def _get_interpolation_weights(vertex_coordinates, triangles, points):
+    """Return indices of the points inside the mesh and, for each of them,
+    the three vertices of the triangle containing the point and their
+    interpolation weights (arrays of shape N x 3).
+    """
+
+    from anuga.fit_interpolate.interpolate import Interpolate
+
+    interpolator = Interpolate(vertex_coordinates, triangles)
+    A = interpolator._build_interpolation_matrix_A(points)[0]
+
+    # Entries of the sparse interpolation matrix, sorted by row
+    keys = A.Data.keys()
+    keys.sort()
+    rows = num.array([key[0] for key in keys], num.int)
+    columns = num.array([key[1] for key in keys], num.int)
+    values = num.array([A.Data[key] for key in keys], num.float)
+
+    inside = num.unique(rows)
+
+    # Position of each entry within its row, rows have at most 3 entries
+    row_index = num.searchsorted(inside, rows)
+    position = num.arange(len(rows)) - num.searchsorted(rows, rows)
+
+    vertices = num.zeros((len(inside), 3), num.int)
+    weights = num.zeros((len(inside), 3), num.float)
+    vertices[row_index, position] = columns
+    weights[row_index, position] = values
+
+    return inside, vertices, weights
+
+
+def _max_depth_and_momentum_worker(task):
+
+    filename, points, ground_floor_height, time_block, verbose, use_cache = \
+              task
+
+    return calc_sww_max_depth_and_momentum(filename, points,
+                                           ground_floor_height=\
+                                           ground_floor_height,
+                                           time_block=time_block,
+                                           verbose=verbose,
+                                           use_cache=use_cache)
+
 class EventDamageModel:
     """
     Object for working out the damage and cost
@@ -309,12 +660,16 @@ class EventDamageModel:
         """
         max depth is Inundation height above ground floor (m), so
                   the ground floor has been taken into account.
+
+        The attributes are kept as arrays with one entry per structure,
+        walls as an array of objects (the wall type names).
         """
-        self.max_depths = [float(x) for x in max_depths]
-        self.shore_distances = [float(x) for x in shore_distances]
-        self.walls = walls
-        self.struct_costs = [float(x) for x in struct_costs]
-        self.content_costs = [float(x) for x in content_costs]
+        self.max_depths = num.array(max_depths, num.float)
+        self.shore_distances = num.array(shore_distances, num.float)
+        self.walls = num.empty(len(walls), object)
+        self.walls[:] = list(walls)
+        self.struct_costs = num.array(struct_costs, num.float)
+        self.content_costs = num.array(content_costs, num.float)
 
         self.structure_count = len(self.max_depths)
         #Fixme expand
@@ -354,26 +709,33 @@ class EventDamageModel:
         # the data being created
         struct_damage = num.zeros(self.structure_count, num.float)
         contents_damage = num.zeros(self.structure_count, num.float)
-        self.struct_inundated = ['']* self.structure_count
-
-        for i,max_depth,shore_distance,wall in map(None,
-                                                   range(self.structure_count),
-                                                   self.max_depths,
-                                                   self.shore_distances,
-                                                   self.walls):
-            ## WARNING SKIP IF DEPTH < 0.0 
-            if 0.0 > max_depth:
-                continue
-            
-            # The definition of inundated is if the max_depth is > 0.0
-            self.struct_inundated[i] = 1.0
-            
-            #calc structural damage %
-            damage_curve = self.struct_damage_curve.get(wall,
-                                              self.default_struct_damage_curve)
-            struct_damage[i] = damage_curve(max_depth)
-            contents_damage[i] = self.contents_damage_curve(max_depth)
-           
+        self.struct_inundated = num.empty(self.structure_count, object)
+        self.struct_inundated[:] = ''
+
+        ## WARNING SKIP IF DEPTH < 0.0 
+        # The definition of inundated is if the max_depth is > 0.0
+        inundated = ~(0.0 > self.max_depths)
+        self.struct_inundated[inundated] = 1.0
+
+        #calc structural damage % for each wall type
+        default = inundated.copy()
+        for wall, damage_curve in self.struct_damage_curve.iteritems():
+            indices = num.flatnonzero(inundated & (self.walls == wall))
+            default[indices] = False
+            if len(indices) > 0:
+                struct_damage[indices] = \
+                    damage_curve(self.max_depths[indices])
+
+        indices = num.flatnonzero(default)
+        if len(indices) > 0:
+            struct_damage[indices] = \
+                self.default_struct_damage_curve(self.max_depths[indices])
+
+        indices = num.flatnonzero(inundated)
+        if len(indices) > 0:
+            contents_damage[indices] = \
+                self.contents_damage_curve(self.max_depths[indices])
+
         self.struct_damage = struct_damage
         self.contents_damage = contents_damage
            
@@ -382,11 +744,8 @@ class EventDamageModel:
         """
         Once the damage has been calculated, determine the $ cost.
         """
-        # ensure_numeric does not cut it.
-        self.struct_loss = self.struct_damage * \
-                           ensure_numeric(self.struct_costs)
-        self.contents_loss = self.contents_damage * \
-                           ensure_numeric(self.content_costs)
+        self.struct_loss = self.struct_damage * self.struct_costs
+        self.contents_loss = self.contents_damage * self.content_costs
         
     def calc_collapse_probability(self):
         """
@@ -394,42 +753,35 @@ class EventDamageModel:
              key is collapse probability
              value is list of struct indexes with key probability of collapse 
         """
-        # I could've done this is the calc_damage_percentages and
-        # Just had one loop.
-        # But for ease of testing and bug finding I'm seperating the loops.
-        # I'm make the outer loop for both of them the same though,
-        # so this loop can easily be folded into the other loop.
-        
         # dict of which structures have x probability of collapse.
         # key of collapse probability
         # value of list of struct indexes 
         struct_coll_prob = {}
-        
-        for i,max_depth,shore_distance,wall in map(None,
-                                                   range(self.structure_count),
-                                                   self.max_depths,
-                                                   self.shore_distances,
-                                                   self.walls):
-            # WARNING ASSUMING THE FIRST BIN OF DEPTHS GIVE A ZERO PROBABILITY
-            depth_upper_limits = self.depth_upper_limits
-            shore_upper_limits = self.shore_upper_limits
-            collapse_probability = self.collapse_probability
-            if max_depth <= depth_upper_limits[0]:
+
+        depth_upper_limits = num.array(self.depth_upper_limits, num.float)
+        shore_upper_limits = num.array(self.shore_upper_limits, num.float)
+        collapse_probability = num.array(self.collapse_probability,
+                                         num.float)
+
+        # Bins of the depth and shore distance of each structure, the first
+        # limit not smaller than the value (past the end if there is none)
+        i_depth = num.searchsorted(depth_upper_limits, self.max_depths)
+        i_shore = num.searchsorted(shore_upper_limits, self.shore_distances)
+
+        # WARNING ASSUMING THE FIRST BIN OF DEPTHS GIVE A ZERO PROBABILITY
+        binned = (i_depth > 0) & (i_depth < len(depth_upper_limits)) & \
+                 (i_shore < len(shore_upper_limits))
+
+        indices = num.flatnonzero(binned)
+        probabilities = collapse_probability[i_depth[indices],
+                                             i_shore[indices]]
+
+        for coll_prob in num.unique(probabilities):
+            if 0.0 == coll_prob:
                 continue
-            start = 1
-            for i_depth, depth_limit in enumerate(depth_upper_limits[start:]):
-                #Have to change i_depth so it indexes into the lists correctly
-                i_depth += start
-                if max_depth <= depth_limit:
-                    for i_shore, shore_limit in enumerate(shore_upper_limits):
-                        if shore_distance <= shore_limit:
-                            coll_prob = collapse_probability[i_depth][i_shore]
-                            if 0.0 == collapse_probability[i_depth][i_shore]:
-                                break
-                            struct_coll_prob.setdefault(coll_prob,[]).append(i)
-                            break
-                    break
-                            
+            coll_prob_indices = indices[probabilities == coll_prob]
+            struct_coll_prob[float(coll_prob)] = coll_prob_indices.tolist()
+
         return struct_coll_prob
     
     def _calc_collapse_structures(self, collapse_probability,
@@ -439,29 +791,31 @@ class EventDamageModel:
         and collapse some houses
         """
         
-        self.struct_collapsed = ['']* self.structure_count
+        self.struct_collapsed = num.empty(self.structure_count, object)
+        self.struct_collapsed[:] = ''
         if verbose_csv:
-            self.collapse_csv_info = ['']* self.structure_count
+            self.collapse_csv_info = num.empty(self.structure_count, object)
+            self.collapse_csv_info[:] = ''
         #for a given 'bin', work out how many houses will collapse
         for probability, house_indexes in collapse_probability.iteritems():
             collapse_count = round(len(house_indexes) *probability)
             
             if verbose_csv:
-                for i in house_indexes:
-                    # This could be sped up I think
-                    self.collapse_csv_info[i] = str(probability) + ' prob.( ' \
-                           + str(int(collapse_count)) + ' collapsed out of ' \
-                           + str(len(house_indexes)) + ')'
-            for _ in range(int(collapse_count)):
-                house_index = choice(house_indexes)
-                self.struct_damage[house_index] = 1.0
-                self.contents_damage[house_index] = 1.0
-                house_indexes.remove(house_index)
-                self.struct_collapsed[house_index] = 1
-                
+                self.collapse_csv_info[house_indexes] = str(probability) + \
+                       ' prob.( ' + str(int(collapse_count)) + \
+                       ' collapsed out of ' + str(len(house_indexes)) + ')'
+
+            collapsed = sample(house_indexes, int(collapse_count))
+            self.struct_damage[collapsed] = 1.0
+            self.contents_damage[collapsed] = 1.0
+            self.struct_collapsed[collapsed] = 1
+
             # Warning, the collapse_probability list now lists 
-            # houses that did not collapse, (though not all of them)
-            
+            # houses that did not collapse
+            collapsed = set(collapsed)
+            house_indexes[:] = [i for i in house_indexes
+                                if i not in collapsed]
+
 #############################################################################
 if __name__ == "__main__":
     pass 
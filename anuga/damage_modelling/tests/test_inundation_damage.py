@@ -318,6 +318,97 @@ class Test_inundation_damage(unittest.TestCase):
         os.remove(sww.filename)
         os.remove(csv_file)
          
+    def test_inundation_damage_chunked(self):
+
+        # create mesh
+        mesh_file = tempfile.mktemp(".tsh")    
+        points = [[0.0,0.0],[6.0,0.0],[6.0,6.0],[0.0,6.0]]
+        m = Mesh()
+        m.add_vertices(points)
+        m.auto_segment()
+        m.generate_mesh(verbose=False)
+        m.export_mesh_file(mesh_file)
+        
+        #Create shallow water domain
+        domain = Domain(mesh_file)
+        os.remove(mesh_file)
+        
+        domain.default_order=2
+
+        #Set some field values
+        domain.set_quantity('elevation', elevation_function)
+        domain.set_quantity('friction', 0.03)
+        domain.set_quantity('xmomentum', 22.0)
+        domain.set_quantity('ymomentum', 55.0)
+
+        ######################
+        # Boundary conditions
+        B = Transmissive_boundary(domain)
+        domain.set_boundary( {'exterior': B})
+
+        # This call mangles the stage values.
+        domain.distribute_to_vertices_and_edges()
+        domain.set_quantity('stage', 0.3)
+
+        domain.set_name('datatest' + str(time.time()))
+        domain.format = 'sww'
+        domain.smooth = True
+        domain.reduction = mean
+
+        sww = SWW_file(domain)
+        sww.store_connectivity()
+        sww.store_timestep()
+        domain.set_quantity('stage', -0.3)
+        domain.time = 2.
+        sww.store_timestep()
+
+        #Create a csv file, with structures in all collapse bins
+        num.random.seed(13)
+        walls = ['Timber', 'Double Brick', 'Brick Veneer']
+        csv_file = tempfile.mktemp(".csv")
+        fd = open(csv_file,'wb')
+        writer = csv.writer(fd)
+        writer.writerow(['x','y',STR_VALUE_LABEL,CONT_VALUE_LABEL,'ROOF_TYPE',WALL_TYPE_LABEL, SHORE_DIST_LABEL])
+        for i in range(50):
+            writer.writerow([7.0*num.random.rand(), 6.0*num.random.rand(),
+                             '150000', '76000', 'Metal', walls[i % 3],
+                             300.0*num.random.rand()])
+        fd.close()
+
+        sww_file = domain.get_name() + "." + domain.format
+
+        import random
+        random.seed(17)
+        inundation_damage(sww_file, csv_file, exposure_file_out_marker='_all',
+                          verbose=False)
+        random.seed(17)
+        inundation_damage(sww_file, csv_file, exposure_file_out_marker='_chunk',
+                          chunk_size=7, verbose=False)
+
+        file_all = csv_file[:-4] + '_all.csv'
+        file_chunk = csv_file[:-4] + '_chunk.csv'
+        assert open(file_all).read() == open(file_chunk).read()
+
+        csv_handle = Exposure(file_chunk)
+        collapsed = csv_handle.get_column(
+            EventDamageModel.STRUCT_COLLAPSED_TITLE)
+        assert '1' in collapsed
+
+        # Overwriting the results of the input file
+        random.seed(17)
+        inundation_damage(sww_file, file_chunk, chunk_size=4,
+                          overwrite=True, verbose=False)
+        assert open(file_all).read() == open(file_chunk).read()
+
+        self.failUnlessRaises(TitleValueError, inundation_damage,
+                              sww_file, file_chunk, chunk_size=4,
+                              verbose=False)
+
+        os.remove(sww.filename)
+        os.remove(csv_file)
+        os.remove(file_all)
+        os.remove(file_chunk)
+
     def test_inundation_damage_list(self):
 
         # create mesh
@@ -592,6 +683,70 @@ class Test_inundation_damage(unittest.TestCase):
         assert num.allclose(deps[1],11.3215)
         assert num.allclose(deps[2],0.0) # this value is outside both sww files
         
+    def test_calc_max_depth_and_momentum_timesteps(self):
+        """Maxima over many timesteps, read a few timesteps at a time,
+        are the same as from the file function at each timestep.
+        """
+
+        # Sww files with varying stage and momentum
+        filenames = []
+        for i, domain in enumerate([self.domain, self.domain2]):
+            domain.set_name('tidtimesteps_P%d' % i)
+            sww = SWW_file(domain)
+            sww.store_connectivity()
+            stage = domain.quantities['stage'].vertex_values.copy()
+            for k in range(7):
+                domain.time = float(k)
+                factor = 1.0 + 0.5*num.sin(k + num.arange(len(stage)))
+                domain.set_quantity('stage', stage*factor[:,num.newaxis])
+                domain.set_quantity('xmomentum', stage*(10.0 - k))
+                domain.set_quantity('ymomentum', stage*k)
+                sww.store_timestep()
+            filenames.append(sww.filename)
+
+        points_lat_long = [[-34, 151.5], [-35.5, 151.5], [-50, 151],
+                           [-33.2, 150.3], [-34.7, 151.9], [-35.8, 150.1]]
+        spat = Geospatial_data(data_points=points_lat_long,
+                               points_are_lats_longs=True)
+        points_ab = spat.get_data_points(absolute=True)
+        ground_floor_height = 0.3
+
+        # Maxima from the file function at each point and timestep
+        ref_depths = [-ground_floor_height]*len(points_ab)
+        ref_momentums = [-ground_floor_height]*len(points_ab)
+        for filename in filenames:
+            f = file_function(filename,
+                              quantities=['stage', 'elevation',
+                                          'xmomentum', 'ymomentum'],
+                              interpolation_points=points_ab,
+                              use_cache=False)
+            for i in range(len(points_ab)):
+                for t in f.get_time():
+                    w, z, uh, vh = f(t, i)
+                    if w == NAN or z == NAN or uh == NAN or vh == NAN:
+                        continue
+                    depth = w - z - ground_floor_height
+                    ref_depths[i] = max(ref_depths[i], depth)
+                    ref_momentums[i] = max(ref_momentums[i],
+                                           sqrt(uh*uh + vh*vh))
+
+        try:
+            for processes in [None, 2]:
+                deps, moms = calc_max_depth_and_momentum('tidtimesteps',
+                                    points_ab,
+                                    ground_floor_height=ground_floor_height,
+                                    verbose=False,
+                                    use_cache=False,
+                                    time_block=3,
+                                    processes=processes)
+
+                assert num.allclose(deps, ref_depths)
+                assert num.allclose(moms, ref_momentums)
+                assert deps[2] == -ground_floor_height  # Outside
+        finally:
+            for filename in filenames:
+                os.remove(filename)
+
 #-------------------------------------------------------------
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1][0].upper() == 'V':
@@ -87,6 +87,26 @@ class SWW_file(Data_format):
         else:
             self.minimum_storable_height = default_minimum_storable_height
 
+        # Buffered mode keeps the file open between timesteps and writes
+        # blocks of buffer_size timesteps at once (see store_timestep)
+        if hasattr(domain, 'store_buffer_size'):
+            self.buffer_size = domain.store_buffer_size
+        else:
+            self.buffer_size = 0
+
+        # Asynchronous mode hands timesteps to a writer thread via a
+        # queue of at most queue_size timesteps
+        if hasattr(domain, 'store_queue_size'):
+            self.queue_size = domain.store_queue_size
+        else:
+            self.queue_size = 0
+
+        self.fid = None
+        self.buffer = []
+        self.queue = None
+        self.thread = None
+        self.thread_error = None
+
         # Call parent constructor
         Data_format.__init__(self, domain, 'sww', mode)
 
@@ -113,21 +133,30 @@ class SWW_file(Data_format):
                 if self.store_centroids: dynamic_c_quantities.append(q+'_c')
 
 
+        self.writer = Write_sww(static_quantities,
+                                dynamic_quantities,
+                                static_c_quantities,
+                                dynamic_c_quantities)
+
         # NetCDF file definition
+        self._create_file(mode)
+
+    def _create_file(self, mode):
+        """Create the sww file and its header (mode 'w') or check it
+        can be opened (mode 'a').
+        """
+
+        domain = self.domain
+
         fid = NetCDFFile(self.filename, mode)
         if mode[0] == 'w':
             description = 'Output from anuga.file.sww ' \
                           'suitable for plotting'
 
-            self.writer = Write_sww(static_quantities,
-                                    dynamic_quantities,
-                                    static_c_quantities,
-                                    dynamic_c_quantities)
-
             self.writer.store_header(fid,
                                      domain.starttime,
                                      self.number_of_volumes,
-                                     self.domain.number_of_nodes,
+                                     self.number_of_nodes,
                                      description=description,
                                      smoothing=domain.smooth,
                                      order=domain.default_order,
@@ -236,8 +265,20 @@ class SWW_file(Data_format):
 
     def store_timestep(self):
         """Store time and time dependent quantities
+
+        If the domain has a store_buffer_size > 0 (see
+        domain.set_store_buffered) the timestep is buffered in memory and
+        written together with other buffered timesteps via flush.
+        If the domain has a store_queue_size > 0 (see
+        domain.set_store_asynchronous) a copy of the timestep is passed
+        to a writer thread. Otherwise the file is opened, appended to
+        and closed again.
         """
 
+        if self.buffer_size > 0 or self.queue_size > 0:
+            self._store_timestep_buffered()
+            return
+
         #import types
         from time import sleep
         from os import stat
@@ -273,145 +314,456 @@ class SWW_file(Data_format):
         file_size = stat(self.filename)[6]
         file_size_increase = file_size / i
         if file_size + file_size_increase > self.max_size * 2**self.recursion:
-            # In order to get the file name and start time correct,
-            # I change the domain.filename and domain.starttime.
-            # This is the only way to do this without changing
-            # other modules (I think).
-
-            # Write a filename addon that won't break the anuga viewers
-            # (10.sww is bad)
-            filename_ext = '_time_%s' % self.domain.time
-            filename_ext = filename_ext.replace('.', '_')
-
-            # Remember the old filename, then give domain a
-            # name with the extension
-            old_domain_filename = self.domain.get_name()
-            if not self.recursion:
-                self.domain.set_name(old_domain_filename + filename_ext)
-
-            # Temporarily change the domain starttime to the current time
-            old_domain_starttime = self.domain.starttime
-            self.domain.starttime = self.domain.get_time()
-
-            # Build a new data_structure.
-            next_data_structure = SWW_file(self.domain, mode=self.mode,
-                                           max_size=self.max_size,
-                                           recursion=self.recursion+1)
-            if not self.recursion:
-                log.critical('    file_size = %s' % file_size)
-                log.critical('    saving file to %s'
-                             % next_data_structure.filename)
-
-            # Set up the new data_structure
-            self.domain.writer = next_data_structure
-
-            # Store connectivity and first timestep
-            next_data_structure.store_connectivity()
-            next_data_structure.store_timestep()
+            self._split_file(file_size)
             fid.sync()
             fid.close()
-
-            # Restore the old starttime and filename
-            self.domain.starttime = old_domain_starttime
-            self.domain.set_name(old_domain_filename)
         else:
             self.recursion = False
-            domain = self.domain
 
-            # Get the variables
-            time = fid.variables['time'][:]
-            i = len(time)
+            dynamic_quantities, dynamic_quantities_centroid = \
+                                        self._get_dynamic_quantities()
+
+            # Store dynamic quantities
+            slice_index = self.writer.store_quantities(fid,
+                                         time=self.domain.time,
+                                         sww_precision=self.precision,
+                                         **dynamic_quantities)
+
+            # Store dynamic quantities
+            if self.store_centroids:
+                self.writer.store_quantities_centroid(fid,
+                                                      slice_index= slice_index,
+                                                      sww_precision=self.precision,
+                                                      **dynamic_quantities_centroid)
+
+
+            # Update extrema if requested
+            self._store_extrema(fid)
+
+            # Flush and close
+            #fid.sync()
+            fid.close()
+
+
+    def flush(self):
+        """Write all buffered timesteps to the sww file in one block.
+
+        The file is kept open. If a writer thread is running this waits
+        until the thread has written all timesteps handed to it.
+        """
+
+        if self.thread is not None:
+            self.queue.put(('flush',))
+            self.queue.join()
+            self._check_thread_error()
+        else:
+            self._write_buffer()
+
+
+    def close(self):
+        """Flush any buffered timesteps and close the sww file.
+
+        Only relevant for buffered or asynchronous storage. The file
+        will be reopened if further timesteps are stored.
+        """
+
+        if self.thread is not None:
+            self.queue.put(('close',))
+            self.thread.join()
+            self.thread = None
+            self.queue = None
+
+        if self.fid is not None:
+            try:
+                if self.thread_error is None:
+                    self._write_buffer()
+            finally:
+                self.fid.close()
+                self.fid = None
+                self.buffer = []
+
+        self._check_thread_error()
 
 
-            if 'stage' in self.writer.dynamic_quantities:
-                # Select only those values for stage,
-                # xmomentum and ymomentum (if stored) where
-                # depth exceeds minimum_storable_height
-                #
-                # In this branch it is assumed that elevation
-                # is also available as a quantity
+    def __getstate__(self):
+        """Open file handles, buffers and threads can't be pickled
+        (checkpointing).
+        """
 
+        state = self.__dict__.copy()
+        state['fid'] = None
+        state['buffer'] = []
+        state['queue'] = None
+        state['thread'] = None
+        state['thread_error'] = None
+        return state
 
-                # Smoothing for the get_vertex_values will be obtained
-                # from the smooth setting in domain
 
-                Q = domain.quantities['stage']
-                w, _ = Q.get_vertex_values(xy=False)
+    def _get_open_file(self):
+        """Return the open sww file used for buffered storage, opening
+        it and reading the stored times if necessary.
+        """
 
-                Q = domain.quantities['elevation']
-                z, _ = Q.get_vertex_values(xy=False)
+        if self.fid is None:
+            from os import stat
 
-                storable_indices = num.array(w-z >= self.minimum_storable_height)
+            self.fid = NetCDFFile(self.filename, netcdf_mode_a)
 
-                #print numpy.sum(storable_indices), len(z), self.minimum_storable_height, numpy.min(w-z)
+            time = self.fid.variables['time'][:]
+            self.next_index = len(time)
+            if len(time) > 0:
+                self.last_stored_time = time[-1]
             else:
-                # Very unlikely branch
-                storable_indices = None # This means take all
+                self.last_stored_time = None
 
-            # Now store dynamic quantities
-            dynamic_quantities = {}
-            dynamic_quantities_centroid = {}
+            # Track file size in memory rather than stat each timestep
+            self.file_size = stat(self.filename)[6]
+            self.frames_stored = 0
 
-            for name in self.writer.dynamic_quantities:
-                #netcdf_array = fid.variables[name]
+        return self.fid
 
-                Q = domain.quantities[name]
-                A, _ = Q.get_vertex_values(xy=False,
-                                           precision=self.precision)
 
-                if storable_indices is not None:
-                    if name == 'stage':
-                        A = num.choose(storable_indices, (z, A))
+    def _store_timestep_buffered(self):
+        """Buffer the current timestep, or pass it to the writer thread.
+        """
 
-                    if name in ['xmomentum', 'ymomentum']:
-                        # Get xmomentum where depth exceeds
-                        # minimum_storable_height
+        self._get_open_file()
 
-                        # Define a zero vector of same size and type as A
-                        # for use with momenta
-                        null = num.zeros(num.size(A), A.dtype.char)
-                        A = num.choose(storable_indices, (null, A))
+        number_of_points = self.domain.number_of_nodes
+        if not self.domain.smooth:
+            number_of_points = 3*self.number_of_volumes
+        frame_size = 8 + 4*number_of_points*len(self.writer.dynamic_quantities)
+        frame_size += 4*self.number_of_volumes* \
+                      len(self.writer.dynamic_c_quantities)
 
-                dynamic_quantities[name] = A
+        file_size = self.file_size + self.frames_stored*frame_size
 
-            for name in self.writer.dynamic_c_quantities:
-                Q = domain.quantities[name[:-2]]
-                dynamic_quantities_centroid[name] = Q.centroid_values
+        if file_size + frame_size > self.max_size * 2**self.recursion:
+            self.close()
+            self._split_file(file_size)
+            return
 
+        self.recursion = False
+        self.frames_stored += 1
 
-            # Store dynamic quantities
-            slice_index = self.writer.store_quantities(fid,
-                                         time=self.domain.time,
-                                         sww_precision=self.precision,
-                                         **dynamic_quantities)
+        snapshot = self._get_dynamic_snapshot()
+        extrema = self._get_extrema_snapshot()
 
-            # Store dynamic quantities
-            if self.store_centroids:
-                self.writer.store_quantities_centroid(fid,
-                                                      slice_index= slice_index,
-                                                      sww_precision=self.precision,
-                                                      **dynamic_quantities_centroid)
+        if self.queue_size > 0:
+            if self.thread is None:
+                self._start_thread()
 
+            # Blocks while the queue is full
+            self.queue.put(('store', self.domain.time, snapshot, extrema))
+            self._check_thread_error()
+        else:
+            self._buffer_timestep(self.domain.time, snapshot, extrema)
 
-            # Update extrema if requested
-            domain = self.domain
-            if domain.quantities_to_be_monitored is not None:
-                for q, info in domain.quantities_to_be_monitored.items():
-                    if info['min'] is not None:
-                        fid.variables[q + '.extrema'][0] = info['min']
-                        fid.variables[q + '.min_location'][:] = \
-                                        info['min_location']
-                        fid.variables[q + '.min_time'][0] = info['min_time']
-
-                    if info['max'] is not None:
-                        fid.variables[q + '.extrema'][1] = info['max']
-                        fid.variables[q + '.max_location'][:] = \
-                                        info['max_location']
-                        fid.variables[q + '.max_time'][0] = info['max_time']
 
-            # Flush and close
-            #fid.sync()
-            fid.close()
+    def _buffer_timestep(self, time, snapshot, extrema):
+        """Add a timestep to the buffer and write the buffer if full.
+        """
+
+        dynamic_quantities, dynamic_quantities_centroid = \
+                                self._mask_dynamic_quantities(snapshot)
+
+        self.buffer.append((time,
+                            dynamic_quantities,
+                            dynamic_quantities_centroid,
+                            extrema))
+
+        if len(self.buffer) >= max(self.buffer_size, 1):
+            self._write_buffer()
+
+
+    def _write_buffer(self):
+        """Write the buffered timesteps as one slab. Nothing happens if
+        the buffer is empty.
+        """
+
+        if len(self.buffer) == 0:
+            return
+
+        fid = self._get_open_file()
+
+        times = num.array([frame[0] for frame in self.buffer])
+        n = len(times)
+
+        # Find the slice index, allowing for times already saved
+        # as is the case when restarting from a checkpoint
+        i = self.next_index
+        if i > 0 and times[0] <= self.last_stored_time:
+            file_time = fid.variables['time'][:]
+            check = num.where(num.abs(file_time-times[0]) < 1.0e-14)
+            i = int(check[0][0])
+
+        fid.variables['time'][i:i+n] = times
+
+        for name in self.writer.dynamic_quantities:
+            block = num.array([frame[1][name] for frame in self.buffer])
+            fid.variables[name][i:i+n] = block.astype(self.precision)
+
+            # Update the _range values
+            q_range = fid.variables[name + Write_sww.RANGE][:]
+            block_min = num.min(block)
+            if block_min < q_range[0]:
+                fid.variables[name + Write_sww.RANGE][0] = block_min
+            block_max = num.max(block)
+            if block_max > q_range[1]:
+                fid.variables[name + Write_sww.RANGE][1] = block_max
+
+        for name in self.writer.dynamic_c_quantities:
+            block = num.array([frame[2][name] for frame in self.buffer],
+                              self.precision)
+            fid.variables[name][i:i+n] = block
+
+        # Extrema as they were at the last buffered timestep
+        self._store_extrema(fid, self.buffer[-1][3])
+
+        fid.sync()
+
+        self.next_index = i + n
+        self.last_stored_time = times[-1]
+        self.buffer = []
+
+
+    def _start_thread(self):
+        """Start the writer thread for asynchronous storage.
+        """
+
+        import threading
+        import Queue
+
+        self.queue = Queue.Queue(maxsize=self.queue_size)
+        self.thread_error = None
+        self.thread = threading.Thread(target=self._run_thread)
+        self.thread.daemon = True
+        self.thread.start()
+
+
+    def _run_thread(self):
+        """Writer thread: mask and buffer the timesteps taken from the
+        queue and write them to the sww file.
+
+        Exceptions are kept and raised in the main thread at the next
+        store_timestep, flush or close.
+        """
+
+        import sys
+
+        while True:
+            item = self.queue.get()
+            try:
+                if self.thread_error is None:
+                    if item[0] == 'store':
+                        self._buffer_timestep(item[1], item[2], item[3])
+                    else:
+                        self._write_buffer()
+            except:
+                self.thread_error = sys.exc_info()
+            finally:
+                self.queue.task_done()
+
+            if item[0] == 'close':
+                break
+
+
+    def _check_thread_error(self):
+        """Raise an exception raised in the writer thread.
+        """
+
+        if self.thread_error is not None:
+            error = self.thread_error
+            self.thread_error = None
+            raise error[0], error[1], error[2]
+
+
+    def _split_file(self, file_size):
+        """Continue storing in a new sww file once max_size is exceeded.
+        """
+
+        # In order to get the file name and start time correct,
+        # I change the domain.filename and domain.starttime.
+        # This is the only way to do this without changing
+        # other modules (I think).
+
+        # Write a filename addon that won't break the anuga viewers
+        # (10.sww is bad)
+        filename_ext = '_time_%s' % self.domain.time
+        filename_ext = filename_ext.replace('.', '_')
+
+        # Remember the old filename, then give domain a
+        # name with the extension
+        old_domain_filename = self.domain.get_name()
+        if not self.recursion:
+            self.domain.set_name(old_domain_filename + filename_ext)
+
+        # Temporarily change the domain starttime to the current time
+        old_domain_starttime = self.domain.starttime
+        self.domain.starttime = self.domain.get_time()
+
+        # Build a new data_structure.
+        next_data_structure = SWW_file(self.domain, mode=self.mode,
+                                       max_size=self.max_size,
+                                       recursion=self.recursion+1)
+        if not self.recursion:
+            log.critical('    file_size = %s' % file_size)
+            log.critical('    saving file to %s'
+                         % next_data_structure.filename)
+
+        # Set up the new data_structure
+        self.domain.writer = next_data_structure
+
+        # Store connectivity and first timestep
+        next_data_structure.store_connectivity()
+        next_data_structure.store_timestep()
+
+        # Restore the old starttime and filename
+        self.domain.starttime = old_domain_starttime
+        self.domain.set_name(old_domain_filename)
+
+
+    def _get_dynamic_quantities(self):
+        """Return dictionaries of vertex and centroid values of the
+        dynamic quantities to be stored at the current time.
+        """
+
+        snapshot = self._get_dynamic_snapshot(copy=False)
+
+        return self._mask_dynamic_quantities(snapshot)
+
+
+    def _get_dynamic_snapshot(self, copy=True):
+        """Return vertex values of the dynamic quantities, centroid
+        values and the depths needed by _mask_dynamic_quantities.
+
+        With copy=True centroid values are copied so the domain can
+        carry on evolving while the snapshot is stored.
+        """
+
+        domain = self.domain
+
+        if 'stage' in self.writer.dynamic_quantities:
+            # Smoothing for the get_vertex_values will be obtained
+            # from the smooth setting in domain
+
+            Q = domain.quantities['stage']
+            w, _ = Q.get_vertex_values(xy=False)
+
+            Q = domain.quantities['elevation']
+            z, _ = Q.get_vertex_values(xy=False)
+        else:
+            # Very unlikely branch
+            w = z = None
+
+        vertex_values = {}
+        centroid_values = {}
+
+        for name in self.writer.dynamic_quantities:
+            Q = domain.quantities[name]
+            A, _ = Q.get_vertex_values(xy=False,
+                                       precision=self.precision)
+            vertex_values[name] = A
+
+        for name in self.writer.dynamic_c_quantities:
+            Q = domain.quantities[name[:-2]]
+            if copy:
+                centroid_values[name] = num.array(Q.centroid_values)
+            else:
+                centroid_values[name] = Q.centroid_values
+
+        return w, z, vertex_values, centroid_values
+
+
+    def _mask_dynamic_quantities(self, snapshot):
+        """Return dictionaries of vertex and centroid values to be
+        stored, with stage and momenta masked where the depth is
+        below minimum_storable_height.
+        """
+
+        w, z, vertex_values, centroid_values = snapshot
+
+        if w is not None:
+            # Select only those values for stage,
+            # xmomentum and ymomentum (if stored) where
+            # depth exceeds minimum_storable_height
+            #
+            # In this branch it is assumed that elevation
+            # is also available as a quantity
+            storable_indices = num.array(w-z >= self.minimum_storable_height)
+
+            #print numpy.sum(storable_indices), len(z), self.minimum_storable_height, numpy.min(w-z)
+        else:
+            storable_indices = None # This means take all
+
+        # Now store dynamic quantities
+        dynamic_quantities = {}
+
+        for name in self.writer.dynamic_quantities:
+            A = vertex_values[name]
+
+            if storable_indices is not None:
+                if name == 'stage':
+                    A = num.choose(storable_indices, (z, A))
+
+                if name in ['xmomentum', 'ymomentum']:
+                    # Get xmomentum where depth exceeds
+                    # minimum_storable_height
+
+                    # Define a zero vector of same size and type as A
+                    # for use with momenta
+                    null = num.zeros(num.size(A), A.dtype.char)
+                    A = num.choose(storable_indices, (null, A))
+
+            dynamic_quantities[name] = A
+
+        return dynamic_quantities, centroid_values
+
+
+    def _get_extrema_snapshot(self):
+        """Return a copy of the monitored quantities info of the domain
+        (or None), so buffered and queued timesteps store the extrema
+        of their own time while the domain carries on evolving.
+        """
+
+        monitored = self.domain.quantities_to_be_monitored
+        if monitored is None:
+            return None
+
+        extrema = {}
+        for q, info in monitored.items():
+            info = info.copy()
+            for key in ['min_location', 'max_location']:
+                if info[key] is not None:
+                    info[key] = num.array(info[key])
+            extrema[q] = info
+
+        return extrema
+
+
+    def _store_extrema(self, fid, extrema=None):
+        """Update extrema of monitored quantities if requested.
+
+        extrema is a snapshot from _get_extrema_snapshot, if None the
+        current info of the domain is used.
+        """
+
+        if extrema is None:
+            extrema = self.domain.quantities_to_be_monitored
+
+        if extrema is not None:
+            for q, info in extrema.items():
+                if info['min'] is not None:
+                    fid.variables[q + '.extrema'][0] = info['min']
+                    fid.variables[q + '.min_location'][:] = \
+                                    info['min_location']
+                    fid.variables[q + '.min_time'][0] = info['min_time']
+
+                if info['max'] is not None:
+                    fid.variables[q + '.extrema'][1] = info['max']
+                    fid.variables[q + '.max_location'][:] = \
+                                    info['max_location']
+                    fid.variables[q + '.max_time'][0] = info['max_time']
 
 
 class Read_sww:
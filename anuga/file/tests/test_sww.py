@@ -8,7 +8,7 @@ from anuga.file.csv_file import load_csv_as_array, load_csv_as_dict
 from anuga.abstract_2d_finite_volumes.mesh_factory import rectangular
 from anuga.shallow_water.shallow_water_domain import Domain
 from anuga.file.sww import load_sww_as_domain, weed, get_mesh_and_quantities_from_file, \
-                Write_sww
+                Write_sww, SWW_file
 from anuga.file.netcdf import NetCDFFile
 
 from anuga.config import netcdf_mode_w, netcdf_float
@@ -875,6 +875,157 @@ class Test_sww(unittest.TestCase):
                                            new_origin)),points_utm)
         os.remove(filename)
 
+    def _evolve_and_store(self, name, buffer_size=0, queue_size=0,
+                          monitor=False):
+        """Evolve a small domain and return name of the sww file.
+        """
+
+        points, vertices, boundary = rectangular(6, 6)
+
+        domain = Domain(points, vertices, boundary)
+        domain.set_name(name)
+        domain.set_quantity('elevation', lambda x,y: -x/3)
+        domain.set_quantity('stage', expression='elevation + 0.05')
+        domain.set_boundary({'left': Dirichlet_boundary([0.2,0.,0.]),
+                             'right': Reflective_boundary(domain),
+                             'top': Reflective_boundary(domain),
+                             'bottom': Reflective_boundary(domain)})
+        if buffer_size > 0:
+            domain.set_store_buffered(True, buffer_size=buffer_size)
+        if queue_size > 0:
+            domain.set_store_asynchronous(True, queue_size=queue_size)
+        if monitor:
+            domain.set_quantities_to_be_monitored('stage')
+
+        for t in domain.evolve(yieldstep=0.01, finaltime=0.07):
+            pass
+
+        assert domain.writer.fid is None
+        assert domain.writer.thread is None
+        assert len(domain.writer.buffer) == 0
+
+        return domain.get_name() + '.sww'
+
+    def _assert_same_sww(self, filename1, filename2):
+
+        fid1 = NetCDFFile(filename1)
+        fid2 = NetCDFFile(filename2)
+
+        assert len(fid2.variables['time']) == 8
+        for name in ['time', 'stage', 'xmomentum', 'ymomentum',
+                     'stage_range', 'xmomentum_range',
+                     'stage_c', 'xmomentum_c', 'ymomentum_c']:
+            assert num.allclose(fid1.variables[name][:],
+                                fid2.variables[name][:])
+
+        fid1.close()
+        fid2.close()
+
+    def test_store_buffered(self):
+        """Buffered storage should give the same sww file as
+        opening and closing the file at each yieldstep.
+        """
+
+        filename1 = self._evolve_and_store('test_store_unbuffered')
+        filename2 = self._evolve_and_store('test_store_buffered',
+                                           buffer_size=3)
+
+        self._assert_same_sww(filename1, filename2)
+
+        os.remove(filename1)
+        os.remove(filename2)
+
+    def test_store_asynchronous(self):
+        """Storage via a writer thread should give the same sww file as
+        storing at each yieldstep.
+        """
+
+        filename1 = self._evolve_and_store('test_store_synchronous')
+        filename2 = self._evolve_and_store('test_store_asynchronous',
+                                           queue_size=2)
+        filename3 = self._evolve_and_store('test_store_asynchronous_buffered',
+                                           buffer_size=3, queue_size=2)
+
+        self._assert_same_sww(filename1, filename2)
+        self._assert_same_sww(filename1, filename3)
+
+        os.remove(filename1)
+        os.remove(filename2)
+        os.remove(filename3)
+
+    def test_store_asynchronous_extrema(self):
+        """Extrema written by the writer thread are those of the stored
+        timestep, not of the domain at the time of writing.
+        """
+
+        filename1 = self._evolve_and_store('test_store_extrema_synchronous',
+                                           monitor=True)
+        filename2 = self._evolve_and_store('test_store_extrema_asynchronous',
+                                           buffer_size=3, queue_size=2,
+                                           monitor=True)
+
+        fid1 = NetCDFFile(filename1)
+        fid2 = NetCDFFile(filename2)
+        for name in ['stage.extrema', 'stage.min_location',
+                     'stage.max_location', 'stage.min_time',
+                     'stage.max_time']:
+            assert num.allclose(fid1.variables[name][:],
+                                fid2.variables[name][:])
+        fid1.close()
+        fid2.close()
+
+        # The snapshot is not changed by the evolving domain
+        points, vertices, boundary = rectangular(2, 2)
+        domain = Domain(points, vertices, boundary)
+        domain.set_name('test_store_extrema_snapshot')
+        domain.set_quantity('stage', 0.1)
+        domain.set_quantities_to_be_monitored('stage')
+        domain.update_extrema()
+
+        sww = SWW_file(domain)
+        extrema = sww._get_extrema_snapshot()
+
+        info = domain.quantities_to_be_monitored['stage']
+        info['max'] = 2.0
+        info['max_location'] = (100.0, 100.0)
+
+        assert num.allclose(extrema['stage']['max'], 0.1)
+        assert extrema['stage']['max_location'][0] != 100.0
+
+        os.remove(filename1)
+        os.remove(filename2)
+        os.remove(sww.filename)
+
+    def test_store_buffered_flush_on_exception(self):
+        """Buffered timesteps are written if evolve is interrupted.
+        """
+
+        points, vertices, boundary = rectangular(4, 4)
+
+        domain = Domain(points, vertices, boundary)
+        domain.set_name('test_store_buffered_exception')
+        domain.set_quantity('elevation', 0.0)
+        domain.set_quantity('stage', 0.1)
+        domain.set_boundary({'left': Reflective_boundary(domain),
+                             'right': Reflective_boundary(domain),
+                             'top': Reflective_boundary(domain),
+                             'bottom': Reflective_boundary(domain)})
+        domain.set_store_buffered(True, buffer_size=100)
+
+        try:
+            for t in domain.evolve(yieldstep=0.01, finaltime=1.0):
+                if t >= 0.03:
+                    raise ValueError
+        except ValueError:
+            pass
+
+        filename = domain.get_name() + '.sww'
+        fid = NetCDFFile(filename)
+        assert num.allclose(fid.variables['time'][:], [0.0, 0.01, 0.02, 0.03])
+        fid.close()
+
+        os.remove(filename)
+
 #################################################################################
 
 if __name__ == "__main__":
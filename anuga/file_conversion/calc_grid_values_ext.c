@@ -406,6 +406,94 @@ void _calc_grid_values( double *x, double *y, double *norms,
 
 }
 
+// Same search as _calc_grid_values, but store the triangle (or -1) and
+// the three interpolation weights of each grid point instead of the
+// interpolated values, so that any number of quantities can be gridded
+// without repeating the search.
+void _calc_grid_weights( double *x, double *y, double *norms,
+				 long *volumes,
+				 int num_tri,
+				 double cell_size,
+				 int nrow,
+				 int ncol,
+				 long *grid_tri,
+				 double *grid_weights )
+{
+	int i, j, k;
+	int x_min, x_max, y_min, y_max, point_index;
+	double x_dist, y_dist, x_base, y_base;
+	double val1, val2, res[2];
+	double fraction, intpart;
+	double triangle[6], point[2];
+	double v1[2], v2[2], v3[2];
+	double n1[2], n2[2], n3[2];
+	EXTENT extent[1];
+
+	x_dist = cell_size;
+	y_dist = cell_size;
+
+	x_base = 0.0;
+	y_base = 0.0;
+
+	for ( i = 0; i < num_tri; i++ ) {
+
+		get_tri_vertices( x,y, volumes, i, triangle, v1, v2, v3);
+		get_tri_norms( norms, i, n1, n2, n3 );
+		get_tri_extent( triangle, extent );
+
+		fraction = modf( (extent->x_min - x_base)/x_dist, &intpart );
+		x_min = intpart;
+		x_min = (x_min < 0) ? 0 : x_min;
+
+		fraction = modf( ABS(extent->x_max - x_base)/x_dist, &intpart );
+		x_max = intpart;
+		x_max = (x_max > (ncol-1)) ? (ncol-1) : x_max;
+
+		fraction = modf( (extent->y_min - y_base)/y_dist, &intpart );
+		y_min = intpart;
+		y_min = (y_min < 0 ) ? 0 : y_min;
+
+		fraction = modf( ABS(extent->y_max - y_base)/y_dist, &intpart );
+		y_max = intpart;
+		y_max = (y_max > (nrow-1)) ? (nrow-1) : y_max;
+
+		if ( x_max >= 0 && y_max >= 0 ) {
+		for ( j = y_min; j <= y_max; j++ ) {
+			for ( k = x_min; k <= x_max; k++ ) {
+				point_index = j*ncol+k;
+
+				point[0] = k*cell_size;
+				point[1] = j*cell_size;
+
+				if ( _is_inside_triangle( point, triangle, \
+							  1, 1.0e-12, 1.0e-12 ) ) {
+					grid_tri[point_index] = i;
+
+					point_sub( point, v2, res);
+					val1 = point_dot( res, n1 );
+					point_sub( v1, v2 , res);
+					val2 = point_dot( res, n1 );
+					grid_weights[3*point_index] = val2 ? val1/val2 : 0;
+
+					point_sub( point, v3, res);
+					val1 = point_dot( res, n2 );
+					point_sub( v2, v3, res);
+					val2 = point_dot( res, n2 );
+					grid_weights[3*point_index+1] = val2 ? val1/val2 : 0;
+
+					point_sub( point, v1, res);
+					val1 = point_dot( res, n3 );
+					point_sub( v3, v1, res);
+					val2 = point_dot( res, n3 );
+					grid_weights[3*point_index+2] = val2 ? val1/val2 : 0;
+				}
+			}
+		}
+		}
+	}
+
+}
+
 static PyObject *calc_grid_values( PyObject *self, PyObject *args )
 {
 	int i, ok, num_tri, num_vert, ncol, nrow, num_norms, num_grid_val;
@@ -479,8 +567,70 @@ static PyObject *calc_grid_values( PyObject *self, PyObject *args )
 	return Py_BuildValue("");
 }
 
+static PyObject *calc_grid_weights( PyObject *self, PyObject *args )
+{
+	int i, ok, num_tri, ncol, nrow;
+	long *volumes;
+	double cell_size;
+	double *x, *y;
+	double *norms;
+	long *grid_tri;
+	double *grid_weights;
+	PyObject *pyobj_x;
+	PyObject *pyobj_y;
+	PyObject *pyobj_norms;
+	PyObject *pyobj_volumes;
+	PyObject *pyobj_grid_tri;
+	PyObject *pyobj_grid_weights;
+
+	ok = PyArg_ParseTuple( args, "iidOOOOOO",
+				&nrow,
+				&ncol,
+				&cell_size,
+				&pyobj_x,
+				&pyobj_y,
+				&pyobj_norms,
+				&pyobj_volumes,
+				&pyobj_grid_tri,
+				&pyobj_grid_weights );
+
+	if( !ok ){
+		PyErr_SetString(PyExc_RuntimeError,
+			"calc_grid_weights: argument parsing error");
+		return NULL;
+	}
+
+	// get data from python objects
+	x = DDATA( pyobj_x );
+	y = DDATA( pyobj_y );
+	norms = DDATA( pyobj_norms );
+	volumes = IDATA( pyobj_volumes );
+	grid_tri = IDATA( pyobj_grid_tri );
+	grid_weights = DDATA( pyobj_grid_weights );
+
+	num_tri = ((PyArrayObject*)pyobj_volumes)->dimensions[0];
+
+	// init triangle array
+	init_norms( x,y, norms, volumes, num_tri );
+
+	// grid points outside the mesh have no triangle
+	for ( i = 0 ; i < nrow*ncol; i++ ) {
+		grid_tri[i] = -1;
+		grid_weights[3*i] = 0.0;
+		grid_weights[3*i+1] = 0.0;
+		grid_weights[3*i+2] = 0.0;
+	}
+
+	_calc_grid_weights( x,y, norms, volumes, num_tri, \
+				    cell_size, nrow, ncol, \
+				    grid_tri, grid_weights );
+
+	return Py_BuildValue("");
+}
+
 static PyMethodDef calc_grid_values_ext_methods[] = {
 	{"calc_grid_values", calc_grid_values, METH_VARARGS},
+	{"calc_grid_weights", calc_grid_weights, METH_VARARGS},
 	{NULL, NULL}
 };
 
@@ -86,37 +86,73 @@ def sww2dem(name_in, name_out,
     format can be either 'asc' or 'ers'
     block_size - sets the number of slices along the non-time axis to
                  process in one block.
+
+    To write several quantities, reductions or formats from the same sww
+    file use sww2dem_multi, which reads the file and interpolates to the
+    grid only once.
+    """
+
+    basenames = sww2dem_multi(name_in,
+                              [(quantity, reduction, name_out)],
+                              cellsize=cellsize,
+                              number_of_decimal_places=number_of_decimal_places,
+                              NODATA_value=NODATA_value,
+                              easting_min=easting_min,
+                              easting_max=easting_max,
+                              northing_min=northing_min,
+                              northing_max=northing_max,
+                              verbose=verbose,
+                              origin=origin,
+                              datum=datum,
+                              block_size=block_size)
+
+    return basenames[0]
+
+
+def sww2dem_multi(name_in, jobs,
+                  cellsize=10,
+                  number_of_decimal_places=None,
+                  NODATA_value=-9999.0,
+                  easting_min=None,
+                  easting_max=None,
+                  northing_min=None,
+                  northing_max=None,
+                  verbose=False,
+                  origin=None,
+                  datum='WGS84',
+                  block_size=None):
+    """Write several DEM files (.asc or .ers) from one SWW file.
+
+    jobs is a list of (quantity, reduction, name_out) tuples, with
+    quantity and reduction as in sww2dem (None for the defaults
+    'elevation' and max). All other arguments are as in sww2dem and are
+    the same for all jobs.
+
+    The sww file is read once, block by block, each distinct quantity
+    expression is evaluated once per block and reduced for all jobs using
+    it. The triangle and interpolation weights of each grid point are
+    computed once and used for all jobs.
+
+    Returns the list of basenames of the files written.
+
+    Example, maximum depth and speed and the depth at each timestep:
+
+        jobs = [('depth', max, 'run_depth_max.asc'),
+                ('speed', max, 'run_speed_max.asc')]
+        jobs += [('depth', i, 'run_depth_%d.asc' % i) for i in range(50)]
+        sww2dem_multi('run.sww', jobs, cellsize=5)
     """
 
-    import sys
     import types
 
-    from anuga.geometry.polygon import inside_polygon, outside_polygon
     from anuga.abstract_2d_finite_volumes.util import \
          apply_expression_to_dictionary
 
     basename_in, in_ext = os.path.splitext(name_in)
-    basename_out, out_ext = os.path.splitext(name_out)
-    out_ext = out_ext.lower()
 
     if in_ext != '.sww':
         raise IOError('Input format for %s must be .sww' % name_in)
 
-    if out_ext not in ['.asc', '.ers']:
-        raise IOError('Format for %s must be either asc or ers.' % name_out)
-
-    false_easting = 500000
-    false_northing = 10000000
-
-    if quantity is None:
-        quantity = 'elevation'
-    
-    if reduction is None:
-        reduction = max
-
-    if quantity_formula.has_key(quantity):
-        quantity = quantity_formula[quantity]
-
     if number_of_decimal_places is None:
         number_of_decimal_places = 3
 
@@ -125,10 +161,33 @@ def sww2dem(name_in, name_out,
 
     assert(isinstance(block_size, (int, long, float)))
 
+    # Normalise jobs
+    expressions = []
+    reductions = []
+    names_out = []
+    for quantity, reduction, name_out in jobs:
+        basename_out, out_ext = os.path.splitext(name_out)
+        if out_ext.lower() not in ['.asc', '.ers']:
+            raise IOError('Format for %s must be either asc or ers.' % name_out)
+
+        if quantity is None:
+            quantity = 'elevation'
+
+        if reduction is None:
+            reduction = max
+
+        if quantity_formula.has_key(quantity):
+            quantity = quantity_formula[quantity]
+
+        expressions.append(quantity)
+        reductions.append(reduction)
+        names_out.append(name_out)
+
     # Read sww file
     if verbose:
         log.critical('Reading from %s' % name_in)
-        log.critical('Output directory is %s' % name_out)
+        for name_out in names_out:
+            log.critical('Output directory is %s' % name_out)
 
     from anuga.file.netcdf import NetCDFFile
     fid = NetCDFFile(name_in)
@@ -137,8 +196,16 @@ def sww2dem(name_in, name_out,
     x = num.array(fid.variables['x'][:], num.float)
     y = num.array(fid.variables['y'][:], num.float)
     volumes = num.array(fid.variables['volumes'][:], num.int)
-    if type(reduction) is not types.BuiltinFunctionType:
-        times = fid.variables['time'][reduction]
+    # Statistics are for a single timestep if all jobs use the same one
+    time_index = reductions[0]
+    for reduction in reductions:
+        if type(reduction) is types.BuiltinFunctionType or \
+               reduction != time_index:
+            time_index = None
+            break
+
+    if time_index is not None:
+        times = fid.variables['time'][time_index]
     else:
         times = fid.variables['time'][:]
 
@@ -149,8 +216,6 @@ def sww2dem(name_in, name_out,
         number_of_timesteps = fid.dimensions['number_of_timesteps']
         number_of_points = fid.dimensions['number_of_points']
 
-
-
     if origin is None:
         # Get geo_reference
         # sww files don't have to have a geo_ref
@@ -176,7 +241,7 @@ def sww2dem(name_in, name_out,
         log.critical('  Name: %s' % name_in)
         log.critical('  Reference:')
         log.critical('    Lower left corner: [%f, %f]' % (xllcorner, yllcorner))
-        if type(reduction) is not types.BuiltinFunctionType:
+        if time_index is not None:
             log.critical('    Time: %f' % times)
         else:
             log.critical('    Start time: %f' % fid.starttime)
@@ -185,18 +250,18 @@ def sww2dem(name_in, name_out,
                      %(num.min(x), num.max(x), len(x.flat)))
         log.critical('    y [m] in [%f, %f], len(y) == %d'
                      % (num.min(y), num.max(y), len(y.flat)))
-        if type(reduction) is not types.BuiltinFunctionType:
+        if time_index is not None:
             log.critical('    t [s] = %f, len(t) == %d' % (times, 1))
         else:
             log.critical('    t [s] in [%f, %f], len(t) == %d'
                          % (min(times), max(times), len(times)))
         log.critical('  Quantities [SI units]:')
-        
+
         # Comment out for reduced memory consumption
         for name in ['stage', 'xmomentum', 'ymomentum']:
             q = fid.variables[name][:].flatten()
-            if type(reduction) is not types.BuiltinFunctionType:
-                q = q[reduction*len(x):(reduction+1)*len(x)]
+            if time_index is not None:
+                q = q[time_index*len(x):(time_index+1)*len(x)]
             if verbose: log.critical('    %s in [%f, %f]'
                                      % (name, min(q), max(q)))
         for name in ['elevation']:
@@ -204,26 +269,37 @@ def sww2dem(name_in, name_out,
             if verbose: log.critical('    %s in [%f, %f]'
                                      % (name, min(q), max(q)))
 
-    # Get the variables in the supplied expression.
+    # Get the variables in the supplied expressions.
     # This may throw a SyntaxError exception.
-    var_list = get_vars_in_expression(quantity)
-
-    # Check that we have the required variables in the SWW file.
-    missing_vars = []
-    for name in var_list:
-        try:
-            _ = fid.variables[name]
-        except KeyError:
-            missing_vars.append(name)
-    if missing_vars:
-        msg = ("In expression '%s', variables %s are not in the SWW file '%s'"
-               % (quantity, str(missing_vars), name_in))
-        raise Exception, msg
+    var_lists = {}
+    for quantity in expressions:
+        if var_lists.has_key(quantity):
+            continue
 
-    # Create result array and start filling, block by block.
+        var_list = get_vars_in_expression(quantity)
 
+        # Check that we have the required variables in the SWW file.
+        missing_vars = []
+        for name in var_list:
+            try:
+                _ = fid.variables[name]
+            except KeyError:
+                missing_vars.append(name)
+        if missing_vars:
+            msg = ("In expression '%s', variables %s are not in the SWW file '%s'"
+                   % (quantity, str(missing_vars), name_in))
+            raise Exception, msg
+
+        var_lists[quantity] = var_list
+
+    all_vars = []
+    for var_list in var_lists.values():
+        for name in var_list:
+            if name not in all_vars:
+                all_vars.append(name)
 
-    result = num.zeros(number_of_points, num.float)
+    # Create result arrays and start filling, block by block.
+    results = [num.zeros(number_of_points, num.float) for job in jobs]
 
     if verbose:
         msg = 'Slicing sww file, num points: ' + str(number_of_points)
@@ -233,37 +309,46 @@ def sww2dem(name_in, name_out,
     for start_slice in xrange(0, number_of_points, block_size):
         # Limit slice size to array end if at last block
         end_slice = min(start_slice + block_size, number_of_points)
-        
-        # Get slices of all required variables
+
+        # Get slices of all required variables, each read only once
         q_dict = {}
-        for name in var_list:
+        for name in all_vars:
             # check if variable has time axis
             if len(fid.variables[name].shape) == 2:
                 q_dict[name] = fid.variables[name][:,start_slice:end_slice]
             else:       # no time axis
                 q_dict[name] = fid.variables[name][start_slice:end_slice]
 
-        # Evaluate expression with quantities found in SWW file
-        res = apply_expression_to_dictionary(quantity, q_dict)
+        # Evaluate each expression once with quantities found in SWW file
+        values = {}
+        for quantity, var_list in var_lists.items():
+            values[quantity] = apply_expression_to_dictionary(quantity,
+                                    dict((name, q_dict[name]) for name in var_list))
+
+        for result, quantity, reduction in zip(results, expressions, reductions):
+            res = values[quantity]
 
-        if len(res.shape) == 2:
-            new_res = num.zeros(res.shape[1], num.float)
-            for k in xrange(res.shape[1]):
+            if len(res.shape) == 2:
                 if type(reduction) is not types.BuiltinFunctionType:
-                    new_res[k] = res[reduction,k]
+                    res = res[reduction,:]
                 else:
-                    new_res[k] = reduction(res[:,k])
-            res = new_res
+                    new_res = num.zeros(res.shape[1], num.float)
+                    for k in xrange(res.shape[1]):
+                        new_res[k] = reduction(res[:,k])
+                    res = new_res
 
-        result[start_slice:end_slice] = res
-                                    
-    # Post condition: Now q has dimension: number_of_points
-    assert len(result.shape) == 1
-    assert result.shape[0] == number_of_points
+            result[start_slice:end_slice] = res
 
-    if verbose:
-        log.critical('Processed values for %s are in [%f, %f]'
-                     % (quantity, min(result), max(result)))
+    fid.close()
+
+    # Post condition: Now each result has dimension: number_of_points
+    for result, quantity in zip(results, expressions):
+        assert len(result.shape) == 1
+        assert result.shape[0] == number_of_points
+
+        if verbose:
+            log.critical('Processed values for %s are in [%f, %f]'
+                         % (quantity, min(result), max(result)))
 
     # Create grid and update xll/yll corner and x,y
     # Relative extent
@@ -306,78 +391,87 @@ def sww2dem(name_in, name_out,
     x = x + xllcorner - newxllcorner
     y = y + yllcorner - newyllcorner
 
+    # Triangle and interpolation weights of each grid point, shared by
+    # all jobs
+    grid_tri, grid_weights = calc_grid_weights(nrows, ncols, cellsize,
+                                               x, y, volumes)
 
-    grid_values = num.zeros( (nrows*ncols, ), num.float)
-    #print '---',grid_values.shape
+    basenames_out = []
+    for result, quantity, name_out in zip(results, expressions, names_out):
 
-    #-------------------------------------------------------
-    # Calculate grid values using the "standard" interpolation
-    # method (ie quad trees and such)
-    #-------------------------------------------------------
-    def calc_grid_values(nrows, ncols, cellsize, NODATA_value,
-                         x,y, norms, volumes, result, grid_values):
+        grid_values = interpolate_grid_values(grid_tri, grid_weights,
+                                              volumes, result, NODATA_value)
 
-        grid_points = num.zeros ((ncols*nrows, 2), num.float)
-        vertex_points = num.concatenate ((x[:,num.newaxis], y[:,num.newaxis]), axis=1)
-        assert len(vertex_points.shape) == 2
+        if verbose:
+            log.critical('Interpolated values are in [%f, %f]'
+                         % (num.min(grid_values), num.max(grid_values)))
 
-        for i in xrange(nrows):
-            yg = i * cellsize
-#            if out_ext == '.asc':
-#                yg = i * cellsize
-#            else:
-#                # this will flip the order of the y values for ers
-#                yg = (nrows-i) * cellsize
+        basenames_out.append(write_dem(name_out, grid_values, quantity,
+                                       nrows, ncols, cellsize,
+                                       newxllcorner, newyllcorner,
+                                       zone, datum, NODATA_value,
+                                       number_of_decimal_places,
+                                       verbose=verbose))
 
-            for j in xrange(ncols):
-                xg = j * cellsize
-                k = i*ncols + j
+    return basenames_out
 
-                grid_points[k, 0] = xg
-                grid_points[k, 1] = yg
 
-        # Interpolate
-        from anuga.fit_interpolate.interpolate import Interpolate
+def calc_grid_weights(nrows, ncols, cellsize, x, y, volumes):
+    """Locate the points of a nrows x ncols grid with spacing cellsize
+    (and origin at x, y = 0) in the triangles of the mesh given by x, y
+    and volumes.
 
-        # Remove loners from vertex_points, volumes here
-        vertex_points, volumes = remove_lone_verts(vertex_points, volumes)
-        # export_mesh_file('monkey.tsh',{'vertices':vertex_points, 'triangles':volumes})
+    Return grid_tri, the triangle of each grid point (-1 outside the
+    mesh) and grid_weights, the nrows*ncols x 3 interpolation weights of
+    the vertices of that triangle.
+    """
 
+    from calc_grid_values_ext import calc_grid_weights as _calc_grid_weights
 
-        interp = Interpolate(vertex_points, volumes, verbose = verbose)
+    x = num.ascontiguousarray(x, num.float)
+    y = num.ascontiguousarray(y, num.float)
+    volumes = num.ascontiguousarray(volumes, num.int)
 
-        # Interpolate using quantity values
-        if verbose: log.critical('Interpolating')
-        grid_values[:] = interp.interpolate(result, grid_points,
-                                         NODATA_value= NODATA_value,
-                                         verbose=verbose).flatten()
-        #print grid_values.shape
+    norms = num.zeros(6*len(volumes), num.float)
+    grid_tri = num.zeros(nrows*ncols, num.int)
+    grid_weights = num.zeros((nrows*ncols, 3), num.float)
 
-        return
+    _calc_grid_weights(nrows, ncols, cellsize, x, y, norms, volumes,
+                       grid_tri, grid_weights)
 
-    num_tri =  len(volumes)
-    norms = num.zeros(6*num_tri, num.float)
+    return grid_tri, grid_weights
 
-    #print norms
-    from calc_grid_values_ext import calc_grid_values
 
-    calc_grid_values(nrows, ncols, cellsize, NODATA_value,
-                     x,y, norms, volumes, result, grid_values)
+def interpolate_grid_values(grid_tri, grid_weights, volumes, vertex_values,
+                            NODATA_value=-9999.0):
+    """Interpolate vertex_values to the grid located by calc_grid_weights.
+    Grid points outside the mesh get NODATA_value.
+    """
 
+    grid_values = num.zeros(len(grid_tri), num.float)
+    grid_values[:] = NODATA_value
 
+    inside = grid_tri >= 0
+    w = grid_weights[inside]
+    v = vertex_values[volumes[grid_tri[inside]]]
 
-    #print outside_indices
+    grid_values[inside] = w[:,0]*v[:,0] + w[:,1]*v[:,1] + w[:,2]*v[:,2]
 
-    if verbose:
-        log.critical('Interpolated values are in [%f, %f]'
-                     % (num.min(grid_values), num.max(grid_values)))
+    return grid_values
 
-    # Assign NODATA_value to all points outside bounding polygon (from interpolation mesh)
-    
-#    P = interp.mesh.get_boundary_polygon()
-#    outside_indices = outside_polygon(grid_points, P, closed=True)
 
+def write_dem(name_out, grid_values, quantity, nrows, ncols, cellsize,
+              xllcorner, yllcorner, zone, datum, NODATA_value,
+              number_of_decimal_places, verbose=False):
+    """Write grid values (with rows ordered from south to north) to
+    name_out in asc or ers format, return basename of name_out.
+    """
 
+    basename_out, out_ext = os.path.splitext(name_out)
+    out_ext = out_ext.lower()
+
+    false_easting = 500000
+    false_northing = 10000000
 
     if out_ext == '.ers':
         # setup ERS header information
@@ -389,11 +483,11 @@ def sww2dem(name_in, name_out,
         header['projection'] = '"UTM-' + str(zone) + '"'
         header['coordinatetype'] = 'EN'
         if header['coordinatetype'] == 'LL':
-            header['longitude'] = str(newxllcorner)
-            header['latitude'] = str(newyllcorner)
+            header['longitude'] = str(xllcorner)
+            header['latitude'] = str(yllcorner)
         elif header['coordinatetype'] == 'EN':
-            header['eastings'] = str(newxllcorner)
-            header['northings'] = str(newyllcorner)
+            header['eastings'] = str(xllcorner)
+            header['northings'] = str(yllcorner)
         header['nullcellvalue'] = str(NODATA_value)
         header['xdimension'] = str(cellsize)
         header['ydimension'] = str(cellsize)
@@ -410,8 +504,6 @@ def sww2dem(name_in, name_out,
         reordered_grid_values = grid_values[::-1,:]
 
         ermapper_grids.write_ermapper_grid(name_out, reordered_grid_values, header)
-
-        fid.close()
     else:
         #Write to Ascii format
         #Write prj file
@@ -436,20 +528,11 @@ def sww2dem(name_in, name_out,
 
         ascid.write('ncols         %d\n' %ncols)
         ascid.write('nrows         %d\n' %nrows)
-        ascid.write('xllcorner     %d\n' %newxllcorner)
-        ascid.write('yllcorner     %d\n' %newyllcorner)
+        ascid.write('xllcorner     %d\n' %xllcorner)
+        ascid.write('yllcorner     %d\n' %yllcorner)
         ascid.write('cellsize      %f\n' %cellsize)
         ascid.write('NODATA_value  %d\n' %NODATA_value)
 
-        #Get bounding polygon from mesh
-        #P = interp.mesh.get_boundary_polygon()
-        #inside_indices = inside_polygon(grid_points, P)
-
-        # change printoptions so that a long string of zeros in not
-        # summarized as [0.0, 0.0, 0.0, ... 0.0, 0.0, 0.0]
-        #printoptions = num.get_printoptions()
-        #num.set_printoptions(threshold=sys.maxint)
-
         format = '%.'+'%g' % number_of_decimal_places +'e'
         for i in range(nrows):
             if verbose and i % ((nrows+10)/10) == 0:
@@ -460,13 +543,11 @@ def sww2dem(name_in, name_out,
             slice = grid_values[base_index:base_index+ncols]
 
             num.savetxt(ascid, slice.reshape(1,ncols), format, ' ' )
-            
-        
+
         #Close
         ascid.close()
-        fid.close()
 
-        return basename_out
+    return basename_out
 
 
 
@@ -518,33 +599,33 @@ def sww2dem_batch(basename_in, extra_name_out=None,
 
     files_out = []
     for sww_file in iterate_over:
+        swwin = dir+os.sep+sww_file+'.sww'
+
+        # All quantities of an sww file are written from one read of it
+        jobs = []
         for quantity in quantities:
             if extra_name_out is None:
                 basename_out = sww_file + '_' + quantity
             else:
                 basename_out = sww_file + '_' + quantity + '_' + extra_name_out
 
-            swwin = dir+os.sep+sww_file+'.sww'
             demout = dir+os.sep+basename_out+'.'+format
 
             if verbose:
                 log.critical('sww2dem: %s => %s' % (swwin, demout))
 
-            file_out = sww2dem(swwin,
-                               demout,
-                               quantity,
-                               reduction,
-                               cellsize,
-                               number_of_decimal_places,
-                               NODATA_value,
-                               easting_min,
-                               easting_max,
-                               northing_min,
-                               northing_max,
-                               verbose,
-                               origin,
-                               datum)
-                               
-            files_out.append(file_out)
+            jobs.append((quantity, reduction, demout))
+
+        files_out.extend(sww2dem_multi(swwin,
+                                       jobs,
+                                       cellsize=cellsize,
+                                       number_of_decimal_places=number_of_decimal_places,
+                                       NODATA_value=NODATA_value,
+                                       easting_min=easting_min,
+                                       easting_max=easting_max,
+                                       northing_min=northing_min,
+                                       northing_max=northing_max,
+                                       verbose=verbose,
+                                       origin=origin,
+                                       datum=datum))
     return files_out
-
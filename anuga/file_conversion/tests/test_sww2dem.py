@@ -20,7 +20,8 @@ from anuga.abstract_2d_finite_volumes.generic_boundary_conditions\
             Time_boundary, File_boundary, AWI_boundary
 
 # local modules
-from anuga.file_conversion.sww2dem import sww2dem, sww2dem_batch
+from anuga.file_conversion.sww2dem import sww2dem, sww2dem_batch, \
+     sww2dem_multi
 
 from pprint import pprint
 
@@ -2170,6 +2171,104 @@ class Test_Sww2Dem(unittest.TestCase):
         else:
             self.assertTrue(0 == 1, 'Bad input did not throw exception error!')
         
+    def test_sww2dem_multi(self):
+        """Test that sww2dem_multi writes the same files as separate
+        calls to sww2dem, for several quantities, reductions and formats.
+        """
+
+        import os
+        from anuga.file_conversion.calc_grid_values_ext import calc_grid_values
+
+        # Setup
+        self.domain.set_name('datatest_multi')
+        swwfile = self.domain.get_name() + '.sww'
+
+        self.domain.set_datadir('.')
+        self.domain.format = 'sww'
+        self.domain.smooth = True
+        self.domain.set_quantity('elevation', lambda x, y:-x - y)
+
+        self.domain.geo_reference = Geo_reference(56, 308500, 6189000)
+
+        sww = SWW_file(self.domain)
+        sww.store_connectivity()
+        sww.store_timestep()
+
+        self.domain.evolve_to_end(finaltime=0.01)
+        sww.store_timestep()
+
+        jobs = [('stage', max, 'datatest_multi_stage_max.asc'),
+                ('stage', min, 'datatest_multi_stage_min.asc'),
+                ('stage', 1, 'datatest_multi_stage_1.asc'),
+                ('depth', 0, 'datatest_multi_depth_0.asc'),
+                ('momentum', None, 'datatest_multi_momentum.ers'),
+                (None, None, 'datatest_multi_elevation.asc')]
+
+        # Files written one at a time
+        expected = {}
+        for quantity, reduction, name_out in jobs:
+            sww2dem(swwfile, name_out,
+                    quantity=quantity,
+                    reduction=reduction,
+                    cellsize=0.1,
+                    number_of_decimal_places=9,
+                    block_size=4,
+                    verbose=self.verbose)
+
+            if name_out.endswith('.ers'):
+                os.rename(name_out, name_out + '.single')
+                os.rename(name_out[:-4], name_out[:-4] + '.single')
+            else:
+                expected[name_out] = open(name_out).read()
+                os.remove(name_out)
+
+        basenames = sww2dem_multi(swwfile, jobs,
+                                  cellsize=0.1,
+                                  number_of_decimal_places=9,
+                                  block_size=4,
+                                  verbose=self.verbose)
+
+        assert basenames == [os.path.splitext(job[2])[0] for job in jobs]
+
+        for name_out in expected:
+            assert open(name_out).read() == expected[name_out], name_out
+
+        for name in ['datatest_multi_momentum.ers', 'datatest_multi_momentum']:
+            assert open(name).read() == open(name + '.single').read()
+            os.remove(name + '.single')
+
+        # Compare with the interpolation of the original C routine
+        fid = NetCDFFile(swwfile, netcdf_mode_r)
+        x = num.array(fid.variables['x'][:], num.float)
+        y = num.array(fid.variables['y'][:], num.float)
+        volumes = num.array(fid.variables['volumes'][:], num.int)
+        stage = num.array(fid.variables['stage'][1], num.float)
+        fid.close()
+
+        x -= min(x)
+        y -= min(y)
+        ncols = int(max(x)/0.1) + 1
+        nrows = int(max(y)/0.1) + 1
+
+        grid_values = num.zeros(nrows*ncols, num.float)
+        norms = num.zeros(6*len(volumes), num.float)
+        calc_grid_values(nrows, ncols, 0.1, -9999.0, x, y, norms, volumes,
+                         stage, grid_values)
+
+        lines = open('datatest_multi_stage_1.asc').readlines()
+        values = num.array([map(float, L.split()) for L in lines[6:]])
+
+        assert num.allclose(values[::-1].flatten(), grid_values)
+
+        # Cleanup
+        for quantity, reduction, name_out in jobs:
+            basename = os.path.splitext(name_out)[0]
+            for name in [name_out, basename + '.prj', basename]:
+                if os.path.exists(name):
+                    os.remove(name)
+        os.remove(swwfile)
+
+
     def test_sww2dem_verbose_True(self):
         '''test sww2dem when verbose is True
         uses the example from function test_sww2dem_asc_elevation_depth'''
@@ -29,7 +29,9 @@
 from anuga.abstract_2d_finite_volumes.neighbour_mesh import Mesh
 from anuga.caching import cache
 from anuga.geospatial_data.geospatial_data import Geospatial_data, \
-     ensure_absolute
+     ensure_absolute, _read_pts_file_header, _read_pts_file_blocking
+from anuga.file.netcdf import NetCDFFile
+from anuga.config import netcdf_mode_r
 from anuga.fit_interpolate.general_fit_interpolate import FitInterpolate
 
 from anuga.utilities.sparse import Sparse_CSR
@@ -110,6 +112,7 @@ class Fit(FitInterpolate):
         self.AtA = None
         self.Atz = None
         self.D = None
+        self.B = None
         self.point_count = 0
 
         # NOTE PADARN: NEEDS FIXING - currently need smoothing matrix
@@ -266,11 +269,154 @@ class Fit(FitInterpolate):
             fitsmooth.combine_partial_AtA_Atz(self.AtA, AtA, \
                     self.Atz, Atz, zdim, self.mesh.number_of_nodes)
 
+    def get_partial_AtA_Atz(self):
+        """Return the AtA and Atz built so far as
+        (point_count, (rows, cols, values), Atz), or None if no points
+        have been added. Unlike AtA itself this can be pickled and sent
+        to another process.
+        """
+
+        if self.AtA is None:
+            return None
+
+        return (self.point_count,
+                fitsmooth.get_dok_triplets(self.AtA),
+                self.Atz)
+
+    def add_partial_AtA_Atz(self, partial):
+        """Add partial AtA and Atz, as returned by get_partial_AtA_Atz of
+        a Fit object of the same mesh, to AtA and Atz.
+        """
+
+        if partial is None:
+            return
+
+        point_count, (rows, cols, values), Atz = partial
+
+        AtA = fitsmooth.build_dok_from_triplets(
+                          num.ascontiguousarray(rows, num.int),
+                          num.ascontiguousarray(cols, num.int),
+                          num.ascontiguousarray(values, num.float))
+
+        # Same memory layout as Atz built by _build_matrix_AtA_Atz
+        if len(Atz.shape) == 1:
+            zdim = 1
+            Atz = num.array(Atz, num.float)
+        else:
+            zdim = Atz.shape[1]
+            Atz = num.array(Atz.transpose(), num.float).transpose()
+
+        self.point_count += point_count
+
+        if self.AtA is None and self.Atz is None:
+            self.AtA = AtA
+            self.Atz = Atz
+        else:
+            fitsmooth.combine_partial_AtA_Atz(self.AtA, AtA, \
+                    self.Atz, Atz, zdim, self.mesh.number_of_nodes)
+
+    def _build_matrix_AtA_Atz_parallel(self, point_coordinates_or_filename,
+                                       z=None,
+                                       point_origin=None,
+                                       attribute_name=None,
+                                       max_read_lines=1e7,
+                                       processes=None,
+                                       parallel=False,
+                                       verbose=False):
+        """Build AtA and Atz with the blocks of points shared between
+        a pool of processes worker processes and, if parallel is True,
+        between the MPI processors (which must all call this method).
+
+        Each worker builds partial AtA and Atz of its blocks against the
+        quad tree inherited from this process. The partial matrices are
+        added up on processor 0 with combine_partial_AtA_Atz.
+
+        If building fails on any processor the exception is raised on all
+        processors, before the partial matrices are sent.
+
+        Return the number of processors and the id of this processor.
+        """
+
+        import anuga.utilities.parallel_abstraction as pypar
+
+        if parallel:
+            numprocs = pypar.size()
+            myid = pypar.rank()
+        else:
+            numprocs = 1
+            myid = 0
+
+        if processes is None or processes < 1:
+            processes = 1
+
+        if parallel and processes > 1:
+            # Forking an MPI process is not safe
+            import warnings
+            msg = 'A parallel fit does not use worker processes, '
+            msg += 'building AtA in this process'
+            warnings.warn(msg)
+            processes = 1
+
+        try:
+            source, tasks = _get_fit_tasks(point_coordinates_or_filename, z,
+                                           point_origin=point_origin,
+                                           attribute_name=attribute_name,
+                                           max_read_lines=max_read_lines,
+                                           number_of_tasks=processes*numprocs)
+
+            # Tasks of this processor
+            tasks = (task for i, task in enumerate(tasks)
+                     if i%numprocs == myid)
+
+            if verbose:
+                log.critical('Fit.fit: Building AtA on processor %d with %d '
+                             'worker processes' % (myid, processes))
+
+            if processes > 1:
+                from multiprocessing import Pool
+
+                pool = Pool(processes, _fit_worker_init, (self, source))
+                try:
+                    for partial in pool.imap_unordered(_fit_worker, tasks):
+                        self.add_partial_AtA_Atz(partial)
+                finally:
+                    pool.terminate()
+            else:
+                for task in tasks:
+                    for points, values in _read_fit_task(source, task):
+                        self._build_matrix_AtA_Atz(points, values)
+        except Exception, e:
+            if numprocs == 1:
+                raise
+
+            # Let the other processors know before raising
+            exc_info = sys.exc_info()
+            _share_error(_picklable_error(e), numprocs, myid)
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+        if numprocs > 1:
+            error = _share_error(None, numprocs, myid)
+            if error is not None:
+                raise error
+
+            if myid == 0:
+                for p in range(1, numprocs):
+                    self.add_partial_AtA_Atz(pypar.receive(p))
+
+                # The other processors now wait for the solution
+                self.solution_pending = True
+            else:
+                pypar.send(self.get_partial_AtA_Atz(), 0)
+
+        return numprocs, myid
+
     def fit(self, point_coordinates_or_filename=None, z=None,
             verbose=False,
             point_origin=None,
             attribute_name=None,
-            max_read_lines=1e7):
+            max_read_lines=1e7,
+            processes=None,
+            parallel=False):
         """Fit a smooth surface to given 1d array of data points z.
 
         The smooth surface is computed at each vertex in the underlying
@@ -283,8 +429,86 @@ class Fit(FitInterpolate):
               data points or an nx2 numeric array or a Geospatial_data object
               or points file filename
           z: Single 1d vector or array of data at the point_coordinates.
+          processes: Number of worker processes building AtA and Atz from
+              blocks of the points (default only this process).
+          parallel: If True the blocks of points are also shared between
+              the MPI processors, which must all call fit with the same
+              mesh and points. The system is solved on processor 0 and the
+              result returned on all processors.
+
+              If a processor fails to build its part of the system, or
+              processor 0 fails to solve it, the exception is raised on
+              all processors.
+
+        """
 
+        if not parallel:
+            return self._fit(point_coordinates_or_filename, z,
+                             verbose=verbose,
+                             point_origin=point_origin,
+                             attribute_name=attribute_name,
+                             max_read_lines=max_read_lines,
+                             processes=processes)
+
+        import anuga.utilities.parallel_abstraction as pypar
+
+        if pypar.rank() != 0:
+            self._fit(point_coordinates_or_filename, z,
+                      verbose=verbose,
+                      point_origin=point_origin,
+                      attribute_name=attribute_name,
+                      max_read_lines=max_read_lines,
+                      processes=processes,
+                      parallel=True)
+
+            # Processor 0 sends the solution or the exception it raised
+            vertex_attributes, error = pypar.receive(0)
+            if error is not None:
+                raise error
+
+            return vertex_attributes
+
+        self.solution_pending = False
+        try:
+            vertex_attributes = self._fit(point_coordinates_or_filename, z,
+                                          verbose=verbose,
+                                          point_origin=point_origin,
+                                          attribute_name=attribute_name,
+                                          max_read_lines=max_read_lines,
+                                          processes=processes,
+                                          parallel=True)
+        except Exception, e:
+            exc_info = sys.exc_info()
+
+            # Make sure the other processors don't wait forever. Errors
+            # while building AtA are already raised on all processors.
+            if self.solution_pending:
+                for p in range(1, pypar.size()):
+                    pypar.send((None, _picklable_error(e)), p)
+
+            self.solution_pending = False
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+        if self.solution_pending:
+            for p in range(1, pypar.size()):
+                pypar.send((vertex_attributes, None), p)
+
+        self.solution_pending = False
+
+        return vertex_attributes
+
+    def _fit(self, point_coordinates_or_filename=None, z=None,
+             verbose=False,
+             point_origin=None,
+             attribute_name=None,
+             max_read_lines=1e7,
+             processes=None,
+             parallel=False):
+        """Build and solve the fit system, see fit. If parallel is True
+        only processor 0 solves the system, the other processors return
+        None once their part of AtA and Atz is sent.
         """
+
         if isinstance(point_coordinates_or_filename, basestring):
             if point_coordinates_or_filename[-4:] != ".pts":
                 use_blocking_option2 = False
@@ -296,8 +520,24 @@ class Fit(FitInterpolate):
         if verbose:
             print 'Fit.fit: Initializing'
 
+        if (processes is not None and processes > 1) or parallel:
+            numprocs, myid = self._build_matrix_AtA_Atz_parallel(
+                                           point_coordinates_or_filename, z,
+                                           point_origin=point_origin,
+                                           attribute_name=attribute_name,
+                                           max_read_lines=max_read_lines,
+                                           processes=processes,
+                                           parallel=parallel,
+                                           verbose=verbose)
+
+            if myid != 0:
+                # The system is solved on processor 0
+                return None
+
+            point_coordinates = None
+
         # Use blocking to load in the point info
-        if isinstance(point_coordinates_or_filename, basestring):
+        elif isinstance(point_coordinates_or_filename, basestring):
             msg = "Don't set a point origin when reading from a file"
             assert point_origin is None, msg
             filename = point_coordinates_or_filename
@@ -366,10 +606,313 @@ class Fit(FitInterpolate):
             log.critical(msg)
 
             #raise VertsWithNoTrianglesError(msg)
-        return conjugate_gradient(self.B, self.Atz, self.Atz,
+        vertex_attributes = conjugate_gradient(self.B, self.Atz, self.Atz,
                                   imax=2 * len(self.Atz)+1000, use_c_cg=self.use_c_cg,
                                   precon=self.cg_precon)
 
+        return vertex_attributes
+
+    def _build_alpha_system(self):
+        """Return (colind, row_ptr, AtA_data, D_data), the common sparsity
+        pattern of AtA and D in csr format with the entries of AtA and D
+        on that pattern, so that B = AtA + alpha*D can be formed for any
+        alpha without rebuilding AtA or D.
+        """
+
+        msg = 'AtA and D are combined in place when fit solves for B, '
+        msg += 'so fit_alphas must be called instead of fit'
+        assert self.B is None, msg
+
+        msg = 'No interpolation matrix.'
+        assert self.AtA is not None, msg
+
+        m = self.mesh.number_of_nodes
+
+        rows_a, cols_a, values_a = fitsmooth.get_dok_triplets(self.AtA)
+        rows_d, cols_d, values_d = fitsmooth.get_dok_triplets(self.D)
+
+        keys = num.concatenate((num.asarray(rows_a)*m + cols_a,
+                                num.asarray(rows_d)*m + cols_d))
+        keys, inverse = num.unique(keys, return_inverse=True)
+
+        na = len(values_a)
+        AtA_data = num.bincount(inverse[:na], weights=values_a,
+                                minlength=len(keys))
+        D_data = num.bincount(inverse[na:], weights=values_d,
+                              minlength=len(keys))
+
+        colind = num.ascontiguousarray(keys % m, dtype=num.int)
+        row_ptr = num.searchsorted(keys // m, num.arange(m+1)).astype(num.int)
+
+        return colind, row_ptr, AtA_data, D_data
+
+    def fit_alphas(self, alphas, point_coordinates_or_filename=None, z=None,
+                   point_origin=None, attribute_name=None,
+                   max_read_lines=1e7, processes=None, verbose=False):
+        """Fit a smooth surface for each smoothing parameter in alphas.
+
+        AtA, Atz and the smoothing matrix D do not depend on alpha, so they
+        are built once (from the given points, as in fit, or by earlier
+        calls to build_fit_subset) and only (AtA + alpha*D) x = Atz is
+        solved for each alpha. The alphas are solved in increasing order,
+        each solve starting from the solution for the previous alpha.
+
+        processes: Number of worker processes sharing the alphas (each
+            solving a contiguous range of alphas with warm starts).
+
+        Return list of vertex attributes, one for each alpha.
+        """
+
+        if point_coordinates_or_filename is not None:
+            if isinstance(point_coordinates_or_filename, basestring):
+                G_data = Geospatial_data(point_coordinates_or_filename,
+                                         max_read_lines=max_read_lines,
+                                         load_file_now=False,
+                                         verbose=verbose)
+
+                for geo_block in G_data:
+                    points = geo_block.get_data_points(absolute=True)
+                    values = geo_block.get_attributes(
+                                               attribute_name=attribute_name)
+                    self._build_matrix_AtA_Atz(points, values, verbose=verbose)
+            else:
+                point_coordinates = ensure_absolute(point_coordinates_or_filename,
+                                                    geo_reference=point_origin)
+                self._build_matrix_AtA_Atz(point_coordinates, z,
+                                           attribute_name=attribute_name,
+                                           verbose=verbose, output='counter')
+
+        m = self.mesh.number_of_nodes
+        if self.point_count < m and 0.0 in alphas:
+            msg = 'ERROR (least_squares): Too few data points\n'
+            msg += 'There are only %d data points and alpha == 0. ' \
+                   % self.point_count
+            msg += 'Need at least %d\n' % m
+            raise TooFewPointsError(msg)
+
+        system = self._build_alpha_system()
+
+        # Contiguous ranges of the sorted alphas, one for each process
+        order = num.argsort(alphas)
+        if processes is None or processes < 1:
+            processes = 1
+        processes = min(processes, len(alphas))
+        tasks = [[(i, alphas[i]) for i in chunk]
+                 for chunk in num.array_split(order, processes)]
+
+        if verbose:
+            log.critical('Fit.fit_alphas: Solving for %d alphas with %d '
+                         'processes' % (len(alphas), processes))
+
+        state = (system, self.Atz, int(m), self.use_c_cg, self.cg_precon)
+
+        results = [None]*len(alphas)
+        if processes > 1:
+            from multiprocessing import Pool
+
+            pool = Pool(processes, _alpha_worker_init, (state,))
+            try:
+                for solutions in pool.imap_unordered(_alpha_worker, tasks):
+                    for i, x in solutions:
+                        results[i] = x
+            finally:
+                pool.terminate()
+        else:
+            _alpha_worker_init(state)
+            for i, x in _alpha_worker(tasks[0]):
+                results[i] = x
+
+        return results
+
+
+def _picklable_error(error):
+    """Return error, or an Exception with its message if error can't be
+    pickled to be sent to the other processors.
+    """
+
+    import cPickle
+    try:
+        cPickle.dumps(error)
+    except Exception:
+        error = Exception(str(error))
+
+    return error
+
+
+def _share_error(error, numprocs, myid):
+    """Send the error of this processor (None if there is none) to
+    processor 0, and return the error of the first processor which
+    failed, or None, on all processors.
+    """
+
+    import anuga.utilities.parallel_abstraction as pypar
+
+    if myid == 0:
+        errors = [error] + [pypar.receive(p) for p in range(1, numprocs)]
+        errors = [e for e in errors if e is not None] + [None]
+        error = errors[0]
+
+        for p in range(1, numprocs):
+            pypar.send(error, p)
+    else:
+        pypar.send(error, 0)
+        error = pypar.receive(0)
+
+    return error
+
+
+def _get_fit_tasks(point_coordinates_or_filename, z=None,
+                   point_origin=None,
+                   attribute_name=None,
+                   max_read_lines=1e7,
+                   number_of_tasks=1):
+    """Split the points to be fitted into tasks for
+    Fit._build_matrix_AtA_Atz_parallel.
+
+    Return the source of the points and an iterator of tasks, where the
+    source is one of
+      ('points', points, z, max_read_lines) for points in memory
+      ('pts', filename, attribute_name, max_read_lines) for a pts file
+      ('blocks',) for other files, which can only be read sequentially
+    and a task is either ('rows', start, stop), number_of_tasks ranges of
+    rows of points or of the pts file, or ('block', points, z), one block
+    of points read from a csv file.
+    """
+
+    max_read_lines = int(max_read_lines)
+
+    if isinstance(point_coordinates_or_filename, basestring):
+        msg = "Don't set a point origin when reading from a file"
+        assert point_origin is None, msg
+        filename = point_coordinates_or_filename
+
+        if filename[-4:] == '.pts':
+            fid = NetCDFFile(filename, netcdf_mode_r)
+            _, _, number_of_points = _read_pts_file_header(fid)
+            fid.close()
+
+            source = ('pts', filename, attribute_name, max_read_lines)
+        else:
+            G_data = Geospatial_data(filename,
+                                     max_read_lines=max_read_lines,
+                                     load_file_now=False)
+
+            tasks = (('block',
+                      geo_block.get_data_points(absolute=True),
+                      geo_block.get_attributes(attribute_name=attribute_name))
+                     for geo_block in G_data)
+
+            return ('blocks',), tasks
+    else:
+        point_coordinates = point_coordinates_or_filename
+
+        if z is None:
+            msg = 'z not specified'
+            assert isinstance(point_coordinates, Geospatial_data), msg
+            z = point_coordinates.get_attributes(attribute_name)
+
+        points = ensure_absolute(point_coordinates,
+                                 geo_reference=point_origin)
+        z = ensure_numeric(z, num.float)
+        number_of_points = len(points)
+
+        source = ('points', points, z, max_read_lines)
+
+    bounds = num.linspace(0, number_of_points, number_of_tasks+1)
+    bounds = bounds.astype(num.int)
+
+    tasks = (('rows', start, stop)
+             for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start)
+
+    return source, tasks
+
+
+def _read_fit_task(source, task):
+    """Yield the blocks (points, z) of a task of _get_fit_tasks
+    """
+
+    if task[0] == 'block':
+        yield task[1], task[2]
+        return
+
+    _, start, stop = task
+
+    if source[0] == 'points':
+        _, points, z, max_read_lines = source
+
+        for i in range(start, stop, max_read_lines):
+            j = min(i + max_read_lines, stop)
+            yield points[i:j], z[i:j]
+    else:
+        _, filename, attribute_name, max_read_lines = source
+
+        fid = NetCDFFile(filename, netcdf_mode_r)
+        georef, keys, _ = _read_pts_file_header(fid)
+
+        for i in range(start, stop, max_read_lines):
+            j = min(i + max_read_lines, stop)
+            pointlist, att_dict = _read_pts_file_blocking(fid, i, j, keys)
+
+            geo_block = Geospatial_data(pointlist, att_dict, georef)
+            yield (geo_block.get_data_points(absolute=True),
+                   geo_block.get_attributes(attribute_name=attribute_name))
+
+        fid.close()
+
+
+# Fit object and points source shared by the worker processes building AtA
+_fit_worker_state = None
+
+def _fit_worker_init(fit, source):
+
+    global _fit_worker_state
+    _fit_worker_state = (fit, source)
+
+
+def _fit_worker(task):
+
+    fit, source = _fit_worker_state
+
+    # Only return the AtA and Atz of this task
+    fit.AtA = None
+    fit.Atz = None
+    fit.point_count = 0
+
+    for points, z in _read_fit_task(source, task):
+        fit._build_matrix_AtA_Atz(points, z)
+
+    return fit.get_partial_AtA_Atz()
+
+
+# Matrices AtA, D and Atz shared by the worker processes solving for alphas
+_alpha_worker_state = None
+
+def _alpha_worker_init(state):
+
+    global _alpha_worker_state
+    _alpha_worker_state = state
+
+
+def _alpha_worker(task):
+    """Solve (AtA + alpha*D) x = Atz for the (index, alpha) pairs of task,
+    each starting from the solution of the previous alpha.
+    """
+
+    (colind, row_ptr, AtA_data, D_data), Atz, m, use_c_cg, cg_precon = \
+                                                      _alpha_worker_state
+
+    solutions = []
+    x = Atz
+    for i, alpha in task:
+        B = Sparse_CSR(data=AtA_data + alpha*D_data, Colind=colind,
+                       rowptr=row_ptr, m=m, n=m)
+
+        x = conjugate_gradient(B, Atz, x, imax=2*len(Atz)+1000,
+                               use_c_cg=use_c_cg, precon=cg_precon)
+        solutions.append((i, x))
+
+    return solutions
+
 
 #poin_coordiantes can also be a points file name
 
@@ -386,7 +929,9 @@ def fit_to_mesh(point_coordinates,
                 attribute_name=None,
                 use_cache=False,
                 cg_precon='Jacobi',
-                use_c_cg=True):
+                use_c_cg=True,
+                processes=None,
+                parallel=False):
     """Wrapper around internal function _fit_to_mesh for use with caching.
     """
 
@@ -402,7 +947,9 @@ def fit_to_mesh(point_coordinates,
               'max_read_lines': max_read_lines,
               'attribute_name': attribute_name,
               'cg_precon': cg_precon,
-              'use_c_cg': use_c_cg
+              'use_c_cg': use_c_cg,
+              'processes': processes,
+              'parallel': parallel
               }
 
     if use_cache is True:
@@ -440,7 +987,9 @@ def _fit_to_mesh(point_coordinates,
                  max_read_lines=None,
                  attribute_name=None,
                  cg_precon='Jacobi',
-                 use_c_cg=True):
+                 use_c_cg=True,
+                 processes=None,
+                 parallel=False):
     """
     Fit a smooth surface to a triangulation,
     given data points with attributes.
@@ -470,6 +1019,12 @@ def _fit_to_mesh(point_coordinates,
           point_attributes: Vector or array of data at the
                             point_coordinates.
 
+          processes: Number of worker processes building the fit
+                     matrices (see Fit.fit).
+
+          parallel: Share the points between the MPI processors
+                    (see Fit.fit).
+
     """
 
     if mesh is None:
@@ -499,7 +1054,9 @@ def _fit_to_mesh(point_coordinates,
                                    point_origin=data_origin,
                                    max_read_lines=max_read_lines,
                                    attribute_name=attribute_name,
-                                   verbose=verbose)
+                                   verbose=verbose,
+                                   processes=processes,
+                                   parallel=parallel)
 
     # Add the value checking stuff that's in least squares.
     # Maybe this stuff should get pushed down into Fit.
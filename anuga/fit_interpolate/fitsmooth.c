@@ -723,6 +723,112 @@ PyObject *combine_partial_AtA_Atz(PyObject *self, PyObject *args) {
     return Py_BuildValue("");
 }
 
+// Returns the entries of a sparse_dok matrix as three numpy arrays of
+// row indices, column indices and values. Takes as input a capsule object
+// containing a pointer to the sparse_dok object.
+//
+// Used to send partial AtA matrices between processes, as the capsule
+// itself can't be pickled.
+PyObject *get_dok_triplets(PyObject *self, PyObject *args) {
+
+    // Setting up variables to parse input
+    PyObject *dok_cap; // capsule object holding sparse_dok pointer
+
+    // Convert Python arguments to C
+    if (!PyArg_ParseTuple(args, "O",&dok_cap
+                                            )) {
+      PyErr_SetString(PyExc_RuntimeError,
+              "fitsmooth.get_dok_triplets: could not parse input");
+      return NULL;
+    }
+
+    // Get pointer to sparse_dok struct
+    #ifdef PYVERSION273
+    sparse_dok * dok = (sparse_dok*) PyCapsule_GetPointer(dok_cap,"sparse dok");
+    #else
+    sparse_dok * dok = (sparse_dok*) PyCObject_AsVoidPtr(dok_cap);
+    #endif
+
+    npy_intp n = (npy_intp) dok->num_entries;
+
+    PyArrayObject *rows = (PyArrayObject*) PyArray_SimpleNew(1, &n, NPY_LONG);
+    PyArrayObject *cols = (PyArrayObject*) PyArray_SimpleNew(1, &n, NPY_LONG);
+    PyArrayObject *values = (PyArrayObject*) PyArray_SimpleNew(1, &n, NPY_DOUBLE);
+
+    long *rows_data = (long*) rows->data;
+    long *cols_data = (long*) cols->data;
+    double *values_data = (double*) values->data;
+
+    edge_t *s;
+    npy_intp k = 0;
+    for(s=dok->edgetable; s != NULL && k < n; s=(edge_t*)(s->hh.next)) {
+        rows_data[k] = (long) s->key.i;
+        cols_data[k] = (long) s->key.j;
+        values_data[k] = s->entry;
+        k++;
+    }
+
+    // Build python list for return (references to arrays stolen)
+    PyObject *lst = PyList_New(3);
+    PyList_SET_ITEM(lst, 0, (PyObject*) rows);
+    PyList_SET_ITEM(lst, 1, (PyObject*) cols);
+    PyList_SET_ITEM(lst, 2, (PyObject*) values);
+
+    return lst;
+}
+
+// Builds a sparse_dok matrix from numpy arrays of row indices, column
+// indices and values (as returned by get_dok_triplets), returning a capsule
+// object wrapping a pointer to the new sparse_dok. Repeated entries are
+// added together.
+PyObject *build_dok_from_triplets(PyObject *self, PyObject *args) {
+
+    PyArrayObject *rows;
+    PyArrayObject *cols;
+    PyArrayObject *values;
+
+    // Convert Python arguments to C
+    if (!PyArg_ParseTuple(args, "OOO",&rows, &cols, &values
+                                            )) {
+      PyErr_SetString(PyExc_RuntimeError,
+              "fitsmooth.build_dok_from_triplets: could not parse input");
+      return NULL;
+    }
+
+    CHECK_C_CONTIG(rows);
+    CHECK_C_CONTIG(cols);
+    CHECK_C_CONTIG(values);
+
+    int n = rows->dimensions[0];
+    long *rows_data = (long*) rows->data;
+    long *cols_data = (long*) cols->data;
+    double *values_data = (double*) values->data;
+
+    sparse_dok * dok;
+    dok = make_dok();
+
+    int k;
+    edge_key_t key;
+    for(k=0; k<n; k++) {
+        key.i = (int) rows_data[k];
+        key.j = (int) cols_data[k];
+        add_dok_entry(dok, key, values_data[k]);
+    }
+
+    #ifdef PYVERSION273
+
+    return  PyCapsule_New((void*) dok,
+                  "sparse dok",
+                  &delete_dok_cap); 
+
+    #else
+
+    return  PyCObject_FromVoidPtr((void*) dok,
+                  &delete_dok_cobj); 
+    
+    #endif
+}
+
 // Converts a sparse_dok matrix to a full non-compressed matrix expressed
 // as a list of lists (python). Takes as input a capsule object containing a pointer to the
 // sparse_dok object. Also takes an integer n as input, specifying the (n x n) size of the 
@@ -866,6 +972,8 @@ static struct PyMethodDef MethodTable[] = {
     {"build_matrix_AtA_Atz_points",build_matrix_AtA_Atz_points, METH_VARARGS, "Print out"},
     {"combine_partial_AtA_Atz",combine_partial_AtA_Atz, METH_VARARGS, "Print out"},
     {"individual_tree_search",individual_tree_search, METH_VARARGS, "Print out"},
+    {"get_dok_triplets",get_dok_triplets, METH_VARARGS, "Print out"},
+    {"build_dok_from_triplets",build_dok_from_triplets, METH_VARARGS, "Print out"},
 	{NULL, NULL, 0, NULL}   // sentinel
 };
 
@@ -671,6 +671,8 @@ class Interpolation_function:
         vertex_coordinates:   mx2 array of coordinates (float)
         triangles:            nx3 array of indices into vertex_coordinates (int)
         interpolation_points: Nx2 array of coordinates to be interpolated to
+        time_window:          Number of time slices interpolated at a time
+                              (lazy mode, see below)
         verbose:              Level of reporting
 
     The quantities returned by the callable object are specified by
@@ -683,6 +685,18 @@ class Interpolation_function:
     quantities are to be computed whenever object is called.
     If None, return average value
 
+    By default the quantities are interpolated to the interpolation points
+    for all timesteps when the object is created. If time_window is given
+    (and interpolation points are specified) only a block of time_window
+    time slices, starting at the current time index, is interpolated and
+    kept. The next block is interpolated when the object is called with a
+    time outside the current block. The time dependent quantities can then
+    be any objects returning arrays when sliced along the time axis
+    (e.g. NetCDF variables of an open file or memory mapped arrays) so that
+    only the time slices of the current block are ever read into memory.
+    close() releases the quantities (closing the file of quantities with a
+    close method), after which only the current block can be evaluated.
+
     FIXME (Ole): Need to allow vertex coordinates and interpolation points to
                  be geospatial data objects
 
@@ -702,12 +716,16 @@ class Interpolation_function:
                  time_thinning=1,
                  verbose=False,
                  gauge_neighbour_id=None,
-                 output_centroids=False):
+                 output_centroids=False,
+                 time_window=None):
         """Initialise object and build spatial interpolation if required
 
         Time_thinning_number controls how many timesteps to use. Only timesteps
         with index%time_thinning_number == 0 will used, or in other words a
         value of 3, say, will cause the algorithm to use every third time step.
+
+        time_window is the number of (thinned) time slices interpolated
+        at a time. If None all time slices are interpolated up front.
         """
 
         from anuga.config import time_format
@@ -755,9 +773,20 @@ class Interpolation_function:
         # Thin timesteps if needed
         # Note array() is used to make the thinned arrays contiguous in memory
         self.time = num.array(time[::time_thinning])
-        for name in quantity_names:
-            if len(quantities[name].shape) == 2:
-                quantities[name] = num.array(quantities[name][::time_thinning,:])
+
+        if time_window is not None and interpolation_points is not None:
+            msg = 'time_window must be at least 2. I got %s' % str(time_window)
+            assert time_window >= 2, msg
+
+            # Time slices are read from the quantities when their block is
+            # interpolated, so thinning is applied at that point
+            self.source_thinning = time_thinning
+        else:
+            time_window = None
+            self.source_thinning = 1
+            for name in quantity_names:
+                if len(quantities[name].shape) == 2:
+                    quantities[name] = num.array(quantities[name][::time_thinning,:])
 
         if verbose is True:
             log.critical('Interpolation_function: precomputing')
@@ -765,16 +794,26 @@ class Interpolation_function:
         # Save for use with statistics
         self.quantities_range = {}
         for name in quantity_names:
-            q = quantities[name][:].flatten()
-            self.quantities_range[name] = [min(q), max(q)]
+            if time_window is None:
+                q = quantities[name][:].flatten()
+                self.quantities_range[name] = [min(q), max(q)]
+            else:
+                # Updated as blocks are read
+                self.quantities_range[name] = [num.inf, -num.inf]
 
         self.quantity_names = quantity_names
         self.vertex_coordinates = vertex_coordinates
         self.interpolation_points = interpolation_points
+        self.time_window = time_window
+        self.quantities = None    # Kept to read blocks from if time_window
+        self.gauge_neighbour_id = gauge_neighbour_id
+        self.output_centroids = output_centroids
 
         self.index = 0    # Initial time index
+        self.window_start = 0    # Time index of first precomputed value
         self.precomputed_values = {}
         self.centroids = []
+        self.interpol = None
 
         # Precomputed spatial interpolation if requested
         if interpolation_points is not None:
@@ -864,12 +903,8 @@ class Interpolation_function:
                                   figname='points_boundary',
                                   label=title)
 
-            m = len(self.interpolation_points)
             p = len(self.time)
 
-            for name in quantity_names:
-                self.precomputed_values[name] = num.zeros((p, m), num.float)
-
             if verbose is True:
                 log.critical('Build interpolator')
 
@@ -884,9 +919,9 @@ class Interpolation_function:
                     log.critical(msg)
 
                 # This one is no longer needed for STS files
-                interpol = Interpolate(vertex_coordinates,
-                                       triangles,
-                                       verbose=verbose)
+                self.interpol = Interpolate(vertex_coordinates,
+                                            triangles,
+                                            verbose=verbose)
 
             elif triangles is None and vertex_coordinates is not None:
                 if verbose:
@@ -904,40 +939,18 @@ class Interpolation_function:
                 else:
                     log.critical()
 
-            for i, t in enumerate(self.time):
-                # Interpolate quantities at this timestep
-                #if verbose and i%((p+10)/10) == 0:
-                if verbose:
-                    log.critical('  time step %d of %d' % (i, p))
-
-                for name in quantity_names:
-                    if len(quantities[name].shape) == 2:
-                        Q = quantities[name][i,:] # Quantities at timestep i
-                    else:
-                        Q = quantities[name][:]   # No time dependency
+            if time_window is None:
+                self.precomputed_values = \
+                    self._interpolate_time_slices(quantities, 0, p,
+                                                  verbose=verbose)
+            else:
+                # Keep quantities to read further blocks from
+                self.quantities = quantities
+                self.precomputed_values = \
+                    self._interpolate_time_slices(quantities, 0,
+                                                  min(time_window, p),
+                                                  verbose=verbose)
 
-                    #if verbose and i%((p+10)/10) == 0:
-                    if verbose:
-                        log.critical('    quantity %s, size=%d' % (name, len(Q)))
-
-                    # Interpolate
-                    if triangles is not None and vertex_coordinates is not None:
-                        result = interpol.interpolate(Q,
-                                                      point_coordinates=\
-                                                      self.interpolation_points,
-                                                      verbose=False,
-                                                      output_centroids=output_centroids)
-                        self.centroids = interpol.centroids                                                          
-                    elif triangles is None and vertex_coordinates is not None:
-                        result = interpolate_polyline(Q,
-                                                      vertex_coordinates,
-                                                      gauge_neighbour_id,
-                                                      interpolation_points=\
-                                                          self.interpolation_points)
-
-                    #assert len(result), len(interpolation_points)
-                    self.precomputed_values[name][i, :] = result                                    
-                    
             # Report
             if verbose:
                 log.critical(self.statistics())            
@@ -950,6 +963,111 @@ class Interpolation_function:
 #         # return 'Interpolation function (spatio-temporal)'
 #         return self.statistics()
 
+    def _interpolate_time_slices(self, quantities, start, stop, verbose=False):
+        """Interpolate quantities to the interpolation points at
+        (thinned) time slices start to stop-1.
+
+        Return dictionary of arrays of shape (stop-start) x N
+        """
+
+        p = len(self.time)
+        m = len(self.interpolation_points)
+        k = self.source_thinning
+
+        values = {}
+        blocks = {}
+        for name in self.quantity_names:
+            values[name] = num.zeros((stop-start, m), num.float)
+
+            if len(quantities[name].shape) == 2:
+                # Time slices of this block
+                blocks[name] = quantities[name][start*k:stop*k:k]
+            else:
+                blocks[name] = quantities[name][:]   # No time dependency
+
+            if self.time_window is not None:
+                q = blocks[name]
+                q_range = self.quantities_range[name]
+                q_range[0] = min(q_range[0], num.min(q))
+                q_range[1] = max(q_range[1], num.max(q))
+
+        for i in range(start, stop):
+            # Interpolate quantities at this timestep
+            #if verbose and i%((p+10)/10) == 0:
+            if verbose:
+                log.critical('  time step %d of %d' % (i, p))
+
+            for name in self.quantity_names:
+                if len(quantities[name].shape) == 2:
+                    Q = blocks[name][i-start,:] # Quantities at timestep i
+                else:
+                    Q = blocks[name]
+
+                #if verbose and i%((p+10)/10) == 0:
+                if verbose:
+                    log.critical('    quantity %s, size=%d' % (name, len(Q)))
+
+                # Interpolate
+                if self.interpol is not None:
+                    result = self.interpol.interpolate(Q,
+                                                  point_coordinates=\
+                                                  self.interpolation_points,
+                                                  verbose=False,
+                                                  output_centroids=\
+                                                  self.output_centroids)
+                    self.centroids = self.interpol.centroids
+                else:
+                    result = interpolate_polyline(Q,
+                                                  self.vertex_coordinates,
+                                                  self.gauge_neighbour_id,
+                                                  interpolation_points=\
+                                                      self.interpolation_points)
+
+                #assert len(result), len(interpolation_points)
+                values[name][i-start, :] = result
+
+        return values
+
+    def _update_window(self):
+        """Interpolate the block of time slices starting at the current
+        time index unless the current and next time slices are already
+        precomputed (only used if time_window is specified)
+        """
+
+        p = len(self.time)
+
+        start = self.window_start
+        stop = start + len(self.precomputed_values[self.quantity_names[0]])
+
+        if start <= self.index and min(self.index+1, p-1) < stop:
+            return
+
+        msg = 'Interpolation function has been closed, time %f is outside ' \
+              % self.time[self.index]
+        msg += 'the time slices %f to %f interpolated last' \
+               % (self.time[start], self.time[stop-1])
+        assert self.quantities is not None, msg
+
+        start = self.index
+        stop = min(start + self.time_window, p)
+
+        self.precomputed_values = \
+            self._interpolate_time_slices(self.quantities, start, stop)
+        self.window_start = start
+
+    def close(self):
+        """Release the quantities kept to interpolate further blocks of
+        time slices (only used if time_window is specified), closing the
+        file they are read from.
+        """
+
+        if self.quantities is not None:
+            for name in self.quantity_names:
+                if hasattr(self.quantities[name], 'close'):
+                    self.quantities[name].close()
+
+        self.quantities = None
+
     def __call__(self, t, point_id=None, x=None, y=None):
         """Evaluate f(t) or f(t, point_id)
 
@@ -963,8 +1081,11 @@ class Interpolation_function:
           If no spatial info is present, point_id arguments are ignored
           making f a function of time only.
 
+          If point_id is an array of indices the values at all these
+          points are returned as an array with one row per quantity,
+          i.e. of shape (len(quantity_names), len(point_id)).
+
           FIXME: f(t, x, y) x, y could overrided location, point_id ignored
-          FIXME: point_id could also be a slice
           FIXME: What if x and y are vectors?
           FIXME: What about f(x,y) without t?
         """
@@ -994,6 +1115,12 @@ class Interpolation_function:
         while t > self.time[self.index]: self.index += 1
         while t < self.time[self.index]: self.index -= 1
 
+        if self.time_window is not None:
+            self._update_window()
+
+        # Index into precomputed values
+        index = self.index - self.window_start
+
         if t == self.time[self.index]:
             # Protect against case where t == T[-1] (last time)
             #  - also works in general when t == T[i]
@@ -1003,6 +1130,27 @@ class Interpolation_function:
             ratio = ((t - self.time[self.index]) /
                          (self.time[self.index+1] - self.time[self.index]))
 
+        if self.spatial is True and point_id is not None \
+               and not num.isscalar(point_id):
+            # Interpolate at all requested points at once
+            point_id = ensure_numeric(point_id, num.int)
+
+            q = num.zeros((len(self.quantity_names), len(point_id)), num.float)
+            for i, name in enumerate(self.quantity_names):
+                Q = self.precomputed_values[name]
+
+                Q0 = Q[index, point_id]
+                if ratio > 0:
+                    Q1 = Q[index+1, point_id]
+
+                    # Linear temporal interpolation
+                    both_nan = num.logical_and(Q0 == NAN, Q1 == NAN)
+                    q[i,:] = num.where(both_nan, Q0, Q0 + ratio*(Q1 - Q0))
+                else:
+                    q[i,:] = Q0
+
+            return q
+
         # Compute interpolated values
         q = num.zeros(len(self.quantity_names), num.float)
         for i, name in enumerate(self.quantity_names):
@@ -1012,17 +1160,17 @@ class Interpolation_function:
                 # If there is no spatial info
                 assert len(Q.shape) == 1
 
-                Q0 = Q[self.index]
-                if ratio > 0: Q1 = Q[self.index+1]
+                Q0 = Q[index]
+                if ratio > 0: Q1 = Q[index+1]
             else:
                 if x is not None and y is not None:
                     # Interpolate to x, y
                     raise Exception('x,y interpolation not yet implemented')
                 else:
                     # Use precomputed point
-                    Q0 = Q[self.index, point_id]
+                    Q0 = Q[index, point_id]
                     if ratio > 0:
-                        Q1 = Q[self.index+1, point_id]
+                        Q1 = Q[index+1, point_id]
 
             # Linear temporal interpolation
             if ratio > 0:
@@ -1102,7 +1250,10 @@ class Interpolation_function:
                                             max(interpolation_points[:,0]))
             msg += '    eta in [%f, %f]\n' %(min(interpolation_points[:,1]),
                                              max(interpolation_points[:,1]))
-            msg += '  Interpolated quantities (over all timesteps):\n'
+            if self.time_window is None:
+                msg += '  Interpolated quantities (over all timesteps):\n'
+            else:
+                msg += '  Interpolated quantities (over current time window):\n'
 
             for name in quantity_names:
                 q = precomputed_values[name][:].flatten()
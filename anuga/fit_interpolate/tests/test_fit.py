@@ -326,6 +326,108 @@ class Test_Fit(unittest.TestCase):
         os.remove(fileName)
         os.remove(fileName_pts)
         
+    def test_fit_processes(self):
+        """Fitting with AtA built by worker processes from blocks of
+        the points gives the same result as the serial fit.
+        """
+
+        from anuga.abstract_2d_finite_volumes.mesh_factory \
+             import rectangular_cross
+
+        points, triangles, _ = rectangular_cross(8, 6, len1=8.0, len2=6.0)
+        mesh = Mesh(points, triangles)
+
+        num.random.seed(17)
+        data_points = num.random.uniform(0.0, 6.0, (1000, 2))
+        z = num.zeros((1000, 2), num.float)
+        z[:,0] = linear_function(data_points)
+        z[:,1] = num.sin(data_points[:,0])
+
+        answer = Fit(mesh=mesh, alpha=0.01).fit(data_points, z)
+
+        # Points in memory, one or two attributes
+        # (parallel with worker processes is test_fit_parallel_processes)
+        for processes, parallel in [(3, False), (None, True)]:
+            f = Fit(mesh=mesh, alpha=0.01).fit(data_points, z,
+                                               max_read_lines=150,
+                                               processes=processes,
+                                               parallel=parallel)
+            assert num.allclose(f, answer)
+
+            f = Fit(mesh=mesh, alpha=0.01).fit(data_points, z[:,1],
+                                               max_read_lines=150,
+                                               processes=processes,
+                                               parallel=parallel)
+            assert num.allclose(f, answer[:,1])
+
+        # Points files
+        geo = Geospatial_data(data_points, {'elevation': z[:,1]})
+        for ext in ['.pts', '.csv']:
+            fileName = tempfile.mktemp(ext)
+            geo.export_points_file(fileName)
+
+            f = fit_to_mesh(fileName, mesh=mesh, alpha=0.01,
+                            max_read_lines=150, processes=2)
+            assert num.allclose(f, answer[:,1], atol=1.0e-5)
+
+            os.remove(fileName)
+
+        # Partial AtA and Atz of the two halves of the points
+        fit = Fit(mesh=mesh, alpha=0.01)
+        fit.build_fit_subset(data_points[:400], z[:400])
+        other = Fit(mesh=mesh, alpha=0.01)
+        other.build_fit_subset(data_points[400:], z[400:])
+        fit.add_partial_AtA_Atz(other.get_partial_AtA_Atz())
+
+        assert fit.point_count == 1000
+        assert num.allclose(fit.fit(), answer)
+
+    def test_fit_alphas(self):
+        """Fitting several alphas from one AtA, Atz and D gives the same
+        results as separate fits.
+        """
+
+        from anuga.abstract_2d_finite_volumes.mesh_factory \
+             import rectangular_cross
+
+        points, triangles, _ = rectangular_cross(8, 6, len1=8.0, len2=6.0)
+        mesh = Mesh(points, triangles)
+
+        num.random.seed(17)
+        data_points = num.random.uniform(0.0, 6.0, (500, 2))
+        z = num.sin(data_points[:,0]) + data_points[:,1]
+
+        alphas = [1.0, 0.0001, 0.1, 0.01]
+        answers = [Fit(mesh=mesh, alpha=alpha).fit(data_points, z)
+                   for alpha in alphas]
+
+        for processes in [None, 2]:
+            fit = Fit(mesh=mesh)
+            results = fit.fit_alphas(alphas, data_points, z,
+                                     processes=processes)
+
+            # Same up to the tolerance of the conjugate gradient solver
+            # (the warm started solves are the more accurate ones)
+            assert len(results) == len(alphas)
+            for result, answer in zip(results, answers):
+                assert num.allclose(result, answer, atol=1.0e-4)
+
+        # AtA built by build_fit_subset
+        fit = Fit(mesh=mesh)
+        fit.build_fit_subset(data_points, z)
+        results = fit.fit_alphas(alphas)
+        assert num.allclose(results[2], answers[2], atol=1.0e-4)
+
+        # AtA and D are used up by fit
+        fit = Fit(mesh=mesh)
+        fit.fit(data_points, z)
+        try:
+            fit.fit_alphas(alphas)
+        except AssertionError:
+            pass
+        else:
+            raise Exception('fit_alphas after fit should have failed')
+
     def test_fit_to_mesh_pts_passing_mesh_in(self):
         a = [-1.0, 0.0]
         b = [3.0, 4.0]
@@ -648,6 +750,167 @@ class Test_Fit(unittest.TestCase):
         #f will be different from answer due to smoothing
         assert num.allclose(f, answer,atol=5)
 
+    def test_fit_parallel_error(self):
+        """If processor 0 fails to solve a parallel fit the other
+        processors raise its exception instead of waiting for the solution.
+        Two processors are simulated by replacing the communication.
+        """
+
+        import anuga.utilities.parallel_abstraction as pypar
+
+        points = [[0.0, 0.0], [0.0, 2.0], [2.0, 0.0],
+                  [0.0, 4.0], [2.0, 2.0], [4.0, 0.0]]
+        triangles = [[1,0,2], [1,2,4], [4,2,5], [3,1,4]]
+
+        data_points = num.array([[0.66666667, 0.66666667],
+                                 [1.33333333, 1.33333333],
+                                 [2.66666667, 0.66666667],
+                                 [0.66666667, 2.66666667]])
+        z = linear_function(data_points)
+
+        # Partial AtA and Atz of processor 1
+        other = Fit(points, triangles, alpha=0.0)
+        other.build_fit_subset(data_points[2:], z[2:])
+
+        sent = []
+        received = []
+        saved = (pypar.rank, pypar.size, pypar.send, pypar.receive)
+        try:
+            pypar.size = lambda: 2
+            pypar.send = lambda value, p: sent.append((p, value))
+            pypar.receive = lambda p: received.pop(0)
+
+            # Processor 0 has too few points and alpha == 0. Processor 1
+            # sends its status, then its partial AtA and Atz
+            pypar.rank = lambda: 0
+            received[:] = [None, other.get_partial_AtA_Atz()]
+
+            try:
+                Fit(points, triangles, alpha=0.0).fit(data_points, z,
+                                                      parallel=True)
+            except TooFewPointsError:
+                pass
+            else:
+                raise Exception('Should have raised TooFewPointsError')
+
+            assert received == []
+            assert len(sent) == 2
+            assert sent[0] == (1, None)
+            p, (vertex_attributes, error) = sent[1]
+            assert p == 1
+            assert vertex_attributes is None
+            assert isinstance(error, TooFewPointsError)
+
+            # Processor 1 raises the exception of processor 0
+            pypar.rank = lambda: 1
+            received[:] = [None, sent[1][1]]
+            del sent[:]
+
+            try:
+                Fit(points, triangles, alpha=0.0).fit(data_points, z,
+                                                      parallel=True)
+            except TooFewPointsError:
+                pass
+            else:
+                raise Exception('Should have raised TooFewPointsError')
+
+            assert received == []
+            assert sent[0] == (0, None)
+        finally:
+            pypar.rank, pypar.size, pypar.send, pypar.receive = saved
+
+    def test_fit_parallel_build_error(self):
+        """If a processor fails to build its part of a parallel fit all
+        processors raise its exception, without sending the partial AtA
+        and Atz. Two processors are simulated by replacing the
+        communication.
+        """
+
+        import anuga.utilities.parallel_abstraction as pypar
+
+        points = [[0.0, 0.0], [0.0, 2.0], [2.0, 0.0],
+                  [0.0, 4.0], [2.0, 2.0], [4.0, 0.0]]
+        triangles = [[1,0,2], [1,2,4], [4,2,5], [3,1,4]]
+
+        data_points = num.array([[0.66666667, 0.66666667],
+                                 [1.33333333, 1.33333333],
+                                 [2.66666667, 0.66666667],
+                                 [0.66666667, 2.66666667]])
+        z = linear_function(data_points)
+
+        sent = []
+        received = []
+        saved = (pypar.rank, pypar.size, pypar.send, pypar.receive)
+        try:
+            pypar.size = lambda: 2
+            pypar.send = lambda value, p: sent.append((p, value))
+            pypar.receive = lambda p: received.pop(0)
+
+            # Processor 1 can't read its points file
+            pypar.rank = lambda: 1
+            received[:] = [IOError('No such file')]
+
+            self.assertRaises(IOError,
+                              Fit(points, triangles, alpha=0.0).fit,
+                              'no_such_file.pts', parallel=True)
+
+            assert received == []
+            assert len(sent) == 1
+            p, error = sent[0]
+            assert p == 0
+            assert isinstance(error, IOError)
+
+            # Processor 0 raises the exception of processor 1 instead of
+            # waiting for its partial AtA and Atz
+            pypar.rank = lambda: 0
+            received[:] = [error]
+            del sent[:]
+
+            self.assertRaises(IOError,
+                              Fit(points, triangles, alpha=1.0e-3).fit,
+                              data_points, z, parallel=True)
+
+            assert received == []
+            assert sent == [(1, error)]
+        finally:
+            pypar.rank, pypar.size, pypar.send, pypar.receive = saved
+
+    def test_fit_parallel_processes(self):
+        """A parallel fit does not fork worker processes
+        """
+
+        import warnings
+        import anuga.utilities.parallel_abstraction as pypar
+
+        points = [[0.0, 0.0], [0.0, 2.0], [2.0, 0.0],
+                  [0.0, 4.0], [2.0, 2.0], [4.0, 0.0]]
+        triangles = [[1,0,2], [1,2,4], [4,2,5], [3,1,4]]
+
+        data_points = num.array([[0.66666667, 0.66666667],
+                                 [1.33333333, 1.33333333],
+                                 [2.66666667, 0.66666667],
+                                 [0.66666667, 2.66666667]])
+        z = linear_function(data_points)
+
+        expected = Fit(points, triangles, alpha=1.0e-3).fit(data_points, z)
+
+        saved = (pypar.rank, pypar.size)
+        try:
+            pypar.size = lambda: 1
+            pypar.rank = lambda: 0
+
+            with warnings.catch_warnings(record=True) as w:
+                warnings.simplefilter('always')
+                f = Fit(points, triangles, alpha=1.0e-3).fit(data_points, z,
+                                                             processes=2,
+                                                             parallel=True)
+        finally:
+            pypar.rank, pypar.size = saved
+
+        assert len(w) == 1
+        assert 'worker processes' in str(w[0].message)
+        assert num.allclose(f, expected)
+
 
     #Tests of smoothing matrix
     def test_smoothing_matrix_one_triangle(self):
@@ -1376,6 +1376,76 @@ class Test_Interpolate(unittest.TestCase):
 
 
 
+    def test_interpolation_function_time_window(self):
+        # Interpolating blocks of time slices as they are needed gives
+        # the same values as interpolating all time slices up front
+
+        time = [1.0, 2.0, 4.0, 5.0, 7.0, 8.0, 9.0, 10.0]
+
+        points = [[0.0, 0.0], [0.0, 2.0], [2.0, 0.0],
+                  [0.0, 4.0], [2.0, 2.0], [4.0, 0.0]]
+        triangles = [[1,0,2], [1,2,4], [4,2,5], [3,1,4]]
+
+        interpolation_points = [[ 0.0, 0.0],
+                                [ 0.5, 0.5],
+                                [ 0.7, 0.7],
+                                [ 1.0, 0.5],
+                                [ 2.0, 0.4],
+                                [ 2.8, 1.2]]
+
+        Q = num.zeros((8,6), num.float)
+        for i, t in enumerate(time):
+            Q[i, :] = t*linear_function(points)
+
+        answer = linear_function(interpolation_points)
+
+        for time_thinning in [1, 2]:
+            I = Interpolation_function(time, Q,
+                                       vertex_coordinates=points,
+                                       triangles=triangles,
+                                       interpolation_points=interpolation_points,
+                                       time_thinning=time_thinning,
+                                       time_window=2)
+
+            assert I.precomputed_values['Attribute'].shape == (2, 6)
+
+            t = time[0]
+            for j in range(80): #t in [1, 9]
+                for id in range(len(interpolation_points)):
+                    assert num.allclose(I(t, id), t*answer[id])
+                assert num.allclose(I(t, range(6)), t*answer)
+                t += 0.1
+
+            # Back in time
+            for t in [2.5, 1.0, 8.5, 4.0]:
+                assert num.allclose(I(t, range(6)), t*answer)
+
+        # Quantities are only sliced along the time axis
+        class Slices:
+            def __init__(self, Q):
+                self.Q = Q
+                self.shape = Q.shape
+                self.rows_read = 0
+
+            def __getitem__(self, key):
+                values = self.Q[key]
+                self.rows_read += len(values)
+                return values
+
+        S = Slices(Q)
+        I = Interpolation_function(time, {'Attribute': S},
+                                   vertex_coordinates=points,
+                                   triangles=triangles,
+                                   interpolation_points=interpolation_points,
+                                   time_window=4)
+
+        assert S.rows_read == 4
+        assert num.allclose(I(3.0, range(6)), 3.0*answer)
+        assert S.rows_read == 4
+        assert num.allclose(I(9.5, range(6)), 9.5*answer)
+        assert S.rows_read == 6
+
+
     def test_interpolation_precompute_points(self):
         # looking at a discrete mesh
         #
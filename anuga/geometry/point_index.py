@@ -0,0 +1,155 @@
+"""
+    Bucketed grid over a fixed set of points.
+
+    The points are sorted into the cells of a regular grid with a few
+    points per cell, so that the points inside a bounding box, polygon or
+    near a line can be found by only looking at the cells overlapping the
+    query instead of testing every point.
+"""
+
+import numpy as num
+
+from anuga.geometry.polygon import inside_polygon
+
+
+class Point_index:
+    """ Spatial index of a fixed set of points (e.g. triangle centroids).
+
+        points_per_cell is the average number of points in each cell
+        of the grid.
+    """
+
+    def __init__(self, points, points_per_cell=8):
+
+        points = num.array(points, num.float).reshape((-1, 2))
+
+        self.points = points
+        N = len(points)
+
+        if N == 0:
+            self.xmin = self.ymin = 0.0
+            self.nx = self.ny = 1
+            self.dx = self.dy = 1.0
+            self.order = num.zeros(0, num.int)
+            self.cell_ptr = num.zeros(2, num.int)
+            return
+
+        x = points[:, 0]
+        y = points[:, 1]
+
+        self.xmin = x.min()
+        self.ymin = y.min()
+        width = x.max() - self.xmin
+        height = y.max() - self.ymin
+
+        # Choose roughly square cells
+        number_of_cells = max(1.0, float(N)/points_per_cell)
+        if width > 0.0 and height > 0.0:
+            nx = int(num.sqrt(number_of_cells*width/height))
+            ny = int(number_of_cells/max(nx, 1))
+        elif width > 0.0:
+            nx, ny = int(number_of_cells), 1
+        else:
+            nx, ny = 1, int(number_of_cells)
+
+        self.nx = nx = max(nx, 1)
+        self.ny = ny = max(ny, 1)
+
+        self.dx = width/nx if width > 0.0 else 1.0
+        self.dy = height/ny if height > 0.0 else 1.0
+
+        ix = num.clip(((x - self.xmin)/self.dx).astype(num.int), 0, nx-1)
+        iy = num.clip(((y - self.ymin)/self.dy).astype(num.int), 0, ny-1)
+        cells = iy*nx + ix
+
+        # Points sorted by cell, the points of cell k are
+        # order[cell_ptr[k]:cell_ptr[k+1]]
+        self.order = num.argsort(cells, kind='mergesort')
+        self.cell_ptr = num.searchsorted(cells[self.order],
+                                         num.arange(nx*ny+1))
+
+
+    def __len__(self):
+        return len(self.points)
+
+
+    def get_cell_range(self, xmin, xmax, ymin, ymax):
+        """Return range of cells ix0, ix1, iy0, iy1 (inclusive)
+        overlapping the box, or None if there are none.
+        """
+
+        ix0 = int(num.floor((xmin - self.xmin)/self.dx))
+        ix1 = int(num.floor((xmax - self.xmin)/self.dx))
+        iy0 = int(num.floor((ymin - self.ymin)/self.dy))
+        iy1 = int(num.floor((ymax - self.ymin)/self.dy))
+
+        # Points on the upper edge of the grid are in the last cell
+        if ix1 < 0 or iy1 < 0 or ix0 > self.nx or iy0 > self.ny:
+            return None
+
+        ix0 = min(max(ix0, 0), self.nx-1)
+        ix1 = min(max(ix1, 0), self.nx-1)
+        iy0 = min(max(iy0, 0), self.ny-1)
+        iy1 = min(max(iy1, 0), self.ny-1)
+
+        return ix0, ix1, iy0, iy1
+
+
+    def query_box(self, xmin, xmax, ymin, ymax):
+        """Return sorted indices of points inside the box (boundary
+        included).
+        """
+
+        cell_range = self.get_cell_range(xmin, xmax, ymin, ymax)
+
+        if cell_range is None or len(self.points) == 0:
+            return num.zeros(0, num.int)
+
+        ix0, ix1, iy0, iy1 = cell_range
+
+        # Cells ix0 to ix1 of each row are contiguous
+        nx = self.nx
+        ptr = self.cell_ptr
+        candidates = [self.order[ptr[iy*nx+ix0]:ptr[iy*nx+ix1+1]]
+                      for iy in range(iy0, iy1+1)]
+        candidates = num.sort(num.concatenate(candidates))
+
+        x = self.points[candidates, 0]
+        y = self.points[candidates, 1]
+        inside = (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+
+        return candidates[inside]
+
+
+    def query_circle(self, center, radius):
+        """Return sorted indices of points strictly inside the circle
+        """
+
+        c = center
+        r = radius
+
+        candidates = self.query_box(c[0]-r, c[0]+r, c[1]-r, c[1]+r)
+
+        x = self.points[candidates, 0]
+        y = self.points[candidates, 1]
+
+        return candidates[(x-c[0])**2 + (y-c[1])**2 < r**2]
+
+
+    def inside_polygon(self, polygon, closed=True):
+        """Return sorted indices of points inside polygon,
+        same as inside_polygon(points, polygon, closed)
+        """
+
+        polygon = num.array(polygon, num.float).reshape((-1, 2))
+
+        candidates = self.query_box(polygon[:, 0].min(), polygon[:, 0].max(),
+                                    polygon[:, 1].min(), polygon[:, 1].max())
+
+        if len(candidates) == 0:
+            return candidates
+
+        indices = inside_polygon(self.points[candidates], polygon,
+                                 closed=closed)
+
+        return candidates[num.sort(indices)]
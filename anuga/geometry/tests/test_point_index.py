@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+import unittest
+
+import numpy as num
+
+from anuga.geometry.point_index import Point_index
+from anuga.geometry.polygon import inside_polygon
+
+
+class Test_Point_index(unittest.TestCase):
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_query_box(self):
+
+        num.random.seed(3)
+        points = num.random.rand(1000, 2)*[10.0, 2.0] + [5.0, -1.0]
+
+        index = Point_index(points, points_per_cell=4)
+        assert len(index) == 1000
+        assert index.nx > index.ny
+
+        for box in [[6.0, 7.5, -0.5, 0.5],
+                    [0.0, 100.0, -100.0, 100.0],
+                    [20.0, 30.0, 0.0, 1.0],
+                    [5.0, 5.0, -1.0, 1.0]]:
+            xmin, xmax, ymin, ymax = box
+            x = points[:, 0]
+            y = points[:, 1]
+            expected = num.where((x >= xmin) & (x <= xmax) &
+                                 (y >= ymin) & (y <= ymax))[0]
+
+            indices = index.query_box(xmin, xmax, ymin, ymax)
+            assert num.alltrue(indices == expected), box
+
+        # Points on the edge of the bounding box of all points
+        corner = points[num.argmax(points[:, 0])]
+        indices = index.query_box(corner[0], corner[0], corner[1], corner[1])
+        assert len(indices) == 1
+
+    def test_inside_polygon(self):
+
+        points = [[0.5, 0.5], [1.0, -0.5], [0.3, 0.2], [1.0, 1.0], [0.0, 0.5]]
+        polygon = [[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0]]
+
+        index = Point_index(points)
+
+        assert num.alltrue(index.inside_polygon(polygon) == [0, 2, 3, 4])
+        assert num.alltrue(index.inside_polygon(polygon, closed=False) == [0, 2])
+
+        num.random.seed(5)
+        points = num.random.rand(2000, 2)
+        index = Point_index(points)
+
+        for i in range(10):
+            polygon = num.random.rand(6, 2)
+            expected = num.sort(inside_polygon(points, polygon))
+            assert num.alltrue(index.inside_polygon(polygon) == expected)
+
+    def test_degenerate(self):
+
+        # Points on a line
+        points = num.zeros((100, 2))
+        points[:, 1] = num.arange(100)
+
+        index = Point_index(points)
+        assert num.alltrue(index.query_box(-1.0, 1.0, 10.0, 19.5) ==
+                           num.arange(10, 20))
+        assert len(index.query_circle([0.0, 50.0], 2.0)) == 3
+
+        index = Point_index([])
+        assert len(index.query_box(0.0, 1.0, 0.0, 1.0)) == 0
+
+
+#-------------------------------------------------------------
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(Test_Point_index, 'test')
+    runner = unittest.TextTestRunner()
+    runner.run(suite)
@@ -1324,12 +1324,18 @@ def find_optimal_smoothing_parameter(data_file,
                                      split_factor=0.1,
                                      seed_num=None,
                                      cache=False,
+                                     processes=None,
                                      verbose=False):
     """Removes a small random sample of points from 'data_file'.
     Then creates models with different alpha values from 'alpha_list' and
     cross validates the predicted value to the previously removed point data.
     Returns the alpha value which has the smallest covariance.
 
+    The fit matrices AtA, Atz and D are built once from the remaining
+    points and only the smoothing system is solved for each alpha (see
+    Fit.fit_alphas), the removed points are predicted with a single
+    interpolation matrix.
+
     data_file: must not contain points outside the boundaries defined
                and it must be either a pts, txt or csv file.
 
@@ -1347,6 +1353,8 @@ def find_optimal_smoothing_parameter(data_file,
 
     seed_num: the seed to the random number generator
 
+    processes: number of worker processes solving for the alphas
+
     USAGE:
         value, alpha = find_optimal_smoothing_parameter(data_file=fileName,
                                              alpha_list=[0.0001, 0.01, 1],
@@ -1371,8 +1379,8 @@ def find_optimal_smoothing_parameter(data_file,
     from anuga.geospatial_data.geospatial_data import Geospatial_data
     from anuga.pmesh.mesh_interface import create_mesh_from_regions
     from anuga.utilities.numerical_tools import cov
-    from anuga.geometry.polygon import is_inside_polygon
-    from anuga.fit_interpolate.benchmark_least_squares import mem_usage
+    from anuga.fit_interpolate.fit import Fit
+    from anuga.fit_interpolate.interpolate import Interpolate
 
     attribute_smoothed = 'elevation'
 
@@ -1444,32 +1452,37 @@ def find_optimal_smoothing_parameter(data_file,
 
     normal_cov = num.array(num.zeros([len(alphas), 2]), dtype=num.float)
 
-    if verbose: log.critical('Setup computational domains with '
-                             'different alphas')
+    if verbose: log.critical('Setup computational domain')
+    domain = Domain(mesh_file, use_cache=cache, verbose=verbose)
+    if verbose: log.critical(domain.statistics())
+
+    mesh = domain.mesh
+    geo_reference = domain.geo_reference
+
+    # AtA, Atz and D are the same for all alphas. The points are passed
+    # as domain.set_quantity(geospatial_data=G_other) passes them to Fit.fit
+    if verbose: log.critical('Build fit matrices')
+    fit = Fit(mesh=mesh, verbose=verbose)
+    fit.build_fit_subset(G_other.get_data_points(absolute=True),
+                         G_other.get_attributes(attribute_smoothed))
+
+    if verbose: log.critical('Fit alphas')
+    vertex_values = fit.fit_alphas(alphas, processes=processes,
+                                   verbose=verbose)
+
+    # returns the predicted elevation of the points that were "split" out
+    # of the original data set, for all alphas with the same
+    # interpolation matrix
+    if verbose: log.critical('Get predicted elevation for location '
+                             'to be compared')
+    interp = Interpolate(mesh.nodes, mesh.triangles)
+    sample_points = geo_reference.get_relative(
+                                  G_small.get_data_points(absolute=True))
+    predicted = interp.interpolate_block(num.array(vertex_values).T,
+                                         sample_points)
 
     for i, alpha in enumerate(alphas):
-        # add G_other data to domains with different alphas
-        if verbose:
-            log.critical('Calculating domain and mesh for Alpha=%s'
-                         % str(alpha))
-        domain = Domain(mesh_file, use_cache=cache, verbose=verbose)
-        if verbose: log.critical(domain.statistics())
-        domain.set_quantity(attribute_smoothed,
-                            geospatial_data=G_other,
-                            use_cache=cache,
-                            verbose=verbose,
-                            alpha=alpha)
-
-        # Convert points to geospatial data for use with get_values below
-        points_geo = Geospatial_data(points, domain.geo_reference)
-
-        # returns the predicted elevation of the points that were "split" out
-        # of the original data set for one particular alpha
-        if verbose: log.critical('Get predicted elevation for location '
-                                 'to be compared')
-        elevation_predicted = \
-                domain.quantities[attribute_smoothed].\
-                    get_values(interpolation_points=points_geo)
+        elevation_predicted = predicted[:,i]
 
         # add predicted elevation to array that starts with x, y, z...
         data[:,i+3] = elevation_predicted
@@ -9,10 +9,11 @@ import kinematic_viscosity_operator_ext
 import anuga.utilities.log as log
 
 from anuga.operators.base_operator import Operator
+from anuga.utilities.preconditioned_operator import Preconditioned_operator
 
 
 
-class Elliptic_operator(Operator):
+class Elliptic_operator(Operator, Preconditioned_operator):
     """
     Class for setting up structures and matrices for elliptic differential
     operator using centroid values.
@@ -43,7 +44,8 @@ class Elliptic_operator(Operator):
 
     """
 
-    def __init__(self, domain, use_triangle_areas=True, verbose=False):
+    def __init__(self, domain, use_triangle_areas=True,
+                 preconditioner='None', verbose=False):
         if verbose: log.critical('Kinematic Viscosity: Beginning Initialisation')
         
 
@@ -83,6 +85,9 @@ class Elliptic_operator(Operator):
         # Setup type of scaling
         self.set_triangle_areas(use_triangle_areas)        
 
+        # Preconditioner for the conjugate gradient solves
+        self.set_preconditioner(preconditioner)
+
         # FIXME SR: should this really be a matrix?
         temp  = Sparse(self.n, self.n)
         for i in range(self.n):
@@ -162,6 +167,8 @@ class Elliptic_operator(Operator):
                 self.operator_data, self.operator_colind, self.operator_rowptr, \
                 self.n, self.tot_len)
 
+        self.precon_cache = None
+
 
     def update_elliptic_matrix(self, a=None):
         """
@@ -183,6 +190,8 @@ class Elliptic_operator(Operator):
         kinematic_viscosity_operator_ext.update_elliptic_matrix(self, \
                 a.centroid_values, \
                 a.boundary_values)
+
+        self.precon_cache = None
         
 
 
@@ -427,7 +436,8 @@ class Elliptic_operator(Operator):
         x0 = u_in.centroid_values
 
         x, stats = conjugate_gradient(A,rhs,x0,imax=imax, tol=tol, atol=atol,
-                               iprint=iprint, output_stats=True)
+                               iprint=iprint, output_stats=True,
+                               precon=self.get_preconditioner())
 
         u_out.set_values(x, location='centroids')
         u_out.set_boundary_values(u_in.boundary_values)
@@ -480,7 +490,8 @@ class Elliptic_operator(Operator):
         x0 = u_in.centroid_values
 
         x, stats = conjugate_gradient(IdtA,rhs,x0,imax=imax, tol=tol, atol=atol,
-                                      iprint=iprint, output_stats=True)
+                                      iprint=iprint, output_stats=True,
+                                      precon=self.get_preconditioner())
 
         self.set_parabolic_solve(False)
 
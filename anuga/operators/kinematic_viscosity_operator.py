@@ -9,10 +9,11 @@ import kinematic_viscosity_operator_ext
 import anuga.utilities.log as log
 
 from anuga.operators.base_operator import Operator
+from anuga.utilities.preconditioned_operator import Preconditioned_operator
 
 
 
-class Kinematic_viscosity_operator(Operator):
+class Kinematic_viscosity_operator(Operator, Preconditioned_operator):
     """
     Class for setting up structures and matrices for kinematic viscosity differential
     operator using centroid values.
@@ -30,6 +31,7 @@ class Kinematic_viscosity_operator(Operator):
                  domain, diffusivity='height',
                  use_triangle_areas=True,
                  add_safety = False,
+                 preconditioner='None',
                  verbose=False):
 
         if verbose: log.critical('Kinematic Viscosity: Beginning Initialisation')
@@ -86,6 +88,9 @@ class Kinematic_viscosity_operator(Operator):
         # Setup type of scaling
         self.set_triangle_areas(use_triangle_areas)        
 
+        # Preconditioner for the conjugate gradient solves
+        self.set_preconditioner(preconditioner)
+
         # FIXME SR: should this really be a matrix?
         temp  = Sparse(self.n, self.n)
         for i in range(self.n):
@@ -220,6 +225,8 @@ class Kinematic_viscosity_operator(Operator):
                 self.operator_data, self.operator_colind, self.operator_rowptr, \
                 self.n, self.tot_len)
 
+        self.precon_cache = None
+
 
     def update_elliptic_matrix(self, a=None):
         """
@@ -241,6 +248,8 @@ class Kinematic_viscosity_operator(Operator):
         kinematic_viscosity_operator_ext.update_elliptic_matrix(self, \
                 a.centroid_values, \
                 a.boundary_values)
+
+        self.precon_cache = None
         
 
 
@@ -485,7 +494,8 @@ class Kinematic_viscosity_operator(Operator):
         x0 = u_in.centroid_values
 
         x, stats = conjugate_gradient(A,rhs,x0,imax=imax, tol=tol, atol=atol,
-                               iprint=iprint, output_stats=True)
+                               iprint=iprint, output_stats=True,
+                               precon=self.get_preconditioner())
 
         u_out.set_values(x, location='centroids')
         u_out.set_boundary_values(u_in.boundary_values)
@@ -548,7 +558,8 @@ class Kinematic_viscosity_operator(Operator):
         x0 = u_in.centroid_values
 
         x, stats = conjugate_gradient(IdtA,rhs,x0,imax=imax, tol=tol, atol=atol,
-                                      iprint=iprint, output_stats=True)
+                                      iprint=iprint, output_stats=True,
+                                      precon=self.get_preconditioner())
 
         self.set_parabolic_solve(False)
 
@@ -14,6 +14,7 @@ from anuga.config import indent
 import numpy as num
 import anuga.utilities.log as log
 from anuga.utilities.function_utils import evaluate_temporal_function
+from anuga.utilities.function_utils import determine_function_type
 
 
 from anuga import Quantity
@@ -438,3 +439,303 @@ class Polygonal_rate_operator(Rate_operator):
                                polygon=polygon,
                                default_rate=default_rate,
                                verbose=verbose)
+
+
+
+#===============================================================================
+# Many rate operators applied as one fractional step
+#===============================================================================
+class Grouped_rate_operator(Operator):
+    """
+    Add water at certain rates (ms^{-1} = vol/Area/sec) over many
+    regions in one fractional step, for instance rain from many
+    sub-catchment rain gauges.
+
+    regions: list of Region objects, polygons or None (== all triangles)
+
+    rates: list of rates, one per region, each a scalar or a function
+    of time, or a single function of time returning an array of rates,
+    one per region.
+
+    The rates of all regions are evaluated once per timestep and applied
+    to stage via a precomputed sparse (triangle x region) matrix, so the
+    cost per timestep does not grow with the number of operators.
+    Overlapping regions add their rates. The influx of each region is
+    available via get_region_influx.
+
+    Other units can be used by using the factor argument.
+
+    """
+
+    def __init__(self,
+                 domain,
+                 regions=None,
+                 rates=0.0,
+                 factor=1.0,
+                 relative_time=True,
+                 default_rate=0.0,
+                 description = None,
+                 label = None,
+                 logging = False,
+                 verbose = False,
+                 monitor = False):
+
+
+        Operator.__init__(self, domain, description, label, logging, verbose)
+
+        #------------------------------------------
+        # Local variables
+        #------------------------------------------
+        self.monitor = monitor
+        self.factor = factor
+        self.relative_time = relative_time
+
+        if regions is None:
+            regions = [None]
+
+        self.set_regions(regions)
+        self.set_rates(rates)
+        self.set_default_rate(default_rate)
+
+        # Mass tracking
+        self.local_influx = 0.0
+        self.region_influx = num.zeros(self.number_of_regions, num.float)
+
+
+    def set_regions(self, regions):
+        """Setup sparse matrix mapping region rates to the triangles
+        of the regions.
+        """
+
+        from anuga.utilities.sparse import Sparse_CSR
+
+        N = len(self.domain)
+
+        region_indices = []
+        for region in regions:
+            if region is None:
+                indices = num.arange(N)
+            elif isinstance(region, Region):
+                if region.indices is None:
+                    indices = num.arange(N)
+                else:
+                    indices = region.indices
+            else:
+                # A polygon
+                indices = Region(self.domain, polygon=region).indices
+
+            region_indices.append(num.asarray(indices, num.int).ravel())
+
+        self.number_of_regions = len(region_indices)
+
+        region_ids = num.repeat(num.arange(self.number_of_regions),
+                                [len(indices) for indices in region_indices])
+        if self.number_of_regions > 0:
+            triangle_ids = num.concatenate(region_indices)
+        else:
+            triangle_ids = num.zeros(0, num.int)
+
+        # Sort by triangle so that each triangle is one row of the matrix
+        order = num.argsort(triangle_ids, kind='mergesort')
+        triangle_ids = triangle_ids[order]
+        region_ids = region_ids[order]
+
+        self.indices, row_ptr = num.unique(triangle_ids, return_index=True)
+        row_ptr = num.append(row_ptr, len(triangle_ids))
+
+        m = len(self.indices)
+        n = self.number_of_regions
+        self.scatter = Sparse_CSR(None,
+                                  num.ones(len(region_ids), num.float),
+                                  num.ascontiguousarray(region_ids, num.int),
+                                  num.ascontiguousarray(row_ptr, num.int),
+                                  m, n)
+
+        # Row of each nonzero, used to split triangle updates per region
+        self.nonzero_rows = num.repeat(num.arange(m), num.diff(row_ptr))
+
+        full = self.domain.tri_full_flag[self.indices] == 1
+        self.areas = self.domain.areas[self.indices]
+        self.full_areas = self.areas*full
+
+        # Area of full triangles of each region
+        self.region_areas = num.bincount(region_ids,
+                                         weights=self.full_areas[self.nonzero_rows],
+                                         minlength=n)
+
+
+    def set_rates(self, rates):
+        """Set rates
+        Can change rates while running
+        Either a list of scalars or functions of t, one per region, or a
+        function of t returning an array of rates
+        """
+
+        if callable(rates):
+            self.rates = rates
+            self.rates_batch = True
+        else:
+            if isinstance(rates, (int, float)):
+                rates = [rates]*self.number_of_regions
+
+            msg = 'Need one rate per region, got %d rates for %d regions' \
+                  % (len(rates), self.number_of_regions)
+            assert len(rates) == self.number_of_regions, msg
+
+            for rate in rates:
+                msg = 'Rates must be scalars or functions of time'
+                assert determine_function_type(rate) in ['scalar', 't'], msg
+
+            self.rates = list(rates)
+            self.rates_batch = False
+
+
+    def set_default_rate(self, default_rate):
+        """
+        Check and store default_rate, used when the rates are evaluated
+        outside the time range of their data
+        """
+
+        msg = ('Default_rate must be either None '
+               'a scalar, or a function of time.\nI got %s.' % str(default_rate))
+        assert (default_rate is None or
+                isinstance(default_rate, (int, float)) or
+                callable(default_rate)), msg
+
+        if default_rate is not None and not callable(default_rate):
+            tmp = default_rate
+            default_rate = lambda t: tmp
+
+        self.default_rate = default_rate
+
+
+    def get_rates(self, t=None):
+        """Return array of the rates of all regions at time t
+        """
+
+        if t is None:
+            t = self.domain.get_time(relative_time=self.relative_time)
+
+        default_rate = self.default_rate
+
+        if self.rates_batch:
+            rates = evaluate_temporal_function(self.rates, t,
+                                               default_right_value=default_rate,
+                                               default_left_value=default_rate)
+            rates = num.array(rates, num.float).ravel()
+            if rates.size == 1:
+                rates = num.repeat(rates, self.number_of_regions)
+        else:
+            rates = num.array([evaluate_temporal_function(rate, t,
+                                    default_right_value=default_rate,
+                                    default_left_value=default_rate)
+                               for rate in self.rates], num.float)
+
+        msg = 'Need one rate per region, got %d rates for %d regions' \
+              % (rates.size, self.number_of_regions)
+        assert rates.size == self.number_of_regions, msg
+
+        return rates
+
+
+    def __call__(self):
+        """
+        Apply rates to the triangles of all regions
+        """
+
+        if len(self.indices) == 0:
+            return
+
+        timestep = self.domain.get_timestep()
+        factor = self.factor
+        indices = self.indices
+
+        rates = self.get_rates()
+
+        local_rates = factor*timestep*(self.scatter*rates)
+
+        if num.all(rates >= 0.0):
+            self.region_influx[:] = factor*timestep*rates*self.region_areas
+        else:
+            # Be more careful if rate < 0
+            depth = self.stage_c[indices] - self.elev_c[indices]
+            limited_rates = num.maximum(local_rates, -depth)
+
+            # Share the limited update between the regions
+            # in proportion to their rates
+            ratio = num.ones_like(local_rates)
+            nonzero = local_rates != 0.0
+            ratio[nonzero] = limited_rates[nonzero]/local_rates[nonzero]
+
+            rows = self.nonzero_rows
+            weights = factor*timestep*rates[self.scatter.colind] \
+                      *ratio[rows]*self.full_areas[rows]
+            self.region_influx[:] = num.bincount(self.scatter.colind,
+                                                 weights=weights,
+                                                 minlength=self.number_of_regions)
+            local_rates = limited_rates
+
+        self.stage_c[indices] = self.stage_c[indices] + local_rates
+
+        self.local_influx = self.region_influx.sum()
+
+        # Update mass inflows from fractional steps
+        self.domain.fractional_step_volume_integral+=self.local_influx
+
+        if self.monitor:
+            log.critical('Local Flux at time %.2f = %f'
+                         % (self.domain.get_time(), self.local_influx))
+
+        return
+
+
+    def get_region_influx(self):
+        """Return array of the volume added to each region
+        (full triangles only) in the last timestep
+        """
+
+        return self.region_influx.copy()
+
+
+    def get_Q(self, full_only=True):
+        """ Calculate current overall discharge
+        """
+
+        rates = self.get_rates()
+
+        if full_only:
+            return num.sum(self.region_areas*rates)*self.factor
+        else:
+            areas = self.scatter.data*self.areas[self.nonzero_rows]
+            region_areas = num.bincount(self.scatter.colind, weights=areas,
+                                        minlength=self.number_of_regions)
+            return num.sum(region_areas*rates)*self.factor
+
+
+    def parallel_safe(self):
+        """Operator is applied independently on each cell and
+        so is parallel safe.
+        """
+        return True
+
+    def statistics(self):
+
+        message = self.label + ': Grouped rate operator over %d regions' \
+                  % self.number_of_regions
+        return message
+
+
+    def timestepping_statistics(self):
+
+        rates = self.get_rates()
+        try:
+            min_rate = num.min(rates)
+            max_rate = num.max(rates)
+        except ValueError:
+            min_rate = 0.0
+            max_rate = 0.0
+
+        Q = self.get_Q()
+        message  = indent + self.label + ': Min rate = %g m/s, Max rate = %g m/s, Total Q = %g m^3/s'% (min_rate,max_rate, Q)
+
+        return message
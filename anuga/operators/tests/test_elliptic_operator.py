@@ -0,0 +1,110 @@
+from anuga import Quantity
+from anuga import rectangular_cross_domain
+from anuga.operators.elliptic_operator import Elliptic_operator
+
+import numpy as num
+import unittest
+
+
+class Test_elliptic_operator(unittest.TestCase):
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def create_quantities(self, domain):
+
+        # Diffusivity
+        a = Quantity(domain)
+        a.set_values(lambda x,y : 1.0 + x)
+        a.set_boundary_values(1.0)
+
+        # Quantity for rhs
+        b = Quantity(domain)
+        b.set_values(lambda x,y : num.sin(3*x) + y)
+        b.set_boundary_values(0.0)
+
+        return a, b
+
+    def test_operator_matrix(self):
+
+        domain = rectangular_cross_domain(6, 6, len1=1.0, len2=3.0)
+        a, b = self.create_quantities(domain)
+
+        op = Elliptic_operator(domain)
+        op.dt = 0.01
+        op.update_elliptic_matrix(a)
+
+        # Operator matrix is the operator applied by op
+        x = num.sin(num.arange(op.n))
+        for parabolic in [False, True]:
+            op.set_parabolic_solve(parabolic)
+            assert num.allclose(op.get_operator_matrix()*x, op*x)
+
+    def test_parabolic_solve_preconditioners(self):
+
+        domain = rectangular_cross_domain(20, 20, len1=1.0, len2=3.0)
+        a, b = self.create_quantities(domain)
+
+        op = Elliptic_operator(domain)
+        op.dt = 0.01
+        op.update_elliptic_matrix(a)
+
+        iterations = {}
+        for precon in ['None', 'Jacobi', 'IC0', 'Multigrid']:
+            op.set_preconditioner(precon)
+
+            u_in = Quantity(domain)
+            u_in.set_values(0.0)
+            u_in.set_boundary_values(0.0)
+
+            u_out, stats = op.parabolic_solve(u_in, b, a, update_matrix=False,
+                                              output_stats=True)
+
+            if precon == 'None':
+                u_ref = u_out.centroid_values.copy()
+
+            assert num.allclose(u_out.centroid_values, u_ref)
+            assert stats.precon == precon
+            iterations[precon] = stats.iter
+
+            # Same solution with the preconditioner built for the first solve
+            u_out = op.parabolic_solve(u_in, b, a, update_matrix=False)
+            assert num.allclose(u_out.centroid_values, u_ref)
+
+        assert iterations['IC0'] < iterations['None']
+        assert iterations['Multigrid'] < iterations['None']
+
+    def test_elliptic_solve_preconditioners(self):
+
+        domain = rectangular_cross_domain(10, 10, len1=1.0, len2=3.0)
+        a, b = self.create_quantities(domain)
+
+        op = Elliptic_operator(domain)
+
+        for precon in ['None', 'Jacobi']:
+            op.set_preconditioner(precon)
+
+            u_in = Quantity(domain)
+            u_in.set_values(0.0)
+            u_in.set_boundary_values(0.0)
+
+            u_out = op.elliptic_solve(u_in, b, a)
+
+            if precon == 'None':
+                u_ref = u_out.centroid_values.copy()
+
+            # u_out solves div ( a grad u ) = b
+            assert num.allclose(op*u_out.centroid_values + op.boundary_term,
+                                b.centroid_values, atol=1.0e-6)
+            assert num.allclose(u_out.centroid_values, u_ref, atol=1.0e-6)
+
+
+################################################################################
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(Test_elliptic_operator, 'test')
+    runner = unittest.TextTestRunner()
+    runner.run(suite)
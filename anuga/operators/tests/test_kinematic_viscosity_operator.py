@@ -1532,6 +1532,56 @@ class Test_kinematic_viscosity(unittest.TestCase):
         assert num.allclose(w.centroid_values, wc, rtol=2.0e-3)
 
 
+    def test_parabolic_solve_preconditioners(self):
+
+        from anuga import rectangular_cross_domain
+
+        domain = rectangular_cross_domain(20, 20, len1=1.0, len2=3.0)
+
+        # Diffusivity
+        a = Quantity(domain)
+        a.set_values(lambda x,y : 1.0 + x)
+        a.set_boundary_values(1.0)
+
+        # Quantity for rhs
+        b = Quantity(domain)
+        b.set_values(lambda x,y : num.sin(3*x) + y)
+        b.set_boundary_values(0.0)
+
+        kv = Kinematic_viscosity_operator(domain)
+        kv.dt = 0.01
+        kv.update_elliptic_matrix(a)
+
+        # Operator matrix is the operator applied by kv
+        x = num.sin(num.arange(kv.n))
+        for parabolic in [False, True]:
+            kv.set_parabolic_solve(parabolic)
+            assert num.allclose(kv.get_operator_matrix()*x, kv*x)
+        kv.set_parabolic_solve(False)
+
+        iterations = {}
+        for precon in ['None', 'Jacobi', 'IC0', 'Multigrid']:
+            kv.set_preconditioner(precon)
+
+            u_in = Quantity(domain)
+            u_in.set_values(0.0)
+            u_in.set_boundary_values(0.0)
+
+            u_out, stats = kv.parabolic_solve(u_in, b, a, update_matrix=False,
+                                              output_stats=True,
+                                              use_dt_tol=False)
+
+            if precon == 'None':
+                u_ref = u_out.centroid_values.copy()
+
+            assert num.allclose(u_out.centroid_values, u_ref, atol=1.0e-4)
+            assert stats.iter == len(stats.residual_history)
+            iterations[precon] = stats.iter
+
+        assert iterations['IC0'] < iterations['None']
+        assert iterations['Multigrid'] < iterations['None']
+
+
 ################################################################################
 
 if __name__ == "__main__":
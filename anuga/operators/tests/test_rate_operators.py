@@ -983,6 +983,82 @@ class Test_rate_operators(unittest.TestCase):
         assert num.allclose(float(rr[3]), 0.0)
 
 
+    def test_grouped_rate_operator(self):
+
+        def create_domain():
+            domain = rectangular_cross_domain(4, 4, len1=4.0, len2=4.0)
+            domain.set_quantity('elevation', 0.0)
+            domain.set_quantity('stage', 1.0)
+            domain.set_quantity('friction', 0.0)
+            domain.set_boundary({'left': Reflective_boundary(domain),
+                                 'right': Reflective_boundary(domain),
+                                 'top': Reflective_boundary(domain),
+                                 'bottom': Reflective_boundary(domain)})
+            domain.timestep = 0.5
+            return domain
+
+        polygons = [[[0.0, 0.0], [2.0, 0.0], [2.0, 2.0], [0.0, 2.0]],
+                    [[1.0, 1.0], [4.0, 1.0], [4.0, 4.0], [1.0, 4.0]],
+                    [[3.0, 0.0], [4.0, 0.0], [4.0, 1.0], [3.0, 1.0]]]
+
+        rates = [1.0, lambda t: 2.0 + t, -3.0]
+
+        # Reference: one Rate_operator per region
+        domain1 = create_domain()
+        operators = [Rate_operator(domain1, rate=rate, polygon=polygon)
+                     for polygon, rate in zip(polygons, rates)]
+
+        domain2 = create_domain()
+        regions = [anuga.Region(domain2, polygon=polygons[0]),
+                   polygons[1],
+                   polygons[2]]
+        grouped = Grouped_rate_operator(domain2, regions=regions, rates=rates)
+
+        assert grouped.number_of_regions == 3
+
+        for i in range(3):
+            domain1.set_time(float(i))
+            domain2.set_time(float(i))
+
+            domain1.fractional_step_volume_integral = 0.0
+            domain2.fractional_step_volume_integral = 0.0
+
+            for op in operators:
+                op()
+            grouped()
+
+            stage1 = domain1.quantities['stage'].centroid_values
+            stage2 = domain2.quantities['stage'].centroid_values
+
+            assert num.allclose(stage1, stage2)
+
+            region_influx = grouped.get_region_influx()
+            influx = [op.local_influx for op in operators]
+
+            # Regions with positive rates are independent of the
+            # order in which they are applied
+            assert num.allclose(region_influx[:2], influx[:2])
+            assert num.allclose(domain1.fractional_step_volume_integral,
+                                domain2.fractional_step_volume_integral)
+
+        Q = sum(op.get_Q() for op in operators)
+        assert num.allclose(grouped.get_Q(), Q)
+
+        # Rates given as a single function returning all rates
+        domain3 = create_domain()
+        grouped = Grouped_rate_operator(domain3, regions=polygons[:2],
+                                        rates=lambda t: [1.0, 2.0 + t])
+        domain3.set_time(1.0)
+        grouped()
+
+        assert num.allclose(grouped.get_rates(), [1.0, 3.0])
+        assert num.allclose(grouped.get_region_influx(),
+                            0.5*num.array([1.0, 3.0])*grouped.region_areas)
+
+        stats = grouped.timestepping_statistics()
+        assert 'Max rate = 3 m/s' in stats
+
+
 if __name__ == "__main__":
     suite = unittest.makeSuite(Test_rate_operators, 'test')
     runner = unittest.TextTestRunner(verbosity=1)
@@ -36,6 +36,10 @@ except:
 
 verbose = False
 
+# Triangle weights are scaled to integers from 1 to
+# metis_weight_resolution for metis
+metis_weight_resolution = 100
+
 #########################################################
 #
 # If the triangles list is reordered, the quantities
@@ -123,6 +127,7 @@ def reorder_new(quantities, epart_order, proc_sum):
 
 try:
     from anuga.pymetis.metis_ext import partMeshNodal
+    from anuga.pymetis.metis_ext import partGraphKway
 except ImportError:
     print "***************************************************"
     print "         Metis is probably not compiled."
@@ -130,17 +135,101 @@ except ImportError:
     print "***************************************************"
     raise ImportError
 
+def pmesh_partition_metis(domain, n_procs, weights=None):
+    """Return the partition vector of the domain, i.e. the processor
+    number of each triangle, as computed by metis.
+
+    weights is the (relative) cost of each triangle. If given the dual
+    graph of the mesh is partitioned so that the sum of the weights,
+    rather than the number of triangles, is balanced.
+    """
+
+    n_tri = len(domain.triangles)
+
+    if n_procs == 1: #Because metis chokes on it...
+        return num.zeros(n_tri, num.int)
+
+    if weights is not None:
+        return pmesh_partition_metis_weighted(domain, n_procs, weights)
+
+    n_vert = domain.get_number_of_nodes()
+    t_list = domain.triangles.copy()
+    t_list = num.reshape(t_list, (-1,))
+
+    # The 1 here is for triangular mesh elements.
+    # FIXME: Should update to Metis 5
+    edgecut, epart, npart = partMeshNodal(n_tri, n_vert, t_list, 1, n_procs)
+    del edgecut
+    del npart
+
+    # Sometimes (usu. on x86_64), partMeshNodal returns an array of zero
+    # dimensional arrays. Correct this.
+    if type(epart[0]) == num.ndarray:
+        epart_new = num.zeros(len(epart), num.int)
+        epart_new[:] = epart[:][0]
+        epart = epart_new
+        del epart_new
+
+    return num.array(epart, num.int)
+
+def pmesh_partition_metis_weighted(domain, n_procs, weights):
+    """Partition the dual graph of the mesh (triangles joined across
+    their internal edges) with the triangle weights.
+    """
+
+    n_tri = len(domain.triangles)
+
+    weights = num.array(weights, num.float).reshape((-1,))
+
+    msg = 'Number of weights %d must equal number of triangles %d' \
+          % (len(weights), n_tri)
+    assert len(weights) == n_tri, msg
+
+    msg = 'Triangle weights must be non negative'
+    assert num.all(weights >= 0.0), msg
+
+    # Metis needs positive integer weights
+    wmax = weights.max()
+    if wmax > 0.0:
+        weights = weights/wmax
+    vwgt = num.maximum(num.round(weights*metis_weight_resolution), 1)
+
+    neighbours = domain.neighbours
+    internal = neighbours >= 0
+
+    xadj = num.zeros(n_tri+1, num.int)
+    xadj[1:] = num.cumsum(num.sum(internal, axis=1))
+    adjncy = neighbours[internal]
+
+    edgecut, epart = partGraphKway(n_tri, xadj, adjncy, vwgt, n_procs)
+
+    return num.array(epart, num.int)
+
+
+def wet_triangle_weights(domain, dry_weight=0.1, minimum_height=None):
+    """Estimated cost of each triangle of the domain, 1.0 for wet
+    triangles and dry_weight for dry triangles, which are much cheaper
+    with the DE algorithms and optimise_dry_cells.
+    """
+
+    weights = num.ones(len(domain), num.float)*dry_weight
+
+    weights[domain.get_wet_elements(minimum_height=minimum_height)] = 1.0
+
+    return weights
+
+
 def pmesh_divide_metis(domain, n_procs):
     # Wrapper for old pmesh_divide_metis which does not return tri_index or r_tri_index
     nodes, ttriangles, boundary, triangles_per_proc, quantities, tri_index, r_tri_index = pmesh_divide_metis_helper(domain, n_procs)
 
     return nodes, ttriangles, boundary, triangles_per_proc, quantities
 
-def pmesh_divide_metis_with_map(domain, n_procs):
+def pmesh_divide_metis_with_map(domain, n_procs, weights=None):
 
-    return pmesh_divide_metis_helper(domain, n_procs)
+    return pmesh_divide_metis_helper(domain, n_procs, weights)
 
-def pmesh_divide_metis_helper(domain, n_procs):
+def pmesh_divide_metis_helper(domain, n_procs, weights=None):
     
     # Initialise the lists
     # List, indexed by processor of # triangles.
@@ -160,28 +249,7 @@ def pmesh_divide_metis_helper(domain, n_procs):
     
     n_tri = len(domain.triangles)
     if n_procs != 1: #Because metis chokes on it...
-        n_vert = domain.get_number_of_nodes()
-        t_list = domain.triangles.copy()
-        t_list = num.reshape(t_list, (-1,))
-    
-        # The 1 here is for triangular mesh elements.
-        # FIXME: Should update to Metis 5
-        edgecut, epart, npart = partMeshNodal(n_tri, n_vert, t_list, 1, n_procs)
-        # print edgecut
-        # print npart
-        #print epart
-        del edgecut
-        del npart
-
-        # Sometimes (usu. on x86_64), partMeshNodal returns an array of zero
-        # dimensional arrays. Correct this.
-        if type(epart[0]) == num.ndarray:
-            epart_new = num.zeros(len(epart), num.int)
-            epart_new[:] = epart[:][0]
-#            for i in xrange(len(epart)):
-#                epart_new[i] = epart[i][0]
-            epart = epart_new
-            del epart_new
+        epart = pmesh_partition_metis(domain, n_procs, weights)
 
 
         triangles_per_proc = num.bincount(epart)
@@ -494,16 +562,10 @@ def ghost_layer_old(submesh, mesh, p, tupper, tlower, parameters = None):
 
 
 
-def ghost_layer(submesh, mesh, p, tupper, tlower, parameters = None):
-
-    ncoord = mesh.number_of_nodes
-    ntriangles = mesh.number_of_triangles
-
-    if parameters is None:
-        layer_width  = 2
-    else:
-        layer_width = parameters['ghost_layer_width']
-
+def ghost_layer_triangles(mesh, tupper, tlower, layer_width=2):
+    """Return the sorted ids of the ghost triangles of the full
+    triangles tlower to tupper-1 of mesh.
+    """
 
     full_ids = num.arange(tlower, tupper)
 
@@ -531,11 +593,26 @@ def ghost_layer(submesh, mesh, p, tupper, tlower, parameters = None):
         layer_cells[i+1] = n0
 
 
-    # Build the triangle list and make note of the vertices
     new_trianglemap = layer_cells[0]
     for i in range(layer_width-1):
         new_trianglemap = numset.union1d(new_trianglemap,layer_cells[i+1])
 
+    return new_trianglemap
+
+
+def ghost_layer(submesh, mesh, p, tupper, tlower, parameters = None):
+
+    ncoord = mesh.number_of_nodes
+    ntriangles = mesh.number_of_triangles
+
+    if parameters is None:
+        layer_width  = 2
+    else:
+        layer_width = parameters['ghost_layer_width']
+
+    # Build the triangle list and make note of the vertices
+    new_trianglemap = ghost_layer_triangles(mesh, tupper, tlower, layer_width)
+
     new_subtriangles = num.concatenate((num.reshape(new_trianglemap, (-1,1)), mesh.triangles[new_trianglemap]), 1)
 
 
@@ -552,8 +629,6 @@ def ghost_layer(submesh, mesh, p, tupper, tlower, parameters = None):
     # Clean up before exiting
 
     del (new_nodes)
-    del (layer_cells)
-    del (n0)
     del (new_trianglemap)
 
     # Return the triangles and vertices sitting on the boundary layer
@@ -1654,6 +1729,160 @@ def extract_submesh(submesh, triangles_per_proc, p2s_map=None, p=0):
            
 
 
+#########################################################
+#
+# Build the submesh of processor p on processor p.
+#
+#  *) Every processor has a copy of the whole domain and
+# of the partition vector (the processor number of each
+# triangle, see pmesh_partition_metis), so that the
+# submeshes can be built concurrently without processor 0
+# building and sending all of them.
+#
+#  *) The ghost layer and the ghost and full communication
+# patterns of processor p are found locally. The full
+# communication pattern only needs the ghost layers of
+# the processors owning the ghost triangles of p.
+#
+# -------------------------------------------------------
+#
+#  *) The same structures as extract_submesh are returned
+# (with tri_l2g mapping to the original triangles) along
+# with the number of full nodes and full triangles.
+#
+#########################################################
+
+class Reordered_mesh:
+    """Nodes, triangles, neighbours and boundary of a mesh with the
+    triangles sorted by processor, as used by ghost_layer and
+    ghost_bnd_layer.
+    """
+
+    def __init__(self, domain, epart_order):
+
+        s2p = num.zeros(len(epart_order), num.int)
+        s2p[epart_order] = num.arange(len(epart_order))
+
+        self.nodes = domain.get_nodes()
+        self.triangles = domain.triangles[epart_order]
+
+        neighbours = domain.neighbours[epart_order]
+        self.neighbours = num.where(neighbours >= 0,
+                                    s2p[num.maximum(neighbours, 0)],
+                                    neighbours)
+
+        self.boundary = {}
+        for (t, e), tag in domain.boundary.items():
+            self.boundary[s2p[t], e] = tag
+
+        self.number_of_nodes = len(self.nodes)
+        self.number_of_triangles = len(self.triangles)
+
+
+def build_local_submesh(domain, partition, numprocs, p, parameters=None):
+
+    partition = num.asarray(partition, num.int)
+
+    msg = 'Partition has %d entries but domain has %d triangles' \
+          % (len(partition), len(domain.triangles))
+    assert len(partition) == len(domain.triangles), msg
+
+    triangles_per_proc = num.bincount(partition, minlength=numprocs)
+
+    msg = 'Partition is for more than %d processors' % numprocs
+    assert len(triangles_per_proc) == numprocs, msg
+
+    msg =  "Partition has at least one submesh with no triangles. "
+    msg += "Try using a smaller number of mpi processes."
+    assert num.all(triangles_per_proc > 0), msg
+
+    proc_sum = num.zeros(numprocs+1, num.int)
+    proc_sum[1:] = num.cumsum(triangles_per_proc)
+    triangles_per_proc_ranges = proc_sum[1:] - 1
+
+    epart_order = num.argsort(partition, kind='mergesort')
+    mesh = Reordered_mesh(domain, epart_order)
+
+    tlower = proc_sum[p]
+    tupper = proc_sum[p+1]
+
+    # Full triangles, nodes and boundary
+
+    full_triangles = mesh.triangles[tlower:tupper]
+
+    ids = num.unique(full_triangles.flat)
+    full_nodes = num.concatenate((num.reshape(ids, (-1,1)), mesh.nodes[ids]), 1)
+
+    full_boundary = {}
+    for k in mesh.boundary:
+        if (k[0] >= tlower and k[0] < tupper):
+            full_boundary[k] = mesh.boundary[k]
+
+    # Ghost layer and ghost communication pattern
+
+    [ghost_nodes, ghost_triangles, layer_width] = \
+        ghost_layer({"full_nodes": {p: full_nodes}}, mesh, p, tupper, tlower,
+                    parameters)
+
+    ghost_boundary = ghost_bnd_layer(ghost_triangles, tlower, tupper, mesh, p)
+
+    ghost_commun = ghost_commun_pattern(ghost_triangles, p,
+                                        triangles_per_proc_ranges)
+
+    # The full triangles of p which are ghost triangles of
+    # the neighbouring processors
+
+    full_commun = {}
+    for i in xrange(tlower, tupper):
+        full_commun[i] = []
+
+    for q in num.unique(ghost_commun[:,1]):
+        ghost_ids = ghost_layer_triangles(mesh, proc_sum[q+1], proc_sum[q],
+                                          layer_width)
+        ghost_ids = ghost_ids[(ghost_ids >= tlower) & (ghost_ids < tupper)]
+        for i in ghost_ids:
+            full_commun[i].append(q)
+
+    # Quantities of the full and ghost triangles
+
+    full_quan = {}
+    ghost_quan = {}
+    for k in domain.quantities:
+        vertex_values = domain.quantities[k].vertex_values
+        full_quan[k] = num.array(vertex_values[epart_order[tlower:tupper]],
+                                 num.float)
+        ghost_quan[k] = num.array(vertex_values[epart_order[ghost_triangles[:,0]]],
+                                  num.float)
+
+    submesh_cell = {}
+    submesh_cell["ghost_layer_width"] = layer_width
+    submesh_cell["full_nodes"] = full_nodes
+    submesh_cell["ghost_nodes"] = ghost_nodes
+    submesh_cell["full_triangles"] = full_triangles
+    submesh_cell["ghost_triangles"] = ghost_triangles
+    submesh_cell["full_boundary"] = full_boundary
+    submesh_cell["ghost_boundary"] = ghost_boundary
+    submesh_cell["ghost_commun"] = ghost_commun
+    submesh_cell["full_commun"] = full_commun
+    submesh_cell["full_quan"] = full_quan
+    submesh_cell["ghost_quan"] = ghost_quan
+
+    points, vertices, boundary, quantities, ghost_recv_dict, \
+            full_send_dict, tri_map, node_map, tri_l2g, node_l2g, \
+            ghost_layer_width = \
+            build_local_mesh(submesh_cell, tlower, tupper, numprocs)
+
+    tri_l2g = epart_order[tri_l2g]
+
+    number_of_full_nodes = len(full_nodes)
+    number_of_full_triangles = len(full_triangles)
+
+    return  points, vertices, boundary, quantities, ghost_recv_dict, \
+           full_send_dict, tri_map, node_map, tri_l2g, node_l2g, \
+           ghost_layer_width, number_of_full_nodes, number_of_full_triangles
+
+
+
 def extract_l2g_map(map):
     # Extract l2g data  from corresponding map
     # Maps
@@ -402,203 +402,329 @@ static PyObject *sendrecv_array(PyObject *self, PyObject *args) {
 
 
 /*************************************************************/
-/* do multiple isends and irecv of Numpy array buffers        */
-/* of type float, double, int, or long                       */
-/*                                                           */
+/* Requests of ghost communication started by                */
+/* start_send_recv_via_dicts and not yet completed by        */
+/* wait_send_recv_via_dicts                                  */
 /*************************************************************/
-static PyObject *send_recv_via_dicts(PyObject *self, PyObject *args) {
+static MPI_Request *pending_requests = NULL;
+static MPI_Status *pending_statuses = NULL;
+static int max_pending_requests = 0;
+static int num_pending_requests = 0;
 
-  PyObject *send_dict;
-  PyObject *recv_dict;
 
-  //PyObject *seq;
+static int _post_via_dict(PyObject *dict, int send) {
+  /* Post an MPI_Isend (send == 1) or MPI_Irecv (send == 0) for the
+     buffer X stored at index 2 of each [Id, Idg, X] list in dict */
 
-  //PyObject *list;
   PyArrayObject *X;
-  //PyArrayObject *Id;
-  //int op, error, count, count1, myid;
-  //MPI_Datatype mpi_type, buffer_type;
-  //MPI_Op mpi_op;
-  int k, lenx;
-  int num_recv=0;
-  int num_send=0;
+  PyObject *key, *value;
+  Py_ssize_t pos = 0;
+  int lenx, ierr;
 
-  int ierr;
-  MPI_Request requests[40];
-  MPI_Status statuses[40];
+  while (PyDict_Next(dict, &pos, &key, &value)) {
+    int i = PyInt_AS_LONG(key);
 
-  Py_ssize_t pos = 0;
+    X = (PyArrayObject *) PyList_GetItem(value, 2);
 
-  PyObject *key, *value;
-  //long *Iddata;
-  //double *xdata;
+    lenx = X->dimensions[0]*X->dimensions[1];
+
+    if (send) {
+      ierr = MPI_Isend(X->data, lenx, MPI_DOUBLE, i, 123, MPI_COMM_WORLD,
+                       &pending_requests[num_pending_requests]);
+    } else {
+      ierr = MPI_Irecv(X->data, lenx, MPI_DOUBLE, i, 123, MPI_COMM_WORLD,
+                       &pending_requests[num_pending_requests]);
+    }
+
+    if (ierr != MPI_SUCCESS) {
+      PyErr_SetString(PyExc_RuntimeError,
+                      send ? "mpiextras.c; error from MPI_Isend"
+                           : "mpiextras.c; error from MPI_Irecv");
+      return -1;
+    }
+
+    num_pending_requests++;
+  }
+
+  return 0;
+}
+
+
+/*************************************************************/
+/* start isends and irecvs of Numpy array buffers            */
+/* stored in the send and recv dictionaries. The buffers     */
+/* must not be touched until wait_send_recv_via_dicts is     */
+/* called, so computation can be done in the meantime.       */
+/*                                                           */
+/*************************************************************/
+static PyObject *start_send_recv_via_dicts(PyObject *self, PyObject *args) {
+
+  PyObject *send_dict;
+  PyObject *recv_dict;
+  int num_requests;
 
   /* process the parameters */
   if (!PyArg_ParseTuple(args, "OO", &send_dict, &recv_dict)) {
     PyErr_SetString(PyExc_RuntimeError,
-		    "mpiextras.c (sendrecv_array): could not parse input");
+		    "mpiextras.c (start_send_recv_via_dicts): could not parse input");
     return NULL;
   }
 
-  //----------------------------------------------------------------------------
-  // Do the recv first
-  //----------------------------------------------------------------------------
-  num_recv = PyDict_Size(recv_dict);
-  //printf("num_recv = %d\n",num_recv);
-  if (num_recv>20) {
+  if (num_pending_requests > 0) {
     PyErr_SetString(PyExc_RuntimeError,
-		    "mpiextras.c; Number of recv communication buffers > 10");
+		    "mpiextras.c (start_send_recv_via_dicts): previous communication not completed");
     return NULL;
   }
 
-  pos = 0;
-  k = 0;
-  while (PyDict_Next(recv_dict, &pos, &key, &value)) {
-    int i = PyInt_AS_LONG(key);
-    //printf("key %d\n",i);
+  num_requests = PyDict_Size(recv_dict) + PyDict_Size(send_dict);
+  if (num_requests > max_pending_requests) {
+    free(pending_requests);
+    free(pending_statuses);
+    pending_requests = (MPI_Request *) malloc(num_requests*sizeof(MPI_Request));
+    pending_statuses = (MPI_Status *) malloc(num_requests*sizeof(MPI_Status));
+    if (pending_requests == NULL || pending_statuses == NULL) {
+      free(pending_requests);
+      free(pending_statuses);
+      pending_requests = NULL;
+      pending_statuses = NULL;
+      max_pending_requests = 0;
+      return PyErr_NoMemory();
+    }
+    max_pending_requests = num_requests;
+  }
 
-    //Id = (PyArrayObject *) PyList_GetItem(value, 0);
-    X   = (PyArrayObject *) PyList_GetItem(value, 2);
+  // Do the recv first, then the sends
+  if (_post_via_dict(recv_dict, 0) < 0) return NULL;
+  if (_post_via_dict(send_dict, 1) < 0) return NULL;
 
-    lenx = X->dimensions[0]*X->dimensions[1];
+  Py_INCREF(Py_None);
+  return (Py_None);
+}
 
 
-    //printf("buf size %d by 3\n",lenx/3);
-    //xdata = (double *) X->data;
-    //Iddata = (long *) Id->data;
+/*************************************************************/
+/* complete communication started by                         */
+/* start_send_recv_via_dicts                                 */
+/*                                                           */
+/*************************************************************/
+static PyObject *wait_send_recv_via_dicts(PyObject *self, PyObject *args) {
 
-    //printf("k = %d \n",k);
-    ierr = MPI_Irecv(X->data, lenx, MPI_DOUBLE, i, 123, MPI_COMM_WORLD, &requests[k]);
-    if (ierr>0) {
-        PyErr_SetString(PyExc_RuntimeError,
-    		    "mpiextras.c; error from MPI_Irecv");
-        return NULL;
-      }
-    //printf("ierr = %d \n",ierr);
-    k++;
-    //for (k=0 ; k < lenx ; k++) printf("X[%d] = %g Id[%d] = %ld \n",k,xdata[k],k,Iddata[k]);
-}
-  //----------------------------------------------------------------------------
-  // Do the sends second
-  //----------------------------------------------------------------------------
-  num_send = PyDict_Size(send_dict);
-  //printf("num_send = %d\n",num_send);
-  if (num_send>20) {
-    PyErr_SetString(PyExc_RuntimeError,
-		    "mpiextras.c; Number of send communication buffers > 10");
-    return NULL;
+  int ierr;
+
+  if (num_pending_requests > 0) {
+    ierr = MPI_Waitall(num_pending_requests, pending_requests, pending_statuses);
+    num_pending_requests = 0;
+
+    if (ierr != MPI_SUCCESS) {
+      PyErr_SetString(PyExc_RuntimeError,
+		      "mpiextras.c (wait_send_recv_via_dicts): error from MPI_Waitall");
+      return NULL;
+    }
   }
 
-  pos = 0;
-  while (PyDict_Next(send_dict, &pos, &key, &value)) {
-    int i = PyInt_AS_LONG(key);
-    //printf("key %d\n",i);
+  Py_INCREF(Py_None);
+  return (Py_None);
+}
 
-    //Id = (PyArrayObject *) PyList_GetItem(value, 0);
-    X   = (PyArrayObject *) PyList_GetItem(value, 2);
 
-    lenx = X->dimensions[0]*X->dimensions[1];
+/*************************************************************/
+/* do multiple isends and irecv of Numpy array buffers        */
+/* of type float, double, int, or long                       */
+/*                                                           */
+/*************************************************************/
+static PyObject *send_recv_via_dicts(PyObject *self, PyObject *args) {
 
-    //printf("buf size %d by 3 \n",lenx/3);
-    //xdata = (double *) X->data;
-    //Iddata = (long *) Id->data;
-    //for (k=0 ; k < lenx ; k++) printf("X[%d] = %g Id[%d] = %ld \n",k,xdata[k],k,Iddata[k]);
+  if (start_send_recv_via_dicts(self, args) == NULL) return NULL;
+  Py_DECREF(Py_None);
 
-    //printf("k = %d \n",k);
-    ierr = MPI_Isend(X->data, lenx, MPI_DOUBLE, i, 123, MPI_COMM_WORLD, &requests[k]);
-    //printf("ierr = %d \n",ierr);
-    
-    k++;
+  return wait_send_recv_via_dicts(self, args);
 }
 
 
 
-  //printf("k = %d\n",k);
+/*************************************************************/
+/* Check the [Id, Idg, X] lists of a send or recv dictionary */
+/* and the centroid value arrays used by pack_via_dict and   */
+/* unpack_via_dict                                           */
+/*************************************************************/
+static int _check_pack_args(PyObject *dict, PyObject *values, int *num_values) {
 
+  PyObject *key, *value;
+  PyArrayObject *Id, *X, *Q;
+  Py_ssize_t pos = 0;
+  int q;
 
-  //----------------------------------------------------------------------------
-  // Now complete communication. We could put some computation between the 
-  // communication calls above and this call.
-  //----------------------------------------------------------------------------
-  ierr =  MPI_Waitall(k,requests,statuses);
+  if (!PyDict_Check(dict) || !PySequence_Check(values)) {
+    PyErr_SetString(PyExc_TypeError,
+                    "mpiextras.c: expected a dictionary and a sequence of arrays");
+    return -1;
+  }
 
+  *num_values = PySequence_Size(values);
 
+  for (q = 0; q < *num_values; q++) {
+    Q = (PyArrayObject *) PySequence_Fast_GET_ITEM(values, q);
+    if (!PyArray_Check(Q) || PyArray_TYPE(Q) != NPY_DOUBLE ||
+        !PyArray_ISCARRAY(Q)) {
+      PyErr_SetString(PyExc_TypeError,
+                      "mpiextras.c: quantity values must be contiguous float arrays");
+      return -1;
+    }
+  }
 
+  while (PyDict_Next(dict, &pos, &key, &value)) {
+    Id = (PyArrayObject *) PyList_GetItem(value, 0);
+    X  = (PyArrayObject *) PyList_GetItem(value, 2);
+    if (Id == NULL || X == NULL) return -1;
+
+    if (!PyArray_Check(Id) || PyArray_TYPE(Id) != NPY_LONG ||
+        !PyArray_ISCARRAY(Id)) {
+      PyErr_SetString(PyExc_TypeError,
+                      "mpiextras.c: ids must be contiguous int arrays");
+      return -1;
+    }
+
+    if (!PyArray_Check(X) || PyArray_TYPE(X) != NPY_DOUBLE ||
+        !PyArray_ISCARRAY(X) || X->nd != 2 ||
+        X->dimensions[0] != Id->dimensions[0] ||
+        X->dimensions[1] < *num_values) {
+      PyErr_SetString(PyExc_ValueError,
+                      "mpiextras.c: communication buffer does not match ids and quantities");
+      return -1;
+    }
+  }
 
+  return 0;
+}
 
-/*
-  for (i = 0; i < len; i++) {
-    x = (PyArrayObject *) PySequence_Fast_GET_ITEM(seq, i);
-    lenx = x->dimensions[0];
-    printf("buf size %d\n",len);
-    xdata = (double *) x->data;
-    printf("x->data[0] %g\n",xdata[0]);y
-  }
-  Py_DECREF(seq);
-*/
 
+/*************************************************************/
+/* pack_via_dict                                             */
+/* Gather the values of all quantities at the full triangles */
+/* into the send buffers of all processors in one pass       */
+/*                                                           */
+/*************************************************************/
+static PyObject *pack_via_dict(PyObject *self, PyObject *args) {
 
-/*
-//   Input check and determination of MPI type
-  mpi_type = type_map(x, &count);
-  if (!mpi_type) {
+  PyObject *send_dict, *values, *seq;
+  PyObject *key, *value;
+  PyArrayObject *Id, *X;
+  Py_ssize_t pos = 0;
+  double **Q, *xdata;
+  long *id;
+  int i, q, n, m, num_values;
+
+  if (!PyArg_ParseTuple(args, "OO", &send_dict, &values)) {
     PyErr_SetString(PyExc_RuntimeError,
-		    "mpiext.c (allreduce_array): could not determine mpi_type");
+		    "mpiextras.c (pack_via_dict): could not parse input");
     return NULL;
   }
 
+  seq = PySequence_Fast(values, "expected a sequence");
+  if (seq == NULL) return NULL;
 
-  //This error is caught at the pypar level - so we won't end up here
-  //  unless mpiext is being used independently
-  buffer_type = type_map(d, &count1);
-  if (mpi_type != buffer_type) {
-    sprintf(errmsg, "mpiext.c (allreduce_array): Input array and buffer must be of the same type.");
-    PyErr_SetString(PyExc_RuntimeError, errmsg);
-
+  if (_check_pack_args(send_dict, seq, &num_values) < 0) {
+    Py_DECREF(seq);
     return NULL;
   }
 
-  if (count != count1) {
-    PyErr_SetString(PyExc_RuntimeError,
-		    "mpiext.c (allreduce_array): Input array and buffer must have same length");
-    return NULL;
+  Q = (double **) malloc((num_values+1)*sizeof(double *));
+  if (Q == NULL) {
+    Py_DECREF(seq);
+    return PyErr_NoMemory();
+  }
+  for (q = 0; q < num_values; q++) {
+    Q[q] = (double *) ((PyArrayObject *) PySequence_Fast_GET_ITEM(seq, q))->data;
   }
 
-  // Input check and determination of MPI op
-  mpi_op = op_map(op);
-  if (!mpi_op) {
+  while (PyDict_Next(send_dict, &pos, &key, &value)) {
+    Id = (PyArrayObject *) PyList_GetItem(value, 0);
+    X  = (PyArrayObject *) PyList_GetItem(value, 2);
+
+    id = (long *) Id->data;
+    xdata = (double *) X->data;
+    n = X->dimensions[0];
+    m = X->dimensions[1];
+
+    for (i = 0; i < n; i++) {
+      for (q = 0; q < num_values; q++) {
+        xdata[i*m + q] = Q[q][id[i]];
+      }
+    }
+  }
+
+  free(Q);
+  Py_DECREF(seq);
+
+  Py_INCREF(Py_None);
+  return (Py_None);
+}
+
+
+/*************************************************************/
+/* unpack_via_dict                                           */
+/* Scatter the received values of all quantities from the    */
+/* recv buffers of all processors to the ghost triangles     */
+/*                                                           */
+/*************************************************************/
+static PyObject *unpack_via_dict(PyObject *self, PyObject *args) {
+
+  PyObject *recv_dict, *values, *seq;
+  PyObject *key, *value;
+  PyArrayObject *Id, *X;
+  Py_ssize_t pos = 0;
+  double **Q, *xdata;
+  long *id;
+  int i, q, n, m, num_values;
+
+  if (!PyArg_ParseTuple(args, "OO", &recv_dict, &values)) {
     PyErr_SetString(PyExc_RuntimeError,
-		    "mpiext.c (allreduce_array): could not determine mpi_op");
+		    "mpiextras.c (unpack_via_dict): could not parse input");
     return NULL;
   }
 
-  if (op == MAXLOC || op == MINLOC) {
-    PyErr_SetString(PyExc_RuntimeError,
-		    "mpiext.c (allreduce_array): MAXLOC and MINLOC are not implemented");
+  seq = PySequence_Fast(values, "expected a sequence");
+  if (seq == NULL) return NULL;
+
+  if (_check_pack_args(recv_dict, seq, &num_values) < 0) {
+    Py_DECREF(seq);
     return NULL;
   }
-  else {
-    // call the MPI routine
-    error =  MPI_Allreduce(x->data, d->data, count, mpi_type, mpi_op, \
-			MPI_COMM_WORLD);
+
+  Q = (double **) malloc((num_values+1)*sizeof(double *));
+  if (Q == NULL) {
+    Py_DECREF(seq);
+    return PyErr_NoMemory();
+  }
+  for (q = 0; q < num_values; q++) {
+    Q[q] = (double *) ((PyArrayObject *) PySequence_Fast_GET_ITEM(seq, q))->data;
   }
 
-  if (error != 0) {
-    MPI_Comm_rank(MPI_COMM_WORLD, &myid);
-    sprintf(errmsg, "Proc %d: MPI_Allreduce failed with error code %d\n",
-	    myid, error);
-    PyErr_SetString(PyExc_RuntimeError, errmsg);
-    return NULL;
+  while (PyDict_Next(recv_dict, &pos, &key, &value)) {
+    Id = (PyArrayObject *) PyList_GetItem(value, 0);
+    X  = (PyArrayObject *) PyList_GetItem(value, 2);
+
+    id = (long *) Id->data;
+    xdata = (double *) X->data;
+    n = X->dimensions[0];
+    m = X->dimensions[1];
+
+    for (i = 0; i < n; i++) {
+      for (q = 0; q < num_values; q++) {
+        Q[q][id[i]] = xdata[i*m + q];
+      }
+    }
   }
-*/
 
+  free(Q);
+  Py_DECREF(seq);
 
   Py_INCREF(Py_None);
   return (Py_None);
 }
 
 
- 
+
 /**********************************/
 /* Method table for python module */
 /**********************************/
@@ -608,6 +734,10 @@ static struct PyMethodDef MethodTable[] = {
   {"allreduce_array", allreduce_array, METH_VARARGS},
   {"sendrecv_array", sendrecv_array, METH_VARARGS},
   {"send_recv_via_dicts", send_recv_via_dicts, METH_VARARGS},
+  {"start_send_recv_via_dicts", start_send_recv_via_dicts, METH_VARARGS},
+  {"wait_send_recv_via_dicts", wait_send_recv_via_dicts, METH_VARARGS},
+  {"pack_via_dict", pack_via_dict, METH_VARARGS},
+  {"unpack_via_dict", unpack_via_dict, METH_VARARGS},
   {NULL, NULL}
 };
 
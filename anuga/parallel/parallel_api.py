@@ -24,6 +24,8 @@ if pypar_available:
     # Mesh partitioning using Metis
     from anuga.parallel.distribute_mesh import build_submesh
     from anuga.parallel.distribute_mesh import pmesh_divide_metis_with_map
+    from anuga.parallel.distribute_mesh import pmesh_partition_metis
+    from anuga.parallel.distribute_mesh import wet_triangle_weights
 
     from anuga.parallel.parallel_shallow_water import Parallel_domain
 
@@ -67,10 +69,14 @@ def collect_value(value):
 
 
 
-def distribute(domain, verbose=False, debug=False, parameters = None):
+def distribute(domain, verbose=False, debug=False, parameters = None,
+               weights = None):
     """ Distribute the domain to all processes
 
     parameters allows user to change size of ghost layer
+
+    weights is the cost of each triangle used to balance the partition,
+    e.g. wet_triangle_weights(domain) for inundation runs
     """
 
     if not pypar_available or numprocs == 1 : return domain # Bypass
@@ -80,7 +86,7 @@ def distribute(domain, verbose=False, debug=False, parameters = None):
         from sequential_distribute import Sequential_distribute
         partition = Sequential_distribute(domain, verbose, debug, parameters)
 
-        partition.distribute(numprocs)
+        partition.distribute(numprocs, weights=weights)
 
         kwargs, points, vertices, boundary, quantities, boundary_map, \
                 domain_name, domain_dir, domain_store, domain_store_centroids, \
@@ -104,6 +110,364 @@ def distribute(domain, verbose=False, debug=False, parameters = None):
             domain_quantities_to_be_stored, domain_smooth, domain_low_froude\
              = receive(0)
 
+    return build_parallel_domain(kwargs, points, vertices, boundary,
+                                 quantities, boundary_map,
+                                 domain_name, domain_dir, domain_store,
+                                 domain_store_centroids,
+                                 domain_minimum_storable_height,
+                                 domain_minimum_allowed_height,
+                                 domain_flow_algorithm, domain_georef,
+                                 domain_quantities_to_be_stored,
+                                 domain_smooth, domain_low_froude)
+
+
+def concurrent_distribute(domain, partition=None, verbose=False, debug=False,
+                          parameters=None, weights=None):
+    """ Distribute the domain to all processes, where every process
+    has a copy of the sequential domain and builds its own submesh,
+    ghost layer and communication pattern.
+
+    partition is the processor number of each triangle of the domain,
+    either as an array or the name of the file saved by
+    sequential_distribute_dump (name_P<numprocs>_partition.npy). If
+    None it is computed by metis on processor 0 (balancing the triangle
+    weights if given) and sent to the other processes.
+
+    parameters allows user to change size of ghost layer
+    """
+
+    if not pypar_available or numprocs == 1 : return domain # Bypass
+
+    if partition is None:
+        if myid == 0:
+            partition = pmesh_partition_metis(domain, numprocs, weights)
+            for p in range(1, numprocs):
+                send(partition, p)
+        else:
+            partition = receive(0)
+    elif isinstance(partition, basestring):
+        partition = num.load(partition)
+
+    from sequential_distribute import Sequential_distribute
+    distributor = Sequential_distribute(domain, verbose, debug, parameters)
+
+    distributor.distribute(numprocs, partition=partition)
+
+    return build_parallel_domain(*distributor.extract_submesh(myid))
+
+
+def repartition(domain, threshold=None, weights=None, dry_weight=0.1,
+                verbose=False, parameters=None):
+    """ Repartition a distributed domain to balance the load of the
+    processes, e.g. as the wet area of an inundation run changes.
+
+    Must be called by all processes at a yield point. If threshold is
+    given the domain is only repartitioned if its load imbalance (the
+    ratio of the maximum to the mean compute time of the processes,
+    see Parallel_domain.get_load_imbalance) is at least threshold,
+    otherwise the domain is returned unchanged.
+
+    Returns the new parallel domain, see repartition_domain.
+    """
+
+    if not pypar_available or numprocs == 1 : return domain # Bypass
+
+    imbalance = domain.get_load_imbalance()
+
+    if verbose and myid == 0:
+        print 'repartition: load imbalance %g' % imbalance
+
+    if threshold is not None and imbalance < threshold:
+        return domain
+
+    return repartition_domain(domain, weights, dry_weight, verbose, parameters)
+
+
+def repartition_domain(domain, weights=None, dry_weight=0.1, verbose=False,
+                       parameters=None):
+    """ Repartition a parallel domain with metis and migrate its state.
+
+    weights is the cost of each full triangle of this process. By
+    default it is estimated from the wetness of the triangles (see
+    wet_triangle_weights) scaled by the compute time of this process
+    measured by the last call of domain.get_load_imbalance.
+
+    The mesh (but not the quantities) and the weights of the full
+    triangles are gathered on processor 0, which partitions the mesh and
+    sends each process its new submesh, ghost layer and communication
+    pattern (full_send_dict and ghost_recv_dict), as distribute does.
+    The quantity values of the triangles which change owner are then sent
+    by their old owner to their new owner only, and the ghost values are
+    filled in from the new owners.
+
+    The new domain continues at the current time and into the same
+    global sww file, so domain.set_store_global() must be used if the
+    domain is stored. The storage and checkpoint settings are carried
+    over.
+
+    This is a restart of the domain: boundary conditions and operators
+    hold references to the old domain and its triangle numbering, so they
+    are not carried over and must be set again on the new domain, e.g.
+
+        domain = repartition(domain)
+        domain.set_boundary({...})
+    """
+
+    from anuga import Domain, Quantity
+    from anuga.config import netcdf_mode_a
+    from anuga.parallel.distribute_mesh import pmesh_partition_metis
+    from anuga.parallel.distribute_mesh import wet_triangle_weights
+    from anuga.parallel.sequential_distribute import Sequential_distribute
+
+    processor = domain.processor
+    nprocs = domain.numproc
+
+    if domain.store:
+        msg = 'Repartitioning a domain which stores per processor sww '
+        msg += 'files is not supported, use domain.set_store_global()'
+        assert domain.get_store_global(), msg
+
+        if hasattr(domain, 'writer'):
+            domain.writer.close()
+
+    full = num.flatnonzero(domain.tri_full_flag == 1)
+    tri_l2g = num.asarray(domain.tri_l2g)
+    node_l2g = num.asarray(domain.node_l2g)
+
+    if weights is None:
+        weights = wet_triangle_weights(domain, dry_weight)[full]
+
+        # Scale to the measured cost of the triangles of this process
+        compute_time = domain.processor_compute_times[processor]
+        if compute_time > 0.0 and num.sum(weights) > 0.0:
+            weights = weights*compute_time/num.sum(weights)
+
+    weights = num.array(weights, num.float)
+
+    msg = 'Number of weights must equal number of full triangles'
+    assert len(weights) == len(full), msg
+
+    if parameters is None:
+        parameters = {'ghost_layer_width' : domain.ghost_layer_width}
+
+    #---------------------------------------------------------------------------
+    # Gather the global mesh on processor 0
+    #---------------------------------------------------------------------------
+    boundary = []
+    for (t, e), tag in domain.boundary.items():
+        if domain.tri_full_flag[t] == 1 and tag != 'ghost':
+            boundary.append((tri_l2g[t], e, tag))
+
+    local = (tri_l2g[full], node_l2g[domain.triangles[full]],
+             node_l2g, domain.get_nodes(), boundary, weights)
+
+    if processor == 0:
+        if verbose: print 'repartition: gather mesh'
+
+        data = [local]
+        for p in range(1, nprocs):
+            data.append(receive(p))
+    else:
+        send(local, 0)
+
+    #---------------------------------------------------------------------------
+    # New partition and submeshes, built on processor 0
+    #---------------------------------------------------------------------------
+    if processor == 0:
+        number_of_global_triangles = domain.number_of_global_triangles
+        number_of_global_nodes = domain.number_of_global_nodes
+
+        points = num.zeros((number_of_global_nodes, 2), num.float)
+        triangles = num.zeros((number_of_global_triangles, 3), num.int)
+        global_boundary = {}
+        global_weights = num.zeros(number_of_global_triangles, num.float)
+        old_partition = num.zeros(number_of_global_triangles, num.int)
+
+        for p, (g_tri, g_vertices, g_nodes, nodes, bnd, w) in enumerate(data):
+            triangles[g_tri] = g_vertices
+            points[g_nodes] = nodes
+            global_weights[g_tri] = w
+            old_partition[g_tri] = p
+            for t, e, tag in bnd:
+                global_boundary[t, e] = tag
+
+        sequential_domain = Domain(points, triangles, global_boundary,
+                                   geo_reference=domain.geo_reference)
+
+        sequential_domain.set_flow_algorithm(domain.get_flow_algorithm())
+        sequential_domain.set_name(domain.get_global_name())
+        sequential_domain.set_datadir(domain.get_datadir())
+        sequential_domain.set_store(domain.get_store())
+        sequential_domain.set_store_centroids(domain.get_store_centroids())
+        sequential_domain.set_low_froude(domain.low_froude)
+        sequential_domain.set_minimum_storable_height(domain.minimum_storable_height)
+        sequential_domain.set_minimum_allowed_height(
+                                    domain.get_minimum_allowed_height())
+        sequential_domain.set_quantities_to_be_stored(domain.quantities_to_be_stored)
+        sequential_domain.smooth = domain.smooth
+
+        for name in domain.quantities:
+            if name not in sequential_domain.quantities:
+                Quantity(sequential_domain, name=name, register=True)
+
+        if verbose: print 'repartition: partition mesh'
+        partition = pmesh_partition_metis(sequential_domain, nprocs,
+                                          global_weights)
+
+        distributor = Sequential_distribute(sequential_domain, verbose,
+                                            parameters=parameters)
+        distributor.distribute(nprocs, partition=partition)
+
+        # Each process gets its submesh, the new owners of its old full
+        # triangles and the old owners of its new full triangles
+        for p in range(nprocs):
+            submesh = distributor.extract_submesh(p)
+
+            # The full triangles come first in the submesh
+            kwargs = submesh[0]
+            new_full = num.asarray(kwargs['tri_l2g'])[
+                                   :kwargs['number_of_full_triangles']]
+            message = (submesh, partition[data[p][0]],
+                       old_partition[new_full])
+
+            if p == 0:
+                local_message = message
+            else:
+                send(message, p)
+
+        del distributor
+        del sequential_domain
+        del data
+
+        submesh, new_owners, old_owners = local_message
+    else:
+        submesh, new_owners, old_owners = receive(0)
+
+    new_domain = build_parallel_domain(*submesh)
+
+    del submesh
+
+    #---------------------------------------------------------------------------
+    # Migrate the quantities of the triangles which change owner
+    #---------------------------------------------------------------------------
+    if verbose and processor == 0:
+        print 'repartition: migrate quantities'
+
+    new_tri_l2g = num.asarray(new_domain.tri_l2g)
+    order = num.argsort(new_tri_l2g)
+
+    def global_to_local(g_ids):
+        return order[num.searchsorted(new_tri_l2g, g_ids, sorter=order)]
+
+    names = domain.quantities.keys()
+
+    def get_values(quantities, ids):
+        return dict((name, (quantities[name].centroid_values[ids],
+                            quantities[name].vertex_values[ids]))
+                    for name in names)
+
+    def set_values(quantities, ids, values):
+        for name in names:
+            centroid_values, vertex_values = values[name]
+            quantities[name].centroid_values[ids] = centroid_values
+            quantities[name].vertex_values[ids] = vertex_values
+
+    g_full = tri_l2g[full]
+
+    messages = {}
+    for p in num.unique(new_owners):
+        ids = new_owners == p
+        if p == processor:
+            set_values(new_domain.quantities, global_to_local(g_full[ids]),
+                       get_values(domain.quantities, full[ids]))
+        else:
+            messages[p] = (g_full[ids], get_values(domain.quantities, full[ids]))
+
+    sources = [p for p in num.unique(old_owners) if p != processor]
+
+    for g_ids, values in _exchange(processor, nprocs, messages, sources):
+        set_values(new_domain.quantities, global_to_local(g_ids), values)
+
+    #---------------------------------------------------------------------------
+    # Fill in the ghost triangles from their new owners
+    #---------------------------------------------------------------------------
+    messages = {}
+    for p in new_domain.full_send_dict:
+        ids = new_domain.full_send_dict[p][0]
+        messages[p] = get_values(new_domain.quantities, ids)
+
+    if processor in messages:
+        set_values(new_domain.quantities,
+                   new_domain.ghost_recv_dict[processor][0],
+                   messages.pop(processor))
+
+    sources = [p for p in new_domain.ghost_recv_dict if p != processor]
+
+    for p, values in zip(sources,
+                         _exchange(processor, nprocs, messages, sources)):
+        set_values(new_domain.quantities, new_domain.ghost_recv_dict[p][0],
+                   values)
+
+    #---------------------------------------------------------------------------
+    # Continue at the current time into the same sww file
+    #---------------------------------------------------------------------------
+    new_domain.set_starttime(domain.get_starttime())
+    new_domain.set_evolve_starttime(domain.get_time())
+    new_domain.evolved_called = domain.evolved_called
+    new_domain.yieldstep_id = domain.yieldstep_id
+    new_domain.set_store_global(domain.get_store_global())
+    new_domain.batch_structures = domain.batch_structures
+    if domain.get_overlap_communication():
+        new_domain.set_overlap_communication()
+
+    # The mesh of a binary checkpoint is stored again for the new domain
+    for attribute in ['checkpoint', 'checkpoint_dir', 'checkpoint_step',
+                      'checkpoint_time', 'checkpoint_format',
+                      'walltime_prev']:
+        if hasattr(domain, attribute):
+            setattr(new_domain, attribute, getattr(domain, attribute))
+    new_domain.checkpoint_mesh_stored = False
+
+    if new_domain.store and hasattr(domain, 'writer'):
+        from anuga.parallel.parallel_sww import Parallel_SWW_file
+        new_domain.writer = Parallel_SWW_file(new_domain, mode=netcdf_mode_a)
+
+    return new_domain
+
+
+def _exchange(processor, nprocs, messages, sources):
+    """ Send messages[p] to each process p and return the list of the
+    messages received from the processes in sources, in that order.
+
+    The processes take turns to send, so the blocking sends cannot
+    deadlock. messages must not contain processor.
+    """
+
+    received = {}
+    for iproc in range(nprocs):
+        if iproc == processor:
+            for p in sorted(messages):
+                send(messages[p], int(p))
+        elif iproc in sources:
+            received[iproc] = receive(int(iproc))
+
+    return [received[p] for p in sources]
+
+
+def build_parallel_domain(kwargs, points, vertices, boundary, quantities,
+                          boundary_map, domain_name, domain_dir, domain_store,
+                          domain_store_centroids,
+                          domain_minimum_storable_height,
+                          domain_minimum_allowed_height,
+                          domain_flow_algorithm, domain_georef,
+                          domain_quantities_to_be_stored, domain_smooth,
+                          domain_low_froude):
+    """ Create the parallel domain of this process from the submesh
+    structures of Sequential_distribute.extract_submesh
+    """
+
+    from anuga.parallel.parallel_shallow_water import Parallel_domain
+
     #---------------------------------------------------------------------------
     # Now Create parallel domain
     #---------------------------------------------------------------------------
@@ -150,37 +150,13 @@ class Parallel_Boyd_pipe_operator(Parallel_Structure_operator):
         Get info from inlets and then call sequential function
         """
 
-        import pypar
-
         local_debug = False
 
-        #Send attributes of both enquiry points to the master proc
-        if self.myid == self.master_proc:
-
-            if self.myid == self.enquiry_proc[0]:
-                enq_total_energy0 = self.inlets[0].get_enquiry_total_energy()
-                enq_stage0 = self.inlets[0].get_enquiry_stage()
-            else:
-                enq_total_energy0 = pypar.receive(self.enquiry_proc[0])
-                enq_stage0 = pypar.receive(self.enquiry_proc[0])
-
-
-            if self.myid == self.enquiry_proc[1]:
-                enq_total_energy1 = self.inlets[1].get_enquiry_total_energy()
-                enq_stage1 = self.inlets[1].get_enquiry_stage()
-            else:
-                enq_total_energy1 = pypar.receive(self.enquiry_proc[1])
-                enq_stage1 = pypar.receive(self.enquiry_proc[1])
-
-        else:
-            if self.myid == self.enquiry_proc[0]:
-                pypar.send(self.inlets[0].get_enquiry_total_energy(), self.master_proc)
-                pypar.send(self.inlets[0].get_enquiry_stage(), self.master_proc)
-
-            if self.myid == self.enquiry_proc[1]:
-                pypar.send(self.inlets[1].get_enquiry_total_energy(), self.master_proc)
-                pypar.send(self.inlets[1].get_enquiry_stage(), self.master_proc)
-
+        # Attributes of both enquiry points on the master proc
+        enq_total_energy0, enq_stage0 = \
+            self.communicate_enquiry_values(0, ['total_energy', 'stage'])
+        enq_total_energy1, enq_stage1 = \
+            self.communicate_enquiry_values(1, ['total_energy', 'stage'])
 
         # Determine the direction of the flow
         if self.myid == self.master_proc:
@@ -189,9 +165,8 @@ class Parallel_Boyd_pipe_operator(Parallel_Structure_operator):
             else:
                 self.delta_total_energy = enq_stage0 - enq_stage1
 
-        self.inflow_index = 0
-        self.outflow_index = 1
         # master proc orders reversal if applicable
+        reverse = None
         if self.myid == self.master_proc:
             # May/June 2014 -- change the driving forces gradually, with forward euler timestepping 
             #
@@ -215,59 +190,26 @@ class Parallel_Boyd_pipe_operator(Parallel_Structure_operator):
 
             # Reverse the inflow and outflow direction?
             if self.smooth_delta_total_energy < 0:
-                self.inflow_index = 1
-                self.outflow_index = 0
+                reverse = True
 
                 #self.delta_total_energy = -self.delta_total_energy
                 self.delta_total_energy = -self.smooth_delta_total_energy
-
-                for i in self.procs:
-                    if i == self.master_proc: continue
-                    pypar.send(True, i)
             else:
+                reverse = False
                 self.delta_total_energy = self.smooth_delta_total_energy
-                for i in self.procs:
-                    if i == self.master_proc: continue
-                    pypar.send(False, i)
 
             #print "ZZZZ: Delta total energy = %f" %(self.delta_total_energy)
-        else:
-            reverse = pypar.receive(self.master_proc)
 
-            if reverse:
-                self.inflow_index = 1
-                self.outflow_index = 0
+        self.communicate_reverse(reverse)
 
         # Get attribute from inflow enquiry point
-        if self.myid == self.master_proc:
-
-            if self.myid == self.enquiry_proc[self.inflow_index]:
-                    inflow_enq_depth = self.inlets[self.inflow_index].get_enquiry_depth()
-                    inflow_enq_specific_energy = self.inlets[self.inflow_index].get_enquiry_specific_energy()
-            else:
-                    inflow_enq_depth = pypar.receive(self.enquiry_proc[self.inflow_index])
-                    inflow_enq_specific_energy = pypar.receive(self.enquiry_proc[self.inflow_index])
-        else:
-            if self.myid == self.enquiry_proc[self.inflow_index]:
-                pypar.send(self.inlets[self.inflow_index].get_enquiry_depth(), self.master_proc)
-                pypar.send(self.inlets[self.inflow_index].get_enquiry_specific_energy(), self.master_proc)
+        inflow_enq_depth, inflow_enq_specific_energy = \
+            self.communicate_enquiry_values(self.inflow_index,
+                                            ['depth', 'specific_energy'])
 
         # Get attribute from outflow enquiry point
-        if self.myid == self.master_proc:
-            
-            if self.myid == self.enquiry_proc[self.outflow_index]:
-                outflow_enq_depth = self.inlets[self.outflow_index].get_enquiry_depth()
-            else:
-                outflow_enq_depth = pypar.receive(self.enquiry_proc[self.outflow_index])
-
-            #print "ZZZZZ: outflow_enq_depth = %f" %(outflow_enq_depth)
-
-        else:
-            if self.myid == self.enquiry_proc[self.outflow_index]:
-                pypar.send(self.inlets[self.outflow_index].get_enquiry_depth(), self.master_proc)
-
-
-
+        outflow_enq_depth, = \
+            self.communicate_enquiry_values(self.outflow_index, ['depth'])
 
         # Master proc computes return values
         if self.myid == self.master_proc:
@@ -27,6 +27,38 @@ def setup_buffers(domain):
     domain.communication_reduce_time = 0.0
     domain.communication_broadcast_time = 0.0
 
+    # Convert the index arrays once so that the communication buffers
+    # can be packed and unpacked in C (see communicate_ghosts_start)
+    for send_proc in domain.full_send_dict:
+        Idf = domain.full_send_dict[send_proc][0]
+        domain.full_send_dict[send_proc][0] = num.ascontiguousarray(Idf, num.int)
+
+    for recv_proc in domain.ghost_recv_dict:
+        Idg = domain.ghost_recv_dict[recv_proc][0]
+        domain.ghost_recv_dict[recv_proc][0] = num.ascontiguousarray(Idg, num.int)
+
+    # Quantities of a ghost communication which has been started
+    # but not finished (see communicate_ghosts_start)
+    domain.ghost_communication_quantities = None
+
+
+def communicate_all_gather(domain, value):
+    """Return the list of the values of all processors on every
+    processor (value may be any picklable object)
+    """
+
+    if domain.processor == 0:
+        values = [value]
+        for p in range(1, domain.numproc):
+            values.append(pypar.receive(p))
+        for p in range(1, domain.numproc):
+            pypar.send(values, p)
+    else:
+        pypar.send(value, 0)
+        values = pypar.receive(0)
+
+    return values
+
 
 def communicate_flux_timestep(domain, yieldstep, finaltime):
     """Calculate local timestep
@@ -141,62 +173,66 @@ def communicate_ghosts_asynchronous(domain, quantities=None):
     # the separate processors
     # Using isend and irecv
 
-    import numpy as num
+    communicate_ghosts_start(domain, quantities)
+    communicate_ghosts_finish(domain)
+
+
+def communicate_ghosts_start(domain, quantities=None):
+    """Copy full cell data into the send buffers and start the
+    isend/irecv of the ghost cell data.
+
+    The communication is completed by communicate_ghosts_finish. Until
+    then the centroid values of the ghost cells are out of date, but
+    any computation not involving the ghost cells can proceed.
+    """
+
     import time
     t0 = time.time()
-    
+
     if quantities is None:
         quantities = domain.conserved_quantities
 
-    # update of non-local ghost cells by copying full cell data into the
-    # Xout buffer arrays
-
-    #iproc == domain.processor
+    from anuga.parallel import mpiextras
 
-    #Setup send buffer arrays for sending full data to other processors
-    for send_proc in domain.full_send_dict:
-        Idf  = domain.full_send_dict[send_proc][0]
-        Xout = domain.full_send_dict[send_proc][2]
+    # update of non-local ghost cells by copying full cell data of all
+    # quantities into the Xout buffer arrays of all processors
+    values = [domain.quantities[q].centroid_values for q in quantities]
+    mpiextras.pack_via_dict(domain.full_send_dict, values)
 
-        for i, q in enumerate(quantities):
-            #print 'Store send data',i,q
-            Q_cv =  domain.quantities[q].centroid_values
-            Xout[:,i] = num.take(Q_cv, Idf)
+    # Start all the communication using isend/irecv via the buffers in the
+    # full_send_dict and ghost_recv_dict
+    mpiextras.start_send_recv_via_dicts(domain.full_send_dict,
+                                        domain.ghost_recv_dict)
 
+    domain.ghost_communication_quantities = quantities
 
+    domain.communication_time += time.time()-t0
 
 
+def communicate_ghosts_finish(domain):
+    """Wait for the ghost communication started by
+    communicate_ghosts_start and copy the received data to the
+    ghost cells. Does nothing if no communication is in progress.
+    """
 
+    import time
 
-    # Do all the comuunication using isend/irecv via the buffers in the
-    # full_send_dict and ghost_recv_dict
-    from anuga.parallel import mpiextras
+    quantities = domain.ghost_communication_quantities
 
-    mpiextras.send_recv_via_dicts(domain.full_send_dict,domain.ghost_recv_dict)
+    if quantities is None:
+        return
 
-#
-#    if pypar.rank() == 0:
-#        print 'After commun 0'
-#        pprint(domain.ghost_recv_dict)
-#
-#    if pypar.rank() == 1:
-#        print 'After commun 1'
-#        pprint(domain.ghost_recv_dict)
+    t0 = time.time()
 
-    # Now copy data from receive buffers to the domain
-    for recv_proc in domain.ghost_recv_dict:
-        Idg  = domain.ghost_recv_dict[recv_proc][0]
-        X    = domain.ghost_recv_dict[recv_proc][2]
+    from anuga.parallel import mpiextras
 
-        #print recv_proc
-        #print X
+    mpiextras.wait_send_recv_via_dicts(domain.full_send_dict,
+                                       domain.ghost_recv_dict)
 
-        for i, q in enumerate(quantities):
-            #print 'Read receive data',i,q
-            Q_cv =  domain.quantities[q].centroid_values
-            num.put(Q_cv, Idg, X[:,i])
+    domain.ghost_communication_quantities = None
 
+    # Now copy data from receive buffers of all processors to the domain
+    values = [domain.quantities[q].centroid_values for q in quantities]
+    mpiextras.unpack_via_dict(domain.ghost_recv_dict, values)
 
     domain.communication_time += time.time()-t0
-
-
@@ -154,8 +154,6 @@ class Parallel_Internal_boundary_operator(Parallel_Structure_operator):
 
     def discharge_routine_explicit(self):
 
-        import pypar
-
         local_debug = False
         
         # If the structure has been closed, then no water gets through
@@ -171,32 +169,11 @@ class Parallel_Internal_boundary_operator(Parallel_Structure_operator):
             else:
                 return None, None, None
 
-        #Send attributes of both enquiry points to the master proc
-        if self.myid == self.master_proc:
-
-            if self.myid == self.enquiry_proc[0]:
-                enq_total_energy0 = self.inlets[0].get_enquiry_total_energy()
-                enq_stage0 = self.inlets[0].get_enquiry_stage()
-            else:
-                enq_total_energy0 = pypar.receive(self.enquiry_proc[0])
-                enq_stage0 = pypar.receive(self.enquiry_proc[0])
-
-
-            if self.myid == self.enquiry_proc[1]:
-                enq_total_energy1 = self.inlets[1].get_enquiry_total_energy()
-                enq_stage1 = self.inlets[1].get_enquiry_stage()
-            else:
-                enq_total_energy1 = pypar.receive(self.enquiry_proc[1])
-                enq_stage1 = pypar.receive(self.enquiry_proc[1])
-
-        else:
-            if self.myid == self.enquiry_proc[0]:
-                pypar.send(self.inlets[0].get_enquiry_total_energy(), self.master_proc)
-                pypar.send(self.inlets[0].get_enquiry_stage(), self.master_proc)
-
-            if self.myid == self.enquiry_proc[1]:
-                pypar.send(self.inlets[1].get_enquiry_total_energy(), self.master_proc)
-                pypar.send(self.inlets[1].get_enquiry_stage(), self.master_proc)
+        # Attributes of both enquiry points on the master proc
+        enq_total_energy0, enq_stage0 = \
+            self.communicate_enquiry_values(0, ['total_energy', 'stage'])
+        enq_total_energy1, enq_stage1 = \
+            self.communicate_enquiry_values(1, ['total_energy', 'stage'])
 
 
         # Determine the direction of the flow
@@ -257,30 +234,14 @@ class Parallel_Internal_boundary_operator(Parallel_Structure_operator):
             self.driving_energy=numpy.nan
 
 
-        self.inflow_index = 0
-        self.outflow_index = 1
         # master proc orders reversal if applicable
+        reverse = None
         if self.myid == self.master_proc:
 
             # Reverse the inflow and outflow direction?
-            if self.smooth_Q < 0.:
-                self.inflow_index = 1
-                self.outflow_index = 0
-
-                for i in self.procs:
-                    if i == self.master_proc: continue
-                    pypar.send(True, i)
-            else:
-                for i in self.procs:
-                    if i == self.master_proc: continue
-                    pypar.send(False, i)
-
-        else:
-            reverse = pypar.receive(self.master_proc)
+            reverse = self.smooth_Q < 0.
 
-            if reverse:
-                self.inflow_index = 1
-                self.outflow_index = 0
+        self.communicate_reverse(reverse)
 
         # Master proc computes return values
         if self.myid == self.master_proc:
@@ -307,8 +268,6 @@ class Parallel_Internal_boundary_operator(Parallel_Structure_operator):
 
         """
 
-        import pypar
-
         local_debug = False
         
         # If the structure has been closed, then no water gets through
@@ -324,55 +283,17 @@ class Parallel_Internal_boundary_operator(Parallel_Structure_operator):
             else:
                 return None, None, None
 
-        #Send attributes of both enquiry points to the master proc
-        if self.myid == self.master_proc:
-
-            if self.myid == self.enquiry_proc[0]:
-                enq_total_energy0 = self.inlets[0].get_enquiry_total_energy()
-                enq_stage0 = self.inlets[0].get_enquiry_stage()
-            else:
-                enq_total_energy0 = pypar.receive(self.enquiry_proc[0])
-                enq_stage0 = pypar.receive(self.enquiry_proc[0])
-
-
-            if self.myid == self.enquiry_proc[1]:
-                enq_total_energy1 = self.inlets[1].get_enquiry_total_energy()
-                enq_stage1 = self.inlets[1].get_enquiry_stage()
-            else:
-                enq_total_energy1 = pypar.receive(self.enquiry_proc[1])
-                enq_stage1 = pypar.receive(self.enquiry_proc[1])
-
-        else:
-            if self.myid == self.enquiry_proc[0]:
-                pypar.send(self.inlets[0].get_enquiry_total_energy(), self.master_proc)
-                pypar.send(self.inlets[0].get_enquiry_stage(), self.master_proc)
-
-            if self.myid == self.enquiry_proc[1]:
-                pypar.send(self.inlets[1].get_enquiry_total_energy(), self.master_proc)
-                pypar.send(self.inlets[1].get_enquiry_stage(), self.master_proc)
+        # Attributes of both enquiry points on the master proc
+        enq_total_energy0, enq_stage0 = \
+            self.communicate_enquiry_values(0, ['total_energy', 'stage'])
+        enq_total_energy1, enq_stage1 = \
+            self.communicate_enquiry_values(1, ['total_energy', 'stage'])
 
         # Send inlet areas to the master proc. FIXME: Inlet areas don't change
         # -- perhaps we could just do this once?
 
-        # area0
-        if self.myid in self.inlet_procs[0]:
-            area0 = self.inlets[0].get_global_area()
-
-        if self.myid == self.master_proc:
-            if self.myid != self.inlet_master_proc[0]:
-                area0 = pypar.receive(self.inlet_master_proc[0])
-        elif self.myid == self.inlet_master_proc[0]:
-            pypar.send(area0, self.master_proc)
-        
-        # area1
-        if self.myid in self.inlet_procs[1]:
-            area1 = self.inlets[1].get_global_area()
-
-        if self.myid == self.master_proc:
-            if self.myid != self.inlet_master_proc[1]:
-                area1 = pypar.receive(self.inlet_master_proc[1])
-        elif self.myid == self.inlet_master_proc[1]:
-            pypar.send(area1, self.master_proc)
+        area0 = self.communicate_global_area(0)
+        area1 = self.communicate_global_area(1)
 
         # Compute discharge
         if self.myid == self.master_proc:
@@ -427,30 +348,14 @@ class Parallel_Internal_boundary_operator(Parallel_Structure_operator):
             self.driving_energy=numpy.nan
 
 
-        self.inflow_index = 0
-        self.outflow_index = 1
         # master proc orders reversal if applicable
+        reverse = None
         if self.myid == self.master_proc:
 
             # Reverse the inflow and outflow direction?
-            if Q < 0.:
-                self.inflow_index = 1
-                self.outflow_index = 0
-
-                for i in self.procs:
-                    if i == self.master_proc: continue
-                    pypar.send(True, i)
-            else:
-                for i in self.procs:
-                    if i == self.master_proc: continue
-                    pypar.send(False, i)
-
-        else:
-            reverse = pypar.receive(self.master_proc)
+            reverse = Q < 0.
 
-            if reverse:
-                self.inflow_index = 1
-                self.outflow_index = 0
+        self.communicate_reverse(reverse)
 
         # Master proc computes return values
         if self.myid == self.master_proc:
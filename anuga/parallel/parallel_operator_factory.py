@@ -18,6 +18,7 @@ from parallel_boyd_box_operator import Parallel_Boyd_box_operator
 from parallel_boyd_pipe_operator import Parallel_Boyd_pipe_operator
 from parallel_weir_orifice_trapezoid_operator import Parallel_Weir_orifice_trapezoid_operator
 from parallel_internal_boundary_operator import Parallel_Internal_boundary_operator
+from parallel_structure_manager import get_structure_manager
 
 from . import distribute, myid, numprocs, finalize
 from anuga.geometry.polygon import inside_polygon, is_inside_polygon, line_intersect
@@ -251,33 +252,43 @@ def Boyd_box_operator(domain,
         print "Inlet Exchange Lines are " + str(line0) + " and " + str(line1)
         print "========================================================"
 
+    # All processors keep a slot for the structure in the structure manager
+    manager = get_structure_manager(domain, procs)
+    if manager is not None:
+        slot = manager.allocate_slot()
+
     if alloc0 or alloc1:
-        return Parallel_Boyd_box_operator(domain=domain,
-                                         losses=losses,
-                                         width=width,
-                                         height=height,
-                                         blockage=blockage,
-                                         barrels=barrels,
-                                         end_points=end_points,
-                                         exchange_lines=exchange_lines,
-                                         enquiry_points=enquiry_points,
-                                         invert_elevations=invert_elevations,
-                                         apron=apron,
-                                         manning=manning,
-                                         enquiry_gap=enquiry_gap,
-                                         smoothing_timescale=smoothing_timescale,
-                                         use_momentum_jet=use_momentum_jet,
-                                         use_velocity_head=use_velocity_head,
-                                         description=description,
-                                         label=label,
-                                         structure_type=structure_type,
-                                         logging=logging,
-                                         verbose=verbose,
-                                         master_proc = inlet0_master_proc,
-                                         procs = structure_procs,
-                                         inlet_master_proc = inlet_master_proc,
-                                         inlet_procs = inlet_procs,
-                                         enquiry_proc = enquiry_proc)
+        operator = Parallel_Boyd_box_operator(domain=domain,
+                                              losses=losses,
+                                              width=width,
+                                              height=height,
+                                              blockage=blockage,
+                                              barrels=barrels,
+                                              end_points=end_points,
+                                              exchange_lines=exchange_lines,
+                                              enquiry_points=enquiry_points,
+                                              invert_elevations=invert_elevations,
+                                              apron=apron,
+                                              manning=manning,
+                                              enquiry_gap=enquiry_gap,
+                                              smoothing_timescale=smoothing_timescale,
+                                              use_momentum_jet=use_momentum_jet,
+                                              use_velocity_head=use_velocity_head,
+                                              description=description,
+                                              label=label,
+                                              structure_type=structure_type,
+                                              logging=logging,
+                                              verbose=verbose,
+                                              master_proc = inlet0_master_proc,
+                                              procs = structure_procs,
+                                              inlet_master_proc = inlet_master_proc,
+                                              inlet_procs = inlet_procs,
+                                              enquiry_proc = enquiry_proc)
+
+        if manager is not None:
+            manager.add_structure(slot, operator)
+
+        return operator
     else:
         return None
 
@@ -416,32 +427,42 @@ def Boyd_pipe_operator(domain,
         print "Inlet Exchange Lines are " + str(line0) + " and " + str(line1)
         print "========================================================"
 
+    # All processors keep a slot for the structure in the structure manager
+    manager = get_structure_manager(domain, procs)
+    if manager is not None:
+        slot = manager.allocate_slot()
+
     if alloc0 or alloc1:
-       return Parallel_Boyd_pipe_operator(domain=domain,
-                                         losses=losses,
-                                         diameter=diameter,
-                                         blockage=blockage,
-                                         barrels=barrels,
-                                         end_points=end_points,
-                                         exchange_lines=exchange_lines,
-                                         enquiry_points=enquiry_points,
-                                         invert_elevations=invert_elevations,
-                                         apron=apron,
-                                         manning=manning,
-                                         enquiry_gap=enquiry_gap,
-                                         smoothing_timescale=smoothing_timescale,
-                                         use_momentum_jet=use_momentum_jet,
-                                         use_velocity_head=use_velocity_head,
-                                         description=description,
-                                         label=label,
-                                         structure_type=structure_type,
-                                         logging=logging,
-                                         verbose=verbose,
-                                         master_proc = inlet0_master_proc,
-                                         procs = structure_procs,
-                                         inlet_master_proc = inlet_master_proc,
-                                         inlet_procs = inlet_procs,
-                                         enquiry_proc = enquiry_proc)
+        operator = Parallel_Boyd_pipe_operator(domain=domain,
+                                               losses=losses,
+                                               diameter=diameter,
+                                               blockage=blockage,
+                                               barrels=barrels,
+                                               end_points=end_points,
+                                               exchange_lines=exchange_lines,
+                                               enquiry_points=enquiry_points,
+                                               invert_elevations=invert_elevations,
+                                               apron=apron,
+                                               manning=manning,
+                                               enquiry_gap=enquiry_gap,
+                                               smoothing_timescale=smoothing_timescale,
+                                               use_momentum_jet=use_momentum_jet,
+                                               use_velocity_head=use_velocity_head,
+                                               description=description,
+                                               label=label,
+                                               structure_type=structure_type,
+                                               logging=logging,
+                                               verbose=verbose,
+                                               master_proc = inlet0_master_proc,
+                                               procs = structure_procs,
+                                               inlet_master_proc = inlet_master_proc,
+                                               inlet_procs = inlet_procs,
+                                               enquiry_proc = enquiry_proc)
+
+        if manager is not None:
+            manager.add_structure(slot, operator)
+
+        return operator
     else:
         return None
 
@@ -597,36 +618,46 @@ def Weir_orifice_trapezoid_operator(domain,
         print "Inlet Exchange Lines are " + str(line0) + " and " + str(line1)
         print "========================================================"
 
+    # All processors keep a slot for the structure in the structure manager
+    manager = get_structure_manager(domain, procs)
+    if manager is not None:
+        slot = manager.allocate_slot()
+
     if alloc0 or alloc1:
-        return Parallel_Weir_orifice_trapezoid_operator(domain=domain,
-                                         losses=losses,
-                                         width=width,
-                                         height=height,
-                                         blockage=blockage,
-                                         barrels=barrels,
-                                         z1=z1,
-                                         z2=z2,
-                                         #culvert_slope=culvert_slope,
-                                         end_points=end_points,
-                                         exchange_lines=exchange_lines,
-                                         enquiry_points=enquiry_points,
-                                         invert_elevations=invert_elevations,
-                                         apron=apron,
-                                         manning=manning,
-                                         enquiry_gap=enquiry_gap,
-                                         smoothing_timescale=smoothing_timescale,
-                                         use_momentum_jet=use_momentum_jet,
-                                         use_velocity_head=use_velocity_head,
-                                         description=description,
-                                         label=label,
-                                         structure_type=structure_type,
-                                         logging=logging,
-                                         verbose=verbose,
-                                         master_proc = inlet0_master_proc,
-                                         procs = structure_procs,
-                                         inlet_master_proc = inlet_master_proc,
-                                         inlet_procs = inlet_procs,
-                                         enquiry_proc = enquiry_proc)
+        operator = Parallel_Weir_orifice_trapezoid_operator(domain=domain,
+                                                            losses=losses,
+                                                            width=width,
+                                                            height=height,
+                                                            blockage=blockage,
+                                                            barrels=barrels,
+                                                            z1=z1,
+                                                            z2=z2,
+                                                            #culvert_slope=culvert_slope,
+                                                            end_points=end_points,
+                                                            exchange_lines=exchange_lines,
+                                                            enquiry_points=enquiry_points,
+                                                            invert_elevations=invert_elevations,
+                                                            apron=apron,
+                                                            manning=manning,
+                                                            enquiry_gap=enquiry_gap,
+                                                            smoothing_timescale=smoothing_timescale,
+                                                            use_momentum_jet=use_momentum_jet,
+                                                            use_velocity_head=use_velocity_head,
+                                                            description=description,
+                                                            label=label,
+                                                            structure_type=structure_type,
+                                                            logging=logging,
+                                                            verbose=verbose,
+                                                            master_proc = inlet0_master_proc,
+                                                            procs = structure_procs,
+                                                            inlet_master_proc = inlet_master_proc,
+                                                            inlet_procs = inlet_procs,
+                                                            enquiry_proc = enquiry_proc)
+
+        if manager is not None:
+            manager.add_structure(slot, operator)
+
+        return operator
     else:
         return None
 
@@ -769,32 +800,42 @@ def Internal_boundary_operator(domain,
         print "Inlet Exchange Lines are " + str(line0) + " and " + str(line1)
         print "========================================================"
 
+    # All processors keep a slot for the structure in the structure manager
+    manager = get_structure_manager(domain, procs)
+    if manager is not None:
+        slot = manager.allocate_slot()
+
     if alloc0 or alloc1:
-        return Parallel_Internal_boundary_operator(domain=domain,
-                                         internal_boundary_function=internal_boundary_function,
-                                         width=width,
-                                         height=height,
-                                         end_points=end_points,
-                                         exchange_lines=exchange_lines,
-                                         enquiry_points=enquiry_points,
-                                         invert_elevation=invert_elevation,
-                                         apron=apron,
-                                         enquiry_gap=enquiry_gap,
-                                         use_velocity_head=use_velocity_head,
-                                         zero_outflow_momentum=zero_outflow_momentum,
-                                         force_constant_inlet_elevations=force_constant_inlet_elevations,
-                                         smoothing_timescale=smoothing_timescale,
-                                         compute_discharge_implicitly=compute_discharge_implicitly,
-                                         description=description,
-                                         label=label,
-                                         structure_type=structure_type,
-                                         logging=logging,
-                                         verbose=verbose,
-                                         master_proc = inlet0_master_proc,
-                                         procs = structure_procs,
-                                         inlet_master_proc = inlet_master_proc,
-                                         inlet_procs = inlet_procs,
-                                         enquiry_proc = enquiry_proc)
+        operator = Parallel_Internal_boundary_operator(domain=domain,
+                                                       internal_boundary_function=internal_boundary_function,
+                                                       width=width,
+                                                       height=height,
+                                                       end_points=end_points,
+                                                       exchange_lines=exchange_lines,
+                                                       enquiry_points=enquiry_points,
+                                                       invert_elevation=invert_elevation,
+                                                       apron=apron,
+                                                       enquiry_gap=enquiry_gap,
+                                                       use_velocity_head=use_velocity_head,
+                                                       zero_outflow_momentum=zero_outflow_momentum,
+                                                       force_constant_inlet_elevations=force_constant_inlet_elevations,
+                                                       smoothing_timescale=smoothing_timescale,
+                                                       compute_discharge_implicitly=compute_discharge_implicitly,
+                                                       description=description,
+                                                       label=label,
+                                                       structure_type=structure_type,
+                                                       logging=logging,
+                                                       verbose=verbose,
+                                                       master_proc = inlet0_master_proc,
+                                                       procs = structure_procs,
+                                                       inlet_master_proc = inlet_master_proc,
+                                                       inlet_procs = inlet_procs,
+                                                       enquiry_proc = enquiry_proc)
+
+        if manager is not None:
+            manager.add_structure(slot, operator)
+
+        return operator
     else:
         return None
 
@@ -20,6 +20,7 @@ import anuga.utilities.parallel_abstraction as pypar
 #from anuga.abstract_2d_finite_volumes.neighbour_mesh import Mesh
 
 import numpy as num
+import time
 from os.path import join
 
 
@@ -106,6 +107,27 @@ class Parallel_domain(Domain):
 
         self.ghost_counter = 0
 
+        # Overlap ghost communication with extrapolation of
+        # triangles away from the ghost layer
+        self.overlap_communication = False
+        self.backup_during_communication = False
+        self.extrapolation_pending = False
+        self.in_timestep = False
+
+        # Write one global sww file from processor 0 rather
+        # than one sww file per processor
+        self.store_global = False
+
+        # Update all structures together with batched communication
+        # (see parallel_structure_manager)
+        self.batch_structures = True
+
+        # Compute time of the processors for measuring the load
+        # imbalance (see get_load_imbalance)
+        self.load_balance_time = time.time()
+        self.load_balance_communication_time = 0.0
+        self.processor_compute_times = num.zeros(self.numproc, num.float)
+
 
     def set_name(self, name):
         """Assign name based on processor number 
@@ -125,6 +147,75 @@ class Parallel_domain(Domain):
         return self.global_name
 
 
+    def set_store_global(self, flag=True):
+        """Write a single sww file (global name) for the whole domain.
+
+        At each store the values of the full triangles of all processors
+        are gathered on processor 0 which writes them at their global
+        positions, so no per processor sww files are written and no
+        sww_merge is needed. Must be set before the sww file is created.
+        """
+
+        self.store_global = flag
+
+
+    def get_store_global(self):
+
+        return self.store_global
+
+
+    def initialise_storage(self):
+        """Create and initialise self.writer object for storing data.
+        Either one sww file per processor or a global sww file.
+        """
+
+        if self.store_global:
+            from anuga.parallel.parallel_sww import Parallel_SWW_file
+
+            self.writer = Parallel_SWW_file(self)
+            self.writer.store_connectivity()
+        else:
+            Domain.initialise_storage(self)
+
+
+    def get_communication_time(self):
+        """Total time spent communicating (including waiting for the
+        other processors)
+        """
+
+        return self.communication_time + self.communication_reduce_time + \
+               self.communication_broadcast_time
+
+
+    def get_load_imbalance(self):
+        """Return the ratio of the maximum to the mean compute time of
+        the processors since the domain was created or the load imbalance
+        was last measured. The compute time is the wall clock time less
+        the communication time, so the time waiting for slower
+        processors is not counted. Must be called on all processors,
+        e.g. at a yield point.
+        """
+
+        now = time.time()
+        communication_time = self.get_communication_time()
+
+        compute_time = (now - self.load_balance_time) - \
+                (communication_time - self.load_balance_communication_time)
+
+        self.load_balance_time = now
+        self.load_balance_communication_time = communication_time
+
+        compute_times = generic_comms.communicate_all_gather(self,
+                                                  max(compute_time, 0.0))
+        self.processor_compute_times = num.array(compute_times, num.float)
+
+        mean_time = num.mean(self.processor_compute_times)
+        if mean_time <= 0.0:
+            return 1.0
+
+        return num.max(self.processor_compute_times)/mean_time
+
+
     def update_timestep(self, yieldstep, finaltime):
         """Calculate local timestep
         """
@@ -139,14 +230,255 @@ class Parallel_domain(Domain):
         """We must send the information from the full cells and
         receive the information for the ghost cells
         """
-            
-        generic_comms.communicate_ghosts_asynchronous(self, quantities)
-        #generic_comms.communicate_ghosts_blocking(self)
+
+        if self.overlap_communication:
+            # The full cells must hold momentum, not velocity, before
+            # they are sent
+            self._complete_extrapolation()
+
+            # Only start the communication, it is completed by
+            # finish_update_ghosts as late as possible
+            generic_comms.communicate_ghosts_finish(self)
+            generic_comms.communicate_ghosts_start(self, quantities)
+        else:
+            generic_comms.communicate_ghosts_asynchronous(self, quantities)
+            #generic_comms.communicate_ghosts_blocking(self)
+
+    def finish_update_ghosts(self):
+        """Complete ghost communication started by update_ghosts
+        when overlapping communication and computation.
+        """
+
+        quantities = self.ghost_communication_quantities
+
+        generic_comms.communicate_ghosts_finish(self)
+
+        if self.backup_during_communication and quantities is not None:
+            # The backup of the rk2/rk3 steps was taken before the ghost
+            # values arrived, so update the ghost part of the backup
+            ghosts = self.ghost_triangles
+            for name in quantities:
+                if name in self.conserved_quantities:
+                    Q = self.quantities[name]
+                    Q.centroid_backup_values[ghosts] = Q.centroid_values[ghosts]
+
+        self.backup_during_communication = False
+
+    def backup_conserved_quantities(self):
+
+        self._complete_extrapolation()
+
+        Domain.backup_conserved_quantities(self)
+
+        self.backup_during_communication = \
+                self.ghost_communication_quantities is not None
+
+    def set_overlap_communication(self, flag=True):
+        """Overlap the ghost communication with computation.
+
+        When set, update_ghosts only starts the communication of the
+        ghost cell data. For the DE flow algorithms the extrapolation of
+        the triangles which do not depend on ghost values, and the fluxes
+        across the edges between them, are computed while the messages
+        are in flight. The communication is completed in compute_fluxes,
+        then the triangles next to and in the ghost layer are extrapolated
+        and the remaining fluxes computed. For other flow algorithms the
+        communication is completed before the extrapolation.
+        """
+
+        self.finish_update_ghosts()
+
+        self.overlap_communication = flag
+        self.extrapolation_pending = False
+
+        if flag:
+            ghost = self.tri_full_flag == 0
+
+            neighbours = self.neighbours
+            surrogates = self.surrogate_neighbours
+
+            def adjacent(mask):
+                return num.any(mask[surrogates], axis=1) | \
+                       num.any((neighbours >= 0) & mask[neighbours], axis=1)
+
+            # Triangles next to the ghost layer, whose dry check uses
+            # ghost values, and the triangles next to those, whose
+            # extrapolation uses the result of such a dry check
+            near = ghost | adjacent(ghost)
+            halo = near | adjacent(near & ~ghost)
+            interior = ~halo
+
+            def indices(mask):
+                return num.flatnonzero(mask).astype(num.int)
+
+            self.ghost_triangles = indices(ghost)
+            self.full_triangles = indices(~ghost)
+            self.interior_dry_triangles = indices(~near)
+            self.halo_dry_triangles = indices(near)
+            self.interior_triangles = indices(interior)
+            self.halo_triangles = indices(halo)
+
+            # Edges between interior triangles
+            self.interior_edges = num.ascontiguousarray(
+                (interior[:,num.newaxis] & (neighbours >= 0) &
+                 interior[neighbours]).astype(num.int))
+
+    def get_overlap_communication(self):
+
+        return self.overlap_communication
+
+    def _overlap_extrapolation(self):
+
+        return self.overlap_communication and \
+               self.compute_fluxes_method == 'DE' and \
+               self.ghost_communication_quantities is not None
+
+    def _check_extrapolation_completed(self):
+        """Between the two parts of an overlapped extrapolation the
+        momentum centroid values hold velocities, so the second part
+        must have run by the end of each timestep.
+        """
+
+        msg = 'The extrapolation of the triangles near the ghost layer '
+        msg += 'was not completed during the timestep'
+        assert not self.extrapolation_pending, msg
+
+    def _complete_extrapolation(self):
+        """Run the second part of a pending extrapolation, so that the
+        centroid values hold the conserved quantities again.
+        """
+
+        if self.extrapolation_pending:
+            self._finish_extrapolation()
+
+    def evolve_one_euler_step(self, yieldstep, finaltime):
+
+        self.in_timestep = True
+        try:
+            Domain.evolve_one_euler_step(self, yieldstep, finaltime)
+        finally:
+            self.in_timestep = False
+
+        self._check_extrapolation_completed()
+
+    def evolve_one_rk2_step(self, yieldstep, finaltime):
+
+        self.in_timestep = True
+        try:
+            Domain.evolve_one_rk2_step(self, yieldstep, finaltime)
+        finally:
+            self.in_timestep = False
+
+        self._check_extrapolation_completed()
+
+    def evolve_one_rk3_step(self, yieldstep, finaltime):
+
+        self.in_timestep = True
+        try:
+            Domain.evolve_one_rk3_step(self, yieldstep, finaltime)
+        finally:
+            self.in_timestep = False
+
+        self._check_extrapolation_completed()
+
+    def distribute_to_vertices_and_edges(self):
+        """Specialisation to overlap ghost communication with the
+        extrapolation of interior triangles.
+
+        Within a timestep the extrapolation of the triangles near the
+        ghost layer is left to compute_fluxes, so the communication stays
+        in flight until the interior fluxes have been computed.
+        """
+
+        self._complete_extrapolation()
+
+        if not self._overlap_extrapolation():
+            self.finish_update_ghosts()
+            Domain.distribute_to_vertices_and_edges(self)
+            return
+
+        from anuga.shallow_water.swDE1_domain_ext import protect_new_part
+        from anuga.shallow_water.swDE1_domain_ext import \
+                extrapolate_second_order_edge_sw_part
+
+        # Extrapolate interior triangles while the messages are in flight
+        protect_new_part(self, self.full_triangles)
+        extrapolate_second_order_edge_sw_part(self, 1,
+                                              self.full_triangles,
+                                              self.interior_dry_triangles,
+                                              self.interior_triangles)
+
+        self.extrapolation_pending = True
+
+        if not self.in_timestep:
+            self._finish_extrapolation()
+
+    def _finish_extrapolation(self):
+        """Complete the ghost communication and extrapolate the
+        triangles next to and in the ghost layer.
+        """
+
+        from anuga.shallow_water.swDE1_domain_ext import protect_new_part
+        from anuga.shallow_water.swDE1_domain_ext import \
+                extrapolate_second_order_edge_sw_part
+
+        assert self.extrapolation_pending
+
+        self.finish_update_ghosts()
+
+        protect_new_part(self, self.ghost_triangles)
+        extrapolate_second_order_edge_sw_part(self, 2,
+                                              self.ghost_triangles,
+                                              self.halo_dry_triangles,
+                                              self.halo_triangles)
+
+        self.extrapolation_pending = False
+
+    def update_boundary(self):
+
+        # Boundary values near the ghost layer are only available once
+        # the extrapolation is completed in compute_fluxes
+        if self.extrapolation_pending:
+            return
+
+        Domain.update_boundary(self)
+
+    def compute_fluxes(self):
+
+        if not self.extrapolation_pending:
+            Domain.compute_fluxes(self)
+            return
+
+        from anuga.shallow_water.swDE1_domain_ext import \
+                compute_fluxes_ext_central_part
+
+        timestep = self.evolve_max_timestep
+
+        # Fluxes between interior triangles while the messages are
+        # still in flight
+        compute_fluxes_ext_central_part(self, timestep,
+                                        self.interior_edges, 1)
+
+        self._finish_extrapolation()
+        Domain.update_boundary(self)
+
+        self.flux_timestep = compute_fluxes_ext_central_part(self, timestep,
+                                                  self.interior_edges, 2)
+
+    def update_extrema(self):
+
+        self._complete_extrapolation()
+
+        # Only wait for the ghost values if they are monitored, otherwise
+        # the communication stays in flight until the next extrapolation
+        if self.quantities_to_be_monitored is not None:
+            self.finish_update_ghosts()
+
+        Domain.update_extrema(self)
 
     def apply_fractional_steps(self):
 
-        for operator in self.fractional_step_operators:
-            operator()
+        Domain.apply_fractional_steps(self)
 
         # PETE: Make sure that there are no deadlocks here
 
@@ -154,19 +486,31 @@ class Parallel_domain(Domain):
 
 
 
-    def sww_merge(self, verbose=False, delete_old=False):
+    def sww_merge(self, verbose=False, delete_old=False, chunk_size=None,
+                  processes=None):
 
         # make sure all the computations have finished
 
         pypar.barrier()
 
         # now on processor 0 pull all the separate sww files together
-        if self.processor == 0 and self.numproc > 1 and self.store :
+        # (a global sww file is already complete)
+        if self.processor == 0 and self.numproc > 1 and self.store \
+               and not self.store_global:
             import anuga.utilities.sww_merge as merge
 
+            if processes is not None and processes > 1:
+                # Forking an MPI process is not safe
+                import warnings
+                msg = 'sww_merge of a parallel domain does not use worker '
+                msg += 'processes, merging in this process'
+                warnings.warn(msg)
+                processes = None
+
             global_name = join(self.get_datadir(),self.get_global_name())
             
-            merge.sww_merge_parallel(global_name,self.numproc,verbose,delete_old)
+            merge.sww_merge_parallel(global_name,self.numproc,verbose,delete_old,
+                                     chunk_size, processes)
 
         # make sure all the merge completes on processor 0 before other
         # processors complete (like when finalize is forgotten in main script)
@@ -0,0 +1,181 @@
+"""Batched communication for parallel structure operators
+
+Each Parallel_Structure_operator (boyd box, boyd pipe, weir orifice
+trapezoid, internal boundary) on its own gathers the state of its inlets and
+enquiry points on its master processor and sends the new inlet values back
+with blocking sends and receives of scalars, several round trips per
+structure and timestep.
+
+The structure manager of a Parallel_domain instead updates all structures
+of the domain together, with two allreduce operations per timestep:
+
+1. Every processor adds the local sums over its inlet triangles (area,
+   water volume, stage, xmomentum and ymomentum times area) and the values
+   of the enquiry points it holds into one array with a row per structure.
+   After the first allreduce every processor has the global values of all
+   inlets and enquiry points.
+
+2. The master processor of each structure computes the discharge (without
+   communication) and the new inlet values, which are summed into a second
+   array. After the second allreduce all inlet processors set the new
+   values.
+
+The manager is created by the structure factories in
+parallel_operator_factory when a structure is allocated over all
+processors, and is registered as a fractional step operator at the position
+of the first structure. The __call__ of the managed structures does
+nothing. Batching is switched off with domain.set_batch_structures(False)
+before the structures are created.
+"""
+
+import numpy as num
+
+import anuga
+import anuga.utilities.parallel_abstraction as pypar
+
+
+# Fields of the state of each inlet
+inlet_state_fields = ['area', 'volume', 'stage', 'xmom', 'ymom']
+
+# Values of the enquiry point of each inlet
+enquiry_state_fields = ['total_energy', 'stage', 'depth', 'specific_energy']
+
+number_of_state_fields = len(inlet_state_fields) + len(enquiry_state_fields)
+
+# Fields of the update of each structure: direction of the flow and
+# new depth, xmom, ymom of the inflow and outflow inlets
+update_fields = ['inflow_index',
+                 'inflow_depth', 'inflow_xmom', 'inflow_ymom',
+                 'outflow_depth', 'outflow_xmom', 'outflow_ymom']
+
+number_of_update_fields = len(update_fields)
+
+
+class Parallel_Structure_manager(anuga.Operator):
+    """Update all parallel structures of a domain with batched
+    communication. Must exist on all processors, with the structures
+    allocated in the same order.
+    """
+
+    def __init__(self, domain, verbose=False):
+
+        anuga.Operator.__init__(self, domain, label='structure_manager',
+                                verbose=verbose)
+
+        self.myid = pypar.rank()
+        self.numproc = pypar.size()
+
+        # Structure of each slot, None on processors without the structure
+        self.structures = []
+
+
+    def allocate_slot(self):
+        """Reserve a slot for a structure, must be called by all
+        processors for each structure.
+        """
+
+        self.structures.append(None)
+
+        return len(self.structures) - 1
+
+
+    def add_structure(self, slot, structure):
+
+        self.structures[slot] = structure
+        structure.manager = self
+
+
+    def get_number_of_structures(self):
+
+        return len(self.structures)
+
+
+    def allreduce(self, x):
+        """Return the elementwise sum of x over all processors
+        """
+
+        if self.numproc == 1:
+            return x
+
+        import anuga.parallel.pypar_ext as par_exts
+
+        buffer = num.zeros_like(x)
+        par_exts.allreduce(x, pypar.SUM, buffer=buffer, bypass=True)
+
+        return buffer
+
+
+    def __call__(self):
+
+        n = len(self.structures)
+
+        if n == 0:
+            return
+
+        local_state = num.zeros((n, 2, number_of_state_fields), num.float)
+        for slot, structure in enumerate(self.structures):
+            if structure is not None:
+                structure.get_local_state(local_state[slot])
+
+        state = self.allreduce(local_state)
+
+        local_update = num.zeros((n, number_of_update_fields), num.float)
+        for slot, structure in enumerate(self.structures):
+            if structure is not None and self.myid == structure.master_proc:
+                structure.compute_update(state[slot], local_update[slot])
+
+        update = self.allreduce(local_update)
+
+        for slot, structure in enumerate(self.structures):
+            if structure is not None:
+                structure.apply_update(update[slot])
+
+
+    def parallel_safe(self):
+
+        return True
+
+
+    def statistics(self):
+
+        message = 'Structure manager of %d structures' % len(self.structures)
+        return message
+
+
+    def timestepping_statistics(self):
+
+        return ''
+
+
+    # The managed structures report their own statistics
+    def print_statistics(self):
+
+        pass
+
+
+    def print_timestepping_statistics(self):
+
+        pass
+
+
+    def log_timestepping_statistics(self):
+
+        pass
+
+
+def get_structure_manager(domain, procs):
+    """Return the structure manager of domain, created on first use, or
+    None if batching is switched off or procs is not the set of all
+    processors (the allreduce operations involve all processors).
+    """
+
+    if not domain.get_batch_structures():
+        return None
+
+    if sorted(procs) != range(pypar.size()):
+        return None
+
+    if getattr(domain, 'structure_manager', None) is None:
+        domain.structure_manager = Parallel_Structure_manager(domain)
+
+    return domain.structure_manager
@@ -4,6 +4,9 @@ import math
 import parallel_inlet_enquiry 
 import pypar
 
+from parallel_structure_manager import inlet_state_fields, \
+     enquiry_state_fields, number_of_update_fields
+
 from anuga.utilities.system_tools import log_to_file
 from anuga.utilities.numerical_tools import ensure_numeric
 from anuga.structures.inlet_enquiry import Inlet_enquiry
@@ -249,10 +252,20 @@ class Parallel_Structure_operator(anuga.Operator):
         self.inflow_index = 0
         self.outflow_index = 1
 
+        # Set by a Parallel_Structure_manager which updates this structure
+        # together with the other structures of the domain, global_state
+        # holds the global inlet and enquiry values of the current update
+        self.manager = None
+        self.global_state = None
+
         self.set_parallel_logging(logging)
 
     def __call__(self):
 
+        # Managed structures are updated by the structure manager
+        if self.manager is not None:
+            return
+
         timestep = self.domain.get_timestep()
 
         Q, barrel_speed, outlet_depth = self.discharge_routine()
@@ -280,71 +293,12 @@ class Parallel_Structure_operator(anuga.Operator):
             pypar.send(old_inflow_ymom, self.master_proc)
             pypar.send(inflow_area, self.master_proc)
 
-        # Implement the update of flow over a timestep by
-        # using a semi-implict update. This ensures that
-        # the update does not create a negative depth
-        
         # Master proc of structure only
         if self.myid == self.master_proc:
-            if old_inflow_depth > 0.0 :
-                dt_Q_on_d = timestep*Q/old_inflow_depth
-            else:
-                dt_Q_on_d = 0.0
-
-            # Check whether we should use the wet-dry Q adjustment (where Q is
-            # multiplied by new_inflow_depth/old_inflow_depth)
-            always_use_Q_wetdry_adjustment = self.always_use_Q_wetdry_adjustment
-            # Always use it if we are near wet-dry
-            use_Q_wetdry_adjustment = ((always_use_Q_wetdry_adjustment) |\
-                (old_inflow_depth*inflow_area <= Q*timestep))
-
-            factor = 1.0/(1.0 + dt_Q_on_d/inflow_area)
-        
-            if use_Q_wetdry_adjustment:
-                new_inflow_depth = old_inflow_depth*factor
-                if old_inflow_depth > 0.:
-                    timestep_star = timestep*new_inflow_depth/old_inflow_depth
-                else:
-                    timestep_star = 0.
-            else:
-                new_inflow_depth = old_inflow_depth - timestep*Q/inflow_area
-                timestep_star = timestep
-
-            #new_inflow_xmom = old_inflow_xmom*factor
-            #new_inflow_ymom = old_inflow_ymom*factor
-            if(self.use_old_momentum_method):
-                # This method is here for consistency with the old version of the
-                # routine
-                new_inflow_xmom = old_inflow_xmom*factor
-                new_inflow_ymom = old_inflow_ymom*factor
-
-            else:
-                # For the momentum balance, note that Q also transports the velocity,
-                # which has an average value of new_inflow_mom/depth (or old_inflow_mom/depth). 
-                #
-                #     new_inflow_xmom*inflow_area = 
-                #     old_inflow_xmom*inflow_area - 
-                #     timestep*Q*(new_inflow_xmom/old_inflow_depth)
-                # and:
-                #     new_inflow_ymom*inflow_area = 
-                #     old_inflow_ymom*inflow_area - 
-                #     timestep*Q*(new_inflow_ymom/old_inflow_depth)
-                #
-                # The choice of new_inflow_mom in the final term might be
-                # replaced with old_inflow_mom.
-                #
-                # The units balance: (m^2/s)*(m^2) = (m^2/s)*(m^2) - s*(m^3/s)*(m^2/s)*(m^(-1))
-                #
-                if old_inflow_depth > 0.:
-                    if use_Q_wetdry_adjustment:
-                        factor2 = 1.0/(1.0 + dt_Q_on_d*new_inflow_depth/(old_inflow_depth*inflow_area))
-                    else:
-                        factor2 = 1.0/(1.0 + timestep*Q/(old_inflow_depth*inflow_area))
-                else:
-                    factor2 = 0.
-
-                new_inflow_xmom = old_inflow_xmom*factor2
-                new_inflow_ymom = old_inflow_ymom*factor2
+            new_inflow_depth, new_inflow_xmom, new_inflow_ymom, timestep_star = \
+                self.compute_new_inflow(Q, timestep, old_inflow_depth,
+                                        old_inflow_xmom, old_inflow_ymom,
+                                        inflow_area)
 
         # Master proc of structure sends new inflow attributes to all inflow inlet processors
 
@@ -390,61 +344,16 @@ class Parallel_Structure_operator(anuga.Operator):
 
         # Master proc of structure computes new outflow attributes
         if self.myid == self.master_proc:
-            loss = (old_inflow_depth - new_inflow_depth)*inflow_area
-            xmom_loss = (old_inflow_xmom - new_inflow_xmom)*inflow_area
-            ymom_loss = (old_inflow_ymom - new_inflow_ymom)*inflow_area
-
-            # set outflow
-            outflow_extra_depth = Q*timestep_star/outflow_area
-            outflow_direction = - outflow_outward_culvert_vector
-            #outflow_extra_momentum = outflow_extra_depth*barrel_speed*outflow_direction
-            
-            gain = outflow_extra_depth*outflow_area
-
-            # Update Stats
-            self.discharge  = Q*timestep_star/timestep #outflow_extra_depth*self.outflow.get_area()/timestep
-            self.discharge_abs_timemean += Q*timestep_star/self.domain.yieldstep
-            self.velocity = barrel_speed #self.discharge/outlet_depth/self.width
-
-            new_outflow_depth = outflow_average_depth + outflow_extra_depth
-
-            self.outlet_depth = new_outflow_depth
-            #if self.use_momentum_jet :
-            #    # FIXME (SR) Review momentum to account for possible hydraulic jumps at outlet
-            #    #new_outflow_xmom = outflow.get_average_xmom() + outflow_extra_momentum[0]
-            #    #new_outflow_ymom = outflow.get_average_ymom() + outflow_extra_momentum[1]
-
-            #    new_outflow_xmom = barrel_speed*new_outflow_depth*outflow_direction[0]
-            #    new_outflow_ymom = barrel_speed*new_outflow_depth*outflow_direction[1]
-
-            #else:
-            #    #new_outflow_xmom = outflow.get_average_xmom()
-            #    #new_outflow_ymom = outflow.get_average_ymom()
-
-            #    new_outflow_xmom = 0.0
-            #    new_outflow_ymom = 0.0
-            if self.use_momentum_jet:
-                # FIXME (SR) Review momentum to account for possible hydraulic jumps at outlet
-                # FIXME (GD) Depending on barrel speed I think this will be either
-                # a source or sink of momentum (considering the momentum losses
-                # above). Might not always be reasonable.
-                #new_outflow_xmom = self.outflow.get_average_xmom() + outflow_extra_momentum[0]
-                #new_outflow_ymom = self.outflow.get_average_ymom() + outflow_extra_momentum[1]
-                new_outflow_xmom = barrel_speed*new_outflow_depth*outflow_direction[0]
-                new_outflow_ymom = barrel_speed*new_outflow_depth*outflow_direction[1]
-                
-            elif self.zero_outflow_momentum:
-                new_outflow_xmom = 0.0
-                new_outflow_ymom = 0.0
-                #new_outflow_xmom = outflow.get_average_xmom()
-                #new_outflow_ymom = outflow.get_average_ymom()
-
-            else:
-                # Add the momentum lost from the inflow to the outflow. For
-                # structures where barrel_speed is unknown + direction doesn't
-                # change from inflow to outflow
-                new_outflow_xmom = outflow_average_xmom + xmom_loss/outflow_area
-                new_outflow_ymom = outflow_average_ymom + ymom_loss/outflow_area
+            new_outflow_depth, new_outflow_xmom, new_outflow_ymom = \
+                self.compute_new_outflow(Q, barrel_speed, timestep, timestep_star,
+                                         old_inflow_depth, old_inflow_xmom,
+                                         old_inflow_ymom, inflow_area,
+                                         new_inflow_depth, new_inflow_xmom,
+                                         new_inflow_ymom, outflow_area,
+                                         outflow_average_depth,
+                                         outflow_outward_culvert_vector,
+                                         outflow_average_xmom,
+                                         outflow_average_ymom)
 
             # master proc of structure sends outflow attributes to all outflow procs
             for i in self.inlet_procs[self.outflow_index]:
@@ -464,6 +373,335 @@ class Parallel_Structure_operator(anuga.Operator):
             self.inlets[self.outflow_index].set_xmoms(new_outflow_xmom)
             self.inlets[self.outflow_index].set_ymoms(new_outflow_ymom)
 
+
+    def get_local_state(self, state):
+        """Add the contribution of this processor to the state (one row
+        per inlet, fields inlet_state_fields and enquiry_state_fields of
+        parallel_structure_manager) of the structure. Summed over all
+        processors the inlet fields are the totals over the inlet
+        triangles and the enquiry fields are the values at the enquiry
+        points.
+        """
+
+        n = len(inlet_state_fields)
+
+        for i, inlet in enumerate(self.inlets):
+            if inlet is None:
+                continue
+
+            areas = inlet.get_areas()
+
+            state[i, 0] = inlet.get_area()
+            state[i, 1] = num.sum(inlet.get_depths()*areas)
+            state[i, 2] = num.sum(inlet.get_stages()*areas)
+            state[i, 3] = num.sum(inlet.get_xmoms()*areas)
+            state[i, 4] = num.sum(inlet.get_ymoms()*areas)
+
+            if self.myid == self.enquiry_proc[i]:
+                for j, name in enumerate(enquiry_state_fields):
+                    state[i, n + j] = getattr(inlet, 'get_enquiry_' + name)()
+
+
+    def compute_update(self, state, update):
+        """Compute the discharge and the new inlet values from the global
+        state of the structure. Called by the structure manager on the
+        master proc only, update gets the fields update_fields of
+        parallel_structure_manager.
+        """
+
+        self.global_state = state
+
+        timestep = self.domain.get_timestep()
+
+        Q, barrel_speed, outlet_depth = self.discharge_routine()
+
+        # Global averages over the inlets
+        average = num.zeros((2, 4), num.float)
+        for i in [0, 1]:
+            if state[i, 0] > 0.0:
+                average[i] = state[i, 1:5]/state[i, 0]
+
+        inflow_area = state[self.inflow_index, 0]
+        old_inflow_depth, old_inflow_stage, old_inflow_xmom, old_inflow_ymom = \
+                                                    average[self.inflow_index]
+
+        new_inflow_depth, new_inflow_xmom, new_inflow_ymom, timestep_star = \
+            self.compute_new_inflow(Q, timestep, old_inflow_depth,
+                                    old_inflow_xmom, old_inflow_ymom,
+                                    inflow_area)
+
+        if self.outflow_index == 0:
+            outflow_outward_culvert_vector = self.culvert_vector
+        else:
+            outflow_outward_culvert_vector = - self.culvert_vector
+
+        outflow_area = state[self.outflow_index, 0]
+        outflow_average_depth, _, outflow_average_xmom, outflow_average_ymom = \
+                                                    average[self.outflow_index]
+
+        new_outflow_depth, new_outflow_xmom, new_outflow_ymom = \
+            self.compute_new_outflow(Q, barrel_speed, timestep, timestep_star,
+                                     old_inflow_depth, old_inflow_xmom,
+                                     old_inflow_ymom, inflow_area,
+                                     new_inflow_depth, new_inflow_xmom,
+                                     new_inflow_ymom, outflow_area,
+                                     outflow_average_depth,
+                                     outflow_outward_culvert_vector,
+                                     outflow_average_xmom,
+                                     outflow_average_ymom)
+
+        update[:] = [self.inflow_index,
+                     new_inflow_depth, new_inflow_xmom, new_inflow_ymom,
+                     new_outflow_depth, new_outflow_xmom, new_outflow_ymom]
+
+        self.global_state = None
+
+
+    def apply_update(self, update):
+        """Set the new inlet values computed by compute_update on the
+        inlet triangles of this processor.
+        """
+
+        assert len(update) == number_of_update_fields
+
+        self.inflow_index = int(update[0])
+        self.outflow_index = 1 - self.inflow_index
+
+        inflow = self.inlets[self.inflow_index]
+        if inflow is not None:
+            inflow.set_depths(update[1])
+            inflow.set_xmoms(update[2])
+            inflow.set_ymoms(update[3])
+
+        outflow = self.inlets[self.outflow_index]
+        if outflow is not None:
+            outflow.set_depths(update[4])
+            outflow.set_xmoms(update[5])
+            outflow.set_ymoms(update[6])
+
+
+    def communicate_enquiry_values(self, index, names):
+        """Return on the master proc the list of values names (from
+        enquiry_state_fields) of the enquiry point of inlet index, sent
+        as one message by the processor of the enquiry point. Must be
+        called by the master proc and the enquiry proc, other processors
+        get a list of None.
+
+        During an update by the structure manager (only on the master
+        proc) the values are taken from the global state without
+        communication.
+        """
+
+        if self.global_state is not None:
+            n = len(inlet_state_fields)
+            return [self.global_state[index, n + enquiry_state_fields.index(name)]
+                    for name in names]
+
+        values = [None]*len(names)
+
+        if self.myid == self.enquiry_proc[index]:
+            inlet = self.inlets[index]
+            values = [getattr(inlet, 'get_enquiry_' + name)() for name in names]
+
+        if self.myid == self.master_proc:
+            if self.myid != self.enquiry_proc[index]:
+                values = pypar.receive(self.enquiry_proc[index])
+        elif self.myid == self.enquiry_proc[index]:
+            pypar.send(values, self.master_proc)
+            values = [None]*len(names)
+
+        return values
+
+
+    def communicate_global_area(self, index):
+        """Return on the master proc the global area of inlet index.
+        Must be called by all processors of the inlet.
+        """
+
+        if self.global_state is not None:
+            return self.global_state[index, 0]
+
+        area = None
+
+        if self.myid in self.inlet_procs[index]:
+            area = self.inlets[index].get_global_area()
+
+        if self.myid == self.master_proc:
+            if self.myid != self.inlet_master_proc[index]:
+                area = pypar.receive(self.inlet_master_proc[index])
+        elif self.myid == self.inlet_master_proc[index]:
+            pypar.send(area, self.master_proc)
+
+        return area
+
+
+    def communicate_reverse(self, reverse):
+        """Send the flow direction decided by the master proc (reverse is
+        True if the flow is from inlet 1 to inlet 0) to all processors of
+        the structure and set inflow_index and outflow_index.
+        """
+
+        if self.global_state is None:
+            if self.myid == self.master_proc:
+                for i in self.procs:
+                    if i == self.master_proc: continue
+                    pypar.send(reverse, i)
+            else:
+                reverse = pypar.receive(self.master_proc)
+
+        if reverse:
+            self.inflow_index = 1
+            self.outflow_index = 0
+        else:
+            self.inflow_index = 0
+            self.outflow_index = 1
+
+        return reverse
+
+
+    def compute_new_inflow(self, Q, timestep, old_inflow_depth,
+                           old_inflow_xmom, old_inflow_ymom, inflow_area):
+        """Return new depth, xmom and ymom of the inflow inlet after
+        removing the discharge Q over timestep, and the timestep over
+        which Q is actually applied.
+        """
+
+        # Implement the update of flow over a timestep by
+        # using a semi-implict update. This ensures that
+        # the update does not create a negative depth
+
+        if old_inflow_depth > 0.0 :
+            dt_Q_on_d = timestep*Q/old_inflow_depth
+        else:
+            dt_Q_on_d = 0.0
+
+        # Check whether we should use the wet-dry Q adjustment (where Q is
+        # multiplied by new_inflow_depth/old_inflow_depth)
+        always_use_Q_wetdry_adjustment = self.always_use_Q_wetdry_adjustment
+        # Always use it if we are near wet-dry
+        use_Q_wetdry_adjustment = ((always_use_Q_wetdry_adjustment) |\
+            (old_inflow_depth*inflow_area <= Q*timestep))
+
+        factor = 1.0/(1.0 + dt_Q_on_d/inflow_area)
+
+        if use_Q_wetdry_adjustment:
+            new_inflow_depth = old_inflow_depth*factor
+            if old_inflow_depth > 0.:
+                timestep_star = timestep*new_inflow_depth/old_inflow_depth
+            else:
+                timestep_star = 0.
+        else:
+            new_inflow_depth = old_inflow_depth - timestep*Q/inflow_area
+            timestep_star = timestep
+
+        #new_inflow_xmom = old_inflow_xmom*factor
+        #new_inflow_ymom = old_inflow_ymom*factor
+        if(self.use_old_momentum_method):
+            # This method is here for consistency with the old version of the
+            # routine
+            new_inflow_xmom = old_inflow_xmom*factor
+            new_inflow_ymom = old_inflow_ymom*factor
+
+        else:
+            # For the momentum balance, note that Q also transports the velocity,
+            # which has an average value of new_inflow_mom/depth (or old_inflow_mom/depth). 
+            #
+            #     new_inflow_xmom*inflow_area = 
+            #     old_inflow_xmom*inflow_area - 
+            #     timestep*Q*(new_inflow_xmom/old_inflow_depth)
+            # and:
+            #     new_inflow_ymom*inflow_area = 
+            #     old_inflow_ymom*inflow_area - 
+            #     timestep*Q*(new_inflow_ymom/old_inflow_depth)
+            #
+            # The choice of new_inflow_mom in the final term might be
+            # replaced with old_inflow_mom.
+            #
+            # The units balance: (m^2/s)*(m^2) = (m^2/s)*(m^2) - s*(m^3/s)*(m^2/s)*(m^(-1))
+            #
+            if old_inflow_depth > 0.:
+                if use_Q_wetdry_adjustment:
+                    factor2 = 1.0/(1.0 + dt_Q_on_d*new_inflow_depth/(old_inflow_depth*inflow_area))
+                else:
+                    factor2 = 1.0/(1.0 + timestep*Q/(old_inflow_depth*inflow_area))
+            else:
+                factor2 = 0.
+
+            new_inflow_xmom = old_inflow_xmom*factor2
+            new_inflow_ymom = old_inflow_ymom*factor2
+
+        return new_inflow_depth, new_inflow_xmom, new_inflow_ymom, timestep_star
+
+
+    def compute_new_outflow(self, Q, barrel_speed, timestep, timestep_star,
+                            old_inflow_depth, old_inflow_xmom, old_inflow_ymom,
+                            inflow_area, new_inflow_depth, new_inflow_xmom,
+                            new_inflow_ymom, outflow_area, outflow_average_depth,
+                            outflow_outward_culvert_vector, outflow_average_xmom,
+                            outflow_average_ymom):
+        """Return new depth, xmom and ymom of the outflow inlet and
+        update the discharge statistics.
+        """
+
+        loss = (old_inflow_depth - new_inflow_depth)*inflow_area
+        xmom_loss = (old_inflow_xmom - new_inflow_xmom)*inflow_area
+        ymom_loss = (old_inflow_ymom - new_inflow_ymom)*inflow_area
+
+        # set outflow
+        outflow_extra_depth = Q*timestep_star/outflow_area
+        outflow_direction = - outflow_outward_culvert_vector
+        #outflow_extra_momentum = outflow_extra_depth*barrel_speed*outflow_direction
+
+        gain = outflow_extra_depth*outflow_area
+
+        # Update Stats
+        self.discharge  = Q*timestep_star/timestep #outflow_extra_depth*self.outflow.get_area()/timestep
+        self.discharge_abs_timemean += Q*timestep_star/self.domain.yieldstep
+        self.velocity = barrel_speed #self.discharge/outlet_depth/self.width
+
+        new_outflow_depth = outflow_average_depth + outflow_extra_depth
+
+        self.outlet_depth = new_outflow_depth
+        #if self.use_momentum_jet :
+        #    # FIXME (SR) Review momentum to account for possible hydraulic jumps at outlet
+        #    #new_outflow_xmom = outflow.get_average_xmom() + outflow_extra_momentum[0]
+        #    #new_outflow_ymom = outflow.get_average_ymom() + outflow_extra_momentum[1]
+
+        #    new_outflow_xmom = barrel_speed*new_outflow_depth*outflow_direction[0]
+        #    new_outflow_ymom = barrel_speed*new_outflow_depth*outflow_direction[1]
+
+        #else:
+        #    #new_outflow_xmom = outflow.get_average_xmom()
+        #    #new_outflow_ymom = outflow.get_average_ymom()
+
+        #    new_outflow_xmom = 0.0
+        #    new_outflow_ymom = 0.0
+        if self.use_momentum_jet:
+            # FIXME (SR) Review momentum to account for possible hydraulic jumps at outlet
+            # FIXME (GD) Depending on barrel speed I think this will be either
+            # a source or sink of momentum (considering the momentum losses
+            # above). Might not always be reasonable.
+            #new_outflow_xmom = self.outflow.get_average_xmom() + outflow_extra_momentum[0]
+            #new_outflow_ymom = self.outflow.get_average_ymom() + outflow_extra_momentum[1]
+            new_outflow_xmom = barrel_speed*new_outflow_depth*outflow_direction[0]
+            new_outflow_ymom = barrel_speed*new_outflow_depth*outflow_direction[1]
+
+        elif self.zero_outflow_momentum:
+            new_outflow_xmom = 0.0
+            new_outflow_ymom = 0.0
+            #new_outflow_xmom = outflow.get_average_xmom()
+            #new_outflow_ymom = outflow.get_average_ymom()
+
+        else:
+            # Add the momentum lost from the inflow to the outflow. For
+            # structures where barrel_speed is unknown + direction doesn't
+            # change from inflow to outflow
+            new_outflow_xmom = outflow_average_xmom + xmom_loss/outflow_area
+            new_outflow_ymom = outflow_average_ymom + ymom_loss/outflow_area
+
+        return new_outflow_depth, new_outflow_xmom, new_outflow_ymom
+
+
     def __process_non_skew_culvert(self):
         """Create lines at the end of a culvert inlet and outlet.
         At either end two lines will be created; one for the actual flow to pass through and one a little further away
@@ -0,0 +1,224 @@
+"""Write a single sww file for a parallel run
+
+By default each Parallel_domain writes its own sww file
+(name_P<numproc>_<processor>.sww) which are merged after the run with
+sww_merge. With
+
+    domain.set_store_global()
+
+the values of the full triangles of each processor are instead sent to
+processor 0 each time the domain is stored, and processor 0 writes them at
+their global position (from tri_l2g and node_l2g) into name.sww. The file
+is the same as the one produced by sww_merge, so there are no per processor
+files and no merge step.
+"""
+
+import numpy as num
+
+import anuga.utilities.parallel_abstraction as pypar
+
+from anuga.file.sww import SWW_file
+from anuga.file.netcdf import NetCDFFile
+from anuga.config import netcdf_mode_w, netcdf_mode_a
+from anuga.utilities.file_utils import create_filename
+
+
+class Parallel_SWW_file(SWW_file):
+    """Interface to a global sww file written by processor 0 of a
+    parallel run. All processors must create it and call
+    store_connectivity and store_timestep together.
+    """
+
+    def __init__(self, domain, mode=netcdf_mode_w):
+
+        SWW_file.__init__(self, domain, mode=mode)
+
+
+    def _create_file(self, mode):
+        """Setup the local to global maps of the stored values and
+        create the global sww file on processor 0.
+        """
+
+        domain = self.domain
+
+        self.processor = domain.processor
+        self.numproc = domain.numproc
+
+        self.filename = create_filename(domain.get_datadir(),
+                                        domain.get_global_name(), 'sww')
+
+        self.number_of_volumes = domain.number_of_global_triangles
+
+        tri_l2g = num.asarray(domain.tri_l2g)
+
+        # Map from local to global points of the sww file
+        if domain.smooth:
+            self.number_of_nodes = domain.number_of_global_nodes
+            self.point_l2g = num.asarray(domain.node_l2g)
+        else:
+            self.number_of_nodes = 3*self.number_of_volumes
+            self.point_l2g = (3*tri_l2g[:, num.newaxis] +
+                              num.arange(3)).ravel()
+
+        Q = domain.quantities.values()[0]
+        _, V = Q.get_vertex_values(xy=False)
+
+        # Only the values of full triangles and their vertices are stored
+        self.volume_ids = num.where(domain.tri_full_flag == 1)[0]
+        self.point_ids = num.unique(V[self.volume_ids])
+
+        self.global_volume_ids = tri_l2g[self.volume_ids]
+        self.global_point_ids = self.point_l2g[self.point_ids]
+
+        # Global volumes of the local full triangles
+        self.global_volumes = self.point_l2g[V[self.volume_ids]]
+
+        # Processor 0 keeps the global ids of all processors
+        self.global_ids = self.gather((self.global_point_ids,
+                                       self.global_volume_ids))
+
+        if self.processor == 0:
+            SWW_file._create_file(self, mode)
+
+
+    def gather(self, local):
+        """Send local to processor 0. On processor 0 return the list of
+        the local data of all processors, elsewhere return None.
+        """
+
+        if self.processor == 0:
+            data = [local]
+            for p in range(1, self.numproc):
+                data.append(pypar.receive(p))
+            return data
+        else:
+            pypar.send(local, 0)
+            return None
+
+
+    def assemble(self, data, centroids=False, dtype=None):
+        """Scatter the list of local values of each processor (as
+        returned by gather on processor 0) into a global array of
+        point (or volume) values.
+        """
+
+        if dtype is None:
+            dtype = self.precision
+
+        if centroids:
+            n = self.number_of_volumes
+            k = 1
+        else:
+            n = self.number_of_nodes
+            k = 0
+
+        values = num.zeros((n,) + data[0].shape[1:], dtype)
+        for local, global_ids in zip(data, self.global_ids):
+            values[global_ids[k]] = local
+
+        return values
+
+
+    def store_connectivity(self):
+        """Store global points, triangles and static quantities.
+        """
+
+        domain = self.domain
+        writer = self.writer
+
+        Q = domain.quantities.values()[0]
+        X, Y, _, _ = Q.get_vertex_values(xy=True, precision=self.precision)
+        points = num.concatenate((X[:, num.newaxis], Y[:, num.newaxis]), axis=1)
+
+        local = [points[self.point_ids], self.global_volumes]
+
+        for name in writer.static_quantities:
+            A, _ = domain.quantities[name].get_vertex_values(xy=False,
+                                                   precision=self.precision)
+            local.append(A[self.point_ids])
+
+        for name in writer.static_c_quantities:
+            A = domain.quantities[name[:-2]].centroid_values
+            local.append(A[self.volume_ids])
+
+        data = self.gather(local)
+
+        if self.processor != 0:
+            return
+
+        points = self.assemble([d[0] for d in data])
+        volumes = self.assemble([d[1] for d in data], centroids=True,
+                                dtype=num.int)
+
+        i = 2
+        static_quantities = {}
+        for name in writer.static_quantities:
+            static_quantities[name] = self.assemble([d[i] for d in data])
+            i += 1
+
+        static_quantities_centroid = {}
+        for name in writer.static_c_quantities:
+            static_quantities_centroid[name] = \
+                    self.assemble([d[i] for d in data], centroids=True)
+            i += 1
+
+        fid = NetCDFFile(self.filename, netcdf_mode_a)
+
+        writer.store_triangulation(fid, points, volumes,
+                                   points_georeference=domain.geo_reference)
+        writer.store_static_quantities(fid, **static_quantities)
+        writer.store_static_quantities_centroid(fid,
+                                                **static_quantities_centroid)
+
+        fid.close()
+
+
+    def store_timestep(self):
+        """Gather the dynamic quantities on processor 0 and store them
+        with the current time.
+        """
+
+        writer = self.writer
+
+        dynamic_quantities, dynamic_quantities_centroid = \
+                                    self._get_dynamic_quantities()
+
+        local = []
+        for name in writer.dynamic_quantities:
+            local.append(dynamic_quantities[name][self.point_ids])
+
+        for name in writer.dynamic_c_quantities:
+            A = dynamic_quantities_centroid[name][self.volume_ids]
+            local.append(A.astype(self.precision))
+
+        data = self.gather(local)
+
+        if self.processor != 0:
+            return
+
+        i = 0
+        dynamic_quantities = {}
+        for name in writer.dynamic_quantities:
+            dynamic_quantities[name] = self.assemble([d[i] for d in data])
+            i += 1
+
+        dynamic_quantities_centroid = {}
+        for name in writer.dynamic_c_quantities:
+            dynamic_quantities_centroid[name] = \
+                    self.assemble([d[i] for d in data], centroids=True)
+            i += 1
+
+        fid = NetCDFFile(self.filename, netcdf_mode_a)
+
+        slice_index = writer.store_quantities(fid,
+                                              time=self.domain.time,
+                                              sww_precision=self.precision,
+                                              **dynamic_quantities)
+
+        if self.store_centroids:
+            writer.store_quantities_centroid(fid,
+                                             slice_index=slice_index,
+                                             sww_precision=self.precision,
+                                             **dynamic_quantities_centroid)
+
+        fid.close()
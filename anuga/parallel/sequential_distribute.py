@@ -13,6 +13,7 @@ from anuga.parallel.distribute_mesh  import extract_submesh
 
 # Mesh partitioning using Metis
 from anuga.parallel.distribute_mesh import build_submesh
+from anuga.parallel.distribute_mesh import build_local_submesh
 from anuga.parallel.distribute_mesh import pmesh_divide_metis_with_map
 
 from anuga.parallel.parallel_shallow_water import Parallel_domain
@@ -32,7 +33,17 @@ class Sequential_distribute(object):
         self.parameters = parameters
 
 
-    def distribute(self, numprocs=1):
+    def distribute(self, numprocs=1, partition=None, weights=None):
+        """Partition the domain into numprocs submeshes.
+
+        If the partition vector (the processor of each triangle) is
+        given the submeshes are not built here, but each one is built
+        separately by extract_submesh(p), so that each processor can
+        build its own submesh.
+
+        weights is the cost of each triangle used by metis to balance
+        the partition (see wet_triangle_weights).
+        """
 
         self.numprocs = numprocs
 
@@ -65,13 +76,19 @@ class Sequential_distribute(object):
         self.number_of_global_nodes = domain.number_of_nodes
         self.boundary_map = domain.boundary_map
 
+        if partition is not None:
+            self.partition = num.asarray(partition, num.int)
+            self.submesh = None
+            self.triangles_per_proc = None
+            self.p2s_map = None
+            return
 
         # Subdivide the mesh
         if verbose: print 'sequential_distribute: Subdivide mesh'
 
         new_nodes, new_triangles, new_boundary, triangles_per_proc, quantities, \
                s2p_map, p2s_map = \
-               pmesh_divide_metis_with_map(domain, numprocs)
+               pmesh_divide_metis_with_map(domain, numprocs, weights)
 
 
         # Build the mesh that should be assigned to each processor,
@@ -94,6 +111,11 @@ class Sequential_distribute(object):
         self.triangles_per_proc = triangles_per_proc
         self.p2s_map =  p2s_map
 
+        # Partition vector, processor number of each original triangle
+        self.partition = num.zeros(domain.number_of_triangles, num.int)
+        self.partition[p2s_map] = num.repeat(num.arange(numprocs),
+                                             triangles_per_proc)
+
 
     def extract_submesh(self, p=0):
         """Build the local mesh for processor p
@@ -109,14 +131,21 @@ class Sequential_distribute(object):
         assert p<self.numprocs
 
 
-        points, vertices, boundary, quantities, \
-            ghost_recv_dict, full_send_dict, \
-            tri_map, node_map, tri_l2g, node_l2g, ghost_layer_width =\
-              extract_submesh(submesh, triangles_per_proc, p2s_map, p)
-
+        if submesh is None:
+            points, vertices, boundary, quantities, \
+                ghost_recv_dict, full_send_dict, \
+                tri_map, node_map, tri_l2g, node_l2g, ghost_layer_width, \
+                number_of_full_nodes, number_of_full_triangles = \
+                  build_local_submesh(self.domain, self.partition,
+                                      self.numprocs, p, self.parameters)
+        else:
+            points, vertices, boundary, quantities, \
+                ghost_recv_dict, full_send_dict, \
+                tri_map, node_map, tri_l2g, node_l2g, ghost_layer_width =\
+                  extract_submesh(submesh, triangles_per_proc, p2s_map, p)
 
-        number_of_full_nodes = len(submesh['full_nodes'][p])
-        number_of_full_triangles = len(submesh['full_triangles'][p])
+            number_of_full_nodes = len(submesh['full_nodes'][p])
+            number_of_full_triangles = len(submesh['full_triangles'][p])
 
 
         if debug:
@@ -212,7 +241,8 @@ class Sequential_distribute(object):
 
 
 
-def sequential_distribute_dump(domain, numprocs=1, verbose=False, partition_dir='.', debug=False, parameters = None):
+def sequential_distribute_dump(domain, numprocs=1, verbose=False, partition_dir='.', debug=False, parameters = None,
+                               weights = None):
     """ Distribute the domain, create parallel domain and pickle result
     """
 
@@ -220,7 +250,7 @@ def sequential_distribute_dump(domain, numprocs=1, verbose=False, partition_dir=
 
     partition = Sequential_distribute(domain, verbose, debug, parameters)
 
-    partition.distribute(numprocs)
+    partition.distribute(numprocs, weights=weights)
 
     # Make sure the partition_dir exists
     if partition_dir == '.' :
@@ -234,6 +264,11 @@ def sequential_distribute_dump(domain, numprocs=1, verbose=False, partition_dir=
             if exception.errno != errno.EEXIST:
                 raise
 
+    # Save the partition vector, so that the processors can instead
+    # build their own submeshes (see concurrent_distribute)
+    partition_name = partition.domain_name + '_P%g_partition.npy' % numprocs
+    num.save(join(partition_dir, partition_name), partition.partition)
+
     import cPickle
     for p in range(0, numprocs):
 
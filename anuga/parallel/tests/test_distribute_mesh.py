@@ -1517,6 +1517,131 @@ class Test_Distribute_Mesh(unittest.TestCase):
 
         #pprint(submesh_cell_1)
 
+    def test_build_local_submesh(self):
+        """
+        Test that the submeshes built separately from the partition
+        vector are the same as those extracted from build_submesh
+        """
+
+        import os
+        import shutil
+        import tempfile
+
+        from anuga import rectangular_cross_domain
+        from anuga.parallel.sequential_distribute import Sequential_distribute
+        from anuga.parallel.sequential_distribute import \
+             sequential_distribute_dump
+
+        domain = rectangular_cross_domain(8, 6)
+        domain.set_quantity('elevation', topography)
+        domain.set_quantity('stage', xcoord)
+        domain.set_quantity('xmomentum', ycoord)
+        domain.set_name('local_submesh')
+
+        numprocs = 3
+
+        # The partition vector is saved with the pickled submeshes
+        partition_dir = tempfile.mkdtemp()
+        sequential_distribute_dump(domain, numprocs,
+                                   partition_dir=partition_dir)
+        partition = num.load(os.path.join(partition_dir,
+                                          'local_submesh_P3_partition.npy'))
+        shutil.rmtree(partition_dir)
+
+        assert len(partition) == domain.number_of_triangles
+        assert num.allclose(num.bincount(partition) > 0, True)
+
+        for parameters in [None, {'ghost_layer_width' : 3}]:
+
+            sequential = Sequential_distribute(domain, parameters=parameters)
+            sequential.distribute(numprocs)
+
+            assert num.all(sequential.partition == partition)
+
+            local = Sequential_distribute(domain, parameters=parameters)
+            local.distribute(numprocs, partition=partition)
+
+            assert local.submesh is None
+
+            for p in range(numprocs):
+
+                kwargs0, points0, vertices0, boundary0, quantities0 = \
+                         sequential.extract_submesh(p)[:5]
+                kwargs1, points1, vertices1, boundary1, quantities1 = \
+                         local.extract_submesh(p)[:5]
+
+                assert num.allclose(points0, points1)
+                assert num.all(vertices0 == vertices1)
+                assert boundary0 == boundary1
+
+                for k in quantities0:
+                    assert num.allclose(quantities0[k], quantities1[k])
+
+                for key in ['number_of_full_nodes', 'number_of_full_triangles',
+                            'ghost_layer_width', 'processor', 'numproc']:
+                    assert kwargs0[key] == kwargs1[key]
+
+                assert num.all(kwargs0['tri_l2g'] == kwargs1['tri_l2g'])
+                assert num.all(kwargs0['node_l2g'] == kwargs1['node_l2g'])
+
+                for key in ['full_send_dict', 'ghost_recv_dict']:
+                    comm0 = kwargs0[key]
+                    comm1 = kwargs1[key]
+                    assert sorted(comm0.keys()) == sorted(comm1.keys())
+                    for q in comm0:
+                        assert num.all(comm0[q][0] == comm1[q][0])
+                        assert num.all(comm0[q][1] == comm1[q][1])
+
+    def test_partition_weighted(self):
+        """
+        Test metis partition balancing the triangle weights of a
+        partly wet domain
+        """
+
+        from anuga import rectangular_cross_domain
+        from anuga.parallel.distribute_mesh import pmesh_partition_metis
+        from anuga.parallel.distribute_mesh import wet_triangle_weights
+        from anuga.parallel.distribute_mesh import pmesh_divide_metis_with_map
+
+        domain = rectangular_cross_domain(20, 10)
+
+        # Wet only for x < 0.25
+        domain.set_quantity('elevation', topography)
+        domain.set_quantity('stage', lambda x, y: -0.125)
+
+        weights = wet_triangle_weights(domain, dry_weight=0.1)
+
+        wet = domain.get_wet_elements()
+        assert 0 < len(wet) < len(domain)
+        assert num.allclose(weights[wet], 1.0)
+        assert num.allclose(num.sum(weights), len(wet) + 0.1*(len(domain)-len(wet)))
+
+        numprocs = 4
+
+        unweighted = pmesh_partition_metis(domain, numprocs)
+        weighted = pmesh_partition_metis(domain, numprocs, weights)
+
+        assert len(weighted) == domain.number_of_triangles
+        assert num.all(num.bincount(weighted, minlength=numprocs) > 0)
+
+        # Sum of the weights of each processor
+        unweighted_cost = num.bincount(unweighted, weights=weights)
+        weighted_cost = num.bincount(weighted, weights=weights)
+
+        imbalance = max(weighted_cost)/num.mean(weighted_cost)
+        assert imbalance < 1.1
+        assert imbalance < max(unweighted_cost)/num.mean(unweighted_cost)
+
+        # Reordered mesh from the weighted partition
+        new_nodes, new_triangles, new_boundary, triangles_per_proc, \
+               quantities, tri_index, p2s_map = \
+               pmesh_divide_metis_with_map(domain, numprocs, weights)
+
+        assert num.all(triangles_per_proc == num.bincount(weighted))
+        assert num.all(new_triangles == domain.triangles[p2s_map])
+        assert num.all(weighted[p2s_map] ==
+                       num.repeat(num.arange(numprocs), triangles_per_proc))
+
 #-------------------------------------------------------------
 
 if __name__ == "__main__":
@@ -0,0 +1,221 @@
+"""
+Test repartitioning a parallel domain to balance the load, e.g.
+as the wet area of an inundation run changes.
+"""
+
+import unittest
+import os
+import tempfile
+import shutil
+
+import numpy as num
+
+from anuga import Reflective_boundary
+from anuga import Dirichlet_boundary
+from anuga import rectangular_cross_domain
+from anuga.abstract_2d_finite_volumes.mesh_factory import rectangular_cross
+from anuga.file.netcdf import NetCDFFile
+from anuga.parallel.parallel_shallow_water import Parallel_domain
+from anuga.parallel.parallel_api import repartition_domain
+
+from anuga import distribute, myid, numprocs, barrier, finalize
+
+#--------------------------------------------------------------------------
+# Setup parameters
+#--------------------------------------------------------------------------
+nprocs = 3
+verbose = False
+
+
+def topography(x, y):
+    return -x/2
+
+
+def set_boundaries(domain):
+
+    Br = Reflective_boundary(domain)
+    Bd = Dirichlet_boundary([-0.1, 0.0, 0.0])
+    domain.set_boundary({'left': Br, 'right': Bd, 'top': Br, 'bottom': Br})
+
+
+def run_simulation(rebalance=False):
+
+    from anuga import wet_triangle_weights, repartition
+
+    domain = rectangular_cross_domain(12, 8)
+    domain.set_quantity('elevation', topography)
+    domain.set_quantity('stage', -0.4)
+    domain.set_flow_algorithm('DE0')
+
+    if rebalance:
+        domain.set_name('repartitioned')
+    else:
+        domain.set_name('distributed')
+
+    weights = wet_triangle_weights(domain)
+
+    domain = distribute(domain, weights=weights)
+
+    domain.set_store_global()
+    domain.set_store_centroids(True)
+    set_boundaries(domain)
+
+    for t in domain.evolve(yieldstep=0.25, finaltime=0.25):
+        pass
+
+    if rebalance:
+        domain = repartition(domain)
+        set_boundaries(domain)
+
+    for t in domain.evolve(yieldstep=0.25, finaltime=0.5):
+        pass
+
+
+class Test_parallel_repartition(unittest.TestCase):
+
+    def setUp(self):
+        self.datadir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.datadir)
+
+    def test_repartition_domain(self):
+        """Repartitioned domain has the same mesh and state as the
+        original domain and continues storing into the global sww file.
+        """
+
+        points, vertices, boundary = rectangular_cross(6, 4)
+        points = num.array(points)
+        vertices = num.array(vertices)
+
+        # Local numbering of the parallel domain
+        num.random.seed(15)
+        node_l2g = num.random.permutation(len(points))
+        tri_l2g = num.random.permutation(len(vertices))
+
+        node_g2l = num.argsort(node_l2g)
+        tri_g2l = num.argsort(tri_l2g)
+
+        l_boundary = {}
+        for (t, e), tag in boundary.items():
+            l_boundary[(tri_g2l[t], e)] = tag
+
+        domain = Parallel_domain(points[node_l2g], node_g2l[vertices[tri_l2g]],
+                                 l_boundary,
+                                 processor=0, numproc=1,
+                                 number_of_global_triangles=len(vertices),
+                                 number_of_global_nodes=len(points),
+                                 tri_l2g=tri_l2g,
+                                 node_l2g=node_l2g)
+
+        domain.set_quantity('elevation', lambda x, y: -x)
+        domain.set_quantity('stage', lambda x, y: 0.1*y - 0.5)
+        domain.set_name('repartition')
+        domain.set_datadir(self.datadir)
+        domain.set_store_global()
+        domain.set_store_centroids(True)
+        set_boundaries(domain)
+
+        domain.initialise_storage()
+        domain.store_timestep()
+
+        domain.set_time(1.0)
+        domain.quantities['stage'].centroid_values[:] += \
+                                    0.01*num.arange(len(domain))
+        domain.store_timestep()
+
+        assert num.allclose(domain.get_load_imbalance(), 1.0)
+
+        domain.set_checkpointing(checkpoint_dir=self.datadir,
+                                 checkpoint_step=3,
+                                 checkpoint_format='binary')
+
+        new_domain = repartition_domain(domain)
+
+        assert new_domain is not domain
+        assert new_domain.get_time() == 1.0
+        assert new_domain.get_global_name() == 'repartition'
+        assert new_domain.get_store_global()
+        assert new_domain.checkpoint
+        assert new_domain.checkpoint_dir == self.datadir
+        assert new_domain.checkpoint_step == 3
+        assert new_domain.checkpoint_format == 'binary'
+        assert new_domain.number_of_global_triangles == len(vertices)
+        assert len(new_domain) == len(vertices)
+
+        # Same global mesh
+        new_tri_l2g = num.asarray(new_domain.tri_l2g)
+        new_node_l2g = num.asarray(new_domain.node_l2g)
+        assert num.all(new_node_l2g[new_domain.triangles] ==
+                       vertices[new_tri_l2g])
+        assert num.allclose(new_domain.get_nodes(), points[new_node_l2g])
+
+        # Same centroid and vertex values
+        for name in domain.quantities:
+            Q = domain.quantities[name]
+            new_Q = new_domain.quantities[name]
+
+            centroid_values = num.zeros(len(vertices))
+            centroid_values[tri_l2g] = Q.centroid_values
+            assert num.allclose(new_Q.centroid_values,
+                                centroid_values[new_tri_l2g])
+
+            vertex_values = num.zeros((len(vertices), 3))
+            vertex_values[tri_l2g] = Q.vertex_values
+            assert num.allclose(new_Q.vertex_values,
+                                vertex_values[new_tri_l2g])
+
+        # Carry on storing into the same sww file
+        set_boundaries(new_domain)
+        new_domain.set_time(2.0)
+        new_domain.store_timestep()
+
+        stage = num.zeros(len(vertices))
+        stage[tri_l2g] = domain.quantities['stage'].centroid_values
+
+        fid = NetCDFFile(os.path.join(self.datadir, 'repartition.sww'))
+        assert num.allclose(fid.variables['time'][:], [0.0, 1.0, 2.0])
+        assert num.allclose(fid.variables['stage_c'][1], stage)
+        assert num.allclose(fid.variables['stage_c'][2], stage)
+        fid.close()
+
+    def test_repartition_parallel(self):
+        """Results of a repartitioned run are the same as without
+        repartitioning.
+        """
+
+        abs_script_name = os.path.abspath(__file__)
+        cmd = "mpirun -np %d python %s" % (nprocs, abs_script_name)
+        result = os.system(cmd)
+
+        assert result == 0
+
+
+if __name__ == "__main__":
+    if numprocs == 1:
+        runner = unittest.TextTestRunner()
+        suite = unittest.makeSuite(Test_parallel_repartition, 'test')
+        runner.run(suite)
+    else:
+        run_simulation(rebalance=False)
+        run_simulation(rebalance=True)
+
+        barrier()
+
+        if myid == 0:
+            fid0 = NetCDFFile('distributed.sww')
+            fid1 = NetCDFFile('repartitioned.sww')
+
+            assert num.allclose(fid0.variables['time'][:],
+                                fid1.variables['time'][:])
+            for name in ['stage_c', 'xmomentum_c', 'ymomentum_c']:
+                assert num.allclose(fid0.variables[name][:],
+                                    fid1.variables[name][:])
+
+            fid0.close()
+            fid1.close()
+
+            os.remove('distributed.sww')
+            os.remove('repartitioned.sww')
+
+        finalize()
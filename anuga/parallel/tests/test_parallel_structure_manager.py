@@ -0,0 +1,106 @@
+"""
+Test batched communication of parallel structures (structure manager)
+against the structures communicating on their own.
+"""
+
+import unittest
+import os
+
+import numpy as num
+
+import anuga
+from anuga import Reflective_boundary
+from anuga import rectangular_cross_domain
+from anuga import Boyd_box_operator
+from anuga import Boyd_pipe_operator
+from anuga import Weir_orifice_trapezoid_operator
+
+from anuga import distribute, myid, numprocs, barrier, finalize
+
+import anuga.utilities.parallel_abstraction as pypar
+
+#--------------------------------------------------------------------------
+# Setup parameters
+#--------------------------------------------------------------------------
+nprocs = 3
+verbose = False
+
+
+def run_simulation(batch_structures=True):
+
+    domain = rectangular_cross_domain(20, 10, len1=20.0, len2=10.0)
+    domain.set_quantity('elevation', lambda x, y: -x/20.0)
+    domain.set_quantity('friction', 0.01)
+    domain.set_quantity('stage', lambda x, y: num.where(x < 8, 1.0, -x/20.0))
+    domain.set_store(False)
+
+    domain = distribute(domain)
+    domain.set_batch_structures(batch_structures)
+
+    Br = Reflective_boundary(domain)
+    domain.set_boundary({'left': Br, 'right': Br, 'top': Br, 'bottom': Br})
+
+    operators = []
+    operators.append(Boyd_box_operator(domain, losses=1.5,
+                                       width=1.0, height=1.0,
+                                       end_points=[[6.0, 3.0], [12.0, 3.0]]))
+    operators.append(Boyd_pipe_operator(domain, losses=1.5, diameter=1.0,
+                                        end_points=[[6.0, 7.0], [14.0, 7.0]]))
+    operators.append(Weir_orifice_trapezoid_operator(domain, losses=1.5,
+                                       width=1.0, height=1.0, z1=1.0, z2=1.0,
+                                       end_points=[[5.0, 5.0], [15.0, 5.0]]))
+
+    for t in domain.evolve(yieldstep=0.5, finaltime=3.0):
+        pass
+
+    # Stage of the full triangles at their global position
+    stage = num.zeros(domain.number_of_global_triangles, num.float)
+    full = domain.tri_full_flag == 1
+    stage[domain.tri_l2g[full]] = \
+            domain.quantities['stage'].centroid_values[full]
+
+    discharges = [operator.discharge for operator in operators
+                  if operator is not None and myid == operator.master_proc]
+
+    return stage, discharges
+
+
+class Test_parallel_structure_manager(unittest.TestCase):
+
+    def test_structure_manager_parallel(self):
+        """Structures updated by the structure manager give the same
+        results as the structures communicating on their own.
+        """
+
+        abs_script_name = os.path.abspath(__file__)
+        cmd = "mpirun -np %d python %s" % (nprocs, abs_script_name)
+        result = os.system(cmd)
+
+        assert result == 0
+
+
+if __name__ == "__main__":
+    if numprocs == 1:
+        runner = unittest.TextTestRunner()
+        suite = unittest.makeSuite(Test_parallel_structure_manager, 'test')
+        runner.run(suite)
+    else:
+        import anuga.parallel.pypar_ext as par_exts
+
+        stage0, discharges0 = run_simulation(batch_structures=False)
+        stage1, discharges1 = run_simulation(batch_structures=True)
+
+        barrier()
+
+        # Each processor holds the stage of its full triangles
+        global_stage0 = num.zeros_like(stage0)
+        global_stage1 = num.zeros_like(stage1)
+        par_exts.allreduce(stage0, pypar.SUM, buffer=global_stage0,
+                           bypass=True)
+        par_exts.allreduce(stage1, pypar.SUM, buffer=global_stage1,
+                           bypass=True)
+
+        assert num.allclose(global_stage0, global_stage1)
+        assert num.allclose(discharges0, discharges1)
+
+        finalize()
@@ -0,0 +1,180 @@
+"""
+Test writing a single global sww file from a parallel run
+(Parallel_domain.set_store_global) rather than one sww file per
+processor followed by sww_merge.
+"""
+
+import unittest
+import os
+import sys
+import tempfile
+import shutil
+
+import numpy as num
+
+import anuga
+from anuga import Reflective_boundary
+from anuga import rectangular_cross_domain
+from anuga.abstract_2d_finite_volumes.mesh_factory import rectangular_cross
+from anuga.file.netcdf import NetCDFFile
+from anuga.parallel.parallel_shallow_water import Parallel_domain
+
+from anuga import distribute, myid, numprocs, barrier, finalize
+
+#--------------------------------------------------------------------------
+# Setup parameters
+#--------------------------------------------------------------------------
+nprocs = 3
+verbose = False
+
+
+def setup_domain(domain):
+
+    domain.set_quantity('elevation', lambda x, y: -x)
+    domain.set_quantity('stage', lambda x, y: 0.1*y)
+    domain.set_store_centroids(True)
+
+    Br = Reflective_boundary(domain)
+    domain.set_boundary({'left': Br, 'right': Br, 'top': Br, 'bottom': Br})
+
+
+def store_timesteps(domain):
+
+    domain.initialise_storage()
+    for i in range(3):
+        domain.set_time(0.1*i)
+        domain.set_quantity('stage', lambda x, y: 0.1*y + 0.1*i + x)
+        domain.set_quantity('xmomentum', lambda x, y: x*y*i)
+        domain.store_timestep()
+
+
+def compare_sww_files(filename0, filename1):
+
+    fid0 = NetCDFFile(filename0)
+    fid1 = NetCDFFile(filename1)
+
+    names = fid0.variables.keys()
+    assert sorted(names) == sorted(fid1.variables.keys())
+
+    for name in names:
+        values0 = num.array(fid0.variables[name][:])
+        values1 = num.array(fid1.variables[name][:])
+        assert values0.shape == values1.shape, name
+        assert num.allclose(values0, values1), name
+
+    fid0.close()
+    fid1.close()
+
+
+def run_simulation(store_global=False):
+
+    domain = rectangular_cross_domain(8, 6)
+    setup_domain(domain)
+    domain.set_flow_algorithm('DE0')
+
+    domain = distribute(domain)
+
+    Br = Reflective_boundary(domain)
+    domain.set_boundary({'left': Br, 'right': Br, 'top': Br, 'bottom': Br})
+
+    if store_global:
+        domain.set_name('sww_global')
+        domain.set_store_global()
+    else:
+        domain.set_name('sww_merged')
+
+    for t in domain.evolve(yieldstep=0.1, finaltime=0.3):
+        pass
+
+    domain.sww_merge(delete_old=True)
+
+
+class Test_parallel_sww(unittest.TestCase):
+
+    def setUp(self):
+        self.datadir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.datadir)
+
+    def test_store_global(self):
+        """Global sww file written by a Parallel_domain with permuted
+        local numbering is the same as the sequential sww file.
+        """
+
+        points, vertices, boundary = rectangular_cross(6, 4)
+        points = num.array(points)
+        vertices = num.array(vertices)
+
+        # Local numbering of the parallel domain
+        num.random.seed(13)
+        node_l2g = num.random.permutation(len(points))
+        tri_l2g = num.random.permutation(len(vertices))
+
+        node_g2l = num.argsort(node_l2g)
+        tri_g2l = num.argsort(tri_l2g)
+
+        l_points = points[node_l2g]
+        l_vertices = node_g2l[vertices[tri_l2g]]
+        l_boundary = {}
+        for (t, e), tag in boundary.items():
+            l_boundary[(tri_g2l[t], e)] = tag
+
+        for smooth in [True, False]:
+            domain = anuga.Domain(points, vertices, boundary)
+            setup_domain(domain)
+            domain.set_name('sequential')
+            domain.set_datadir(self.datadir)
+            domain.set_store_vertices_uniquely(not smooth)
+            store_timesteps(domain)
+
+            pdomain = Parallel_domain(l_points, l_vertices, l_boundary,
+                                      processor=0, numproc=1,
+                                      number_of_global_triangles=len(vertices),
+                                      number_of_global_nodes=len(points),
+                                      tri_l2g=tri_l2g,
+                                      node_l2g=node_l2g)
+            setup_domain(pdomain)
+            pdomain.set_name('parallel')
+            pdomain.set_datadir(self.datadir)
+            pdomain.set_store_vertices_uniquely(not smooth)
+            pdomain.set_store_global()
+            assert pdomain.get_store_global()
+            store_timesteps(pdomain)
+
+            # No per processor file
+            assert not os.path.exists(os.path.join(self.datadir,
+                                                   'parallel_P1_0.sww'))
+
+            compare_sww_files(os.path.join(self.datadir, 'sequential.sww'),
+                              os.path.join(self.datadir, 'parallel.sww'))
+
+    def test_store_global_parallel(self):
+        """Global sww file of a parallel run is the same as the
+        merged sww files.
+        """
+
+        abs_script_name = os.path.abspath(__file__)
+        cmd = "mpirun -np %d python %s" % (nprocs, abs_script_name)
+        result = os.system(cmd)
+
+        assert result == 0
+
+
+if __name__ == "__main__":
+    if numprocs == 1:
+        runner = unittest.TextTestRunner()
+        suite = unittest.makeSuite(Test_parallel_sww, 'test')
+        runner.run(suite)
+    else:
+        run_simulation(store_global=False)
+        run_simulation(store_global=True)
+
+        barrier()
+
+        if myid == 0:
+            compare_sww_files('sww_merged.sww', 'sww_global.sww')
+            os.remove('sww_merged.sww')
+            os.remove('sww_global.sww')
+
+        finalize()
@@ -7,9 +7,11 @@ typedef int idxtype;
 #include "bridge.h"
 
 static PyObject * metis_partMeshNodal(PyObject *, PyObject *);
+static PyObject * metis_partGraphKway(PyObject *, PyObject *);
 
 static PyMethodDef methods[] = {
   {"partMeshNodal", metis_partMeshNodal, METH_VARARGS, "METIS_PartMeshNodal"},
+  {"partGraphKway", metis_partGraphKway, METH_VARARGS, "METIS_PartGraphKway"},
   {NULL, NULL, 0, NULL}
 };
 
@@ -115,3 +117,83 @@ static PyObject * metis_partMeshNodal(PyObject * self, PyObject * args){
 
   return Py_BuildValue("iOO", edgecut, (PyObject *)epart_pyarr, (PyObject *)npart_pyarr);
 }
+
+/* Run the metis METIS_PartGraphKway function
+ * expected args:
+ * nvtxs: number of vertices of the graph
+ * xadj: adjacency structure of the graph (nvtxs+1 entries), the
+ *       neighbours of vertex i are adjncy[xadj[i]:xadj[i+1]]
+ * adjncy: adjacency lists
+ * vwgt: weights of the vertices or None
+ * nparts: number of partitions
+ * returns:
+ * edgecut: number of cut edges
+ * part: partitioning of the vertices.
+ *
+ * Used to partition the dual graph of a mesh (one vertex per element)
+ * with element weights, which METIS_PartMeshNodal does not support.
+ */
+static PyObject * metis_partGraphKway(PyObject * self, PyObject * args){
+  int nvtxs;
+  int nparts;
+  int edgecut;
+  int wgtflag = 0;
+  int numflag = 0;
+  int options[5] = {0, 0, 0, 0, 0};
+  npy_intp dims[1];
+
+  PyObject * xadj;
+  PyObject * adjncy;
+  PyObject * vwgt;
+  PyArrayObject * xadj_arr;
+  PyArrayObject * adjncy_arr;
+  PyArrayObject * vwgt_arr = NULL;
+  PyArrayObject * part_pyarr;
+
+  idxtype * vwgt_c_arr = NULL;
+  idxtype * part;
+
+  if(!PyArg_ParseTuple(args, "iOOOi", &nvtxs, &xadj, &adjncy, &vwgt, &nparts))
+    return NULL;
+
+  xadj_arr = (PyArrayObject *) PyArray_FROMANY(xadj, PyArray_INT, 1, 1, NPY_IN_ARRAY | NPY_FORCECAST);
+  if(!xadj_arr)
+    return NULL;
+
+  adjncy_arr = (PyArrayObject *) PyArray_FROMANY(adjncy, PyArray_INT, 1, 1, NPY_IN_ARRAY | NPY_FORCECAST);
+  if(!adjncy_arr){
+    Py_DECREF(xadj_arr);
+    return NULL;
+  }
+
+  if(vwgt != Py_None){
+    vwgt_arr = (PyArrayObject *) PyArray_FROMANY(vwgt, PyArray_INT, 1, 1, NPY_IN_ARRAY | NPY_FORCECAST);
+    if(!vwgt_arr){
+      Py_DECREF(xadj_arr);
+      Py_DECREF(adjncy_arr);
+      return NULL;
+    }
+    vwgt_c_arr = (idxtype *)vwgt_arr->data;
+    wgtflag = 2; /* Weights on the vertices only */
+  }
+
+  dims[0] = nvtxs;
+  part_pyarr = (PyArrayObject *)PyArray_SimpleNew(1, dims, PyArray_INT);
+  if(!part_pyarr){
+    Py_DECREF(xadj_arr);
+    Py_DECREF(adjncy_arr);
+    Py_XDECREF(vwgt_arr);
+    return NULL;
+  }
+  part = (idxtype *)part_pyarr->data;
+
+  bridge_partGraphKway(&nvtxs, (idxtype *)xadj_arr->data,
+                       (idxtype *)adjncy_arr->data, vwgt_c_arr, NULL,
+                       &wgtflag, &numflag, &nparts, options, &edgecut, part);
+
+  Py_DECREF(xadj_arr);
+  Py_DECREF(adjncy_arr);
+  Py_XDECREF(vwgt_arr);
+
+  return Py_BuildValue("iN", edgecut, (PyObject *)part_pyarr);
+}
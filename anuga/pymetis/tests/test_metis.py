@@ -144,7 +144,27 @@ class TestMetis(unittest.TestCase):
             self.assert_(edgecut == 14)
             assert allclose(epart, epart_expected)
             assert allclose(npart, npart_expected)
-                
+
+
+    def test_partGraphKway(self):
+        # Path graph 0-1-2-3-4-5 divided 2 ways,
+        # without weights and with a heavy vertex 0
+        xadj = [0, 1, 3, 5, 7, 9, 10]
+        adjncy = [1, 0, 2, 1, 3, 2, 4, 3, 5, 4]
+
+        edgecut, part = metis.partGraphKway(6, xadj, adjncy, None, 2)
+
+        self.assert_(edgecut == 1)
+        assert len(part) == 6
+        assert allclose(sum(part == part[0]), 3)
+
+        edgecut, part = metis.partGraphKway(6, xadj, adjncy,
+                                            array([5, 1, 1, 1, 1, 1]), 2)
+
+        self.assert_(edgecut == 1)
+        # Vertex 0 has half of the weight
+        assert allclose(sum(part == part[0]), 1)
+
 
 if __name__ == "__main__":
     suite = unittest.makeSuite(TestMetis,'test_')
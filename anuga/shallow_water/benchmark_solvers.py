@@ -0,0 +1,264 @@
+#!/usr/bin/env python2
+"""
+Benchmark the shallow water solvers.
+
+Runs each flow algorithm on rectangular and irregular meshes of increasing
+size for a fixed number of timesteps and records
+
+    triangle_updates_per_second: triangles times timesteps per second of
+                                 the evolve loop
+    memory_peak_mb:              peak resident memory of the process
+    memory_growth_mb:            growth of the peak resident memory during
+                                 the benchmark
+    sww_mb_per_second:           sww output throughput
+
+in a json file, so that the performance of the C kernels can be compared
+between versions and machines.
+
+The timings cover the timesteps of the evolve loop only, not the setup of
+the domain or the storage of the initial values. Each benchmark runs in
+its own process by default, so memory_peak_mb is the peak of that
+benchmark alone. The peak resident memory of a process never decreases,
+so when the benchmarks run in the same process memory_peak_mb is the
+peak so far and memory_growth_mb only shows memory beyond the peak of
+the previous benchmarks.
+
+Run as
+
+    python benchmark_solvers.py -o benchmark.json
+
+or use run_benchmarks from a script.
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import time
+from multiprocessing import Pool
+
+import anuga
+from anuga.utilities.system_tools import get_host_name
+
+
+flow_algorithms = ['DE0', 'DE1', 'DE2', '1_5', '2_0', 'tsunami']
+
+# Number of cells along each side of the rectangular meshes.
+# rectangular_cross creates 4 triangles per cell.
+mesh_sizes = [25, 50, 100]
+
+mesh_types = ['rectangular', 'irregular']
+
+# Size of the (square) domain in metres
+length = 100.0
+
+
+def create_benchmark_domain(mesh_type, size, mesh_dir='.'):
+    """Create domain of about 4*size*size triangles with a sloping beach,
+    a wave coming in from the left and rain.
+    """
+
+    if mesh_type == 'rectangular':
+        domain = anuga.rectangular_cross_domain(size, size,
+                                                len1=length, len2=length)
+    elif mesh_type == 'irregular':
+        bounding_polygon = [[0.0, 0.0], [length, 0.0],
+                            [length, length], [0.0, length]]
+        boundary_tags = {'bottom': [0], 'right': [1], 'top': [2], 'left': [3]}
+        maximum_triangle_area = length*length/(4*size*size)
+        mesh_filename = os.path.join(mesh_dir,
+                                     'benchmark_%s_%d.msh' % (mesh_type, size))
+        domain = anuga.create_domain_from_regions(bounding_polygon,
+                            boundary_tags,
+                            maximum_triangle_area=maximum_triangle_area,
+                            mesh_filename=mesh_filename)
+    else:
+        raise Exception('Unknown mesh type %s' % mesh_type)
+
+    domain.set_quantity('elevation', lambda x, y: -x/20.0 + 0.5*(y > 50.0))
+    domain.set_quantity('friction', 0.03)
+    domain.set_quantity('stage', expression='elevation + 2.5')
+
+    Br = anuga.Reflective_boundary(domain)
+    Bt = anuga.Transmissive_boundary(domain)
+    Bw = anuga.Time_boundary(domain,
+                             function=lambda t: [3.0 + 0.5*(t < 2.0), 0.0, 0.0])
+
+    domain.set_boundary({'left': Bw, 'right': Bt, 'top': Br, 'bottom': Br})
+
+    anuga.Rate_operator(domain, rate=1.0e-4, label='rain')
+
+    return domain
+
+
+def run_benchmark(mesh_type, size, flow_algorithm, number_of_steps=100,
+                  yieldstep=0.1, store=True, datadir='.', verbose=False):
+    """Evolve the benchmark domain for (at least) number_of_steps
+    timesteps and return dictionary of timings.
+    """
+
+    initial_memory_peak = memory_peak()
+
+    domain = create_benchmark_domain(mesh_type, size, mesh_dir=datadir)
+    domain.set_flow_algorithm(flow_algorithm)
+
+    name = 'benchmark_%s_%d_%s' % (mesh_type, size, flow_algorithm)
+    domain.set_name(name)
+    domain.set_datadir(datadir)
+    domain.set_store(store)
+    domain.set_profiling()
+
+    # Time from the yield of the initial values, so the setup and the
+    # storage of the initial values are not included
+    steps = 0
+    t0 = None
+    for t in domain.evolve(yieldstep=yieldstep, finaltime=1.0e10):
+        if t0 is None:
+            t0 = time.time()
+            initial_store_time = domain.get_profile().get('store_timestep', 0.0)
+            continue
+
+        steps += domain.number_of_steps
+        if steps >= number_of_steps:
+            break
+    evolve_time = time.time() - t0
+
+    profile = domain.get_profile()
+    store_time = profile.get('store_timestep', 0.0) - initial_store_time
+    compute_time = evolve_time - store_time
+
+    number_of_triangles = len(domain)
+
+    result = {}
+    result['mesh_type'] = mesh_type
+    result['mesh_size'] = size
+    result['flow_algorithm'] = flow_algorithm
+    result['number_of_triangles'] = number_of_triangles
+    result['number_of_steps'] = steps
+    result['simulated_time'] = domain.get_time()
+    result['evolve_time'] = evolve_time
+    result['compute_time'] = compute_time
+    result['triangle_updates_per_second'] = \
+            number_of_triangles*steps/max(compute_time, 1.0e-12)
+    result['memory_peak_mb'] = memory_peak()
+    if initial_memory_peak is not None:
+        result['memory_growth_mb'] = result['memory_peak_mb'] - initial_memory_peak
+    result['profile'] = profile
+
+    if store:
+        sww_filename = os.path.join(datadir, name + '.sww')
+        sww_bytes = os.path.getsize(sww_filename)
+        result['sww_bytes'] = sww_bytes
+        result['sww_write_time'] = store_time
+        result['sww_mb_per_second'] = \
+                sww_bytes/(1024.0*1024.0)/max(store_time, 1.0e-12)
+        os.remove(sww_filename)
+
+    if verbose:
+        print '%-12s %6d %-8s %8d triangles %10.4g triangle updates/s' \
+              % (mesh_type, size, flow_algorithm, number_of_triangles,
+                 result['triangle_updates_per_second'])
+
+    return result
+
+
+def memory_peak():
+    """Return peak resident memory of this process in MB
+    """
+
+    try:
+        import resource
+    except ImportError:
+        # Not available on windows
+        return None
+
+    # ru_maxrss is in kilobytes on linux and in bytes on OSX
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return maxrss/(1024.0*1024.0)
+    else:
+        return maxrss/1024.0
+
+
+def run_benchmarks(output_filename='benchmark.json',
+                   mesh_types=mesh_types,
+                   mesh_sizes=mesh_sizes,
+                   flow_algorithms=flow_algorithms,
+                   number_of_steps=100,
+                   separate_processes=True,
+                   verbose=False):
+    """Run all combinations of mesh type, mesh size and flow algorithm
+    and write the results to output_filename in json format. Returns
+    the dictionary written.
+
+    If separate_processes is True each benchmark runs in a new process,
+    so the memory peaks of the benchmarks are independent.
+    """
+
+    datadir = tempfile.mkdtemp()
+
+    results = []
+    try:
+        for mesh_type in mesh_types:
+            for size in mesh_sizes:
+                for flow_algorithm in flow_algorithms:
+                    args = (mesh_type, size, flow_algorithm)
+                    kwargs = {'number_of_steps': number_of_steps,
+                              'datadir': datadir,
+                              'verbose': verbose}
+
+                    if separate_processes:
+                        pool = Pool(1)
+                        try:
+                            result = pool.apply(run_benchmark, args, kwargs)
+                        finally:
+                            pool.terminate()
+                    else:
+                        result = run_benchmark(*args, **kwargs)
+
+                    results.append(result)
+    finally:
+        shutil.rmtree(datadir)
+
+    benchmark = {}
+    benchmark['anuga_version'] = anuga.__version__
+    benchmark['host'] = get_host_name()
+    benchmark['python_version'] = sys.version.split()[0]
+    benchmark['date'] = time.strftime('%Y-%m-%d %H:%M:%S')
+    benchmark['number_of_steps'] = number_of_steps
+    benchmark['separate_processes'] = separate_processes
+    benchmark['results'] = results
+
+    fid = open(output_filename, 'w')
+    json.dump(benchmark, fid, indent=2, sort_keys=True)
+    fid.close()
+
+    return benchmark
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the shallow water solvers')
+    parser.add_argument('-o', type=str, default='benchmark.json',
+                   help='name of json output file')
+    parser.add_argument('-steps', type=int, default=100,
+                   help='number of timesteps for each run')
+    parser.add_argument('-sizes', type=int, nargs='+', default=mesh_sizes,
+                   help='number of cells along each side of the meshes')
+    parser.add_argument('-alg', type=str, nargs='+', default=flow_algorithms,
+                   help='flow algorithms to benchmark')
+    parser.add_argument('-same_process', action='store_true',
+                   help='run all benchmarks in this process')
+    parser.add_argument('-v', nargs='?', type=bool, const=True, default=False,
+                   help='verbosity')
+    args = parser.parse_args()
+
+    run_benchmarks(args.o,
+                   mesh_sizes=args.sizes,
+                   flow_algorithms=args.alg,
+                   number_of_steps=args.steps,
+                   separate_processes=not args.same_process,
+                   verbose=args.v)
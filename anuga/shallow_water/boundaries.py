@@ -811,7 +811,8 @@ class Field_boundary(Boundary):
                  boundary_polygon=None,
                  default_boundary=None,
                  use_cache=False,
-                 verbose=False):
+                 verbose=False,
+                 time_window=None):
         """Constructor
 
         filename: Name of sww file containing stage and x/ymomentum
@@ -839,6 +840,10 @@ class Field_boundary(Boundary):
         boundary_polygon: 
         use_cache:        True if caching is to be used.
         verbose:          True if this method is to be verbose.
+        time_window:      If given, only read and interpolate blocks of
+                          time_window time slices of the sww file as they
+                          are needed (see file_function). The file is kept
+                          open until close() is called.
 
         """
 
@@ -850,7 +855,8 @@ class Field_boundary(Boundary):
                                            boundary_polygon=boundary_polygon,
                                            default_boundary=default_boundary,
                                            use_cache=use_cache,
-                                           verbose=verbose)
+                                           verbose=verbose,
+                                           time_window=time_window)
 
         # Record information from File_boundary
         self.F = self.file_boundary.F
@@ -865,6 +871,13 @@ class Field_boundary(Boundary):
         return 'Field boundary'
 
 
+    def close(self):
+        """Close the file kept open by the time_window mode
+        """
+
+        self.file_boundary.close()
+
+
     def evaluate(self, vol_id=None, edge_id=None):
         """ Calculate 'field' boundary results.
             vol_id and edge_id are ignored
@@ -882,6 +895,25 @@ class Field_boundary(Boundary):
         return q
 
 
+    def evaluate_segment(self, domain, segment_edges):
+        """ Calculate 'field' boundary results for all edges listed in
+            segment_edges at once.
+        """
+
+        if segment_edges is None:
+            return
+        if domain is None:
+            return
+
+        # Evaluate file boundary
+        self.file_boundary.evaluate_segment(domain, segment_edges)
+
+        # Adjust stage
+        if 'stage' in domain.conserved_quantities:
+            Q = domain.quantities['stage']
+            Q.boundary_values[segment_edges] += self.mean_stage
+
+
 
 
 
@@ -14,14 +14,43 @@ read in the last stored domain. Do that via
 
 domain = load_last_checkpoint_file(domain_name, checkpoint_dir)
 
+
+Binary checkpoints
+------------------
+
+With domain.set_checkpointing(checkpoint_format='binary') the domain is not
+pickled. Instead the mesh (and parallel structure) is written once to
+<name>_mesh.npz and each checkpoint only stores the time varying data in
+<name>_<time>.npz. These are plain numpy files, no unpickling is needed to
+read them.
+
+The mesh file also holds the quantities as they were when it was written.
+A checkpoint stores the centroid values of a quantity only if they differ
+from those in the mesh file (compared via checksums), so static quantities
+such as friction or x, y are stored once. Operators contribute their float
+arrays and numbers (e.g. maxima), except for arrays sharing memory with
+the quantities or the mesh of the domain (such as the stage_c, elev_c and
+areas aliases of the base Operator).
+
+load_checkpoint_file restores binary checkpoints either into a domain passed
+in via the domain argument (created by the same script that set up the
+original simulation, so boundaries and operators are available) or into a
+new domain created from the mesh file. In the latter case boundary
+conditions and operators need to be set again before evolving.
 """
 
+import os
+import hashlib
+
+import numpy as num
+
 from anuga import send, receive, myid, numprocs, barrier
 from time import time as walltime
 
 
 
-def load_checkpoint_file(domain_name = 'domain', checkpoint_dir = '.', time = None):
+def load_checkpoint_file(domain_name = 'domain', checkpoint_dir = '.', time = None,
+                         domain = None):
 
     from os.path import join
 
@@ -43,14 +72,20 @@ def load_checkpoint_file(domain_name = 'domain', checkpoint_dir = '.', time = No
     for time in reversed(times):
 
         pickle_name = join(checkpoint_dir,domain_name)+'_'+str(time)+'.pickle'
+        binary_name = join(checkpoint_dir,domain_name)+'_'+str(time)+'.npz'
         #print pickle_name
 
         try:
-            try:
-                import dill as cPickle
-            except:
-                import cPickle
-            domain = cPickle.load(open(pickle_name, 'rb'))
+            if os.path.exists(binary_name):
+                mesh_name = join(checkpoint_dir,domain_name)+'_mesh.npz'
+                domain = _load_binary_checkpoint_file(binary_name, mesh_name,
+                                                      domain, checkpoint_dir)
+            else:
+                try:
+                    import dill as cPickle
+                except:
+                    import cPickle
+                domain = cPickle.load(open(pickle_name, 'rb'))
             success = True
         except:
             success = False
@@ -81,6 +116,375 @@ def load_checkpoint_file(domain_name = 'domain', checkpoint_dir = '.', time = No
     return domain
 
 
+def save_binary_checkpoint_file(domain, checkpoint_dir = '.'):
+    """Store time varying data of domain in <name>_<time>.npz, also
+    storing the mesh in <name>_mesh.npz the first time around.
+    """
+
+    from os.path import join
+
+    base_name = join(checkpoint_dir, domain.get_name())
+
+    if not domain.checkpoint_mesh_stored:
+        mesh = _get_checkpoint_mesh(domain)
+        _write_npz(base_name+'_mesh.npz', mesh)
+        domain.checkpoint_checksums = _get_checkpoint_checksums(mesh)
+        domain.checkpoint_mesh_stored = True
+
+    _write_npz(base_name+'_'+str(domain.get_time())+'.npz',
+               _get_checkpoint_state(domain))
+
+
+def _write_npz(filename, arrays):
+    """Write dictionary of arrays to filename, via a temporary file so that
+    an interrupted write does not leave a partial checkpoint file.
+    """
+
+    tmp_filename = filename + '.tmp'
+    fid = open(tmp_filename, 'wb')
+    try:
+        num.savez(fid, **arrays)
+    finally:
+        fid.close()
+
+    os.rename(tmp_filename, filename)
+
+
+def _checksum(values):
+    """Return checksum of the values of an array
+    """
+
+    return hashlib.md5(num.ascontiguousarray(values)).hexdigest()
+
+
+def _get_checkpoint_checksums(mesh):
+    """Return checksums of the quantity values stored in the mesh file
+    """
+
+    checksums = {}
+    for key in mesh:
+        if key.startswith('centroid_values_') or \
+               key == 'vertex_values_elevation':
+            checksums[key] = _checksum(mesh[key])
+
+    return checksums
+
+
+def _get_checkpoint_mesh(domain):
+    """Return dictionary of arrays describing the static mesh of domain,
+    together with the current values of the quantities.
+    """
+
+    mesh = {}
+
+    mesh['coordinates'] = domain.get_nodes()
+    mesh['vertices'] = domain.get_triangles()
+
+    boundary_keys = domain.boundary.keys()
+    boundary_keys.sort()
+    mesh['boundary_keys'] = num.array(boundary_keys, num.int).reshape(-1,2)
+    mesh['boundary_tags'] = num.array([domain.boundary[key]
+                                       for key in boundary_keys], num.str)
+
+    for tag, elements in domain.get_tagged_elements().items():
+        mesh['tagged_elements_'+tag] = num.array(elements, num.int)
+
+    geo_reference = domain.geo_reference
+    mesh['geo_reference'] = num.array([geo_reference.get_zone(),
+                                       geo_reference.get_xllcorner(),
+                                       geo_reference.get_yllcorner()])
+
+    mesh['name'] = num.array(domain.get_name())
+    mesh['datadir'] = num.array(domain.get_datadir())
+    mesh['flow_algorithm'] = num.array(domain.get_flow_algorithm())
+    mesh['minimum_storable_height'] = num.array(domain.minimum_storable_height)
+    mesh['smooth'] = num.array(domain.smooth)
+    mesh['store'] = num.array(domain.store)
+    mesh['store_centroids'] = num.array(domain.store_centroids)
+
+    names = domain.quantities_to_be_stored.keys()
+    mesh['quantities_to_be_stored'] = num.array(names, num.str)
+    mesh['quantities_to_be_stored_flags'] = \
+            num.array([domain.quantities_to_be_stored[name] for name in names],
+                      num.int)
+
+    mesh['checkpoint_step'] = num.array(domain.checkpoint_step)
+    if domain.checkpoint_step == 0:
+        mesh['checkpoint_time'] = num.array(domain.checkpoint_time)
+
+    for name, Q in domain.quantities.items():
+        mesh['centroid_values_'+name] = Q.centroid_values
+    mesh['vertex_values_elevation'] = \
+            domain.quantities['elevation'].vertex_values
+
+    mesh['parallel'] = num.array(domain.parallel)
+    if domain.parallel:
+        mesh['global_name'] = num.array(domain.get_global_name())
+        mesh['number_of_full_nodes'] = num.array(domain.number_of_full_nodes)
+        mesh['number_of_full_triangles'] = \
+                num.array(domain.number_of_full_triangles)
+        mesh['number_of_global_triangles'] = \
+                num.array(domain.number_of_global_triangles)
+        mesh['number_of_global_nodes'] = \
+                num.array(domain.number_of_global_nodes)
+        mesh['ghost_layer_width'] = num.array(domain.ghost_layer_width)
+        mesh['tri_l2g'] = domain.tri_l2g
+        mesh['node_l2g'] = domain.node_l2g
+
+        # Only the index arrays, the communication buffers
+        # are created by the domain
+        for p, arrays in domain.full_send_dict.items():
+            for j, array in enumerate(arrays[:2]):
+                mesh['full_send_dict_%d_%d' % (p, j)] = array
+
+        for p, arrays in domain.ghost_recv_dict.items():
+            for j, array in enumerate(arrays[:2]):
+                mesh['ghost_recv_dict_%d_%d' % (p, j)] = array
+
+    return mesh
+
+
+def _get_checkpoint_state(domain):
+    """Return dictionary of arrays with the time varying data of domain
+    """
+
+    state = {}
+
+    state['time'] = num.array(domain.get_time())
+    state['starttime'] = num.array(domain.get_starttime())
+    state['yieldstep_id'] = num.array(domain.yieldstep_id)
+    state['evolved_called'] = num.array(domain.evolved_called)
+
+    # Quantities which changed since the mesh file was written.
+    # Vertex values of elevation are not recomputed from centroids
+    # by all flow algorithms
+    values = {}
+    for name, Q in domain.quantities.items():
+        values['centroid_values_'+name] = Q.centroid_values
+    values['vertex_values_elevation'] = \
+            domain.quantities['elevation'].vertex_values
+
+    checksums = getattr(domain, 'checkpoint_checksums', {})
+    for key, value in values.items():
+        if checksums.get(key) != _checksum(value):
+            state[key] = value
+
+    # Float arrays and scalars held by operators, e.g. maxima or flags
+    domain_arrays = _get_domain_arrays(domain)
+    for i, operator in enumerate(domain.fractional_step_operators):
+        for attribute, value in operator.__dict__.items():
+            if isinstance(value, num.ndarray) and value.dtype == num.float:
+                if _shares_memory(value, domain_arrays):
+                    continue
+                state['operator_%d_%s' % (i, attribute)] = value
+            elif isinstance(value, (bool, int, long, float,
+                                    num.number, num.bool_)):
+                state['operator_%d_%s' % (i, attribute)] = num.array(value)
+
+    return state
+
+
+def _get_domain_arrays(domain):
+    """Return the arrays of the quantities and the mesh of domain
+    """
+
+    arrays = []
+    objects = [domain, domain.mesh] + domain.quantities.values()
+    for obj in objects:
+        for value in obj.__dict__.values():
+            if isinstance(value, num.ndarray):
+                arrays.append(value)
+
+    return arrays
+
+
+def _shares_memory(array, arrays):
+    """True if array may share memory with one of arrays
+    """
+
+    for other in arrays:
+        if num.may_share_memory(array, other):
+            return True
+
+    return False
+
+
+def _load_binary_checkpoint_file(filename, mesh_filename, domain=None,
+                                 checkpoint_dir='.'):
+    """Restore state from binary checkpoint file into domain, creating
+    a new domain from mesh_filename if domain is None.
+    """
+
+    mesh = num.load(mesh_filename)
+    try:
+        if domain is None:
+            domain = _create_domain_from_checkpoint_mesh(mesh, checkpoint_dir)
+
+        # Quantities not stored in the checkpoint have the values
+        # of the mesh file
+        _set_checkpoint_quantities(domain, mesh)
+        domain.checkpoint_checksums = _get_checkpoint_checksums(mesh)
+    finally:
+        mesh.close()
+
+    domain.checkpoint_mesh_stored = True
+
+    state = num.load(filename)
+    try:
+        _set_checkpoint_state(domain, state)
+    finally:
+        state.close()
+
+    # Carry on storing into the existing sww file
+    if domain.store is True:
+        from anuga.file.sww import SWW_file
+        from anuga.config import netcdf_mode_a
+
+        sww_filename = os.path.join(domain.get_datadir(),
+                                    domain.get_name()+'.sww')
+        if os.path.exists(sww_filename):
+            domain.writer = SWW_file(domain, mode=netcdf_mode_a)
+
+    return domain
+
+
+def _create_domain_from_checkpoint_mesh(mesh, checkpoint_dir='.'):
+    """Create a domain from the arrays stored by _get_checkpoint_mesh,
+    checkpointing to checkpoint_dir.
+    """
+
+    from anuga.coordinate_transforms.geo_reference import Geo_reference
+
+    boundary_tags = [str(tag) for tag in mesh['boundary_tags']]
+    boundary = dict(zip([tuple(key) for key in mesh['boundary_keys']],
+                        boundary_tags))
+
+    tagged_elements = {}
+    for key in mesh.files:
+        if key.startswith('tagged_elements_'):
+            tagged_elements[key[len('tagged_elements_'):]] = list(mesh[key])
+
+    zone, xllcorner, yllcorner = mesh['geo_reference']
+    geo_reference = Geo_reference(int(zone), xllcorner, yllcorner)
+
+    if bool(mesh['parallel']):
+        from anuga.parallel.parallel_shallow_water import Parallel_domain
+
+        full_send_dict = _get_checkpoint_dict(mesh, 'full_send_dict_')
+        ghost_recv_dict = _get_checkpoint_dict(mesh, 'ghost_recv_dict_')
+
+        domain = Parallel_domain(mesh['coordinates'], mesh['vertices'],
+                    boundary,
+                    full_send_dict=full_send_dict,
+                    ghost_recv_dict=ghost_recv_dict,
+                    number_of_full_nodes=int(mesh['number_of_full_nodes']),
+                    number_of_full_triangles=\
+                            int(mesh['number_of_full_triangles']),
+                    geo_reference=geo_reference,
+                    processor=myid,
+                    numproc=numprocs,
+                    number_of_global_triangles=\
+                            int(mesh['number_of_global_triangles']),
+                    number_of_global_nodes=int(mesh['number_of_global_nodes']),
+                    tri_l2g=mesh['tri_l2g'],
+                    node_l2g=mesh['node_l2g'],
+                    ghost_layer_width=int(mesh['ghost_layer_width']))
+        domain.set_name(str(mesh['global_name']))
+        domain.build_tagged_elements_dictionary(tagged_elements)
+    else:
+        from anuga.shallow_water.shallow_water_domain import Domain
+
+        domain = Domain(mesh['coordinates'], mesh['vertices'], boundary,
+                        tagged_elements=tagged_elements,
+                        geo_reference=geo_reference)
+        domain.set_name(str(mesh['name']))
+
+    domain.set_flow_algorithm(str(mesh['flow_algorithm']))
+    domain.set_datadir(str(mesh['datadir']))
+    domain.set_minimum_storable_height(float(mesh['minimum_storable_height']))
+    domain.smooth = bool(mesh['smooth'])
+    domain.set_store(bool(mesh['store']))
+    domain.set_store_centroids(bool(mesh['store_centroids']))
+
+    names = [str(name) for name in mesh['quantities_to_be_stored']]
+    flags = [int(flag) for flag in mesh['quantities_to_be_stored_flags']]
+    domain.quantities_to_be_stored = dict(zip(names, flags))
+
+    if int(mesh['checkpoint_step']) == 0:
+        domain.set_checkpointing(checkpoint_dir=checkpoint_dir,
+                                 checkpoint_time=float(mesh['checkpoint_time']),
+                                 checkpoint_format='binary')
+    else:
+        domain.set_checkpointing(checkpoint_dir=checkpoint_dir,
+                                 checkpoint_step=int(mesh['checkpoint_step']),
+                                 checkpoint_format='binary')
+
+    return domain
+
+
+def _get_checkpoint_dict(mesh, prefix):
+    """Rebuild a dictionary of lists of arrays, such as full_send_dict,
+    stored by _get_checkpoint_mesh with keys prefix<key>_<index>.
+    """
+
+    result = {}
+    for key in mesh.files:
+        if key.startswith(prefix):
+            p, j = [int(x) for x in key[len(prefix):].split('_')]
+            result.setdefault(p, {})[j] = mesh[key]
+
+    for p in result:
+        result[p] = [result[p][j] for j in sorted(result[p])]
+
+    return result
+
+
+def _set_checkpoint_state(domain, state):
+    """Set time varying data of domain from the arrays stored by
+    _get_checkpoint_state
+    """
+
+    _set_checkpoint_quantities(domain, state)
+
+    operators = domain.fractional_step_operators
+    for key in state.files:
+        if key.startswith('operator_'):
+            i, attribute = key[len('operator_'):].split('_', 1)
+            i = int(i)
+            if i >= len(operators) or not hasattr(operators[i], attribute):
+                continue
+
+            value = getattr(operators[i], attribute)
+            if isinstance(value, num.ndarray):
+                value[:] = state[key]
+            else:
+                setattr(operators[i], attribute, type(value)(state[key]))
+
+    domain.starttime = float(state['starttime'])
+    domain.set_time(float(state['time']))
+    domain.yieldstep_id = int(state['yieldstep_id'])
+    domain.evolved_called = bool(state['evolved_called'])
+
+
+def _set_checkpoint_quantities(domain, arrays):
+    """Set the quantity values found in arrays (a mesh or checkpoint
+    file), creating quantities which do not exist in domain.
+    """
+
+    from anuga.abstract_2d_finite_volumes.quantity import Quantity
+
+    for key in arrays.files:
+        if key.startswith('centroid_values_'):
+            name = key[len('centroid_values_'):]
+            if name not in domain.quantities:
+                Quantity(domain, name=name, register=True)
+            domain.quantities[name].centroid_values[:] = arrays[key]
+
+    if 'vertex_values_elevation' in arrays.files:
+        domain.quantities['elevation'].vertex_values[:] = \
+                arrays['vertex_values_elevation']
+
+
 def _get_checkpoint_times(domain_name, checkpoint_dir):
 
     import os
@@ -94,12 +498,19 @@ def _get_checkpoint_times(domain_name, checkpoint_dir):
             return None
         else:
             for filename in filenames:
-                filebase = os.path.splitext(filename)[0].rpartition("_")
+                filebase, ext = os.path.splitext(filename)
+                if ext not in ['.pickle', '.npz']:
+                    continue
+                filebase = filebase.rpartition("_")
                 time = filebase[-1]
                 domain_name_base = filebase[0]
                 if domain_name_base == domain_name :
                     #print domain_name_base, time
-                    times.add(float(time))
+                    try:
+                        times.add(float(time))
+                    except ValueError:
+                        # Not a checkpoint, e.g. binary checkpoint mesh
+                        pass
 
 
     #times.sort()
@@ -226,6 +226,9 @@ class Domain(Generic_Domain):
         self.fractional_step_operators = []
         self.kv_operator = None
 
+        # Update structures one by one (see set_batch_structures)
+        self.batch_structures = False
+
 
 
         #-------------------------------
@@ -249,6 +252,8 @@ class Domain(Generic_Domain):
         self.set_store(True)
         self.set_store_centroids(True)
         self.set_store_vertices_uniquely(False)
+        self.set_store_buffered(False)
+        self.set_store_asynchronous(False)
         self.quantities_to_be_stored = {'elevation': 1,
                                         'friction':1,
                                         'stage': 2,
@@ -262,6 +267,8 @@ class Domain(Generic_Domain):
         self.checkpoint = False
         self.yieldstep_id = 1
         self.checkpoint_step = 10
+        self.checkpoint_format = 'pickle'
+        self.checkpoint_mesh_stored = False
 
         #-------------------------------
         # Useful auxiliary quantity
@@ -1059,7 +1066,62 @@ class Domain(Generic_Domain):
 
         return self.store_centroids
 
-    def set_checkpointing(self, checkpoint= True, checkpoint_dir = 'CHECKPOINTS', checkpoint_step=10, checkpoint_time = None):
+    def set_store_buffered(self, flag=True, buffer_size=10):
+        """Set whether the sww file is kept open during evolve, with
+        timesteps buffered in memory and written buffer_size at a time.
+
+        The buffer is flushed at the final yieldstep of evolve, before
+        storing a checkpoint and if evolve is interrupted by an exception.
+        """
+
+        if flag:
+            msg = 'buffer_size must be a positive integer'
+            assert int(buffer_size) > 0, msg
+            self.store_buffer_size = int(buffer_size)
+        else:
+            self.store_buffer_size = 0
+
+        # Update an existing writer
+        if hasattr(self, 'writer'):
+            self.writer.close()
+            self.writer.buffer_size = self.store_buffer_size
+
+    def get_store_buffered(self):
+        """Get whether the sww file is written via a buffer.
+        """
+
+        return self.store_buffer_size > 0
+
+    def set_store_asynchronous(self, flag=True, queue_size=4):
+        """Set whether timesteps are written to the sww file by a
+        separate writer thread, overlapping output with computation.
+
+        At each yieldstep copies of the vertex and centroid values are
+        put on a queue of at most queue_size timesteps. If the queue is
+        full evolve waits for the writer thread. The sww file is complete
+        when evolve returns. Can be combined with set_store_buffered.
+        """
+
+        if flag:
+            msg = 'queue_size must be a positive integer'
+            assert int(queue_size) > 0, msg
+            self.store_queue_size = int(queue_size)
+        else:
+            self.store_queue_size = 0
+
+        # Update an existing writer
+        if hasattr(self, 'writer'):
+            self.writer.close()
+            self.writer.queue_size = self.store_queue_size
+
+    def get_store_asynchronous(self):
+        """Get whether the sww file is written by a writer thread.
+        """
+
+        return self.store_queue_size > 0
+
+    def set_checkpointing(self, checkpoint= True, checkpoint_dir = 'CHECKPOINTS', checkpoint_step=10, checkpoint_time = None,
+                          checkpoint_format = 'pickle'):
         """
         Set up checkpointing.
 
@@ -1068,8 +1130,14 @@ class Domain(Generic_Domain):
         @param checkpoint_step: Save checkpoint files after this many yieldsteps
         @param checkpoint_time: If set, over-rides checkpoint_step. save checkpoint files
                         after this amount of walltime
+        @param checkpoint_format: 'pickle' pickles the whole domain, 'binary'
+                        stores the mesh once and then only the time varying
+                        data of the domain in numpy .npz files
         """
 
+        msg = "checkpoint_format should be 'pickle' or 'binary'"
+        assert checkpoint_format in ['pickle', 'binary'], msg
+
 
 
         if checkpoint:
@@ -1086,6 +1154,8 @@ class Domain(Generic_Domain):
                 self.checkpoint_step = 0
             else:
                 self.checkpoint_step = checkpoint_step
+            self.checkpoint_format = checkpoint_format
+            self.checkpoint_mesh_stored = False
             self.checkpoint = True
             #print self.checkpoint_dir, self.checkpoint_step
         else:
@@ -1494,6 +1564,30 @@ class Domain(Generic_Domain):
 
         self.points_file_block_line_size = points_file_block_line_size
 
+    def set_fit_processes(self, processes):
+        """Set the number of worker processes used to fit the data of
+        points files in set_quantity (see Fit.fit).
+        """
+
+        self.fit_processes = processes
+
+
+    def set_batch_structures(self, flag=True):
+        """Update the structure operators (culverts, weirs, internal
+        boundaries) of the domain together rather than one by one: with
+        array operations over all inlets (see structure_collection) or,
+        for a Parallel_domain, with two allreduce operations per timestep
+        (see parallel_structure_manager). Must be set before the structures
+        are created.
+        """
+
+        self.batch_structures = flag
+
+
+    def get_batch_structures(self):
+
+        return self.batch_structures
+
 
     # FIXME: Probably obsolete in its curren form
     def set_quantities_to_be_stored(self, q):
@@ -2436,6 +2530,28 @@ class Domain(Generic_Domain):
             self.initialise_storage()
 
 
+        try:
+            for t in self._evolve(yieldstep=yieldstep,
+                                  finaltime=finaltime, duration=duration,
+                                  skip_initial_step=skip_initial_step):
+                yield(t)
+        finally:
+            # Make sure buffered timesteps get to the sww file,
+            # also when evolve is interrupted
+            if self.store is True and hasattr(self, 'writer'):
+                self.writer.close()
+
+
+    def _evolve(self,
+                yieldstep=None,
+                finaltime=None,
+                duration=None,
+                skip_initial_step=False):
+        """Evolve loop storing sww and checkpoint data at each yieldstep.
+        """
+
+        from anuga.config import epsilon
+
         # Call basic machinery from parent class
         for t in self._evolve_base(yieldstep=yieldstep,
                                    finaltime=finaltime, duration=duration,
@@ -2449,6 +2565,10 @@ class Domain(Generic_Domain):
             if self.store is True:
                 self.store_timestep()
 
+                # Final yieldstep, so sww file should be complete
+                if self.get_time() >= self.finaltime - epsilon:
+                    self.writer.flush()
+
             if self.checkpoint:
 
 
@@ -2468,14 +2588,25 @@ class Domain(Generic_Domain):
                         save_checkpoint = True
 
                 if save_checkpoint:
-                    pickle_name = os.path.join(self.checkpoint_dir,self.get_name())+'_'+str(self.get_time())+'.pickle'
-                    cPickle.dump(self, open(pickle_name, 'wb'))
+                    if self.store is True:
+                        self.writer.flush()
+
+                    if self.checkpoint_format == 'binary':
+                        from anuga.shallow_water.checkpoint import \
+                             save_binary_checkpoint_file
+                        save_binary_checkpoint_file(self, self.checkpoint_dir)
+                    else:
+                        pickle_name = os.path.join(self.checkpoint_dir,self.get_name())+'_'+str(self.get_time())+'.pickle'
+                        cPickle.dump(self, open(pickle_name, 'wb'))
 
                     barrier()
                     self.walltime_prev = time.time()
 
                     #print 'Stored Checkpoint File '+pickle_name
 
+            if self.profiler is not None:
+                self.profiler.end_yieldstep()
+
             # Pass control on to outer loop for more specific actions
             yield(t)
 
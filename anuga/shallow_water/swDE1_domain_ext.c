@@ -741,7 +741,16 @@ double adjust_edgeflux_with_weir(double *edgeflux,
 }
 
 // Computational function for flux computation
-double _compute_fluxes_central(struct domain *D, double timestep){
+// Compute fluxes in parts, used to overlap ghost communication with
+// computation (see Parallel_domain):
+//
+// part 0  all fluxes (the usual single call)
+// part 1  fluxes of the edges with edge_mask 1 only, the explicit updates
+//         are not summed
+// part 2  the remaining fluxes, within the same flux call as part 1, and
+//         the explicit updates
+double _compute_fluxes_central_part(struct domain *D, double timestep,
+                                    long* edge_mask, int part){
 
     // Local variables
     double max_speed_local, length, inv_area, zl, zr;
@@ -767,18 +776,20 @@ double _compute_fluxes_central(struct domain *D, double timestep){
     static long base_call = 1;
     double speed_max_last, vol, weir_height;
 
-    call++; // Flag 'id' of flux calculation for this timestep
+    if (part != 2) {
+        call++; // Flag 'id' of flux calculation for this timestep
 
-    if (D->timestep_fluxcalls != timestep_fluxcalls) {
-    	timestep_fluxcalls = D->timestep_fluxcalls;
-    	base_call = call;
-    }
+        if (D->timestep_fluxcalls != timestep_fluxcalls) {
+        	timestep_fluxcalls = D->timestep_fluxcalls;
+        	base_call = call;
+        }
 
-    // Set explicit_update to zero for all conserved_quantities.
-    // This assumes compute_fluxes called before forcing terms
-    memset((char*) D->stage_explicit_update, 0, D->number_of_elements * sizeof (double));
-    memset((char*) D->xmom_explicit_update, 0, D->number_of_elements * sizeof (double));
-    memset((char*) D->ymom_explicit_update, 0, D->number_of_elements * sizeof (double));
+        // Set explicit_update to zero for all conserved_quantities.
+        // This assumes compute_fluxes called before forcing terms
+        memset((char*) D->stage_explicit_update, 0, D->number_of_elements * sizeof (double));
+        memset((char*) D->xmom_explicit_update, 0, D->number_of_elements * sizeof (double));
+        memset((char*) D->ymom_explicit_update, 0, D->number_of_elements * sizeof (double));
+    }
 
 
     // Counter for riverwall edges
@@ -790,7 +801,7 @@ double _compute_fluxes_central(struct domain *D, double timestep){
 
     // Fluxes are not updated every timestep,
     // but all fluxes ARE updated when the following condition holds
-    if(D->allow_timestep_increase[0]==1){
+    if(part != 2 && D->allow_timestep_increase[0]==1){
         // We can only increase the timestep if all fluxes are allowed to be updated
         // If this is not done the timestep can't increase (since local_timestep is static)
         local_timestep=1.0e+100;
@@ -806,7 +817,8 @@ double _compute_fluxes_central(struct domain *D, double timestep){
             ki2 = 2 * ki; //k*6 + i*2
             ki3 = 3*ki;
 
-            if ((D->already_computed_flux[ki] == call) || (D->update_next_flux[ki]!=1)) {
+            if ((D->already_computed_flux[ki] == call) || (D->update_next_flux[ki]!=1) ||
+                (part == 1 && edge_mask[ki] != 1)) {
                 // We've already computed the flux across this edge
                 // Check if it is a riverwall
                 if(D->edge_flux_type[ki] == 1){
@@ -1018,7 +1030,14 @@ double _compute_fluxes_central(struct domain *D, double timestep){
 
         } // End edge i (and neighbour n)
         // Keep track of maximal speeds
-        if(substep_count==0) D->max_speed[k] = speed_max_last; //max_speed;
+        if(substep_count==0){
+            if(part == 2){
+                // Include the edges computed in part 1
+                D->max_speed[k] = max(D->max_speed[k], speed_max_last);
+            }else{
+                D->max_speed[k] = speed_max_last; //max_speed;
+            }
+        }
 
 
     } // End triangle k
@@ -1077,6 +1096,11 @@ double _compute_fluxes_central(struct domain *D, double timestep){
     //    }
     // }
 
+    if (part == 1) {
+        // The explicit updates are summed by part 2
+        return timestep;
+    }
+
     // Now add up stage, xmom, ymom explicit updates
     for(k=0; k < D->number_of_elements; k++){
         hc = max(D->stage_centroid_values[k] - D->bed_centroid_values[k],0.);
@@ -1122,6 +1146,11 @@ double _compute_fluxes_central(struct domain *D, double timestep){
     return timestep;
 }
 
+double _compute_fluxes_central(struct domain *D, double timestep){
+
+    return _compute_fluxes_central_part(D, timestep, NULL, 0);
+}
+
 // Protect against the water elevation falling below the triangle bed
 double  _protect(int N,
          double minimum_allowed_height,
@@ -1186,9 +1215,10 @@ double  _protect(int N,
 }
 
 // Protect against the water elevation falling below the triangle bed
-double  _protect_new(struct domain *D) {
+// for the n triangles in elements, or all triangles if elements is NULL
+double  _protect_new_elements(struct domain *D, long* elements, int n) {
 
-  int k;
+  int i, k;
   double hc, bmin, bmax;
   double u, v, reduced_speed;
   double mass_error = 0.;
@@ -1223,7 +1253,12 @@ double  _protect_new(struct domain *D) {
 
   // Protect against inifintesimal and negative heights
   //if (maximum_allowed_speed < epsilon) {
-    for (k=0; k<D->number_of_elements; k++) {
+    if (elements == NULL) {
+      n = D->number_of_elements;
+    }
+
+    for (i=0; i<n; i++) {
+      k = (elements == NULL) ? i : elements[i];
       hc = wc[k] - zc[k];
       if (hc < minimum_allowed_height*1.0 ){
             // Set momentum to zero and ensure h is non negative
@@ -1259,6 +1294,10 @@ double  _protect_new(struct domain *D) {
   return mass_error;
 }
 
+double  _protect_new(struct domain *D) {
+
+  return _protect_new_elements(D, NULL, 0);
+}
 
 
 
@@ -1353,87 +1392,88 @@ int limit_gradient(double *dqv, double qmin, double qmax, double beta_w){
 //                                 double* x_centroid_work,
 //                                 double* y_centroid_work,
 //                                 long* update_extrapolation) {
-int _extrapolate_second_order_edge_sw(struct domain *D){
+// Replace momentum centroid with velocity centroid of triangle k, to allow
+// velocity extrapolation. This is changed back by _revert_velocity_element
+static void _prepare_velocity_element(struct domain *D, int k){
 
-  // Local variables
-  double a, b; // Gradient vector used to calculate edge values from centroids
-  int k, k0, k1, k2, k3, k6, coord_index, i, ii, ktmp, k_wetdry;
-  double x, y, x0, y0, x1, y1, x2, y2, xv0, yv0, xv1, yv1, xv2, yv2; // Vertices of the auxiliary triangle
-  double dx1, dx2, dy1, dy2, dxv0, dxv1, dxv2, dyv0, dyv1, dyv2, dq0, dq1, dq2, area2, inv_area2, dpth,momnorm;
-  double dqv[3], qmin, qmax, hmin, hmax, bedmax,bedmin, stagemin;
-  double hc, h0, h1, h2, beta_tmp, hfactor, xtmp, ytmp, weight, tmp;
-  double dk, dk_inv,dv0, dv1, dv2, de[3], demin, dcmax, r0scale, vel_norm, l1, l2, a_tmp, b_tmp, c_tmp,d_tmp;
+  double dk, dk_inv;
 
+  D->height_centroid_values[k] = max(D->stage_centroid_values[k] - D->bed_centroid_values[k], 0.);
 
-  memset((char*) D->x_centroid_work, 0, D->number_of_elements * sizeof (double));
-  memset((char*) D->y_centroid_work, 0, D->number_of_elements * sizeof (double));
+  dk = D->height_centroid_values[k];
+  if(dk> D->minimum_allowed_height){
+      dk_inv=1.0/dk;
+      D->x_centroid_work[k] = D->xmom_centroid_values[k];
+      D->xmom_centroid_values[k] = D->xmom_centroid_values[k]*dk_inv;
 
-  // Parameters used to control how the limiter is forced to first-order near
-  // wet-dry regions
-  a_tmp = 0.3; // Highest depth ratio with hfactor=1
-  b_tmp = 0.1; // Highest depth ratio with hfactor=0
-  c_tmp = 1.0/(a_tmp-b_tmp);
-  d_tmp = 1.0-(c_tmp*a_tmp);
+      D->y_centroid_work[k] = D->ymom_centroid_values[k];
+      D->ymom_centroid_values[k] = D->ymom_centroid_values[k]*dk_inv;
+  }else{
+      D->x_centroid_work[k] = 0.;
+      D->xmom_centroid_values[k] = 0.;
+      D->y_centroid_work[k] = 0.;
+      D->ymom_centroid_values[k] = 0.;
 
-  if(D->extrapolate_velocity_second_order==1){
+  }
+}
 
-      // Replace momentum centroid with velocity centroid to allow velocity
-      // extrapolation This will be changed back at the end of the routine
-      for (k=0; k< D->number_of_elements; k++){
+// Convert velocity back to momenta at the centroid of triangle k
+static void _revert_velocity_element(struct domain *D, int k){
 
-          D->height_centroid_values[k] = max(D->stage_centroid_values[k] - D->bed_centroid_values[k], 0.);
+  D->xmom_centroid_values[k] = D->x_centroid_work[k];
+  D->ymom_centroid_values[k] = D->y_centroid_work[k];
+}
 
-          dk = D->height_centroid_values[k];
-          if(dk> D->minimum_allowed_height){
-              dk_inv=1.0/dk;
-              D->x_centroid_work[k] = D->xmom_centroid_values[k];
-              D->xmom_centroid_values[k] = D->xmom_centroid_values[k]*dk_inv;
+// If a triangle is surrounded by dry cells (or dry cells + boundary
+// condition) set its momentum to zero too. This prevents 'pits' of
+// of water being trapped and unable to lose momentum, which can occur in
+// some situations
+static void _zero_momentum_if_dry_surrounded(struct domain *D, int k){
 
-              D->y_centroid_work[k] = D->ymom_centroid_values[k];
-              D->ymom_centroid_values[k] = D->ymom_centroid_values[k]*dk_inv;
-          }else{
-              D->x_centroid_work[k] = 0.;
-              D->xmom_centroid_values[k] = 0.;
-              D->y_centroid_work[k] = 0.;
-              D->ymom_centroid_values[k] = 0.;
+  int k0, k1, k2, k3;
 
-         }
-      }
-  }
+  k3=k*3;
+  k0 = D->surrogate_neighbours[k3];
+  k1 = D->surrogate_neighbours[k3 + 1];
+  k2 = D->surrogate_neighbours[k3 + 2];
 
-  // If a triangle is surrounded by dry cells (or dry cells + boundary
-  // condition) set its momentum to zero too. This prevents 'pits' of
-  // of water being trapped and unable to lose momentum, which can occur in
-  // some situations
-  for (k=0; k< D->number_of_elements;k++){
+  if(( (D->height_centroid_values[k0] < D->minimum_allowed_height) | k0==k) &
+     ( (D->height_centroid_values[k1] < D->minimum_allowed_height) | k1==k) &
+     ( (D->height_centroid_values[k2] < D->minimum_allowed_height) | k2==k)){
+	  	  //printf("Surrounded by dry cells\n");
+          D->x_centroid_work[k] = 0.;
+          D->xmom_centroid_values[k] = 0.;
+          D->y_centroid_work[k] = 0.;
+          D->ymom_centroid_values[k] = 0.;
 
-      k3=k*3;
-      k0 = D->surrogate_neighbours[k3];
-      k1 = D->surrogate_neighbours[k3 + 1];
-      k2 = D->surrogate_neighbours[k3 + 2];
+  }
+}
 
-      if(( (D->height_centroid_values[k0] < D->minimum_allowed_height) | k0==k) &
-         ( (D->height_centroid_values[k1] < D->minimum_allowed_height) | k1==k) &
-         ( (D->height_centroid_values[k2] < D->minimum_allowed_height) | k2==k)){
-    	  	  //printf("Surrounded by dry cells\n");
-              D->x_centroid_work[k] = 0.;
-              D->xmom_centroid_values[k] = 0.;
-              D->y_centroid_work[k] = 0.;
-              D->ymom_centroid_values[k] = 0.;
+// Extrapolate centroid values of triangle k to its edges
+static int _extrapolate_element(struct domain *D, int k){
 
-      }
+  // Local variables
+  double a, b; // Gradient vector used to calculate edge values from centroids
+  int k0, k1, k2, k3, k6, coord_index, i, ii, ktmp, k_wetdry;
+  double x, y, x0, y0, x1, y1, x2, y2, xv0, yv0, xv1, yv1, xv2, yv2; // Vertices of the auxiliary triangle
+  double dx1, dx2, dy1, dy2, dxv0, dxv1, dxv2, dyv0, dyv1, dyv2, dq0, dq1, dq2, area2, inv_area2, dpth,momnorm;
+  double dqv[3], qmin, qmax, hmin, hmax, bedmax,bedmin, stagemin;
+  double hc, h0, h1, h2, beta_tmp, hfactor, xtmp, ytmp, weight, tmp;
+  double dk, dk_inv,dv0, dv1, dv2, de[3], demin, dcmax, r0scale, vel_norm, l1, l2, a_tmp, b_tmp, c_tmp,d_tmp;
 
 
-  }
+  // Parameters used to control how the limiter is forced to first-order near
+  // wet-dry regions
+  a_tmp = 0.3; // Highest depth ratio with hfactor=1
+  b_tmp = 0.1; // Highest depth ratio with hfactor=0
+  c_tmp = 1.0/(a_tmp-b_tmp);
+  d_tmp = 1.0-(c_tmp*a_tmp);
 
-  // Begin extrapolation routine
-  for (k = 0; k < D->number_of_elements; k++)
-  {
 
     // Don't update the extrapolation if the flux will not be computed on the
     // next timestep
     if(D->update_extrapolation[k]==0){
-       continue;
+       return 0;
     }
 
 
@@ -1464,7 +1504,7 @@ int _extrapolate_second_order_edge_sw(struct domain *D){
       D->height_edge_values[k3+1] = dk;
       D->height_edge_values[k3+2] = dk;
 
-      continue;
+      return 0;
     }
     else
     {
@@ -1563,7 +1603,7 @@ int _extrapolate_second_order_edge_sw(struct domain *D){
           D->ymom_edge_values[k3+1]  = D->ymom_centroid_values[k];
           D->ymom_edge_values[k3+2]  = D->ymom_centroid_values[k];
 
-          continue;
+          return 0;
       }
 
       // Calculate heights of neighbouring cells
@@ -1982,58 +2022,143 @@ int _extrapolate_second_order_edge_sw(struct domain *D){
               D->ymom_edge_values[k3 + i] = D->ymom_centroid_values[k] + dqv[i];
               }
     } // else [number_of_boundaries==2]
-  } // for k=0 to number_of_elements-1
 
+  return 0;
+}
+
+// Compute vertex values of triangle k from its edge values
+static void _compute_vertex_values_element(struct domain *D, int k){
+
+  int i, k3;
+  double dk;
+
+  // Don't proceed if we didn't update the edge/vertex values
+  if(D->update_extrapolation[k]==0){
+     return;
+  }
+
+  k3=3*k;
+
+  // Compute stage vertex values
+  D->stage_vertex_values[k3] = D->stage_edge_values[k3+1] + D->stage_edge_values[k3+2] - D->stage_edge_values[k3] ;
+  D->stage_vertex_values[k3+1] =  D->stage_edge_values[k3] + D->stage_edge_values[k3+2]- D->stage_edge_values[k3+1];
+  D->stage_vertex_values[k3+2] =  D->stage_edge_values[k3] + D->stage_edge_values[k3+1]- D->stage_edge_values[k3+2];
+
+  // Compute height vertex values
+  D->height_vertex_values[k3] = D->height_edge_values[k3+1] + D->height_edge_values[k3+2] - D->height_edge_values[k3] ;
+  D->height_vertex_values[k3+1] =  D->height_edge_values[k3] + D->height_edge_values[k3+2]- D->height_edge_values[k3+1];
+  D->height_vertex_values[k3+2] =  D->height_edge_values[k3] + D->height_edge_values[k3+1]- D->height_edge_values[k3+2];
+
+  // If needed, convert from velocity to momenta
+  if(D->extrapolate_velocity_second_order==1){
+      // Re-compute momenta at edges
+      for (i=0; i<3; i++){
+          dk= D->height_edge_values[k3+i];
+          D->xmom_edge_values[k3+i] = D->xmom_edge_values[k3+i]*dk;
+          D->ymom_edge_values[k3+i] = D->ymom_edge_values[k3+i]*dk;
+      }
+  }
+  // Compute momenta at vertices
+  D->xmom_vertex_values[k3]   =  D->xmom_edge_values[k3+1] + D->xmom_edge_values[k3+2] - D->xmom_edge_values[k3] ;
+  D->xmom_vertex_values[k3+1] =  D->xmom_edge_values[k3] + D->xmom_edge_values[k3+2]- D->xmom_edge_values[k3+1];
+  D->xmom_vertex_values[k3+2] =  D->xmom_edge_values[k3] + D->xmom_edge_values[k3+1]- D->xmom_edge_values[k3+2];
+  D->ymom_vertex_values[k3]   =  D->ymom_edge_values[k3+1] + D->ymom_edge_values[k3+2] - D->ymom_edge_values[k3] ;
+  D->ymom_vertex_values[k3+1] =  D->ymom_edge_values[k3] + D->ymom_edge_values[k3+2]- D->ymom_edge_values[k3+1];
+  D->ymom_vertex_values[k3+2] =  D->ymom_edge_values[k3] + D->ymom_edge_values[k3+1]- D->ymom_edge_values[k3+2];
+
+  // Compute new bed elevation
+  D->bed_edge_values[k3]= D->stage_edge_values[k3]- D->height_edge_values[k3];
+  D->bed_edge_values[k3+1]= D->stage_edge_values[k3+1]- D->height_edge_values[k3+1];
+  D->bed_edge_values[k3+2]= D->stage_edge_values[k3+2]- D->height_edge_values[k3+2];
+  D->bed_vertex_values[k3] = D->bed_edge_values[k3+1] + D->bed_edge_values[k3+2] - D->bed_edge_values[k3] ;
+  D->bed_vertex_values[k3+1] =  D->bed_edge_values[k3] + D->bed_edge_values[k3+2] - D->bed_edge_values[k3+1];
+  D->bed_vertex_values[k3+2] =  D->bed_edge_values[k3] + D->bed_edge_values[k3+1] - D->bed_edge_values[k3+2];
+}
+
+int _extrapolate_second_order_edge_sw(struct domain *D){
+
+  int k;
+
+  memset((char*) D->x_centroid_work, 0, D->number_of_elements * sizeof (double));
+  memset((char*) D->y_centroid_work, 0, D->number_of_elements * sizeof (double));
+
+  if(D->extrapolate_velocity_second_order==1){
+      for (k=0; k< D->number_of_elements; k++){
+          _prepare_velocity_element(D, k);
+      }
+  }
+
+  for (k=0; k< D->number_of_elements;k++){
+      _zero_momentum_if_dry_surrounded(D, k);
+  }
+
+  // Begin extrapolation routine
+  for (k = 0; k < D->number_of_elements; k++){
+      if (_extrapolate_element(D, k) == -1){
+          return -1;
+      }
+  }
 
   // Compute vertex values of quantities
   for (k=0; k< D->number_of_elements; k++){
       if(D->extrapolate_velocity_second_order==1){
-          //Convert velocity back to momenta at centroids
-          D->xmom_centroid_values[k] = D->x_centroid_work[k];
-          D->ymom_centroid_values[k] = D->y_centroid_work[k];
+          _revert_velocity_element(D, k);
       }
+      _compute_vertex_values_element(D, k);
+  }
 
-      // Don't proceed if we didn't update the edge/vertex values
-      if(D->update_extrapolation[k]==0){
-         continue;
-      }
+  return 0;
+}
 
-      k3=3*k;
 
-      // Compute stage vertex values
-      D->stage_vertex_values[k3] = D->stage_edge_values[k3+1] + D->stage_edge_values[k3+2] - D->stage_edge_values[k3] ;
-      D->stage_vertex_values[k3+1] =  D->stage_edge_values[k3] + D->stage_edge_values[k3+2]- D->stage_edge_values[k3+1];
-      D->stage_vertex_values[k3+2] =  D->stage_edge_values[k3] + D->stage_edge_values[k3+1]- D->stage_edge_values[k3+2];
+// Extrapolation of a part of the triangles, used to overlap ghost
+// communication with computation (see Parallel_domain). part 1 uses the
+// triangles which do not depend on ghost values, part 2 the remaining
+// ones once the ghost values have arrived.
+//
+// prepare     triangles whose velocity is computed (part 1: all non ghost
+//             triangles, part 2: the ghost triangles)
+// dry         triangles checked for dry neighbours
+// extrapolate triangles extrapolated to edges and vertices
+//
+// The velocities are converted back to momenta for all triangles at the
+// end of part 2.
+int _extrapolate_second_order_edge_sw_part(struct domain *D, int part,
+                                           long* prepare, int n_prepare,
+                                           long* dry, int n_dry,
+                                           long* extrapolate, int n_extrapolate){
+
+  int i, k;
+
+  if (part == 1){
+      memset((char*) D->x_centroid_work, 0, D->number_of_elements * sizeof (double));
+      memset((char*) D->y_centroid_work, 0, D->number_of_elements * sizeof (double));
+  }
 
-      // Compute height vertex values
-      D->height_vertex_values[k3] = D->height_edge_values[k3+1] + D->height_edge_values[k3+2] - D->height_edge_values[k3] ;
-      D->height_vertex_values[k3+1] =  D->height_edge_values[k3] + D->height_edge_values[k3+2]- D->height_edge_values[k3+1];
-      D->height_vertex_values[k3+2] =  D->height_edge_values[k3] + D->height_edge_values[k3+1]- D->height_edge_values[k3+2];
+  if(D->extrapolate_velocity_second_order==1){
+      for (i=0; i< n_prepare; i++){
+          _prepare_velocity_element(D, prepare[i]);
+      }
+  }
 
-      // If needed, convert from velocity to momenta
-      if(D->extrapolate_velocity_second_order==1){
-          // Re-compute momenta at edges
-          for (i=0; i<3; i++){
-              dk= D->height_edge_values[k3+i];
-              D->xmom_edge_values[k3+i] = D->xmom_edge_values[k3+i]*dk;
-              D->ymom_edge_values[k3+i] = D->ymom_edge_values[k3+i]*dk;
-          }
+  for (i=0; i< n_dry; i++){
+      _zero_momentum_if_dry_surrounded(D, dry[i]);
+  }
+
+  for (i=0; i< n_extrapolate; i++){
+      if (_extrapolate_element(D, extrapolate[i]) == -1){
+          return -1;
+      }
+  }
+
+  if (part == 2 && D->extrapolate_velocity_second_order==1){
+      for (k=0; k< D->number_of_elements; k++){
+          _revert_velocity_element(D, k);
       }
-      // Compute momenta at vertices
-      D->xmom_vertex_values[k3]   =  D->xmom_edge_values[k3+1] + D->xmom_edge_values[k3+2] - D->xmom_edge_values[k3] ;
-      D->xmom_vertex_values[k3+1] =  D->xmom_edge_values[k3] + D->xmom_edge_values[k3+2]- D->xmom_edge_values[k3+1];
-      D->xmom_vertex_values[k3+2] =  D->xmom_edge_values[k3] + D->xmom_edge_values[k3+1]- D->xmom_edge_values[k3+2];
-      D->ymom_vertex_values[k3]   =  D->ymom_edge_values[k3+1] + D->ymom_edge_values[k3+2] - D->ymom_edge_values[k3] ;
-      D->ymom_vertex_values[k3+1] =  D->ymom_edge_values[k3] + D->ymom_edge_values[k3+2]- D->ymom_edge_values[k3+1];
-      D->ymom_vertex_values[k3+2] =  D->ymom_edge_values[k3] + D->ymom_edge_values[k3+1]- D->ymom_edge_values[k3+2];
-
-      // Compute new bed elevation
-      D->bed_edge_values[k3]= D->stage_edge_values[k3]- D->height_edge_values[k3];
-      D->bed_edge_values[k3+1]= D->stage_edge_values[k3+1]- D->height_edge_values[k3+1];
-      D->bed_edge_values[k3+2]= D->stage_edge_values[k3+2]- D->height_edge_values[k3+2];
-      D->bed_vertex_values[k3] = D->bed_edge_values[k3+1] + D->bed_edge_values[k3+2] - D->bed_edge_values[k3] ;
-      D->bed_vertex_values[k3+1] =  D->bed_edge_values[k3] + D->bed_edge_values[k3+2] - D->bed_edge_values[k3+1];
-      D->bed_vertex_values[k3+2] =  D->bed_edge_values[k3] + D->bed_edge_values[k3+1] - D->bed_edge_values[k3+2];
+  }
+
+  for (i=0; i< n_extrapolate; i++){
+      _compute_vertex_values_element(D, extrapolate[i]);
   }
 
   return 0;
@@ -2085,6 +2210,34 @@ PyObject *swde1_compute_fluxes_ext_central(PyObject *self, PyObject *args) {
 }
 
 
+PyObject *swde1_compute_fluxes_ext_central_part(PyObject *self, PyObject *args) {
+  /*Compute a part of the fluxes, see _compute_fluxes_central_part.
+
+    edge_mask is an integer array with an entry for each edge, fluxes
+    of edges with mask 1 are computed by part 1.
+  */
+  struct domain D;
+  PyObject *domain;
+  PyArrayObject *edge_mask;
+
+  double timestep;
+  int part;
+
+  if (!PyArg_ParseTuple(args, "OdOi", &domain, &timestep, &edge_mask, &part)) {
+      report_python_error(AT, "could not parse input arguments");
+      return NULL;
+  }
+
+  get_python_domain(&D,domain);
+
+  timestep=_compute_fluxes_central_part(&D, timestep,
+                                        (long*) edge_mask->data, part);
+
+  // Return updated flux timestep
+  return Py_BuildValue("d", timestep);
+}
+
+
 PyObject *swde1_flux_function_central(PyObject *self, PyObject *args) {
   //
   // Gateway to innermost flux function.
@@ -2271,6 +2424,40 @@ PyObject *swde1_extrapolate_second_order_edge_sw(PyObject *self, PyObject *args)
 
 }// extrapolate_second-order_edge_sw
 
+
+PyObject *swde1_extrapolate_second_order_edge_sw_part(PyObject *self, PyObject *args) {
+  /*Extrapolate a part of the triangles, see
+    _extrapolate_second_order_edge_sw_part. prepare, dry and extrapolate
+    are integer arrays of triangle indices.
+  */
+
+  struct domain D;
+  PyObject *domain;
+  PyArrayObject *prepare, *dry, *extrapolate;
+
+  int e, part;
+
+  if (!PyArg_ParseTuple(args, "OiOOO", &domain, &part,
+                        &prepare, &dry, &extrapolate)) {
+      report_python_error(AT, "could not parse input arguments");
+      return NULL;
+  }
+
+  get_python_domain(&D, domain);
+
+  e = _extrapolate_second_order_edge_sw_part(&D, part,
+          (long*) prepare->data, (int) prepare->dimensions[0],
+          (long*) dry->data, (int) dry->dimensions[0],
+          (long*) extrapolate->data, (int) extrapolate->dimensions[0]);
+
+  if (e == -1) {
+    // Use error string set inside computational routine
+    return NULL;
+  }
+
+  return Py_BuildValue("");
+}
+
 //========================================================================
 // Protect -- to prevent the water level from falling below the minimum
 // bed_edge_value
@@ -2354,6 +2541,32 @@ PyObject *swde1_protect_new(PyObject *self, PyObject *args) {
 }
 
 
+PyObject *swde1_protect_new_part(PyObject *self, PyObject *args) {
+  //
+  //    protect_new_part(domain, elements) protects the triangles in the
+  //    integer array elements only
+
+	struct domain D;
+	PyObject *domain;
+	PyArrayObject *elements;
+
+	double mass_error;
+
+	// Convert Python arguments to C
+	if (!PyArg_ParseTuple(args, "OO", &domain, &elements)) {
+		report_python_error(AT, "could not parse input arguments");
+		return NULL;
+	}
+
+	get_python_domain(&D, domain);
+
+	mass_error = _protect_new_elements(&D, (long*) elements->data,
+	                                   (int) elements->dimensions[0]);
+
+	return Py_BuildValue("d", mass_error);
+}
+
+
 
 
 //========================================================================
@@ -2491,12 +2704,15 @@ static struct PyMethodDef MethodTable[] = {
    */
   //{"rotate", (PyCFunction)rotate, METH_VARARGS | METH_KEYWORDS, "Print out"},
   {"compute_fluxes_ext_central", swde1_compute_fluxes_ext_central, METH_VARARGS, "Print out"},
+  {"compute_fluxes_ext_central_part", swde1_compute_fluxes_ext_central_part, METH_VARARGS, "Print out"},
   {"gravity_c",        swde1_gravity,            METH_VARARGS, "Print out"},
   {"flux_function_central", swde1_flux_function_central, METH_VARARGS, "Print out"},
   {"extrapolate_second_order_edge_sw", swde1_extrapolate_second_order_edge_sw, METH_VARARGS, "Print out"},
+  {"extrapolate_second_order_edge_sw_part", swde1_extrapolate_second_order_edge_sw_part, METH_VARARGS, "Print out"},
   {"compute_flux_update_frequency", swde1_compute_flux_update_frequency, METH_VARARGS, "Print out"},
   {"protect",          swde1_protect, METH_VARARGS | METH_KEYWORDS, "Print out"},
   {"protect_new",      swde1_protect_new, METH_VARARGS | METH_KEYWORDS, "Print out"},
+  {"protect_new_part", swde1_protect_new_part, METH_VARARGS, "Print out"},
   {"evolve_one_euler_step", swde1_evolve_one_euler_step, METH_VARARGS | METH_KEYWORDS, "Print out"},
   {NULL, NULL, 0, NULL}
 };
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+import unittest
+import os
+import json
+import tempfile
+
+from anuga.shallow_water.benchmark_solvers import run_benchmarks
+
+
+class Test_benchmark_solvers(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_run_benchmarks(self):
+
+        run_benchmarks(self.filename,
+                       mesh_sizes=[4],
+                       flow_algorithms=['DE0', '2_0'],
+                       number_of_steps=5)
+
+        benchmark = json.load(open(self.filename))
+
+        assert benchmark['number_of_steps'] == 5
+
+        results = benchmark['results']
+        assert len(results) == 4
+
+        for result in results:
+            assert result['mesh_type'] in ['rectangular', 'irregular']
+            assert result['flow_algorithm'] in ['DE0', '2_0']
+            assert result['number_of_steps'] >= 5
+            assert result['triangle_updates_per_second'] > 0.0
+            assert result['sww_bytes'] > 0
+            assert 'compute_fluxes' in result['profile']
+            assert result['memory_growth_mb'] >= 0.0
+
+        assert results[0]['number_of_triangles'] == 4*4*4
+
+    def test_run_benchmarks_same_process(self):
+
+        run_benchmarks(self.filename,
+                       mesh_types=['rectangular'],
+                       mesh_sizes=[4],
+                       flow_algorithms=['DE0'],
+                       number_of_steps=5,
+                       separate_processes=False)
+
+        benchmark = json.load(open(self.filename))
+
+        assert not benchmark['separate_processes']
+
+        result = benchmark['results'][0]
+        assert result['number_of_steps'] >= 5
+        assert result['compute_time'] <= result['evolve_time']
+
+
+#-------------------------------------------------------------
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(Test_benchmark_solvers, 'test')
+    runner = unittest.TextTestRunner()
+    runner.run(suite)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+#
+
+import unittest
+import os
+import shutil
+import tempfile
+
+import numpy as num
+
+import anuga
+from anuga.shallow_water.checkpoint import load_checkpoint_file
+from anuga.file.sww import SWW_file
+
+
+class Test_checkpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.checkpoint_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.checkpoint_dir)
+
+    def create_domain(self, name):
+
+        domain = anuga.rectangular_cross_domain(6, 4, len1=6.0, len2=4.0)
+        domain.set_name(name)
+        domain.set_datadir(self.checkpoint_dir)
+        domain.set_quantity('elevation', lambda x, y: -x/10.0)
+        domain.set_quantity('stage', expression='elevation + 0.2')
+        domain.set_quantity('friction', 0.01)
+
+        Br = anuga.Reflective_boundary(domain)
+        Bd = anuga.Dirichlet_boundary([0.3, 0.0, 0.0])
+        domain.set_boundary({'left': Bd, 'right': Br, 'top': Br, 'bottom': Br})
+
+        return domain
+
+    def test_binary_checkpoint(self):
+
+        domain = self.create_domain('binary_checkpoint')
+        domain.set_checkpointing(checkpoint_dir=self.checkpoint_dir,
+                                 checkpoint_step=2,
+                                 checkpoint_format='binary')
+
+        for t in domain.evolve(yieldstep=0.5, finaltime=2.0):
+            pass
+
+        files = os.listdir(self.checkpoint_dir)
+        assert 'binary_checkpoint_mesh.npz' in files
+        assert len([f for f in files if f.endswith('.pickle')]) == 0
+
+        time = domain.get_time()
+
+        # Restore into a domain set up by the user
+        domain2 = self.create_domain('binary_checkpoint')
+        domain2 = load_checkpoint_file(domain_name='binary_checkpoint',
+                                       checkpoint_dir=self.checkpoint_dir,
+                                       domain=domain2)
+
+        # Restore into a domain created from the stored mesh
+        domain3 = load_checkpoint_file(domain_name='binary_checkpoint',
+                                       checkpoint_dir=self.checkpoint_dir)
+
+        for restored in [domain2, domain3]:
+            assert num.allclose(restored.get_time(), time)
+            assert restored.evolved_called
+            for name in ['stage', 'xmomentum', 'ymomentum', 'elevation']:
+                assert num.allclose(
+                    restored.quantities[name].centroid_values,
+                    domain.quantities[name].centroid_values)
+            assert isinstance(restored.writer, SWW_file)
+
+        assert num.allclose(domain3.get_nodes(), domain.get_nodes())
+        assert num.all(domain3.get_triangles() == domain.get_triangles())
+        assert domain3.boundary == domain.boundary
+        assert domain3.get_flow_algorithm() == domain.get_flow_algorithm()
+        assert domain3.checkpoint_format == 'binary'
+
+    def test_binary_checkpoint_incremental(self):
+        """Checkpoints hold neither static quantities nor operator
+        aliases of domain arrays.
+        """
+
+        domain = self.create_domain('binary_incremental')
+        op = anuga.Rate_operator(domain, rate=0.1)
+        domain.set_checkpointing(checkpoint_dir=self.checkpoint_dir,
+                                 checkpoint_step=2,
+                                 checkpoint_format='binary')
+
+        for t in domain.evolve(yieldstep=0.5, finaltime=1.0):
+            pass
+
+        # Change a static quantity after the mesh was stored
+        domain.set_quantity('friction', 0.02)
+        from anuga.shallow_water.checkpoint import save_binary_checkpoint_file
+        save_binary_checkpoint_file(domain, self.checkpoint_dir)
+
+        mesh = num.load(os.path.join(self.checkpoint_dir,
+                                     'binary_incremental_mesh.npz'))
+        assert 'centroid_values_friction' in mesh.files
+        mesh.close()
+
+        state = num.load(os.path.join(self.checkpoint_dir,
+                                      'binary_incremental_1.0.npz'))
+        keys = state.files
+        state.close()
+
+        assert 'centroid_values_stage' in keys
+        assert 'centroid_values_x' not in keys
+        assert 'centroid_values_friction' in keys
+        assert 'centroid_values_elevation' not in keys
+        for attribute in ['stage_c', 'xmom_c', 'ymom_c', 'elev_c',
+                          'coord_c', 'areas']:
+            assert 'operator_0_%s' % attribute not in keys
+
+        # Static quantities come from the mesh file
+        domain2 = load_checkpoint_file(domain_name='binary_incremental',
+                                       checkpoint_dir=self.checkpoint_dir)
+        for name in ['stage', 'elevation', 'friction', 'x', 'y']:
+            assert num.allclose(domain2.quantities[name].centroid_values,
+                                domain.quantities[name].centroid_values)
+        assert domain2.checkpoint_dir == self.checkpoint_dir
+
+    def test_binary_checkpoint_operator_scalars(self):
+        """Python and numpy scalars of operators are restored with
+        their type.
+        """
+
+        from anuga.operators.base_operator import Operator
+
+        class Scalar_operator(Operator):
+            def __call__(self):
+                pass
+
+        def create_operator(domain):
+            op = Scalar_operator(domain)
+            op.flag = False
+            op.count = 0
+            op.total = 0.0
+            op.steps = num.int32(0)
+            op.maximum = num.float32(0.0)
+            op.wet = num.bool_(False)
+            return op
+
+        domain = self.create_domain('binary_scalars')
+        op = create_operator(domain)
+        domain.set_checkpointing(checkpoint_dir=self.checkpoint_dir,
+                                 checkpoint_step=2,
+                                 checkpoint_format='binary')
+
+        op.flag = True
+        op.count = 7
+        op.total = 2.5
+        op.steps = num.int32(3)
+        op.maximum = num.float32(1.5)
+        op.wet = num.bool_(True)
+
+        for t in domain.evolve(yieldstep=0.5, finaltime=1.0):
+            pass
+
+        domain2 = self.create_domain('binary_scalars')
+        op2 = create_operator(domain2)
+        domain2 = load_checkpoint_file(domain_name='binary_scalars',
+                                       checkpoint_dir=self.checkpoint_dir,
+                                       domain=domain2)
+
+        for attribute in ['flag', 'count', 'total', 'steps', 'maximum',
+                          'wet']:
+            value = getattr(op2, attribute)
+            assert value == getattr(op, attribute), attribute
+            assert type(value) == type(getattr(op, attribute)), attribute
+
+    def test_binary_checkpoint_restart(self):
+
+        # Reference run straight through
+        domain = self.create_domain('reference')
+        for t in domain.evolve(yieldstep=0.5, finaltime=3.0):
+            pass
+
+        domain1 = self.create_domain('restart')
+        domain1.set_checkpointing(checkpoint_dir=self.checkpoint_dir,
+                                  checkpoint_step=2,
+                                  checkpoint_format='binary')
+        for t in domain1.evolve(yieldstep=0.5, finaltime=1.5):
+            pass
+
+        domain2 = self.create_domain('restart')
+        domain2 = load_checkpoint_file(domain_name='restart',
+                                       checkpoint_dir=self.checkpoint_dir,
+                                       domain=domain2)
+
+        for t in domain2.evolve(yieldstep=0.5, finaltime=3.0):
+            pass
+
+        assert num.allclose(domain2.get_time(), domain.get_time())
+        assert num.allclose(domain2.quantities['stage'].centroid_values,
+                            domain.quantities['stage'].centroid_values)
+
+        # Continued sww file has the same timeslices as the reference
+        fid = anuga.file.netcdf.NetCDFFile(
+                  os.path.join(self.checkpoint_dir, 'restart.sww'))
+        times = fid.variables['time'][:]
+        fid.close()
+
+        assert num.allclose(times, num.arange(0.0, 3.01, 0.5))
+
+
+#-------------------------------------------------------------
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(Test_checkpoint,'test')
+    runner = unittest.TextTestRunner()
+    runner.run(suite)
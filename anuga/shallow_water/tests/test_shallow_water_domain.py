@@ -6115,6 +6115,63 @@ class Test_Shallow_Water(unittest.TestCase):
         os.remove(domain1.get_name() + '.sww')
         os.remove(domain2.get_name() + '.sww')
 
+    def test_spatio_temporal_boundary_segment(self):
+        """Test that evaluate_segment of File_boundary, Field_boundary and
+        AWI_boundary gives the same boundary values as evaluate applied
+        edge by edge.
+        """
+
+        from anuga.abstract_2d_finite_volumes.mesh_factory import rectangular
+
+        # Create sww file of simple propagation from left to right
+        points, vertices, boundary = rectangular(4, 4)
+
+        domain1 = Domain(points, vertices, boundary)
+        domain1.set_datadir('.')
+        domain1.set_name('spatio_temporal_boundary_segment' + str(time.time()))
+        domain1.set_quantity('elevation', lambda x, y: -x/2)
+        domain1.set_quantity('stage', 0)
+
+        Br = Reflective_boundary(domain1)
+        Bd = Dirichlet_boundary([0.3, 0.1, 0])
+        domain1.set_boundary({'left': Bd, 'top': Bd, 'right': Br, 'bottom': Br})
+
+        for t in domain1.evolve(yieldstep=0.5, finaltime=3):
+            pass
+
+        # Domain with boundary inside domain1
+        points, vertices, boundary = rectangular(3, 3, len1=0.8, len2=0.8,
+                                                 origin=(0.1, 0.1))
+
+        domain2 = Domain(points, vertices, boundary)
+        domain2.set_quantity('elevation', lambda x, y: -x/2)
+        domain2.set_quantity('stage', 0.05)
+        domain2.set_quantity('xmomentum', 0.02)
+        domain2.distribute_to_vertices_and_edges()
+
+        filename = domain1.get_name() + '.sww'
+        Bfile = File_boundary(filename, domain2)
+        Bfield = Field_boundary(filename, domain2, mean_stage=0.1)
+        Bawi = AWI_boundary(filename, domain2)
+
+        for B in [Bfile, Bfield, Bawi]:
+            for t in [0.0, 0.25, 1.3, 3.0]:
+                domain2.set_time(t)
+
+                segment_edges = domain2.tag_boundary_cells['left']
+                B.evaluate_segment(domain2, segment_edges)
+
+                for i in segment_edges:
+                    vol_id = domain2.boundary_cells[i]
+                    edge_id = domain2.boundary_edges[i]
+                    q = B.evaluate(vol_id, edge_id)
+
+                    for j, name in enumerate(domain2.conserved_quantities):
+                        Q = domain2.quantities[name]
+                        assert num.allclose(Q.boundary_values[i], q[j])
+
+        os.remove(filename)
+
     def test_spatio_temporal_boundary_2(self):
         """Test that boundary values can be read from file and interpolated
         in both time and space.
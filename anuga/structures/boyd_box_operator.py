@@ -397,3 +397,90 @@ def boyd_box_function(width,
 
     return Q, barrel_velocity, outlet_culvert_depth, flow_area, case
 
+
+
+#=============================================================================
+# Array version of boyd_box_function, used by the structure collection
+# (see structure_collection) to compute the discharge of many culverts at
+# once. All arguments are arrays (or scalars) and the case is returned as
+# an index into boyd_box_cases.
+#=============================================================================
+boyd_box_cases = ['100 blocked culvert',
+                  'Inlet CTRL Outlet unsubmerged PIPE PART FULL',
+                  'INLET CTRL Culvert is open channel flow we will for now assume critical depth',
+                  'Outlet submerged',
+                  'Outlet is Flowing Full',
+                  'Outlet is open channel flow']
+
+
+def boyd_box_function_vectorised(width,
+                                 depth,
+                                 blockage,
+                                 barrels,
+                                 flow_width,
+                                 length,
+                                 driving_energy,
+                                 delta_total_energy,
+                                 outlet_enquiry_depth,
+                                 sum_loss,
+                                 manning):
+
+    width, depth, blockage, barrels, flow_width, length, driving_energy, \
+        delta_total_energy, outlet_enquiry_depth, sum_loss, manning = \
+        numpy.broadcast_arrays(*[numpy.asarray(x, dtype=numpy.float) for x in
+                                 [width, depth, blockage, barrels, flow_width,
+                                  length, driving_energy, delta_total_energy,
+                                  outlet_enquiry_depth, sum_loss, manning]])
+
+    with numpy.errstate(all='ignore'):
+
+        bf = 1 - blockage
+
+        Q_inlet_unsubmerged = 0.544*anuga.g**0.5*bf*width*barrels*driving_energy**1.50
+        Q_inlet_submerged = 0.702*anuga.g**0.5*bf*width*barrels*depth**0.89*driving_energy**0.61
+
+        Q = numpy.where(Q_inlet_unsubmerged < Q_inlet_submerged,
+                        Q_inlet_unsubmerged, Q_inlet_submerged)
+
+        # Inlet control
+        dcrit = (Q**2/anuga.g/(bf*width*barrels)**2)**0.333333
+
+        full = dcrit > depth
+        outlet_culvert_depth = numpy.where(full, depth, dcrit)
+        flow_area = numpy.where(full, bf*width*barrels*depth,
+                                bf*width*barrels*dcrit)
+        perimeter = numpy.where(full, 2*(bf*width*barrels + depth),
+                                bf*width*barrels + 2*dcrit)
+        case = numpy.where(full, 1, 2)
+
+        # Outlet control
+        outlet_control = delta_total_energy < driving_energy
+        submerged = outlet_control & (outlet_enquiry_depth > depth)
+
+        outlet_culvert_depth = numpy.where(submerged, depth,
+                                           outlet_culvert_depth)
+        flow_area = numpy.where(submerged, bf*width*barrels*depth, flow_area)
+        perimeter = numpy.where(submerged, 2.0*(bf*width*barrels + depth),
+                                perimeter)
+        case = numpy.where(outlet_control, numpy.where(full, 4, 5), case)
+        case = numpy.where(submerged, 3, case)
+
+        hyd_rad = flow_area/perimeter
+
+        culvert_velocity = numpy.sqrt(delta_total_energy/((sum_loss/2/anuga.g)\
+                                          +(manning**2*length)/hyd_rad**1.33333))
+        Q_outlet_tailwater = flow_area * culvert_velocity
+
+        Q = numpy.where(outlet_control, numpy.minimum(Q, Q_outlet_tailwater), Q)
+
+        # Determine momentum at the outlet
+        barrel_velocity = Q/(flow_area + anuga.velocity_protection/flow_area)
+
+    blocked = blockage >= 1.0
+    Q = numpy.where(blocked, 0.0, Q)
+    barrel_velocity = numpy.where(blocked, 0.0, barrel_velocity)
+    outlet_culvert_depth = numpy.where(blocked, 0.0, outlet_culvert_depth)
+    flow_area = numpy.where(blocked, 0.00001, flow_area)
+    case = numpy.where(blocked, 0, case)
+
+    return Q, barrel_velocity, outlet_culvert_depth, flow_area, case
@@ -402,3 +402,106 @@ def boyd_pipe_function(depth,
 
     return Q, barrel_velocity, outlet_culvert_depth, flow_area, case
 
+
+
+#=============================================================================
+# Array version of boyd_pipe_function, used by the structure collection
+# (see structure_collection) to compute the discharge of many culverts at
+# once. All arguments are arrays (or scalars) and the case is returned as
+# an index into boyd_pipe_cases.
+#=============================================================================
+boyd_pipe_cases = ['100 blocked culvert',
+                   'Inlet CTRL Outlet submerged Circular PIPE FULL',
+                   'INLET CTRL Culvert is open channel flow we will for now assume critical depth',
+                   'Outlet submerged',
+                   'Outlet unsubmerged PIPE FULL',
+                   'Outlet is open channel flow we will for now assume critical depth']
+
+
+def boyd_pipe_function_vectorised(depth,
+                                  diameter,
+                                  blockage,
+                                  barrels,
+                                  length,
+                                  driving_energy,
+                                  delta_total_energy,
+                                  outlet_enquiry_depth,
+                                  sum_loss,
+                                  manning):
+
+    depth, diameter, blockage, barrels, length, driving_energy, \
+        delta_total_energy, outlet_enquiry_depth, sum_loss, manning = \
+        numpy.broadcast_arrays(*[numpy.asarray(x, dtype=numpy.float) for x in
+                                 [depth, diameter, blockage, barrels, length,
+                                  driving_energy, delta_total_energy,
+                                  outlet_enquiry_depth, sum_loss, manning]])
+
+    with numpy.errstate(all='ignore'):
+
+        bf = numpy.where(blockage > 0.9, 3.333-3.333*blockage,
+                         1.0-0.4012316798*blockage-0.3768350138*(blockage**2))
+
+        # Calculate flows for inlet control for circular pipe
+        Q_inlet_unsubmerged = barrels * (0.421*anuga.g**0.5*((bf*diameter)**0.87)*driving_energy**1.63)
+        Q_inlet_submerged = barrels * (0.530*anuga.g**0.5*((bf*diameter)**1.87)*driving_energy**0.63)
+
+        Q = numpy.minimum(Q_inlet_unsubmerged, Q_inlet_submerged)
+
+        dcrit1 = (bf*diameter)/1.26*(Q/anuga.g**0.5*((bf*diameter)**2.5))**(1/3.75)
+        dcrit2 = (bf*diameter)/0.95*(Q/anuga.g**0.5*(bf*diameter)**2.5)**(1/1.95)
+        dcrit = numpy.where(dcrit1/(bf*diameter) > 0.85, dcrit2, dcrit1)
+
+        # Pipe flowing full and partly full
+        full_area = barrels * (bf*diameter/2)**2 * math.pi
+        full_perimeter = barrels * bf*diameter * math.pi
+
+        alpha = numpy.arccos(numpy.clip(1-2*dcrit/(bf*diameter), -1.0, 1.0))*2
+        part_area = barrels * (bf*diameter)**2/8*(alpha - numpy.sin(alpha))
+
+        # Inlet control
+        full = dcrit >= (bf*diameter)
+        outlet_culvert_depth = numpy.where(full, bf*diameter, dcrit)
+        flow_area = numpy.where(full, full_area, part_area)
+        perimeter = numpy.where(full, full_perimeter,
+                                barrels * (alpha*bf*diameter/2.0))
+        case = numpy.where(full, 1, 2)
+
+        # Outlet control
+        outlet_control = delta_total_energy < driving_energy
+        submerged = outlet_control & (outlet_enquiry_depth > bf*diameter)
+        outlet_full = outlet_control & ~submerged & (dcrit > bf*diameter)
+        outlet_part = outlet_control & ~submerged & ~(dcrit > bf*diameter)
+
+        outlet_culvert_depth = numpy.where(submerged | outlet_full,
+                                           bf*diameter, outlet_culvert_depth)
+        outlet_culvert_depth = numpy.where(outlet_part, dcrit,
+                                           outlet_culvert_depth)
+        flow_area = numpy.where(submerged | outlet_full, full_area, flow_area)
+        flow_area = numpy.where(outlet_part, part_area, flow_area)
+        perimeter = numpy.where(submerged | outlet_full, full_perimeter,
+                                perimeter)
+        perimeter = numpy.where(outlet_part,
+                                barrels * alpha*bf*diameter/2.0, perimeter)
+        case = numpy.where(submerged, 3, case)
+        case = numpy.where(outlet_full, 4, case)
+        case = numpy.where(outlet_part, 5, case)
+
+        hyd_rad = flow_area/perimeter
+
+        culvert_velocity = numpy.sqrt(delta_total_energy/((sum_loss/2/anuga.g)+\
+                                          (manning**2*length)/hyd_rad**1.33333))
+        Q_outlet_tailwater = flow_area * culvert_velocity
+
+        Q = numpy.minimum(Q, Q_outlet_tailwater)
+
+        # Determine momentum at the outlet
+        barrel_velocity = Q/(flow_area + anuga.velocity_protection/flow_area)
+
+    blocked = blockage >= 1.0
+    Q = numpy.where(blocked, 0.0, Q)
+    barrel_velocity = numpy.where(blocked, 0.0, barrel_velocity)
+    outlet_culvert_depth = numpy.where(blocked, 0.0, outlet_culvert_depth)
+    flow_area = numpy.where(blocked, 0.00001, flow_area)
+    case = numpy.where(blocked, 0, case)
+
+    return Q, barrel_velocity, outlet_culvert_depth, flow_area, case
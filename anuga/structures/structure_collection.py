@@ -0,0 +1,558 @@
+"""Update many structures of a sequential domain together
+
+Each Structure_operator (boyd box, boyd pipe, weir orifice trapezoid,
+internal boundary) is a fractional step operator of its own, computing the
+average depth, stage and momentum of its inlets and setting the new values
+with several fancy indexed operations per inlet, and its discharge with
+scalar arithmetic. With hundreds of structures this overhead dominates
+apply_fractional_steps.
+
+The structure collection of a domain instead updates all its structures
+together:
+
+1. The triangle indices of all inlets are concatenated into one array, with
+   the offset of each inlet, and the inlet averages of all inlets are
+   computed with a single add.reduceat over the concatenated triangles.
+
+2. The discharges of all structures of a type with a vectorised discharge
+   function (boyd box, boyd pipe, weir orifice trapezoid) are computed with
+   array operations, using the values at the enquiry points of all inlets.
+   Other structures (such as internal boundaries) compute their discharge
+   with their own discharge_routine.
+
+3. The semi-implicit update of Structure_operator.__call__ is applied to
+   all structures with array operations, and the new depths and momenta
+   of all inlets are set with one scatter.
+
+All structures are updated from the state at the start of the fractional
+step, so the result only differs from updating the structures one after
+the other if inlets of different structures overlap.
+
+The collection is created when the first structure of a domain with
+domain.set_batch_structures() is created and is registered as a fractional
+step operator at the position of that structure. The __call__ of the
+collected structures does nothing.
+"""
+
+import numpy as num
+
+import anuga
+
+from anuga.config import velocity_protection, g
+
+from boyd_box_operator import Boyd_box_operator
+from boyd_box_operator import boyd_box_function_vectorised, boyd_box_cases
+from boyd_pipe_operator import Boyd_pipe_operator
+from boyd_pipe_operator import boyd_pipe_function_vectorised, boyd_pipe_cases
+from weir_orifice_trapezoid_operator import Weir_orifice_trapezoid_operator
+from weir_orifice_trapezoid_operator import \
+     weir_orifice_trapezoid_function_vectorised, weir_orifice_trapezoid_cases
+
+
+# Structure types with a vectorised discharge function: the function, its
+# cases, the attribute which closes the culvert when <= 0 and the keyword
+# arguments of the function taken from attributes of the structures.
+# Subclasses of these types are updated with their own discharge_routine.
+vectorised_structures = {
+    Boyd_box_operator :
+        (boyd_box_function_vectorised, boyd_box_cases, 'culvert_height',
+         {'width'      : 'culvert_width',
+          'depth'      : 'culvert_height',
+          'blockage'   : 'culvert_blockage',
+          'barrels'    : 'culvert_barrels',
+          'flow_width' : 'culvert_width',
+          'length'     : 'culvert_length',
+          'sum_loss'   : 'sum_loss',
+          'manning'    : 'manning'}),
+    Boyd_pipe_operator :
+        (boyd_pipe_function_vectorised, boyd_pipe_cases, 'culvert_diameter',
+         {'diameter'   : 'culvert_diameter',
+          'blockage'   : 'culvert_blockage',
+          'barrels'    : 'culvert_barrels',
+          'length'     : 'culvert_length',
+          'sum_loss'   : 'sum_loss',
+          'manning'    : 'manning'}),
+    Weir_orifice_trapezoid_operator :
+        (weir_orifice_trapezoid_function_vectorised,
+         weir_orifice_trapezoid_cases, 'culvert_height',
+         {'width'      : 'culvert_width',
+          'depth'      : 'culvert_height',
+          'blockage'   : 'culvert_blockage',
+          'barrels'    : 'culvert_barrels',
+          'z1'         : 'culvert_z1',
+          'z2'         : 'culvert_z2',
+          'flow_width' : 'culvert_width',
+          'length'     : 'culvert_length',
+          'sum_loss'   : 'sum_loss',
+          'manning'    : 'manning'})}
+
+
+class Structure_collection(anuga.Operator):
+    """Update all structures of a sequential domain together with array
+    operations over the concatenated inlets.
+    """
+
+    def __init__(self, domain, verbose=False):
+
+        anuga.Operator.__init__(self, domain, label='structure_collection',
+                                verbose=verbose)
+
+        self.structures = []
+        self.modified = True
+
+
+    def add_structure(self, structure):
+
+        self.structures.append(structure)
+        structure.collection = self
+        self.modified = True
+
+
+    def get_number_of_structures(self):
+
+        return len(self.structures)
+
+
+    def set_modified(self):
+        """The parameters of the structures are read when the collection
+        is first called, this must be called after changing them.
+        """
+
+        self.modified = True
+
+
+    def build(self):
+        """Concatenate the inlets of all structures and collect the
+        parameters of the structures into arrays.
+        """
+
+        structures = self.structures
+        inlets = [inlet for structure in structures
+                  for inlet in structure.inlets]
+
+        counts = num.array([len(inlet.triangle_indices) for inlet in inlets],
+                           num.int)
+
+        self.triangle_indices = num.concatenate([inlet.triangle_indices
+                                                 for inlet in inlets])
+        self.triangle_indices = self.triangle_indices.astype(num.int)
+        self.counts = counts
+        self.offsets = num.concatenate(([0], num.cumsum(counts)[:-1]))
+
+        self.triangle_areas = self.domain.areas[self.triangle_indices]
+        self.inlet_areas = num.array([inlet.get_area() for inlet in inlets])
+
+        self.enquiry_indices = num.array([inlet.enquiry_index
+                                          for inlet in inlets], num.int)
+
+        invert_elevations = [inlet.invert_elevation for inlet in inlets]
+        self.has_invert_elevation = num.array([e is not None for e in
+                                               invert_elevations])
+        self.invert_elevations = num.array([0.0 if e is None else e
+                                            for e in invert_elevations])
+
+        self.outward_vectors = num.array([inlet.outward_culvert_vector
+                                          for inlet in inlets], num.float)
+
+        def parameter(name, dtype=num.float):
+            return num.array([getattr(structure, name)
+                              for structure in structures], dtype)
+
+        self.always_use_Q_wetdry_adjustment = \
+                    parameter('always_use_Q_wetdry_adjustment', num.bool)
+        self.use_old_momentum_method = \
+                    parameter('use_old_momentum_method', num.bool)
+        self.use_momentum_jet = parameter('use_momentum_jet', num.bool)
+        self.zero_outflow_momentum = \
+                    parameter('zero_outflow_momentum', num.bool)
+
+        # Structures of each vectorised type, the others use their own
+        # discharge_routine
+        self.groups = []
+        grouped = num.zeros(len(structures), num.bool)
+        for cls, (function, cases, closed_name, arguments) in \
+                vectorised_structures.items():
+
+            ids = num.array([i for i, structure in enumerate(structures)
+                             if structure.__class__ is cls], num.int)
+            if len(ids) == 0:
+                continue
+
+            group = [structures[i] for i in ids]
+
+            def group_parameter(name, dtype=num.float):
+                return num.array([getattr(structure, name)
+                                  for structure in group], dtype)
+
+            parameters = {}
+            for keyword, name in arguments.items():
+                parameters[keyword] = group_parameter(name)
+
+            self.groups.append({'ids' : ids,
+                                'function' : function,
+                                'cases' : list(cases) + ['Culvert blocked',
+                                                         'Inlet dry'],
+                                'closed' : group_parameter(closed_name) <= 0.0,
+                                'parameters' : parameters,
+                                'use_velocity_head' :
+                                    group_parameter('use_velocity_head',
+                                                    num.bool),
+                                'smoothing_timescale' :
+                                    group_parameter('smoothing_timescale'),
+                                'max_velocity' :
+                                    group_parameter('max_velocity')})
+            grouped[ids] = True
+
+        self.other_ids = num.where(~grouped)[0]
+
+        self.modified = False
+
+
+    def get_inlet_averages(self):
+        """Return the average depth, stage, xmomentum and ymomentum of all
+        inlets, computed with one reduceat pass over the concatenated
+        inlet triangles.
+        """
+
+        indices = self.triangle_indices
+
+        stage = self.stage_c.take(indices)
+        elevation = self.elev_c.take(indices)
+        xmom = self.xmom_c.take(indices)
+        ymom = self.ymom_c.take(indices)
+
+        values = num.column_stack((stage - elevation, stage, xmom, ymom))
+        values *= self.triangle_areas[:, num.newaxis]
+
+        sums = num.add.reduceat(values, self.offsets, axis=0)
+        averages = sums/self.inlet_areas[:, num.newaxis]
+
+        return averages[:, 0], averages[:, 1], averages[:, 2], averages[:, 3]
+
+
+    def get_enquiry_values(self):
+        """Return the enquiry stage, depth, total energy and specific
+        energy of all inlets (see Inlet_enquiry).
+        """
+
+        indices = self.enquiry_indices
+
+        stage = self.stage_c[indices]
+        elevation = self.elev_c[indices]
+        xmom = self.xmom_c[indices]
+        ymom = self.ymom_c[indices]
+
+        invert_elevation = num.where(self.has_invert_elevation,
+                                     self.invert_elevations, elevation)
+
+        depth = num.maximum(stage - invert_elevation, 0.0)
+        water_depth = stage - elevation
+
+        u = water_depth*xmom/(water_depth**2 + velocity_protection)
+        v = water_depth*ymom/(water_depth**2 + velocity_protection)
+
+        velocity_head = 0.5*(u**2 + v**2)/g
+
+        return stage, depth, velocity_head + stage, velocity_head + depth
+
+
+    def compute_group_discharges(self, group, enquiry_values):
+        """Discharge of the structures of a vectorised type, following the
+        discharge_routine of the structures (with forward Euler smoothing).
+        """
+
+        ids = group['ids']
+        structures = self.structures
+        n = len(ids)
+
+        stage, depth, total_energy, specific_energy = enquiry_values
+
+        i0 = 2*ids
+        i1 = 2*ids + 1
+
+        closed = group['closed']
+        use_velocity_head = group['use_velocity_head']
+
+        smooth_delta_total_energy = num.array([structures[i].smooth_delta_total_energy
+                                               for i in ids], num.float)
+        smooth_Q = num.array([structures[i].smooth_Q for i in ids], num.float)
+
+        delta_total_energy = num.where(use_velocity_head,
+                                       total_energy[i0] - total_energy[i1],
+                                       stage[i0] - stage[i1])
+
+        # Compute 'smoothed' total energy
+        timestep = self.domain.timestep
+        if timestep > 0.:
+            ts = timestep/num.maximum(max(timestep, 1.0e-06),
+                                      group['smoothing_timescale'])
+        else:
+            ts = num.ones(n, num.float)
+
+        smooth_delta_total_energy = num.where(closed,
+                smooth_delta_total_energy,
+                smooth_delta_total_energy +
+                ts*(delta_total_energy - smooth_delta_total_energy))
+
+        forward = (smooth_delta_total_energy >= 0.) | closed
+        inflow_index = num.where(forward, 0, 1)
+
+        delta_total_energy = num.where(closed, delta_total_energy,
+                                       abs(smooth_delta_total_energy))
+
+        inflow_depth = num.where(forward, depth[i0], depth[i1])
+        outflow_depth = num.where(forward, depth[i1], depth[i0])
+        inflow_specific_energy = num.where(forward, specific_energy[i0],
+                                           specific_energy[i1])
+
+        driving_energy = num.where(use_velocity_head, inflow_specific_energy,
+                                   inflow_depth)
+
+        Q = num.zeros(n, num.float)
+        barrel_velocity = num.zeros(n, num.float)
+        outlet_culvert_depth = num.zeros(n, num.float)
+        case = num.where(closed, len(group['cases']) - 2,
+                         len(group['cases']) - 1)
+
+        # Only calculate flow if there is some water at the inflow inlet.
+        wet = num.where(~closed & (inflow_depth > 0.01))[0]
+
+        if len(wet) > 0:
+            msg = 'Specific energy at inlet is negative'
+            assert num.all(inflow_specific_energy[wet] >= 0.0), msg
+
+            arguments = {}
+            for keyword, values in group['parameters'].items():
+                arguments[keyword] = values[wet]
+            if 'depth' not in arguments:
+                arguments['depth'] = inflow_depth[wet]
+
+            Q_wet, velocity_wet, depth_wet, flow_area, case_wet = \
+                group['function'](driving_energy=driving_energy[wet],
+                                  delta_total_energy=delta_total_energy[wet],
+                                  outlet_enquiry_depth=outflow_depth[wet],
+                                  **arguments)
+
+            # Time-smoothed discharge
+            Qsign = num.sign(smooth_delta_total_energy[wet])
+            smooth_Q[wet] = smooth_Q[wet] + ts[wet]*(Q_wet*Qsign - smooth_Q[wet])
+
+            Q_wet = num.where(num.sign(smooth_Q[wet]) != Qsign, 0.,
+                              num.minimum(abs(smooth_Q[wet]), Q_wet))
+            velocity_wet = Q_wet/flow_area
+
+            # Temporary flow limit
+            max_velocity = group['max_velocity'][wet]
+            limited = velocity_wet > max_velocity
+            velocity_wet = num.where(limited, max_velocity, velocity_wet)
+            Q_wet = num.where(limited, flow_area*velocity_wet, Q_wet)
+
+            Q[wet] = Q_wet
+            barrel_velocity[wet] = velocity_wet
+            outlet_culvert_depth[wet] = depth_wet
+            case[wet] = case_wet
+
+        # Record the state of the discharge routine in the structures
+        cases = group['cases']
+        wet_flags = num.zeros(n, num.bool)
+        wet_flags[wet] = True
+        for k, (i, c, index, flag) in enumerate(zip(ids, case, inflow_index,
+                                                    closed)):
+            structure = structures[i]
+            structure.case = cases[c]
+            structure.inflow = structure.inlets[index]
+            structure.outflow = structure.inlets[1 - index]
+            if not flag:
+                structure.smooth_delta_total_energy = \
+                                    smooth_delta_total_energy[k]
+                structure.delta_total_energy = delta_total_energy[k]
+            if wet_flags[k]:
+                structure.smooth_Q = smooth_Q[k]
+                structure.driving_energy = driving_energy[k]
+
+        return Q, barrel_velocity, outlet_culvert_depth, inflow_index
+
+
+    def __call__(self):
+
+        if len(self.structures) == 0:
+            return
+
+        if self.modified:
+            self.build()
+
+        n = len(self.structures)
+
+        Q = num.zeros(n, num.float)
+        barrel_velocity = num.zeros(n, num.float)
+        outlet_depth = num.zeros(n, num.float)
+        inflow_index = num.zeros(n, num.int)
+
+        # Discharges are computed before any inlet is updated
+        enquiry_values = self.get_enquiry_values()
+        for group in self.groups:
+            ids = group['ids']
+            Q[ids], barrel_velocity[ids], outlet_depth[ids], \
+                inflow_index[ids] = \
+                self.compute_group_discharges(group, enquiry_values)
+
+        for i in self.other_ids:
+            structure = self.structures[i]
+            Q[i], barrel_velocity[i], outlet_depth[i] = \
+                                        structure.discharge_routine()
+            inflow_index[i] = structure.inflow is structure.inlets[1]
+
+        self.update_inlets(Q, barrel_velocity, outlet_depth, inflow_index)
+
+
+    def update_inlets(self, Q, barrel_velocity, outlet_depth, inflow_index):
+        """Semi-implicit update of the inflow and outflow inlets of all
+        structures (see Structure_operator.__call__), followed by one
+        scatter of the new values of all inlets.
+        """
+
+        timestep = self.domain.get_timestep()
+
+        depths, stages, xmoms, ymoms = self.get_inlet_averages()
+
+        ids = num.arange(len(self.structures))
+        inflow = 2*ids + inflow_index
+        outflow = 2*ids + 1 - inflow_index
+
+        inflow_area = self.inlet_areas[inflow]
+        outflow_area = self.inlet_areas[outflow]
+
+        old_inflow_depth = depths[inflow]
+        old_inflow_xmom = xmoms[inflow]
+        old_inflow_ymom = ymoms[inflow]
+
+        wet = old_inflow_depth > 0.0
+
+        with num.errstate(divide='ignore', invalid='ignore'):
+
+            dt_Q_on_d = num.where(wet, timestep*Q/old_inflow_depth, 0.0)
+
+            use_Q_wetdry_adjustment = self.always_use_Q_wetdry_adjustment | \
+                            (old_inflow_depth*inflow_area <= Q*timestep)
+
+            factor = 1.0/(1.0 + dt_Q_on_d/inflow_area)
+
+            new_inflow_depth = num.where(use_Q_wetdry_adjustment,
+                                         old_inflow_depth*factor,
+                                         old_inflow_depth - timestep*Q/inflow_area)
+
+            timestep_star = num.where(use_Q_wetdry_adjustment,
+                    num.where(wet, timestep*new_inflow_depth/old_inflow_depth, 0.),
+                    timestep)
+
+            factor2 = num.where(use_Q_wetdry_adjustment,
+                    1.0/(1.0 + dt_Q_on_d*new_inflow_depth/(old_inflow_depth*inflow_area)),
+                    1.0/(1.0 + timestep*Q/(old_inflow_depth*inflow_area)))
+            factor2 = num.where(wet, factor2, 0.)
+
+        factor2 = num.where(self.use_old_momentum_method, factor, factor2)
+
+        new_inflow_xmom = old_inflow_xmom*factor2
+        new_inflow_ymom = old_inflow_ymom*factor2
+
+        loss = (old_inflow_depth - new_inflow_depth)*inflow_area
+        xmom_loss = (old_inflow_xmom - new_inflow_xmom)*inflow_area
+        ymom_loss = (old_inflow_ymom - new_inflow_ymom)*inflow_area
+
+        # set outflow
+        outflow_extra_depth = Q*timestep_star/outflow_area
+        outflow_direction = - self.outward_vectors[outflow]
+
+        gain = outflow_extra_depth*outflow_area
+
+        assert num.allclose(gain-loss, 0.0)
+
+        new_outflow_depth = depths[outflow] + outflow_extra_depth
+
+        new_outflow_xmom = num.where(self.use_momentum_jet,
+                barrel_velocity*new_outflow_depth*outflow_direction[:, 0],
+                num.where(self.zero_outflow_momentum, 0.0,
+                          xmoms[outflow] + xmom_loss/outflow_area))
+        new_outflow_ymom = num.where(self.use_momentum_jet,
+                barrel_velocity*new_outflow_depth*outflow_direction[:, 1],
+                num.where(self.zero_outflow_momentum, 0.0,
+                          ymoms[outflow] + ymom_loss/outflow_area))
+
+        # Scatter the new values of all inlets
+        new_depths = num.zeros(len(depths), num.float)
+        new_xmoms = num.zeros(len(depths), num.float)
+        new_ymoms = num.zeros(len(depths), num.float)
+
+        new_depths[inflow] = new_inflow_depth
+        new_xmoms[inflow] = new_inflow_xmom
+        new_ymoms[inflow] = new_inflow_ymom
+
+        new_depths[outflow] = new_outflow_depth
+        new_xmoms[outflow] = new_outflow_xmom
+        new_ymoms[outflow] = new_outflow_ymom
+
+        indices = self.triangle_indices
+
+        self.stage_c[indices] = self.elev_c[indices] + \
+                                num.repeat(new_depths, self.counts)
+        self.xmom_c[indices] = num.repeat(new_xmoms, self.counts)
+        self.ymom_c[indices] = num.repeat(new_ymoms, self.counts)
+
+        # Stats
+        discharge = Q*timestep_star/timestep
+        yieldstep = self.domain.yieldstep
+
+        for structure, gain_i, discharge_i, velocity_i, depth_i in \
+                zip(self.structures, gain.tolist(), discharge.tolist(),
+                    barrel_velocity.tolist(), outlet_depth.tolist()):
+            structure.accumulated_flow += gain_i
+            structure.discharge = discharge_i
+            structure.discharge_abs_timemean += gain_i/yieldstep
+            structure.velocity = velocity_i
+            structure.outlet_depth = depth_i
+
+
+    def parallel_safe(self):
+
+        return False
+
+
+    def statistics(self):
+
+        message = 'Structure collection of %d structures' % len(self.structures)
+        return message
+
+
+    def timestepping_statistics(self):
+
+        return ''
+
+
+    # The collected structures report their own statistics
+    def print_statistics(self):
+
+        pass
+
+
+    def print_timestepping_statistics(self):
+
+        pass
+
+
+    def log_timestepping_statistics(self):
+
+        pass
+
+
+def get_structure_collection(domain):
+    """Return the structure collection of domain, created on first use, or
+    None if batching of structures is switched off.
+    """
+
+    if not domain.get_batch_structures():
+        return None
+
+    if getattr(domain, 'structure_collection', None) is None:
+        domain.structure_collection = Structure_collection(domain)
+
+    return domain.structure_collection
@@ -204,7 +204,16 @@ class Structure_operator(anuga.Operator):
             self.inlets[-1].set_elevations(inlet_global_elevation)
 
         tris_1 = self.inlets[1].triangle_indices
-        
+
+        # Structures of a domain with batch_structures are updated together
+        # by the structure collection of the domain
+        from structure_collection import get_structure_collection
+
+        self.collection = None
+        collection = get_structure_collection(self.domain)
+        if collection is not None:
+            collection.add_structure(self)
+
         self.set_logging(logging)
 
         
@@ -213,6 +222,10 @@ class Structure_operator(anuga.Operator):
 
     def __call__(self):
 
+        # Collected structures are updated by the structure collection
+        if self.collection is not None:
+            return
+
         timestep = self.domain.get_timestep()
         
         Q, barrel_speed, outlet_depth = self.discharge_routine()
@@ -359,28 +372,43 @@ class Structure_operator(anuga.Operator):
     def set_culvert_height(self, height):
 
         self.culvert_height = height
+        self.parameters_modified()
 
     def set_culvert_width(self, width):
 
         self.culvert_width = width
+        self.parameters_modified()
         
     def set_culvert_z1(self, z1): 
 
         self.culvert_z1 = z1 
+        self.parameters_modified()
 
     def set_culvert_z2(self, z2):
 
         self.culvert_z2 = z2
+        self.parameters_modified()
         
     def set_culvert_blockage(self, blockage): 
 
         self.culvert_blockage = blockage 
+        self.parameters_modified()
 
     def set_culvert_barrels(self, barrels): 
 
         self.culvert_barrels = barrels 
+        self.parameters_modified()
         
         
+    def parameters_modified(self):
+        """Let the structure collection know that the parameters of the
+        structure have changed.
+        """
+
+        if getattr(self, 'collection', None) is not None:
+            self.collection.set_modified()
+
+
     def __process_non_skew_culvert(self):
 
         """Create lines at the end of a culvert inlet and outlet.
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+
+
+import unittest
+import warnings
+
+import numpy
+
+from anuga.structures.boyd_box_operator import Boyd_box_operator
+from anuga.structures.boyd_box_operator import boyd_box_function
+from anuga.structures.boyd_box_operator import boyd_box_function_vectorised
+from anuga.structures.boyd_box_operator import boyd_box_cases
+from anuga.structures.boyd_pipe_operator import Boyd_pipe_operator
+from anuga.structures.boyd_pipe_operator import boyd_pipe_function
+from anuga.structures.boyd_pipe_operator import boyd_pipe_function_vectorised
+from anuga.structures.boyd_pipe_operator import boyd_pipe_cases
+from anuga.structures.weir_orifice_trapezoid_operator import \
+     Weir_orifice_trapezoid_operator
+from anuga.structures.weir_orifice_trapezoid_operator import \
+     weir_orifice_trapezoid_function
+from anuga.structures.weir_orifice_trapezoid_operator import \
+     weir_orifice_trapezoid_function_vectorised
+from anuga.structures.weir_orifice_trapezoid_operator import \
+     weir_orifice_trapezoid_cases
+from anuga.structures.internal_boundary_operator import \
+     Internal_boundary_operator
+
+from anuga.abstract_2d_finite_volumes.mesh_factory import rectangular_cross
+from anuga.shallow_water.shallow_water_domain import Domain
+from anuga import Reflective_boundary
+
+verbose = False
+
+
+class Test_structure_collection(unittest.TestCase):
+    """
+    Test updating structures together with the structure collection
+    """
+
+    def setUp(self):
+        numpy.random.seed(17)
+
+        n = 200
+        r = numpy.random.rand
+
+        self.n = n
+        self.width = 0.2 + 3*r(n)
+        self.depth = 0.2 + 2*r(n)
+        self.blockage = numpy.where(r(n) < 0.05, 1.0, 0.95*r(n))
+        self.barrels = numpy.floor(1 + 3*r(n))
+        self.length = 1 + 20*r(n)
+        self.driving_energy = 0.02 + 3*r(n)
+        self.delta_total_energy = 3*r(n)
+        self.outlet_enquiry_depth = 3*r(n)
+        self.sum_loss = 3*r(n)
+        self.manning = 0.01 + 0.03*r(n)
+        self.z1 = 2*r(n)
+        self.z2 = 2*r(n)
+
+    def tearDown(self):
+        pass
+
+
+    def _compare(self, scalar_results, vectorised_results, cases):
+
+        Q, v, d, a, case = vectorised_results
+
+        for i, result in enumerate(scalar_results):
+            assert numpy.allclose(result[0], Q[i])
+            assert numpy.allclose(result[1], v[i])
+            assert numpy.allclose(result[2], d[i])
+            assert numpy.allclose(result[3], a[i])
+            assert result[4] == cases[case[i]]
+
+
+    def test_boyd_box_function_vectorised(self):
+
+        scalar_results = []
+        for i in range(self.n):
+            scalar_results.append(boyd_box_function(
+                width=self.width[i],
+                depth=self.depth[i],
+                blockage=self.blockage[i],
+                barrels=self.barrels[i],
+                flow_width=self.width[i],
+                length=self.length[i],
+                driving_energy=self.driving_energy[i],
+                delta_total_energy=self.delta_total_energy[i],
+                outlet_enquiry_depth=self.outlet_enquiry_depth[i],
+                sum_loss=self.sum_loss[i],
+                manning=self.manning[i]))
+
+        results = boyd_box_function_vectorised(
+                width=self.width,
+                depth=self.depth,
+                blockage=self.blockage,
+                barrels=self.barrels,
+                flow_width=self.width,
+                length=self.length,
+                driving_energy=self.driving_energy,
+                delta_total_energy=self.delta_total_energy,
+                outlet_enquiry_depth=self.outlet_enquiry_depth,
+                sum_loss=self.sum_loss,
+                manning=self.manning)
+
+        self._compare(scalar_results, results, boyd_box_cases)
+
+
+    def test_boyd_pipe_function_vectorised(self):
+
+        scalar_results = []
+        for i in range(self.n):
+            scalar_results.append(boyd_pipe_function(
+                depth=self.driving_energy[i],
+                diameter=self.depth[i],
+                blockage=self.blockage[i],
+                barrels=self.barrels[i],
+                length=self.length[i],
+                driving_energy=self.driving_energy[i],
+                delta_total_energy=self.delta_total_energy[i],
+                outlet_enquiry_depth=self.outlet_enquiry_depth[i],
+                sum_loss=self.sum_loss[i],
+                manning=self.manning[i]))
+
+        results = boyd_pipe_function_vectorised(
+                depth=self.driving_energy,
+                diameter=self.depth,
+                blockage=self.blockage,
+                barrels=self.barrels,
+                length=self.length,
+                driving_energy=self.driving_energy,
+                delta_total_energy=self.delta_total_energy,
+                outlet_enquiry_depth=self.outlet_enquiry_depth,
+                sum_loss=self.sum_loss,
+                manning=self.manning)
+
+        self._compare(scalar_results, results, boyd_pipe_cases)
+
+
+    def test_weir_orifice_trapezoid_function_vectorised(self):
+
+        scalar_results = []
+        for i in range(self.n):
+            scalar_results.append(weir_orifice_trapezoid_function(
+                width=self.width[i],
+                depth=self.depth[i],
+                blockage=self.blockage[i],
+                barrels=self.barrels[i],
+                z1=self.z1[i],
+                z2=self.z2[i],
+                flow_width=self.width[i],
+                length=self.length[i],
+                driving_energy=self.driving_energy[i],
+                delta_total_energy=self.delta_total_energy[i],
+                outlet_enquiry_depth=self.outlet_enquiry_depth[i],
+                sum_loss=self.sum_loss[i],
+                manning=self.manning[i]))
+
+        results = weir_orifice_trapezoid_function_vectorised(
+                width=self.width,
+                depth=self.depth,
+                blockage=self.blockage,
+                barrels=self.barrels,
+                z1=self.z1,
+                z2=self.z2,
+                flow_width=self.width,
+                length=self.length,
+                driving_energy=self.driving_energy,
+                delta_total_energy=self.delta_total_energy,
+                outlet_enquiry_depth=self.outlet_enquiry_depth,
+                sum_loss=self.sum_loss,
+                manning=self.manning)
+
+        self._compare(scalar_results, results, weir_orifice_trapezoid_cases)
+
+
+    def _run_structures(self, batch_structures):
+
+        points, vertices, boundary = rectangular_cross(40, 20,
+                                                       len1=40.0, len2=20.0)
+        domain = Domain(points, vertices, boundary)
+        domain.set_name('test_structure_collection')
+        domain.set_store(False)
+        domain.set_quantity('elevation', lambda x, y: -x/20.0)
+        domain.set_quantity('friction', 0.01)
+        domain.set_quantity('stage',
+                            lambda x, y: numpy.where(x < 12, 1.0, -x/20.0))
+
+        Br = Reflective_boundary(domain)
+        domain.set_boundary({'left': Br, 'right': Br, 'top': Br, 'bottom': Br})
+
+        domain.set_batch_structures(batch_structures)
+
+        structures = []
+        structures.append(Boyd_box_operator(domain,
+                                            losses=1.5,
+                                            width=0.8,
+                                            height=0.6,
+                                            end_points=[[6.0, 2.0], [20.0, 2.0]],
+                                            smoothing_timescale=2.0))
+        structures.append(Boyd_pipe_operator(domain,
+                                             losses=1.5,
+                                             diameter=0.7,
+                                             end_points=[[7.0, 6.0], [22.0, 6.0]],
+                                             use_velocity_head=False))
+        structures.append(Weir_orifice_trapezoid_operator(domain,
+                                             losses=1.5,
+                                             width=0.8,
+                                             height=0.6,
+                                             z1=1.0,
+                                             z2=1.0,
+                                             end_points=[[8.0, 10.0], [24.0, 10.0]]))
+        structures.append(Internal_boundary_operator(domain,
+                                             lambda h0, h1: 0.5*(h0-h1),
+                                             width=0.8,
+                                             height=0.8,
+                                             end_points=[[9.0, 14.0], [26.0, 14.0]]))
+        structures.append(Boyd_box_operator(domain,
+                                            losses=1.5,
+                                            width=0.8,
+                                            height=0.0,
+                                            end_points=[[6.0, 18.0], [20.0, 18.0]]))
+
+        for t in domain.evolve(yieldstep=1.0, finaltime=4.0):
+            pass
+
+        return domain, structures
+
+
+    def test_structure_collection(self):
+        """Structures updated by the structure collection give the same
+        results as the structures updated one by one.
+        """
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            domain0, structures0 = self._run_structures(False)
+            domain1, structures1 = self._run_structures(True)
+
+        collection = domain1.structure_collection
+        assert collection.get_number_of_structures() == 5
+        assert getattr(domain0, 'structure_collection', None) is None
+
+        stage0 = domain0.quantities['stage'].centroid_values
+        stage1 = domain1.quantities['stage'].centroid_values
+        assert numpy.allclose(stage0, stage1)
+
+        for s0, s1 in zip(structures0, structures1):
+            if verbose:
+                print s0.discharge, s1.discharge, s0.case, s1.case
+            assert numpy.allclose(s0.discharge, s1.discharge)
+            assert numpy.allclose(s0.accumulated_flow, s1.accumulated_flow)
+            assert numpy.allclose(s0.smooth_Q, s1.smooth_Q)
+            assert s0.case == s1.case
+
+        # Closed culvert
+        assert structures1[-1].case == 'Culvert blocked'
+        assert structures1[-1].discharge == 0.0
+
+
+# =========================================================================
+if __name__ == "__main__":
+    suite = unittest.makeSuite(Test_structure_collection, 'test')
+    runner = unittest.TextTestRunner()
+    runner.run(suite)
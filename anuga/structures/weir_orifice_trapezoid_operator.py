@@ -482,3 +482,166 @@ def weir_orifice_trapezoid_function(
     # END CODE BLOCK for DEPTH  > Required depth for CULVERT Flow
 
     return Q, barrel_velocity, outlet_culvert_depth, flow_area, case
+
+
+#=============================================================================
+# Array version of weir_orifice_trapezoid_function, used by the structure
+# collection (see structure_collection) to compute the discharge of many
+# culverts at once. All arguments are arrays (or scalars) and the case is
+# returned as an index into weir_orifice_trapezoid_cases.
+#=============================================================================
+weir_orifice_trapezoid_cases = ['100% blocked culvert',
+                                'Inlet CTRL Outlet unsubmerged PIPE PART FULL',
+                                'INLET CTRL Culvert is open channel flow we will for now assume critical depth',
+                                'Outlet submerged',
+                                'Outlet is Flowing Full',
+                                'Outlet is open channel flow']
+
+
+def trapezoid_critical_depth(Q, bf, barrels, width, z1, z2):
+    """Critical depth of flow Q in trapezoidal sections by Newton
+    iteration, each element iterated until its own correction is small
+    as in weir_orifice_trapezoid_function.
+    """
+
+    dcrit = numpy.zeros(Q.shape, numpy.float) + 0.00001
+    dyc = numpy.zeros(Q.shape, numpy.float) + 0.001
+
+    active = numpy.where(abs(dyc) > 0.00001)[0]
+    while len(active) > 0:
+        d = dcrit[active]
+        b = bf[active]*barrels[active]*width[active]
+        zs = z1[active] + z2[active]
+
+        Tc = b+zs*d
+        Ac = 0.5*d*(b+Tc)
+        fc = Ac**1.5*Tc**-0.5-Q[active]/(9.81**0.5)
+        ffc = Ac**1.5*-0.5*Tc**-1.5*zs+Tc**-0.5*1.5*Ac**0.5*Tc
+
+        dyc[active] = -fc/ffc
+        dcrit[active] = d + dyc[active]
+
+        active = active[abs(dyc[active]) > 0.00001]
+
+    return dcrit
+
+
+def weir_orifice_trapezoid_function_vectorised(width,
+                                               depth,
+                                               blockage,
+                                               barrels,
+                                               z1,
+                                               z2,
+                                               flow_width,
+                                               length,
+                                               driving_energy,
+                                               delta_total_energy,
+                                               outlet_enquiry_depth,
+                                               sum_loss,
+                                               manning):
+
+    width, depth, blockage, barrels, z1, z2, flow_width, length, \
+        driving_energy, delta_total_energy, outlet_enquiry_depth, sum_loss, \
+        manning = numpy.broadcast_arrays(*[numpy.asarray(x, dtype=numpy.float)
+                                  for x in [width, depth, blockage, barrels,
+                                            z1, z2, flow_width, length,
+                                            driving_energy, delta_total_energy,
+                                            outlet_enquiry_depth, sum_loss,
+                                            manning]])
+
+    # Blocked culverts are not iterated
+    blocked = blockage >= 1.0
+    unblocked = numpy.where(~blocked)[0]
+
+    Q = numpy.zeros(width.shape, numpy.float)
+    barrel_velocity = numpy.zeros(width.shape, numpy.float)
+    outlet_culvert_depth = numpy.zeros(width.shape, numpy.float)
+    flow_area = numpy.zeros(width.shape, numpy.float) + 0.00001
+    case = numpy.zeros(width.shape, numpy.int)
+
+    if len(unblocked) == 0:
+        return Q, barrel_velocity, outlet_culvert_depth, flow_area, case
+
+    width = width[unblocked]
+    depth = depth[unblocked]
+    barrels = barrels[unblocked]
+    z1 = z1[unblocked]
+    z2 = z2[unblocked]
+    length = length[unblocked]
+    driving_energy = driving_energy[unblocked]
+    delta_total_energy = delta_total_energy[unblocked]
+    outlet_enquiry_depth = outlet_enquiry_depth[unblocked]
+    sum_loss = sum_loss[unblocked]
+    manning = manning[unblocked]
+
+    with numpy.errstate(all='ignore'):
+
+        bf = 1 - blockage[unblocked]
+
+        Q_inlet_unsubmerged = 1.7*bf*barrels*((2*width+depth*(z1+z2))/2)*driving_energy**1.50
+        Q_inlet_submerged = 0.8*bf*barrels*anuga.g**0.5*(0.5*depth*(2*width+depth*(z1+z2)))*driving_energy**0.5
+
+        Q_unblocked = numpy.where(Q_inlet_unsubmerged < Q_inlet_submerged,
+                             Q_inlet_unsubmerged, Q_inlet_submerged)
+
+        def flow_area_and_perimeter(d, double_width):
+            area = bf*barrels*width*d+0.5*(z1+z2)*d**2
+            if double_width:
+                perimeter = 2.0*bf*barrels*width+(z1+z2)*d + (d**2+(z1*d)**2)**0.5 + (d**2+(z2*d)**2)**0.5
+            else:
+                perimeter = bf*barrels*width + (d**2+(z1*d)**2)**0.5 + (d**2+(z2*d)**2)**0.5
+            return area, perimeter
+
+        # Inlet control
+        dcrit = trapezoid_critical_depth(Q_unblocked, bf, barrels, width, z1, z2)
+
+        full = dcrit > depth
+        ocd = numpy.where(full, depth, dcrit)
+        area, perimeter = flow_area_and_perimeter(ocd, True)
+        case_unblocked = numpy.where(full, 1, 2)
+
+        hyd_rad = area/perimeter
+        culvert_velocity = numpy.sqrt(delta_total_energy/((sum_loss/2/anuga.g) \
+                                          +(manning**2*length)/hyd_rad**1.33333))
+        Q_outlet_tailwater = area * culvert_velocity
+
+        # Outlet control
+        outlet_control = delta_total_energy < driving_energy
+        submerged = outlet_control & (outlet_enquiry_depth > depth)
+        unsubmerged = numpy.where(outlet_control & ~submerged)[0]
+
+        Q_unblocked = numpy.where(outlet_control & ~submerged,
+                             numpy.minimum(Q_unblocked, Q_outlet_tailwater), Q_unblocked)
+
+        ocd = numpy.where(submerged, depth, ocd)
+        case_unblocked = numpy.where(submerged, 3, case_unblocked)
+
+        if len(unsubmerged) > 0:
+            u = unsubmerged
+            dcrit = trapezoid_critical_depth(Q_unblocked[u], bf[u], barrels[u],
+                                             width[u], z1[u], z2[u])
+            ocd[u] = numpy.where(dcrit > depth[u], depth[u], dcrit)
+            case_unblocked[u] = numpy.where(dcrit > depth[u], 4, 5)
+
+        outlet_area, outlet_perimeter = flow_area_and_perimeter(ocd, False)
+        area = numpy.where(outlet_control, outlet_area, area)
+        perimeter = numpy.where(outlet_control, outlet_perimeter, perimeter)
+
+        hyd_rad = area/perimeter
+        culvert_velocity = numpy.sqrt(delta_total_energy/((sum_loss/2/anuga.g)\
+                                          +(manning**2*length)/hyd_rad**1.33333))
+        Q_outlet_tailwater = area * culvert_velocity
+
+        Q_unblocked = numpy.where(outlet_control,
+                             numpy.minimum(Q_unblocked, Q_outlet_tailwater), Q_unblocked)
+
+        # Determine momentum at the outlet
+        velocity_unblocked = Q_unblocked/(area + anuga.velocity_protection/area)
+
+    Q[unblocked] = Q_unblocked
+    barrel_velocity[unblocked] = velocity_unblocked
+    outlet_culvert_depth[unblocked] = ocd
+    flow_area[unblocked] = area
+    case[unblocked] = case_unblocked
+
+    return Q, barrel_velocity, outlet_culvert_depth, flow_area, case
@@ -294,6 +294,55 @@ class Test_eq(unittest.TestCase):
         #print 'hello',stage   
         assert num.allclose(stage,tmp,atol=1.e-3)
 
+    def test_Okada_func_vectorised(self):
+        """The vectorised evaluation gives the same displacement as the
+        scalar evaluation point by point, also with worker processes.
+        """
+        from anuga.abstract_2d_finite_volumes.mesh_factory \
+                        import rectangular_cross
+        from anuga.abstract_2d_finite_volumes.quantity import Quantity
+
+        points, vertices, boundary = rectangular_cross(10, 10,
+                                               len1=100000, len2=100000)
+        domain = Domain(points, vertices, boundary)
+
+        zrec0 = Quantity(domain)
+        zrec0.set_values(0.0)
+        zrec = zrec0.get_vertex_values(xy=True)
+        x = zrec[0]
+        y = zrec[1]
+
+        # Single rectangular source
+        Ts = Okada_func(ns=1, NSMAX=1, length=10.0, width=6.0, dip=15.0,
+                        x0=7000.0, y0=10000.0, strike=0.0, depth=15.0,
+                        slip=10.0, rake=90.0, zrec=zrec)
+        assert num.allclose(Ts(x, y), Ts.evaluate_pointwise(x, y))
+
+        # Point source
+        Ts = Okada_func(ns=1, NSMAX=1, length=0, width=0, dip=15.0,
+                        x0=[7000.0], y0=[10000.0], strike=0.0, depth=15.0,
+                        slip=10.0, rake=90.0, zrec=zrec)
+        assert num.allclose(Ts(x, y), Ts.evaluate_pointwise(x, y))
+
+        # Multiple sources including a vertical fault, a point source
+        # and sources of zero length and zero width
+        Ts = Okada_func(ns=5, NSMAX=5,
+                        length=[10.0, 20.0, 0.0, 8.0, 0.0],
+                        width=[6.0, 5.0, 4.0, 0.0, 0.0],
+                        dip=[15.0, 30.0, 90.0, 60.0, 45.0],
+                        x0=[7000.0, 40000.0, 60000.0, 20000.0, 50000.0],
+                        y0=[10000.0, 30000.0, 70000.0, 80000.0, 50000.0],
+                        strike=[0.0, 45.0, 120.0, 300.0, 10.0],
+                        depth=[15.0, 20.0, 25.0, 10.0, 12.0],
+                        slip=[10.0, 3.0, 2.0, 5.0, 1.0],
+                        rake=[90.0, 0.0, 30.0, 135.0, 90.0],
+                        zrec=zrec, block_size=100)
+        z = Ts.evaluate_pointwise(x, y)
+        assert num.allclose(Ts(x, y), z)
+
+        Ts.processes = 2
+        assert num.allclose(Ts(x, y), z)
+
 #-------------------------------------------------------------
 
 if __name__ == "__main__":
@@ -21,6 +21,7 @@ Optional
  z0      z origin
  slip    metres of fault slip (1)
  rake    angle of slip (w.r.t. horizontal) in fault plane (90 degrees)
+ processes  number of worker processes evaluating the subfaults (1)
 
 
 
@@ -35,7 +36,7 @@ import anuga.utilities.log as log
 
 def earthquake_tsunami(ns, NSMAX, length, width, strike, depth,
                        dip, xi, yi, z0, slip, rake,
-                       domain=None, verbose=False):
+                       domain=None, verbose=False, processes=None):
 
     from anuga.abstract_2d_finite_volumes.quantity import Quantity
     from math import sin, radians
@@ -83,7 +84,7 @@ def earthquake_tsunami(ns, NSMAX, length, width, strike, depth,
 
     return Okada_func(ns=ns,NSMAX=NSMAX,length=length, width=width, dip=dip, \
                       x0=x0, y0=y0, strike=strike, depth=depth, \
-                      slip=slip, rake=rake, zrec=zrec)
+                      slip=slip, rake=rake, zrec=zrec, processes=processes)
 
 #
 # Okada class
@@ -106,13 +107,20 @@ Optional
  y0      y origin (0)
  slip    metres of fault slip (1)
  rake    angle of slip (w.r.t. horizontal) in fault plane (90 degrees)
+ processes   number of worker processes evaluating the subfaults (1)
+ block_size  number of points evaluated together (100000)
+
+The displacement is evaluated for all points of a block at once with the
+array functions dc3d_uz and dc3d0_uz, subfault by subfault. The scalar
+routines DC3D and DC3D0 below are kept as reference (evaluate_pointwise).
 
 """
 
 class Okada_func:
 
     def __init__(self, ns,NSMAX,length, width, dip, x0, y0, strike, \
-                     depth, slip, rake,zrec):
+                     depth, slip, rake,zrec, processes=None,
+                     block_size=100000):
         self.dip = dip
         self.length = length
         self.width = width
@@ -124,6 +132,46 @@ class Okada_func:
         self.rake = rake
         self.ns=ns
         self.zrec=zrec
+        self.processes=processes
+        self.block_size=block_size
+
+    def get_subfaults(self):
+        """Return list of the subfaults as tuples
+        (xs, ys, length, width, depth, dip, strike, rake, slip)
+        with x pointing to the north as in Okada's system.
+        """
+
+        if self.ns == 1:
+            # Origin may be given as a scalar or as an array of length 1
+            return [(float(num.ravel(self.y0)[0]),
+                     float(num.ravel(self.x0)[0]),
+                     self.length, self.width, self.depth, self.dip,
+                     self.strike, self.rake, self.slip)]
+
+        subfaults = []
+        for ist in range(0, self.ns):
+            subfaults.append((self.y0[ist], self.x0[ist],
+                              self.length[ist], self.width[ist],
+                              self.depth[ist], self.dip[ist],
+                              self.strike[ist], self.rake[ist],
+                              self.slip[ist]))
+
+        return subfaults
+
+    def get_station_depth(self, x, y):
+        """Return depth Z (km) of the stations, taken from the first
+        vertex of zrec whose x and y coordinates are found in x and y.
+        """
+
+        zrec_x = num.asarray(self.zrec[0])
+        zrec_y = num.asarray(self.zrec[1])
+
+        found = num.flatnonzero(num.in1d(zrec_x, x) & num.in1d(zrec_y, y))
+        if len(found) == 0:
+            msg = 'Points do not match the vertices of zrec'
+            raise Exception, msg
+
+        return 0.001*self.zrec[2][found[0]]
 
     def __call__(self, x, y):
         """Make Okada_func a callable object.
@@ -131,6 +179,81 @@ class Okada_func:
         If called as a function, this object returns z values representing
         the initial 3D distribution of water heights at the points (x,y,z)
         produced by a submarine mass failure.
+
+        The points are split in blocks of block_size points, for each block
+        the displacement of all points is accumulated subfault by subfault.
+        With processes > 1 the subfaults are split in chunks evaluated by a
+        pool of worker processes.
+        """
+
+        x = num.asarray(x, num.float)
+        y = num.asarray(y, num.float)
+        N = len(x)
+        assert N == len(y)
+
+        if N == 0:
+            return num.zeros(0, num.float)
+
+        subfaults = self.get_subfaults()
+        Z = self.get_station_depth(x, y)
+        if Z > 0:
+            log.critical('** POSITIVE Z WAS GIVEN IN SUB-DC3D')
+
+        # Okada's x axis points to the north
+        xrec = y
+        yrec = x
+
+        processes = self.processes
+        if processes is None or processes < 1:
+            processes = 1
+
+        ns = len(subfaults)
+        number_of_chunks = min(processes, ns)
+        chunks = [(i*ns//number_of_chunks, (i+1)*ns//number_of_chunks)
+                  for i in range(number_of_chunks)]
+
+        block_size = max(int(self.block_size), 1)
+        tasks = [(start, min(start + block_size, N), first, last)
+                 for start in range(0, N, block_size)
+                 for first, last in chunks]
+
+        uz = num.zeros(N, num.float)
+        active = num.ones(N, num.bool)
+
+        def accumulate(task, result):
+            start, stop = task[:2]
+            uz_chunk, stopped = result
+            uz[start:stop] += num.where(active[start:stop], uz_chunk, 0.0)
+            active[start:stop] &= ~stopped
+
+        # Chunks of a block are accumulated in order, so that the sum stops
+        # at the first singular subfault as in evaluate_pointwise
+        if processes > 1:
+            from multiprocessing import Pool
+
+            pool = Pool(processes, _okada_worker_init,
+                        (xrec, yrec, Z, subfaults))
+            try:
+                for i, result in enumerate(pool.imap(_okada_worker, tasks)):
+                    accumulate(tasks[i], result)
+            finally:
+                pool.terminate()
+        else:
+            for task in tasks:
+                start, stop, first, last = task
+                accumulate(task, okada_subfaults_uz(xrec[start:stop],
+                                                    yrec[start:stop], Z,
+                                                    subfaults[first:last]))
+
+        if not num.all(active):
+            log.critical('There is a problem in Okada subroutine! '
+                         '(%d singular points)' % num.sum(~active))
+
+        return uz
+
+    def evaluate_pointwise(self, x, y):
+        """Scalar evaluation of the water displacement, point by point
+        and subfault by subfault with DC3D and DC3D0. Returns a list.
         """
         from string import replace,strip
         from math import sin, cos, radians, exp, cosh
@@ -1876,3 +1999,381 @@ class Okada_func:
       self.HY=HY
       self.HZ=HZ
       self.ET2=ET2
+
+
+#
+# Vectorised Okada functions
+#
+
+"""The functions below evaluate the vertical displacement UZ of DC3D
+   (finite rectangular source) and DC3D0 (point source) for arrays of
+   stations at once, following the scalar routines of Okada_func term by
+   term. Only UZ is computed as Okada_func returns the vertical
+   displacement only.
+
+   As in the scalar routines ALP5 is taken to be ALP4 in the part A, B
+   and C functions (they are equal for ALPHA = 0.5). Singular stations
+   (IRET=1) get zero displacement. Where the scalar routines would reuse
+   values left over from a previous call (R = 0 in DCCON1 and DCCON2) the
+   corner term is zero (DCCON2) or the station is singular (DCCON1).
+"""
+
+okada_eps = 1.0e-6
+okada_pi2 = 6.283185307179586
+
+
+def _zero_small(x):
+    """Set entries of x with absolute value below EPS to zero
+    """
+
+    return num.where(num.abs(x) < okada_eps, 0.0, x)
+
+
+def okada_medium_constants(alpha, dip):
+    """Return ALP1, ALP2, ALP3, ALP4, SD, CD as computed by DCC0N0
+    """
+
+    alp1 = (1.0 - alpha)/2.0
+    alp2 = alpha/2.0
+    alp3 = (1.0 - alpha)/alpha
+    alp4 = 1.0 - alpha
+
+    sd = num.sin(dip*okada_pi2/360.0)
+    cd = num.cos(dip*okada_pi2/360.0)
+    if abs(cd) < okada_eps:
+        cd = 0.0
+        if sd > 0.0: sd = 1.0
+        if sd < 0.0: sd = -1.0
+
+    return alp1, alp2, alp3, alp4, sd, cd
+
+
+def _dc3d_corner_uz(xi, et, q, Z, constants, kxi, ket,
+                    disl1, disl2, image):
+    """UZ of one corner (XI, ET) of the fault for the real source
+    (DCCON2, UA) or the image source (DCCON2, UA, UB, UC)
+    """
+
+    alp1, alp2, alp3, alp4, sd, cd = constants
+    alp5 = alp4
+    sdcd = sd*cd
+    cdcd = cd*cd
+
+    # DCCON2
+    xi2 = xi*xi
+    et2 = et*et
+    q2 = q*q
+    r2 = xi2 + et2 + q2
+    r = num.sqrt(r2)
+    r3 = r*r2
+    y = et*cd + q*sd
+    d = et*sd - q*cd
+
+    tt = num.where(q == 0.0, 0.0, num.arctan(xi*et/(q*r)))
+
+    rxi = r + xi
+    alx = num.where(kxi, -num.log(r - xi), num.log(rxi))
+    x11 = num.where(kxi, 0.0, 1.0/(r*rxi))
+    x32 = num.where(kxi, 0.0, (r + rxi)*x11*x11/r)
+
+    ret = r + et
+    ale = num.where(ket, -num.log(r - et), num.log(ret))
+    y11 = num.where(ket, 0.0, 1.0/(r*ret))
+    y32 = num.where(ket, 0.0, (r + ret)*y11*y11/r)
+
+    qx = q*x11
+    qy = q*y11
+
+    # Components 1 and 2 (UY, UZ) of UA
+    ua1 = 0.0
+    ua2 = 0.0
+    if disl1 != 0.0:
+        ua1 = ua1 + disl1/okada_pi2*(alp2*q/r)
+        ua2 = ua2 + disl1/okada_pi2*(alp1*ale - alp2*q*qy)
+    if disl2 != 0.0:
+        ua1 = ua1 + disl2/okada_pi2*(tt/2.0 + alp2*et*qx)
+        ua2 = ua2 + disl2/okada_pi2*(alp1*alx - alp2*q*qx)
+
+    if not image:
+        uz = -ua1*sd - ua2*cd
+        return num.where(r == 0.0, 0.0, uz)
+
+    # Components 1 and 2 of UB
+    rd = r + d
+    d11 = 1.0/(r*rd)
+    if cd != 0.0:
+        x = num.sqrt(xi2 + q2)
+        ai4 = num.where(xi == 0.0, 0.0,
+                        1.0/cdcd*(xi/rd*sdcd
+                                  + 2.0*num.arctan((et*(x + q*cd)
+                                                    + x*(r + x)*sd)
+                                                   /(xi*(r + x)*cd))))
+        ai3 = (y*cd/rd - ale + sd*num.log(rd))/cdcd
+    else:
+        rd2 = rd*rd
+        ai3 = (et/rd + y*q/rd2 - ale)/2.0
+        ai4 = xi*y/rd2/2.0
+    ai2 = num.log(rd) + ai3*sd
+
+    ub1 = 0.0
+    ub2 = 0.0
+    if disl1 != 0.0:
+        ub1 = ub1 + disl1/okada_pi2*(-q/r + alp3*y/rd*sd)
+        ub2 = ub2 + disl1/okada_pi2*(q*qy - alp3*ai2*sd)
+    if disl2 != 0.0:
+        ub1 = ub1 + disl2/okada_pi2*(-et*qx - tt - alp3*xi/rd*sdcd)
+        ub2 = ub2 + disl2/okada_pi2*(q*qx + alp3*ai4*sdcd)
+
+    # Components 1 and 2 of UC
+    c = d + Z
+    h = q*cd - Z
+    z32 = sd/r3 - h*y32
+    xy = xi*y11
+
+    uc1 = 0.0
+    uc2 = 0.0
+    if disl1 != 0.0:
+        uc1 = uc1 + disl1/okada_pi2*(alp4*(cd/r + 2.0*qy*sd)
+                                     - alp5*c*q/r3)
+        uc2 = uc2 + disl1/okada_pi2*(alp4*qy*cd
+                                     - alp5*(c*et/r3 - Z*y11 + xi2*z32))
+    if disl2 != 0.0:
+        uc1 = uc1 + disl2/okada_pi2*(alp4*y*x11 - alp5*c*et*q*x32)
+        uc2 = uc2 + disl2/okada_pi2*(-d*x11 - xy*sd
+                                     - alp5*c*(x11 - q2*x32))
+
+    uz = (ua1 + ub1 - Z*uc1)*sd + (ua2 + ub2 - Z*uc2)*cd
+    return num.where(r == 0.0, 0.0, uz)
+
+
+def dc3d_uz(alpha, X, Y, Z, depth, dip, al1, al2, aw1, aw2, disl1, disl2):
+    """Vertical displacement UZ of DC3D (buried finite fault, no tensile
+    dislocation) at the stations X, Y (arrays) and depth Z.
+
+    Return UZ and a boolean array flagging the singular stations (IRET=1),
+    where UZ is zero.
+    """
+
+    X = num.asarray(X, num.float)
+    Y = num.asarray(Y, num.float)
+
+    constants = okada_medium_constants(alpha, dip)
+    sd = constants[4]
+    cd = constants[5]
+
+    xi = [_zero_small(X - al1), _zero_small(X - al2)]
+
+    uz = num.zeros(X.shape, num.float)
+    singular = num.zeros(X.shape, num.bool)
+
+    with num.errstate(all='ignore'):
+        # Real source, then image source
+        for image, D in [(False, depth + Z), (True, depth - Z)]:
+            P = Y*cd + D*sd
+            Q = _zero_small(Y*sd - D*cd)
+            et = [_zero_small(P - aw1), _zero_small(P - aw2)]
+
+            # On fault edge
+            xi_product = xi[0]*xi[1]
+            et_product = et[0]*et[1]
+            singular |= (Q == 0.0) & \
+                        (((xi_product < 0.0) & (et_product == 0.0)) |
+                         ((et_product < 0.0) & (xi_product == 0.0)))
+
+            # On negative extension of fault edge
+            r12 = num.sqrt(xi[0]*xi[0] + et[1]*et[1] + Q*Q)
+            r21 = num.sqrt(xi[1]*xi[1] + et[0]*et[0] + Q*Q)
+            r22 = num.sqrt(xi[1]*xi[1] + et[1]*et[1] + Q*Q)
+            kxi = [(xi[0] < 0.0) & (r21 + xi[1] < okada_eps),
+                   (xi[0] < 0.0) & (r22 + xi[1] < okada_eps)]
+            ket = [(et[0] < 0.0) & (r12 + et[1] < okada_eps),
+                   (et[0] < 0.0) & (r22 + et[1] < okada_eps)]
+
+            for K in range(0, 2):
+                for J in range(0, 2):
+                    du = _dc3d_corner_uz(xi[J], et[K], Q, Z, constants,
+                                         kxi[K], ket[J],
+                                         disl1, disl2, image)
+                    if (J + K) != 1:
+                        uz += du
+                    else:
+                        uz -= du
+
+    uz[singular] = 0.0
+
+    return uz, singular
+
+
+def _dc3d0_uz(X, Y, D, Z, constants, pot1, pot2, image):
+    """UZ of the real source (DCCON1, UA0) or the image source (DCCON1,
+    UA0, UB0, UC0) of a point source. Return UZ and the stations with R = 0.
+    """
+
+    alp1, alp2, alp3, alp4, sd, cd = constants
+    alp5 = alp4
+    sdcd = sd*cd
+
+    # DCCON1, which works on copies of X, Y, D set to zero if small
+    x = _zero_small(X)
+    y = _zero_small(Y)
+    d = _zero_small(D)
+    p = y*cd + d*sd
+    q = y*sd - d*cd
+    t = p*cd - q*sd
+    xy = x*y
+    x2 = x*x
+    y2 = y*y
+    d2 = d*d
+    r2 = x2 + y2 + d2
+    r = num.sqrt(r2)
+    r3 = r*r2
+    r5 = r3*r2
+    a3 = 1.0 - 3.0*x2/r2
+    qr = 3.0*q/r5
+
+    # Component 2 (UZ) of UA0
+    ua = 0.0
+    if pot1 != 0.0:
+        ua = ua + pot1/okada_pi2*(-alp1*X/r3*cd + alp2*X*D*qr)
+    if pot2 != 0.0:
+        ua = ua + pot2/okada_pi2*(-alp1*t/r3 + alp2*D*p*qr)
+
+    if not image:
+        return -ua, r == 0.0
+
+    # Component 2 of UB0
+    c = D + Z
+    rd = r + D
+    d12 = 1.0/(r*rd*rd)
+    d32 = d12*(2.0*r + D)/r2
+    fi4 = -xy*d32
+    fi5 = 1.0/(r*rd) - x2*d32
+
+    ub = 0.0
+    if pot1 != 0.0:
+        ub = ub + pot1/okada_pi2*(-c*X*qr - alp3*fi4*sd)
+    if pot2 != 0.0:
+        ub = ub + pot2/okada_pi2*(-c*p*qr + alp3*fi5*sdcd)
+
+    # Component 2 of UC0
+    qr5 = 5.0*q/r2
+
+    uc = 0.0
+    if pot1 != 0.0:
+        uc = uc + pot1/okada_pi2*(3.0*X/r5*(-alp4*Y*sd
+                                            + alp5*c*(cd + D*qr5)))
+    if pot2 != 0.0:
+        uc = uc + pot2/okada_pi2*(-alp4*a3/r3*sdcd
+                                  + alp5*3.0*c/r5*(t + D*p*qr5))
+
+    return ua + ub + Z*uc, r == 0.0
+
+
+def dc3d0_uz(alpha, X, Y, Z, depth, dip, pot1, pot2):
+    """Vertical displacement UZ of DC3D0 (buried point source, no
+    tensile and inflate potency) at the stations X, Y (arrays) and
+    depth Z.
+
+    Return UZ and a boolean array flagging the singular stations (IRET=1),
+    where UZ is zero.
+    """
+
+    X = num.asarray(X, num.float)
+    Y = num.asarray(Y, num.float)
+
+    constants = okada_medium_constants(alpha, dip)
+
+    with num.errstate(all='ignore'):
+        uz_real, singular_real = _dc3d0_uz(X, Y, depth + Z, Z, constants,
+                                           pot1, pot2, False)
+        uz_image, singular_image = _dc3d0_uz(X, Y, depth - Z, Z, constants,
+                                             pot1, pot2, True)
+
+    uz = uz_real + uz_image
+    singular = singular_real | singular_image
+    uz[singular] = 0.0
+
+    return uz, singular
+
+
+def okada_subfault_uz(xrec, yrec, Z, subfault, alpha=0.5):
+    """Vertical displacement UZ at the stations xrec, yrec (metres, x to
+    the north) of one subfault, given as the tuple
+    (xs, ys, length, width, depth, dip, strike, rake, slip)
+    as in Okada_func.
+
+    Return UZ and a boolean array flagging the singular stations.
+    """
+
+    xs, ys, length, width, depth, dip, strike, rake, slip = subfault
+
+    st = num.radians(strike)
+    csst = num.cos(st)
+    ssst = num.sin(st)
+    ra = num.radians(rake)
+    csra = num.cos(ra)
+    ssra = num.sin(ra)
+
+    # Transform from Aki's to Okada's system
+    X = 0.001*((xrec - xs)*csst + (yrec - ys)*ssst)
+    Y = 0.001*((xrec - xs)*ssst - (yrec - ys)*csst)
+
+    if length == 0 and width == 0:
+        # Point source
+        return dc3d0_uz(alpha, X, Y, Z, depth, dip,
+                        slip*csra, slip*ssra)
+
+    # Finite source
+    AL2 = length
+    AW1 = -width
+    DISL1 = slip*csra
+    DISL2 = slip*ssra
+    if length == 0:
+        AL2 = width*okada_eps
+        DISL1 = DISL1/AL2
+        DISL2 = DISL2/AL2
+    elif width == 0.0:
+        AW1 = -length*okada_eps
+        DISL1 = DISL1/(-AW1)
+        DISL2 = DISL2/(-AW1)
+
+    return dc3d_uz(alpha, X, Y, Z, depth, dip, 0.0, AL2, AW1, 0.0,
+                   DISL1, DISL2)
+
+
+def okada_subfaults_uz(xrec, yrec, Z, subfaults, alpha=0.5):
+    """Sum of the vertical displacement UZ of a sequence of subfaults.
+
+    As in Okada_func.evaluate_pointwise the sum stops at the first
+    subfault for which a station is singular. Return the sum and a boolean
+    array flagging the stations where it stopped.
+    """
+
+    uz = num.zeros(len(xrec), num.float)
+    stopped = num.zeros(len(xrec), num.bool)
+
+    for subfault in subfaults:
+        uz_subfault, singular = okada_subfault_uz(xrec, yrec, Z, subfault,
+                                                  alpha=alpha)
+        stopped |= singular
+        uz += num.where(stopped, 0.0, uz_subfault)
+
+    return uz, stopped
+
+
+# Stations and subfaults shared by the worker processes of Okada_func
+_okada_worker_state = None
+
+def _okada_worker_init(xrec, yrec, Z, subfaults):
+
+    global _okada_worker_state
+    _okada_worker_state = (xrec, yrec, Z, subfaults)
+
+
+def _okada_worker(task):
+
+    xrec, yrec, Z, subfaults = _okada_worker_state
+    start, stop, first, last = task
+
+    return okada_subfaults_uz(xrec[start:stop], yrec[start:stop], Z,
+                              subfaults[first:last])
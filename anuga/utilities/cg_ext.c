@@ -229,7 +229,7 @@ int _jacobi_precon_c(double* data,
 //        imax: maximum number of iterations
 //        tol: error tollerance for stopping criteria
 //        M: length of vectors x and b
-// @return: 0 on success  
+// @return: number of iterations on success, -1 if imax was reached
 int _cg_solve_c(double* data, 
                 long* colind,
                 long* row_ptr,
@@ -283,7 +283,7 @@ int _cg_solve_c(double* data,
     return -1;
   }
   else{
-    return 0;
+    return i;
   }
   
 
@@ -300,7 +300,7 @@ int _cg_solve_c(double* data,
 //        tol: error tollerance for stopping criteria
 //        M: length of vectors x and b
 //        precon: diagonal preconditioner given as vector
-// @return: 0 on success  
+// @return: number of iterations on success, -1 if imax was reached
 int _cg_solve_c_precon(double* data, 
                 long* colind,
                 long* row_ptr,
@@ -360,12 +360,111 @@ int _cg_solve_c_precon(double* data,
     return -1;
   }
   else{
-    return 0;
+    return i;
   }
   
 
 }       
 
+// Incomplete Cholesky factorisation with zero fill in, IC(0), of a
+// symmetric matrix A. On input L holds the lower triangle (including the
+// diagonal) of A in CSR format with sorted column indices, so the diagonal
+// is the last entry of each row. On output L holds the factor with
+// L L^T ~ A on the same sparsity pattern. A non positive pivot is replaced
+// by the diagonal of A (or 1 if that is not positive either).
+// @input data: double vector with non-zero entries of L
+//        colind: long vector of column indicies of non-zero entries of L
+//        row_ptr: long vector giving index of rows for non-zero entires of L
+//        M: number of rows
+// @return: number of replaced pivots
+int _ic0_factor_c(double* data,
+                long* colind,
+                long* row_ptr,
+                int M){
+
+  long i, j, k, kk, mm, diag, jdiag;
+  double s, pivot;
+  int breakdowns = 0;
+
+  for (i=0; i<M; i++){
+    diag = row_ptr[i+1]-1;
+
+    for (k=row_ptr[i]; k<diag; k++) {
+      j = colind[k];
+      jdiag = row_ptr[j+1]-1;
+
+      // s = sum over m < j of L_im L_jm (merge of the sorted rows)
+      s = 0.0;
+      kk = row_ptr[i];
+      mm = row_ptr[j];
+      while (kk<k && mm<jdiag) {
+        if (colind[kk] == colind[mm]) {
+          s += data[kk]*data[mm];
+          kk++;
+          mm++;
+        } else if (colind[kk] < colind[mm]) {
+          kk++;
+        } else {
+          mm++;
+        }
+      }
+
+      data[k] = (data[k] - s)/data[jdiag];
+    }
+
+    s = 0.0;
+    for (k=row_ptr[i]; k<diag; k++) {
+      s += data[k]*data[k];
+    }
+
+    pivot = data[diag] - s;
+    if (pivot <= 0.0) {
+      breakdowns++;
+      pivot = data[diag] > 0.0 ? data[diag] : 1.0;
+    }
+    data[diag] = sqrt(pivot);
+  }
+
+  return breakdowns;
+}
+
+// Solve L L^T z = r for z, with L as computed by _ic0_factor_c
+// @input data: double vector with non-zero entries of L
+//        colind: long vector of column indicies of non-zero entries of L
+//        row_ptr: long vector giving index of rows for non-zero entires of L
+//        r: double vector right hand side
+//        z: double vector to store the result
+//        M: length of vectors r and z
+void _ic0_solve_c(double* data,
+                long* colind,
+                long* row_ptr,
+                double * r,
+                double * z,
+                int M){
+
+  long i, k, diag;
+  double s;
+
+  // Forward substitution L y = r
+  for (i=0; i<M; i++){
+    diag = row_ptr[i+1]-1;
+    s = r[i];
+    for (k=row_ptr[i]; k<diag; k++) {
+      s -= data[k]*z[colind[k]];
+    }
+    z[i] = s/data[diag];
+  }
+
+  // Backward substitution L^T z = y (column oriented)
+  for (i=M-1; i>=0; i--){
+    diag = row_ptr[i+1]-1;
+    z[i] = z[i]/data[diag];
+    for (k=row_ptr[i]; k<diag; k++) {
+      z[colind[k]] -= data[k]*z[i];
+    }
+  }
+}
+
 		     
 /////////////////////////////////////////////////
 // Gateways to Python
@@ -570,11 +669,100 @@ PyObject *cg_solve_c_precon(PyObject *self, PyObject *args) {
 
 
 
+PyObject *ic0_factor_c(PyObject *self, PyObject *args){
+
+  int M,breakdowns;
+
+  PyObject *csr_sparse; // lower triangle in CSR format, factorised in place
+
+  PyArrayObject
+    *data,            //Non Zeros Data array
+    *colind,          //Column indices array
+    *row_ptr;         //Row pointers array
+
+  // Convert Python arguments to C
+  if (!PyArg_ParseTuple(args, "O", &csr_sparse)) {
+    PyErr_SetString(PyExc_RuntimeError, "ic0_factor_c could not parse input");
+    return NULL;
+  }
+
+  data = (PyArrayObject*) PyObject_GetAttrString(csr_sparse, "data");
+  colind = (PyArrayObject*) PyObject_GetAttrString(csr_sparse, "colind");
+  row_ptr = (PyArrayObject*) PyObject_GetAttrString(csr_sparse, "row_ptr");
+  if (!data || !colind || !row_ptr) {
+    PyErr_SetString(PyExc_RuntimeError,
+        "Sparse matrix arrays could not be accessed in ic0_factor_c");
+    return NULL;
+  }
+
+  M = (row_ptr -> dimensions[0])-1;
+
+  breakdowns = _ic0_factor_c((double*) data->data,
+                (long*) colind->data,
+                (long*) row_ptr->data,
+                M);
+
+  // Free extra references to sparse matrix parts
+  Py_DECREF(data);
+  Py_DECREF(colind);
+  Py_DECREF(row_ptr);
+
+  return Py_BuildValue("i",breakdowns);
+}
+
+PyObject *ic0_solve_c(PyObject *self, PyObject *args){
+
+  int M;
+
+  PyObject *csr_sparse; // factor L from ic0_factor_c
+
+  PyArrayObject
+    *data,            //Non Zeros Data array
+    *colind,          //Column indices array
+    *row_ptr,         //Row pointers array
+    *r,               //Right hand side
+    *z;               //Result
+
+  // Convert Python arguments to C
+  if (!PyArg_ParseTuple(args, "OOO", &csr_sparse, &r, &z)) {
+    PyErr_SetString(PyExc_RuntimeError, "ic0_solve_c could not parse input");
+    return NULL;
+  }
+
+  data = (PyArrayObject*) PyObject_GetAttrString(csr_sparse, "data");
+  colind = (PyArrayObject*) PyObject_GetAttrString(csr_sparse, "colind");
+  row_ptr = (PyArrayObject*) PyObject_GetAttrString(csr_sparse, "row_ptr");
+  if (!data || !colind || !row_ptr) {
+    PyErr_SetString(PyExc_RuntimeError,
+        "Sparse matrix arrays could not be accessed in ic0_solve_c");
+    return NULL;
+  }
+
+  M = (row_ptr -> dimensions[0])-1;
+
+  _ic0_solve_c((double*) data->data,
+                (long*) colind->data,
+                (long*) row_ptr->data,
+                (double*) r->data,
+                (double*) z->data,
+                M);
+
+  // Free extra references to sparse matrix parts
+  Py_DECREF(data);
+  Py_DECREF(colind);
+  Py_DECREF(row_ptr);
+
+  return Py_BuildValue("");
+}
+
+
 // Method table for python module
 static struct PyMethodDef MethodTable[] = {
   {"cg_solve_c", cg_solve_c, METH_VARARGS, "Print out"},
   {"cg_solve_c_precon", cg_solve_c_precon, METH_VARARGS, "Print out"},
   {"jacobi_precon_c", jacobi_precon_c, METH_VARARGS, "Print out"},    
+  {"ic0_factor_c", ic0_factor_c, METH_VARARGS, "Print out"},
+  {"ic0_solve_c", ic0_solve_c, METH_VARARGS, "Print out"},
   {NULL, NULL, 0, NULL}   /* sentinel */
 };
 
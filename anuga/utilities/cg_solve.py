@@ -13,6 +13,8 @@ from cg_ext import cg_solve_c
 from cg_ext import cg_solve_c_precon
 from cg_ext import jacobi_precon_c
 
+from anuga.utilities.preconditioners import preconditioners
+
 
 class Stats:
 
@@ -24,12 +26,64 @@ class Stats:
         self.rTr0 = None
         self.x = None
         self.x0 = None
+        self.precon = 'None'
+
+        # Norm of the residual b - A x at each iteration (only the initial
+        # and final residuals for the c implementation)
+        self.residual_history = []
 
     def __str__(self):
         msg = ' iter %.5g rTr %.5g x %.5g dx %.5g rTr0 %.5g x0 %.5g' \
               % (self.iter, self.rTr, self.x, self.dx, self.rTr0, self.x0)
+        if self.precon != 'None':
+            msg += ' precon %s' % self.precon
         return msg
 
+
+def get_preconditioner(precon, A):
+    """Return preconditioner for matrix A (in Sparse_CSR format).
+
+    precon is either the name of a preconditioner ('Jacobi', 'IC0' or
+    'Multigrid') or an already built preconditioner (an object with a
+    solve method), which is returned unchanged so that it can be reused
+    for several solves with the same matrix.
+    """
+
+    if hasattr(precon, 'solve'):
+        return precon
+
+    if precon not in preconditioners:
+        msg = 'Unknown preconditioner %s, expected one of %s' \
+              % (precon, preconditioners.keys())
+        raise PreconditionerError, msg
+
+    msg = ('Preconditioner %s requires that matrix A be of type %s') \
+          % (precon, str(Sparse_CSR))
+    assert isinstance(A, Sparse_CSR), msg
+
+    return preconditioners[precon](A)
+
+
+def _c_cg_stats(A, b, x0, x, iterations, precon='None'):
+    """Stats of a solve with the c implementation of conjugate gradient
+    """
+
+    stats = Stats()
+
+    r0 = b - A * x0
+    r = b - A * x
+
+    stats.iter = iterations
+    stats.x0 = num.linalg.norm(x0)
+    stats.x = num.linalg.norm(x)
+    stats.dx = num.linalg.norm(x - x0)
+    stats.rTr0 = num.dot(r0, r0)
+    stats.rTr = num.dot(r, r)
+    stats.precon = precon
+    stats.residual_history = [num.sqrt(stats.rTr0), num.sqrt(stats.rTr)]
+
+    return stats
+
 # Note Padarn 26/11/12: This function has been modified to include an
 # additional argument 'use_c_cg' solve, which instead of using the current
 # python implementation calls a c implementation of the cg algorithm. This
@@ -38,6 +92,10 @@ class Stats:
 # function.
 # Note Padarn 26/11/12: Further note that to use the c routine, the matrix
 # A must currently be in the sparse_csr format implemented in anuga.util.sparse
+# Note: The c routines now return the number of iterations, from which
+# stats are built when output_stats is set. The preconditioners 'IC0' and
+# 'Multigrid' (or a preconditioner object from anuga.utilities.preconditioners)
+# are applied in the python implementation, with A only used through A * x.
 
 # Test that matrix is in correct format if c routine is being called
 def conjugate_gradient(A, b, x0=None, imax=10000, tol=1.0e-8, atol=1.0e-14,
@@ -49,14 +107,21 @@ def conjugate_gradient(A, b, x0=None, imax=10000, tol=1.0e-8, atol=1.0e-14,
 
     If b is an array, solve it as if it was a set of vectors, solving each
     vector.
+
+    precon is 'None', 'Jacobi', 'IC0', 'Multigrid' or a preconditioner
+    returned by get_preconditioner. The preconditioner is built once and
+    used for all vectors of b.
     """
-    
-    if use_c_cg:
+
+    if use_c_cg and not hasattr(precon, 'solve'):
         from anuga.utilities.sparse import Sparse_CSR
         msg = ('c implementation of conjugate gradient requires that matrix A\
                 be of type %s') % (str(Sparse_CSR))
         assert isinstance(A, Sparse_CSR), msg
 
+    # The Jacobi and c solvers start from b unless an initial guess is given
+    start_from_b = x0 is None
+
     if x0 is None:
         x0 = num.zeros(b.shape, dtype=num.float)
     else:
@@ -65,15 +130,29 @@ def conjugate_gradient(A, b, x0=None, imax=10000, tol=1.0e-8, atol=1.0e-14,
     b = num.array(b, dtype=num.float)
 
     err = 0
+    stats = None
 
     # preconditioner 
     # Padarn Note: currently a fairly lazy implementation, needs fixing
     M = None
-    if precon == 'Jacobi':
+    if hasattr(precon, 'solve') or precon not in ['None', 'Jacobi']:
+
+        M = get_preconditioner(precon, A)
+
+        if len(b.shape) != 1:
+
+            for i in range(b.shape[1]):
+                x0[:, i], stats = _conjugate_gradient_preconditioned(A, b[:, i], x0[:, i], M,
+                                               imax, tol, atol, iprint, Type=M.name)
+        else:
+            x0, stats = _conjugate_gradient_preconditioned(A, b, x0, M, imax, tol, atol, iprint, Type=M.name)
+
+    elif precon == 'Jacobi':
 
         M = num.zeros(b.shape[0])
         jacobi_precon_c(A, M)
-        x0 = b.copy()     
+        if start_from_b:
+            x0 = b.copy()
 
         if len(b.shape) != 1:   
 
@@ -86,13 +165,18 @@ def conjugate_gradient(A, b, x0=None, imax=10000, tol=1.0e-8, atol=1.0e-14,
                     # need to copy into new array to ensure contiguous access
                     xnew = x0[:, i].copy()
                     err = cg_solve_c_precon(A, xnew, b[:, i].copy(), imax, tol, atol, b.shape[1], M)
+                    if err != -1 and output_stats:
+                        stats = _c_cg_stats(A, b[:, i], x0[:, i], xnew, err, precon)
                     x0[:, i] = xnew
         else:
 
             if not use_c_cg:
                 x0, stats = _conjugate_gradient_preconditioned(A, b, x0, M, imax, tol, atol, iprint, Type="Jacobi")
             else:
+                xstart = x0.copy()
                 err = cg_solve_c_precon(A, x0, b, imax, tol, atol, 1, M)
+                if err != -1 and output_stats:
+                    stats = _c_cg_stats(A, b, xstart, x0, err, precon)
 
     else:
 
@@ -107,14 +191,20 @@ def conjugate_gradient(A, b, x0=None, imax=10000, tol=1.0e-8, atol=1.0e-14,
                     # need to copy into new array to ensure contiguous access
                     xnew = x0[:, i].copy()
                     err = cg_solve_c(A, xnew, b[:, i].copy(), imax, tol, atol, b.shape[1])
+                    if err != -1 and output_stats:
+                        stats = _c_cg_stats(A, b[:, i], x0[:, i], xnew, err)
                     x0[:, i] = xnew
         else:   
 
             if not use_c_cg:
                 x0, stats = _conjugate_gradient(A, b, x0, imax, tol, atol, iprint)
             else:
-                x0 = b.copy()
+                if start_from_b:
+                    x0 = b.copy()
+                xstart = x0.copy()
                 err = cg_solve_c(A, x0, b, imax, tol, atol, 1)
+                if err != -1 and output_stats:
+                    stats = _c_cg_stats(A, b, xstart, x0, err)
 
     if err == -1:
         
@@ -173,6 +263,7 @@ def _conjugate_gradient(A, b, x0,
     rTr0 = rTr
 
     stats.rTr0 = rTr0
+    stats.residual_history.append(num.sqrt(rTr))
 
     #FIXME Let the iterations stop if starting with a small residual
     while (i < imax and rTr > tol ** 2 * rTr0 and rTr > atol ** 2):
@@ -198,6 +289,7 @@ def _conjugate_gradient(A, b, x0,
             r = r - alpha * q
         rTrOld = rTr
         rTr = num.dot(r, r)
+        stats.residual_history.append(num.sqrt(rTr))
         bt = rTr / rTrOld
 
         d = r + bt * d
@@ -234,6 +326,8 @@ def _conjugate_gradient_preconditioned(A, b, x0, M,
       (__mul__ just needs to be defined)
    b: right hand side
    x0: inital guess (default the 0 vector)
+   M: preconditioner, the diagonal of A if Type is 'Jacobi', otherwise
+      an object whose method solve(r) approximates A^-1 r
    imax: max number of iterations
    tol: tolerance used for residual
 
@@ -241,20 +335,17 @@ def _conjugate_gradient_preconditioned(A, b, x0, M,
    x: approximate solution
    """
 
-    # Padarn note: This is temporary while the Jacboi preconditioner is the only
-    # one avaliable.
-    D=[]
-    if not Type=='Jacobi':
-        log.warning('Only the Jacobi Preconditioner is impletment cg_solve python')
-        msg = 'Only the Jacobi Preconditioner is impletment in cg_solve python'
-        raise PreconditionerError, msg
+    if Type == 'Jacobi' and not hasattr(M, 'solve'):
+        D = num.array(M, dtype=num.float)
+        precon_solve = lambda r: r / D
+    elif hasattr(M, 'solve'):
+        precon_solve = M.solve
     else:
-        D=Sparse(A.M, A.M)
-        for i in range(A.M):
-            D[i,i]=1/M[i]
-        D=Sparse_CSR(D)
+        msg = 'Preconditioner of type %s needs a solve method' % Type
+        raise PreconditionerError, msg
 
     stats = Stats()
+    stats.precon = Type
 
     b  = num.array(b, dtype=num.float)
     if len(b.shape) != 1:
@@ -275,15 +366,18 @@ def _conjugate_gradient_preconditioned(A, b, x0, M,
     i = 1
     x = x0
     r = b - A * x
-    z = D * r
-    d = r
+    z = precon_solve(r)
+    d = z
     rTr = num.dot(r, z)
     rTr0 = rTr
 
     stats.rTr0 = rTr0
+    stats.residual_history.append(num.linalg.norm(r))
     
+    # r^T z is negative for a negative definite A (e.g. div grad) and
+    # preconditioner, so compare absolute values
     #FIXME Let the iterations stop if starting with a small residual
-    while (i < imax and rTr > tol ** 2 * rTr0 and rTr > atol ** 2):
+    while (i < imax and abs(rTr) > tol ** 2 * abs(rTr0) and abs(rTr) > atol ** 2):
         q = A * d
         alpha = rTr / num.dot(d, q)
         xold = x
@@ -305,8 +399,9 @@ def _conjugate_gradient_preconditioned(A, b, x0, M,
         else:
             r = r - alpha * q
         rTrOld = rTr
-        z = D * r
+        z = precon_solve(r)
         rTr = num.dot(r, z)
+        stats.residual_history.append(num.linalg.norm(r))
         bt = rTr / rTrOld
 
         d = z + bt * d
@@ -0,0 +1,73 @@
+"""
+Preconditioning of the conjugate gradient solves of the elliptic
+operators (Elliptic_operator and Kinematic_viscosity_operator).
+"""
+
+import numpy as num
+
+from anuga.utilities.sparse import Sparse_CSR
+from anuga.utilities.cg_solve import get_preconditioner
+
+
+class Preconditioned_operator:
+    """Mixin providing the preconditioner of an elliptic operator.
+
+    The operator must provide n (the number of centroids), mesh,
+    elliptic_matrix (Sparse_CSR including the boundary columns),
+    apply_triangle_areas, parabolic and dt, and must reset precon_cache
+    to None whenever elliptic_matrix changes.
+    """
+
+    def set_preconditioner(self, precon='None'):
+        """Set preconditioner used by the conjugate gradient method in
+        elliptic_solve and parabolic_solve, one of 'None', 'Jacobi', 'IC0'
+        or 'Multigrid'
+        """
+
+        self.precon = precon
+        self.precon_cache = None
+
+
+    def get_operator_matrix(self):
+        """Return the operator applied by __mul__ (the elliptic operator,
+        or I - dt times the elliptic operator for a parabolic solve)
+        restricted to the centroid values, as an n x n Sparse_CSR matrix
+        """
+
+        n = self.n
+        M = self.elliptic_matrix
+
+        rows = num.repeat(num.arange(n), num.diff(M.row_ptr))
+        interior = M.colind < n
+
+        rows = rows[interior]
+        colind = M.colind[interior]
+        data = M.data[interior]
+
+        if self.apply_triangle_areas:
+            data = data / self.mesh.areas[colind]
+
+        if self.parabolic:
+            data = - self.dt * data
+            data[rows == colind] += 1.0
+
+        row_ptr = num.searchsorted(rows, num.arange(n+1)).astype(num.int)
+
+        return Sparse_CSR(None, data, colind, row_ptr, n, n)
+
+
+    def get_preconditioner(self):
+        """Return preconditioner for the current operator, or 'None'.
+        The preconditioner is reused until the elliptic matrix, dt or the
+        type of solve changes.
+        """
+
+        if self.precon == 'None':
+            return 'None'
+
+        key = (self.parabolic, self.dt)
+        if self.precon_cache is None or self.precon_cache[0] != key:
+            precon = get_preconditioner(self.precon, self.get_operator_matrix())
+            self.precon_cache = (key, precon)
+
+        return self.precon_cache[1]
@@ -0,0 +1,296 @@
+"""
+Preconditioners for the conjugate gradient solver in cg_solve.
+
+All preconditioners are built from a symmetric positive definite matrix
+in Sparse_CSR format and provide a method solve(r) returning an
+approximation z of the solution of A z = r. They are selected by name
+with cg_solve.get_preconditioner:
+
+    'Jacobi'     diagonal scaling
+    'IC0'        incomplete Cholesky factorisation with zero fill in
+    'Multigrid'  algebraic multigrid V-cycle (aggregation based)
+"""
+
+import numpy as num
+
+from anuga.utilities.sparse import Sparse_CSR
+
+# Setup for C preconditioner routines
+from cg_ext import jacobi_precon_c
+from cg_ext import ic0_factor_c
+from cg_ext import ic0_solve_c
+
+
+def _csr_rows(A):
+    """Return the row index of each non-zero entry of A
+    """
+
+    return num.repeat(num.arange(A.M), num.diff(A.row_ptr))
+
+
+def _csr_from_triplets(rows, cols, values, m, n):
+    """Create Sparse_CSR matrix from (row, col, value) triplets,
+    summing duplicate entries.
+    """
+
+    keys = num.asarray(rows, num.int)*n + num.asarray(cols, num.int)
+    keys, inverse = num.unique(keys, return_inverse=True)
+    data = num.bincount(inverse, weights=values)
+
+    colind = num.ascontiguousarray(keys % n, dtype=num.int)
+    row_ptr = num.searchsorted(keys // n, num.arange(m+1)).astype(num.int)
+
+    return Sparse_CSR(data=num.ascontiguousarray(data, dtype=num.float),
+                      Colind=colind, rowptr=row_ptr, m=int(m), n=int(n))
+
+
+def _csr_diagonal(A):
+    """Return the diagonal of A, with zero entries replaced by 1
+    """
+
+    diag = num.zeros(A.M, num.float)
+    jacobi_precon_c(A, diag)
+
+    return diag
+
+
+class Preconditioner:
+    """Base class for preconditioners, solve returns r unchanged.
+    """
+
+    name = 'None'
+
+    def solve(self, r):
+        return num.array(r, dtype=num.float)
+
+    def __str__(self):
+        return self.name
+
+
+class Jacobi_preconditioner(Preconditioner):
+    """Diagonal (Jacobi) preconditioner
+    """
+
+    name = 'Jacobi'
+
+    def __init__(self, A):
+
+        self.diagonal = _csr_diagonal(A)
+
+
+    def solve(self, r):
+        return r/self.diagonal
+
+
+class IC0_preconditioner(Preconditioner):
+    """Incomplete Cholesky preconditioner IC(0). The factor L has the
+    sparsity pattern of the lower triangle of A, and z = (L L^T)^-1 r is
+    computed by forward and backward substitution.
+
+    Non positive pivots (A not an M-matrix) are replaced by the diagonal
+    of A, their number is stored in breakdowns. A negative definite A (such
+    as the discrete div grad operator) is factorised as -A.
+    """
+
+    name = 'IC0'
+
+    def __init__(self, A):
+
+        M = A.M
+        rows = _csr_rows(A)
+        cols = num.asarray(A.colind)
+        data = num.asarray(A.data)
+
+        diagonal = data[rows == cols]
+        if len(diagonal) > 0 and num.all(diagonal < 0.0):
+            self.sign = -1.0
+        else:
+            self.sign = 1.0
+
+        lower = cols <= rows
+
+        # Make sure every row has a diagonal entry
+        diag = num.arange(M)
+        rows = num.concatenate((rows[lower], diag))
+        cols = num.concatenate((cols[lower], diag))
+        values = num.concatenate((self.sign*data[lower],
+                                  num.zeros(M, num.float)))
+
+        self.L = _csr_from_triplets(rows, cols, values, M, M)
+        self.breakdowns = ic0_factor_c(self.L)
+
+
+    def solve(self, r):
+
+        r = num.ascontiguousarray(r, dtype=num.float)
+        z = num.zeros(r.shape, num.float)
+        ic0_solve_c(self.L, r, z)
+
+        return self.sign*z
+
+
+class Multigrid_preconditioner(Preconditioner):
+    """Algebraic multigrid preconditioner using one V-cycle.
+
+    The coarse levels are built by aggregation of strongly connected
+    unknowns (|a_ij| >= strength*sqrt(a_ii a_jj)), the coarse matrices
+    are the Galerkin products P^T A P with the piecewise constant
+    prolongation P. The smoother is damped Jacobi, applied sweeps times
+    before and after the coarse grid correction so that the V-cycle is
+    symmetric. Levels are added until the matrix has at most coarse_size
+    rows, which is then solved directly.
+    """
+
+    name = 'Multigrid'
+
+    def __init__(self, A, strength=0.08, coarse_size=100, max_levels=10,
+                 sweeps=1):
+
+        self.strength = strength
+        self.coarse_size = coarse_size
+        self.sweeps = sweeps
+
+        self.matrices = []
+        self.diagonals = []
+        self.omegas = []
+        self.aggregates = []
+
+        while True:
+            D = _csr_diagonal(A)
+
+            self.matrices.append(A)
+            self.diagonals.append(D)
+            self.omegas.append(self._jacobi_weight(A, D))
+
+            if A.M <= coarse_size or len(self.matrices) == max_levels:
+                break
+
+            aggregate, number_of_aggregates = self._aggregate(A, D)
+
+            # Stop if the aggregation does not coarsen the matrix
+            if number_of_aggregates > 0.9*A.M:
+                break
+
+            self.aggregates.append((aggregate, number_of_aggregates))
+            A = self._coarse_matrix(A, aggregate, number_of_aggregates)
+
+        self.coarse_inverse = num.linalg.pinv(A.todense())
+
+
+    def get_number_of_levels(self):
+        return len(self.matrices)
+
+
+    def _jacobi_weight(self, A, D):
+        """Damping 4/(3 rho) with rho the Gershgorin bound of the
+        spectral radius of D^-1 A.
+        """
+
+        row_sums = num.bincount(_csr_rows(A), weights=num.abs(A.data),
+                                minlength=A.M)
+        rho = num.max(row_sums/num.abs(D)) if A.M > 0 else 1.0
+
+        return 4.0/(3.0*rho)
+
+
+    def _aggregate(self, A, D):
+        """Return aggregate number of each row of A and the number of
+        aggregates.
+        """
+
+        M = A.M
+        rows = _csr_rows(A)
+        cols = num.asarray(A.colind)
+        data = num.asarray(A.data)
+
+        strong = (rows != cols) & \
+                 (num.abs(data) >= self.strength *
+                  num.sqrt(num.abs(D[rows]*D[cols])))
+
+        # Strong neighbours of row i are neighbours[ptr[i]:ptr[i+1]]
+        neighbours = cols[strong]
+        ptr = num.searchsorted(rows[strong], num.arange(M+1))
+
+        aggregate = -num.ones(M, num.int)
+        n = 0
+
+        # Pass 1: a row whose strong neighbours are all free forms an
+        # aggregate with them
+        for i in xrange(M):
+            N_i = neighbours[ptr[i]:ptr[i+1]]
+            if len(N_i) == 0 or aggregate[i] >= 0:
+                continue
+            if num.all(aggregate[N_i] < 0):
+                aggregate[i] = n
+                aggregate[N_i] = n
+                n += 1
+
+        # Pass 2: remaining rows join the aggregate of a strong neighbour
+        remaining = num.where(aggregate < 0)[0]
+        previous = aggregate.copy()
+        for i in remaining:
+            N_i = neighbours[ptr[i]:ptr[i+1]]
+            joined = N_i[previous[N_i] >= 0]
+            if len(joined) > 0:
+                aggregate[i] = previous[joined[0]]
+
+        # Pass 3: rows without aggregated neighbours form new aggregates
+        for i in num.where(aggregate < 0)[0]:
+            if aggregate[i] >= 0:
+                continue
+            N_i = neighbours[ptr[i]:ptr[i+1]]
+            aggregate[i] = n
+            aggregate[N_i[aggregate[N_i] < 0]] = n
+            n += 1
+
+        return aggregate, n
+
+
+    def _coarse_matrix(self, A, aggregate, number_of_aggregates):
+        """Galerkin coarse matrix P^T A P
+        """
+
+        rows = aggregate[_csr_rows(A)]
+        cols = aggregate[num.asarray(A.colind)]
+
+        return _csr_from_triplets(rows, cols, num.asarray(A.data),
+                                  number_of_aggregates, number_of_aggregates)
+
+
+    def _smooth(self, level, x, b):
+
+        A = self.matrices[level]
+        D = self.diagonals[level]
+        omega = self.omegas[level]
+
+        for i in range(self.sweeps):
+            x = x + omega*(b - A*x)/D
+
+        return x
+
+
+    def _cycle(self, level, b):
+
+        if level == len(self.aggregates):
+            return num.dot(self.coarse_inverse, b)
+
+        aggregate, n = self.aggregates[level]
+
+        x = self._smooth(level, num.zeros(b.shape, num.float), b)
+
+        r = b - self.matrices[level]*x
+        rc = num.bincount(aggregate, weights=r, minlength=n)
+        x = x + self._cycle(level+1, rc)[aggregate]
+
+        return self._smooth(level, x, b)
+
+
+    def solve(self, r):
+
+        return self._cycle(0, num.asarray(r, dtype=num.float))
+
+
+preconditioners = {'Jacobi': Jacobi_preconditioner,
+                   'IC0': IC0_preconditioner,
+                   'Multigrid': Multigrid_preconditioner}
+
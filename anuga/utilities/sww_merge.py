@@ -19,7 +19,20 @@ def sww_merge(domain_global_name, np, verbose=False):
     _sww_merge(swwfiles, output, verbose)
 
 
-def sww_merge_parallel(domain_global_name, np, verbose=False, delete_old=False):
+def sww_merge_parallel(domain_global_name, np, verbose=False, delete_old=False,
+                       chunk_size=None, processes=None):
+    """Merge the sww files of a parallel run into domain_global_name.sww
+
+    chunk_size is the number of timesteps merged at a time. By default all
+    timesteps are merged at once. Set it to bound the memory used by the
+    merge, which is then independent of the number of timesteps.
+
+    processes is the number of worker processes used to read the files.
+    By default the merge is done in this process. At most processes
+    blocks of chunk_size timesteps of a quantity are read ahead of the
+    writing, so set chunk_size to bound the memory used by the workers too.
+    Do not use processes from an MPI process, as forking it is not safe.
+    """
 
     output = domain_global_name+".sww"
     swwfiles = [ domain_global_name+"_P"+str(np)+"_"+str(v)+".sww" for v in range(np)]
@@ -36,9 +49,11 @@ def sww_merge_parallel(domain_global_name, np, verbose=False, delete_old=False):
     fid.close()
 
     if 3*number_of_volumes == number_of_points:
-        _sww_merge_parallel_non_smooth(swwfiles, output, verbose, delete_old)
+        _sww_merge_parallel_non_smooth(swwfiles, output, verbose, delete_old,
+                                       chunk_size, processes)
     else:
-        _sww_merge_parallel_smooth(swwfiles, output, verbose, delete_old)
+        _sww_merge_parallel_smooth(swwfiles, output, verbose, delete_old,
+                                   chunk_size, processes)
         
 
 def _sww_merge(swwfiles, output, verbose=False):
@@ -198,7 +213,8 @@ def _sww_merge(swwfiles, output, verbose=False):
     fido.close()
 
 
-def _sww_merge_parallel_smooth(swwfiles, output,  verbose=False, delete_old=False):
+def _sww_merge_parallel_smooth(swwfiles, output,  verbose=False, delete_old=False,
+                               chunk_size=None, processes=None):
     """
         Merge a list of sww files into a single file.
         
@@ -215,6 +231,8 @@ def _sww_merge_parallel_smooth(swwfiles, output,  verbose=False, delete_old=Fals
         swwfiles is a list of .sww files to merge.
         output is the output filename, including .sww extension.
         verbose True to log output information
+        chunk_size number of timesteps merged at a time (default all)
+        processes number of worker processes reading the files (default none)
     """
 
     if verbose:
@@ -223,6 +241,7 @@ def _sww_merge_parallel_smooth(swwfiles, output,  verbose=False, delete_old=Fals
     
     first_file = True
     tri_offset = 0
+    file_indices = []
     for filename in swwfiles:
         if verbose:
             print 'Reading file ', filename, ':'    
@@ -238,10 +257,8 @@ def _sww_merge_parallel_smooth(swwfiles, output,  verbose=False, delete_old=Fals
             starttime = int(fid.starttime)
             
             out_s_quantities = {}
-            out_d_quantities = {}
 
             out_s_c_quantities = {}
-            out_d_c_quantities = {}
 
 
             xllcorner = fid.xllcorner
@@ -287,10 +304,6 @@ def _sww_merge_parallel_smooth(swwfiles, output,  verbose=False, delete_old=Fals
             for quantity in static_quantities:
                 out_s_quantities[quantity] = num.zeros((number_of_global_nodes,),num.float32)
 
-            # Quantities are stored as a 2D array of timesteps x data.
-            for quantity in dynamic_quantities:
-                out_d_quantities[quantity] = \
-                      num.zeros((n_steps,number_of_global_nodes),num.float32)
 
             #=======================================
             # Deal with the centroid based variables
@@ -314,11 +327,6 @@ def _sww_merge_parallel_smooth(swwfiles, output,  verbose=False, delete_old=Fals
             for quantity in static_c_quantities:
                 out_s_c_quantities[quantity] = num.zeros((number_of_global_triangles,),num.float32)
 
-            # Quantities are stored as a 2D array of timesteps x data.
-            for quantity in dynamic_c_quantities:
-                out_d_c_quantities[quantity] = \
-                      num.zeros((n_steps,number_of_global_triangles),num.float32)
-                 
             description = 'merged:' + getattr(fid, 'description')          
             first_file = False
 
@@ -354,7 +362,7 @@ def _sww_merge_parallel_smooth(swwfiles, output,  verbose=False, delete_old=Fals
         #assert num.allclose(l_volumes, l_old_volumes)
 
         # Just pick out the full triangles
-        ftri_ids = num.where(tri_full_flag>0)
+        ftri_ids = num.where(tri_full_flag>0)[0]
         ftri_l2g = num.compress(tri_full_flag, tri_l2g)
         
         #f_ids = num.argwhere(tri_full_flag==1).reshape(-1,)
@@ -412,16 +420,6 @@ def _sww_merge_parallel_smooth(swwfiles, output,  verbose=False, delete_old=Fals
             out_s_quantities[quantity][f_node_l2g] = \
                          num.array(q[:],dtype=num.float32)[fl_nodes]
 
-        
-        #Collate all dynamic quantities according to their timestep
-        for quantity in dynamic_quantities:
-            q = fid.variables[quantity]
-            #print q.shape
-            for i in range(n_steps):
-                #out_d_quantities[quantity][i][node_l2g] = \
-                #           num.array(q[i],dtype=num.float32)
-                out_d_quantities[quantity][i][f_node_l2g] = \
-                           num.array(q[i],dtype=num.float32)[fl_nodes]
 
 
         # Read in static c quantities
@@ -432,15 +430,9 @@ def _sww_merge_parallel_smooth(swwfiles, output,  verbose=False, delete_old=Fals
             out_s_c_quantities[quantity][ftri_l2g] = \
                          num.array(q).astype(num.float32)[ftri_ids]
 
-        
-        #Collate all dynamic c quantities according to their timestep
-        for quantity in dynamic_c_quantities:
-            q = fid.variables[quantity]
-            #print q.shape
-            for i in range(n_steps):
-                out_d_c_quantities[quantity][i][ftri_l2g] = \
-                           num.array(q[i]).astype(num.float32)[ftri_ids]
 
+        # Dynamic quantities are merged after the static data is written
+        file_indices.append((fl_nodes, f_node_l2g, ftri_ids, ftri_l2g))
 
         fid.close()
 
@@ -489,33 +481,13 @@ def _sww_merge_parallel_smooth(swwfiles, output,  verbose=False, delete_old=Fals
     for i in range(n_steps):
         fido.variables['time'][i] = times[i]
 
-        
-    for q in dynamic_quantities:
-        q_values = out_d_quantities[q]
-        if verbose:
-            print '  Writing quantity: ',q
-            
-        for i in range(n_steps):
-            fido.variables[q][i] = q_values[i]
-        
-        # This updates the _range values
-        q_range = fido.variables[q + Write_sww.RANGE][:]
-        q_values_min = num.min(q_values)
-        if q_values_min < q_range[0]:
-            fido.variables[q + Write_sww.RANGE][0] = q_values_min
-        q_values_max = num.max(q_values)
-        if q_values_max > q_range[1]:
-            fido.variables[q + Write_sww.RANGE][1] = q_values_max        
-
-    for q in dynamic_c_quantities:
-        if verbose:
-            print '  Writing quantity: ',q
-            
-        q_values = out_d_c_quantities[q]
-        for i in range(n_steps):
-            fido.variables[q][i] = q_values[i]
+    _merge_dynamic_quantities(fido, swwfiles, file_indices,
+                              dynamic_quantities, dynamic_c_quantities,
+                              n_steps, number_of_global_nodes,
+                              number_of_global_triangles,
+                              chunk_size=chunk_size, processes=processes,
+                              verbose=verbose)
 
-                                        
     #print out_s_quantities
     #print out_d_quantities
     
@@ -535,7 +507,8 @@ def _sww_merge_parallel_smooth(swwfiles, output,  verbose=False, delete_old=Fals
             os.remove(filename)
 
 
-def _sww_merge_parallel_non_smooth(swwfiles, output,  verbose=False, delete_old=False):
+def _sww_merge_parallel_non_smooth(swwfiles, output,  verbose=False, delete_old=False,
+                                   chunk_size=None, processes=None):
     """
         Merge a list of sww files into a single file.
 
@@ -552,6 +525,8 @@ def _sww_merge_parallel_non_smooth(swwfiles, output,  verbose=False, delete_old=
         swwfiles is a list of .sww files to merge.
         output is the output filename, including .sww extension.
         verbose True to log output information
+        chunk_size number of timesteps merged at a time (default all)
+        processes number of worker processes reading the files (default none)
     """
 
     if verbose:
@@ -560,6 +535,7 @@ def _sww_merge_parallel_non_smooth(swwfiles, output,  verbose=False, delete_old=
 
     first_file = True
     tri_offset = 0
+    file_indices = []
     for filename in swwfiles:
         if verbose:
             print 'Reading file ', filename, ':'
@@ -695,6 +671,8 @@ def _sww_merge_parallel_non_smooth(swwfiles, output,  verbose=False, delete_old=
                          num.array(q).astype(num.float32)[f_ids]
                          #num.array(q,dtype=num.float32)[f_ids]
 
+        # Dynamic quantities are merged after the static data is written
+        file_indices.append((l_vids, g_vids, f_ids, f_gids))
         
         fid.close()
 
@@ -736,54 +714,12 @@ def _sww_merge_parallel_non_smooth(swwfiles, output,  verbose=False, delete_old=
     for i in range(n_steps):
         fido.variables['time'][i] = times[i]
 
-    for q in (dynamic_quantities + dynamic_c_quantities):
-
-        if verbose:
-            print '  Writing quantity: ',q
-                    
-        # Initialise q_values with zeros
-        if q in dynamic_quantities:
-            q_values = num.zeros((n_steps, 3*number_of_global_triangles), num.float32)
-        elif q in dynamic_c_quantities:
-            q_values = num.zeros((n_steps, number_of_global_triangles), num.float32)
-
-
-        # Read the quantities one at a time, to reduce memory usage
-        for filename in swwfiles:
-            fid = NetCDFFile(filename, netcdf_mode_r)
-
-            # Index information
-            tri_l2g  = fid.variables['tri_l2g'][:]
-            node_l2g = fid.variables['node_l2g'][:]
-            tri_full_flag = fid.variables['tri_full_flag'][:]
-            f_ids = num.argwhere(tri_full_flag==1).reshape(-1,)
-            f_gids = tri_l2g[f_ids]
-            g_vids = (3*f_gids.reshape(-1,1) + num.array([0,1,2])).reshape(-1,)
-            l_vids = (3*f_ids.reshape(-1,1) + num.array([0,1,2])).reshape(-1,)
-            for i in range(n_steps):
-                # Different indices for vertex and centroid quantities
-                if q in dynamic_quantities:
-                    q_values[i][g_vids] = \
-                    num.array(fid.variables[q][i], dtype=num.float32)[l_vids]
-                elif q in dynamic_c_quantities:
-                    q_values[i][f_gids] = \
-                    num.array(fid.variables[q][i], dtype=num.float32)[f_ids]
-
-            fid.close()
-
-        # Write to the file
-        for i in range(n_steps):
-            fido.variables[q][i] = q_values[i]
-
-        if q in dynamic_quantities:
-            # This updates the _range values
-            q_range = fido.variables[q + Write_sww.RANGE][:]
-            q_values_min = num.min(q_values)
-            if q_values_min < q_range[0]:
-                fido.variables[q + Write_sww.RANGE][0] = q_values_min
-            q_values_max = num.max(q_values)
-            if q_values_max > q_range[1]:
-                fido.variables[q + Write_sww.RANGE][1] = q_values_max
+    _merge_dynamic_quantities(fido, swwfiles, file_indices,
+                              dynamic_quantities, dynamic_c_quantities,
+                              n_steps, 3*number_of_global_triangles,
+                              number_of_global_triangles,
+                              chunk_size=chunk_size, processes=processes,
+                              verbose=verbose)
 
     fido.close()
 
@@ -800,6 +736,167 @@ def _sww_merge_parallel_non_smooth(swwfiles, output,  verbose=False, delete_old=
 
 
 
+def _merge_dynamic_quantities(fido, swwfiles, file_indices,
+                              dynamic_quantities, dynamic_c_quantities,
+                              n_steps, number_of_points, number_of_volumes,
+                              chunk_size=None, processes=None, verbose=False):
+    """
+        Scatter the dynamic quantities of the sww files of a parallel run
+        into the merged sww file fido.
+
+        Only chunk_size timesteps (default all) are read from each file and
+        held in memory at a time, so memory use does not depend on the
+        number of timesteps.
+
+        If processes > 1 a pool of that many worker processes reads and
+        scatters the blocks of each quantity and chunk of timesteps, while
+        this process writes the blocks to the merged file in order. At most
+        processes blocks are submitted ahead of the writing.
+
+        file_indices is a list with, for each file, the tuple
+        (local point ids, global point ids, local volume ids, global volume ids)
+        of the points and volumes to copy.
+    """
+
+    quantities = [(q, number_of_points, False) for q in dynamic_quantities] + \
+                 [(q, number_of_volumes, True) for q in dynamic_c_quantities]
+
+    parallel = processes is not None and processes > 1
+
+    if chunk_size is None:
+        chunk_size = n_steps
+    chunk_size = max(int(chunk_size), 1)
+
+    windows = [(start, min(start + chunk_size, n_steps))
+               for start in range(0, n_steps, chunk_size)]
+
+    # One block per quantity and window of timesteps, so only one quantity
+    # is held in memory at a time
+    tasks = [([quantity], start, stop)
+             for start, stop in windows for quantity in quantities]
+
+    if parallel:
+        from multiprocessing import Pool
+
+        pool = Pool(processes, _merge_worker_init, (swwfiles, file_indices))
+        try:
+            blocks = _imap_bounded(pool, _merge_worker, tasks, processes)
+            q_min, q_max = _write_dynamic_quantities(fido, blocks, verbose)
+        finally:
+            pool.terminate()
+    else:
+        blocks = (_read_dynamic_quantities(swwfiles, file_indices,
+                                           task_quantities, start, stop)
+                  for task_quantities, start, stop in tasks)
+        q_min, q_max = _write_dynamic_quantities(fido, blocks, verbose)
+
+    # This updates the _range values of the vertex quantities
+    for q in dynamic_quantities:
+        if q not in q_min:
+            continue
+        q_range = fido.variables[q + Write_sww.RANGE][:]
+        if q_min[q] < q_range[0]:
+            fido.variables[q + Write_sww.RANGE][0] = q_min[q]
+        if q_max[q] > q_range[1]:
+            fido.variables[q + Write_sww.RANGE][1] = q_max[q]
+
+
+def _read_dynamic_quantities(swwfiles, file_indices, quantities, start, stop):
+    """
+        Read timesteps start to stop-1 of quantities from the sww files of a
+        parallel run and scatter them into global arrays.
+
+        quantities is a list of tuples
+        (name, number of global values, True if centroid quantity)
+
+        Return start, stop and a dictionary of the global arrays.
+    """
+
+    q_values = {}
+    for q, n, centroid in quantities:
+        q_values[q] = num.zeros((stop-start, n), num.float32)
+
+    for filename, indices in zip(swwfiles, file_indices):
+        l_ids, g_ids, l_c_ids, g_c_ids = indices
+
+        fid = NetCDFFile(filename, netcdf_mode_r)
+
+        for q, n, centroid in quantities:
+            values = num.array(fid.variables[q][start:stop], num.float32)
+            if centroid:
+                q_values[q][:, g_c_ids] = values[:, l_c_ids]
+            else:
+                q_values[q][:, g_ids] = values[:, l_ids]
+
+        fid.close()
+
+    return start, stop, q_values
+
+
+def _write_dynamic_quantities(fido, blocks, verbose=False):
+    """
+        Write blocks (start, stop, dictionary of global arrays) into the
+        merged sww file fido. Return dictionaries of the min and max of
+        each quantity.
+    """
+
+    q_min = {}
+    q_max = {}
+
+    for start, stop, q_values in blocks:
+
+        for q in q_values:
+            if verbose:
+                print '  Writing quantity %s, timesteps %d to %d' \
+                      % (q, start, stop-1)
+
+            fido.variables[q][start:stop] = q_values[q]
+
+            q_min[q] = min(q_min.get(q, num.inf), num.min(q_values[q]))
+            q_max[q] = max(q_max.get(q, -num.inf), num.max(q_values[q]))
+
+    return q_min, q_max
+
+
+def _imap_bounded(pool, function, tasks, max_pending):
+    """
+        Like pool.imap(function, tasks), but only submit a task when fewer
+        than max_pending results are waiting, so the results not yet
+        consumed do not pile up in memory.
+    """
+
+    from collections import deque
+
+    pending = deque()
+
+    for task in tasks:
+        if len(pending) >= max_pending:
+            yield pending.popleft().get()
+        pending.append(pool.apply_async(function, (task,)))
+
+    while pending:
+        yield pending.popleft().get()
+
+
+# Files and index maps shared by the worker processes of a parallel merge
+_merge_files = None
+
+def _merge_worker_init(swwfiles, file_indices):
+
+    global _merge_files
+    _merge_files = (swwfiles, file_indices)
+
+
+def _merge_worker(task):
+
+    quantities, start, stop = task
+    swwfiles, file_indices = _merge_files
+
+    return _read_dynamic_quantities(swwfiles, file_indices,
+                                    quantities, start, stop)
+
+
+
 if __name__ == "__main__":
 
     import argparse
@@ -815,6 +912,10 @@ if __name__ == "__main__":
                    help='verbosity')
     parser.add_argument('-delete_old', nargs='?', type=bool, const=True, default=False,
                    help='Flag to delete the input files')
+    parser.add_argument('-chunk_size', type=int, default=None,
+                   help='number of timesteps merged at a time (default all)')
+    parser.add_argument('-processes', type=int, default=None,
+                   help='number of worker processes (default none)')
     args = parser.parse_args()
 
     np = args.np
@@ -824,7 +925,8 @@ if __name__ == "__main__":
 
 
     try:
-        sww_merge_parallel(domain_global_name, np, verbose, delete_old)
+        sww_merge_parallel(domain_global_name, np, verbose, delete_old,
+                           args.chunk_size, args.processes)
     except:
         msg = 'ERROR: When merging sww files %s '% domain_global_name
         print msg
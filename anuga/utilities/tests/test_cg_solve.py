@@ -559,6 +559,154 @@ class Test_CG_Solve(unittest.TestCase):
 
         assert num.allclose(x,xe)
 
+    def build_laplacian_2d(self, n, m):
+        """Standard 2d laplacian as a csr matrix"""
+
+        A = Sparse(m*n, m*n)
+
+        for i in num.arange(0,n):
+            for j in num.arange(0,m):
+                I = j+m*i
+                A[I,I] = 4.0
+                if i > 0  :
+                    A[I,I-m] = -1.0
+                if i < n-1 :
+                    A[I,I+m] = -1.0
+                if j > 0  :
+                    A[I,I-1] = -1.0
+                if j < m-1 :
+                    A[I,I+1] = -1.0
+
+        return Sparse_CSR(A)
+
+    def test_ic0_preconditioner(self):
+        """IC(0) of a tridiagonal matrix is its exact Cholesky factor"""
+
+        A = [[2.0, -1.0, 0.0, 0.0 ],
+             [-1.0, 2.0, -1.0, 0.0],
+             [0.0, -1.0, 2.0, -1.0],
+             [0.0,0.0, -1.0, 2.0]]
+
+        A = Sparse_CSR(Sparse(A))
+
+        M = get_preconditioner('IC0', A)
+        assert M.breakdowns == 0
+
+        L = M.L.todense()
+        assert num.allclose(num.dot(L, L.T), A.todense())
+
+        xe = num.array([0.0, 1.0, 2.0, 3.0])
+        assert num.allclose(M.solve(A*xe), xe)
+
+        # Negative definite matrix
+        A.data = -A.data
+        M = get_preconditioner('IC0', A)
+        assert num.allclose(M.solve(A*xe), xe)
+
+    def test_solve_large_2d_with_preconditioners(self):
+        """Preconditioned solves of 2d laplacian need fewer iterations"""
+
+        n = 30
+        m = 20
+
+        A = self.build_laplacian_2d(n, m)
+
+        xe = num.sin(num.arange(n*m))
+        b  = A*xe
+
+        iterations = {}
+        for precon in ['None', 'Jacobi', 'IC0', 'Multigrid']:
+            x, stats = conjugate_gradient(A, b, tol=1.0e-10, precon=precon,
+                                          output_stats=True)
+
+            assert num.allclose(x, xe)
+            assert stats.precon == precon
+            iterations[precon] = stats.iter
+
+        assert iterations['IC0'] < iterations['Jacobi']/2
+        assert iterations['Multigrid'] < iterations['Jacobi']/2
+
+        # Preconditioner can be built once and reused
+        M = get_preconditioner('Multigrid', A)
+        assert M.get_number_of_levels() > 1
+
+        B = num.array([b, 2*b]).T
+        X = conjugate_gradient(A, B, tol=1.0e-10, precon=M, use_c_cg=True)
+        assert num.allclose(X[:,0], xe)
+        assert num.allclose(X[:,1], 2*xe)
+
+    def test_unknown_preconditioner(self):
+
+        A = self.build_laplacian_2d(3, 3)
+        b = num.ones(9)
+
+        try:
+            conjugate_gradient(A, b, precon='Spam')
+        except PreconditionerError:
+            pass
+        else:
+            msg = 'Should have raised exception'
+            raise TestError, msg
+
+    def test_stats_residual_history(self):
+
+        A = self.build_laplacian_2d(10, 10)
+
+        xe = num.ones( (100,), num.float)
+        b  = A*xe
+
+        for precon in ['None', 'IC0']:
+            x, stats = conjugate_gradient(A, b, tol=1.0e-10, precon=precon,
+                                          output_stats=True)
+
+            history = num.array(stats.residual_history)
+            assert len(history) == stats.iter
+            assert num.allclose(history[0], num.linalg.norm(b))
+            assert num.allclose(history[-1], num.linalg.norm(b - A*x))
+            assert history[-1] < 1.0e-10*history[0]
+
+        # The c implementation reports iterations, the initial and
+        # final residuals
+        for precon in ['None', 'Jacobi']:
+            x, stats = conjugate_gradient(A, b, use_c_cg=True, precon=precon,
+                                          output_stats=True)
+
+            assert num.allclose(x, xe)
+            assert stats.iter > 1
+            assert len(stats.residual_history) == 2
+            assert num.allclose(stats.residual_history[-1],
+                                num.linalg.norm(b - A*x))
+
+    def test_c_ext_without_stats(self):
+        """The c implementation only computes the residuals of the stats
+        when they are requested
+        """
+
+        class Counted_CSR(Sparse_CSR):
+            products = 0
+            def __mul__(self, other):
+                Counted_CSR.products += 1
+                return Sparse_CSR.__mul__(self, other)
+
+        A = self.build_laplacian_2d(10, 10)
+        A = Counted_CSR(None, A.data, A.colind, A.row_ptr, A.M, A.N)
+
+        xe = num.ones( (100,), num.float)
+        b  = Sparse_CSR.__mul__(A, xe)
+
+        for precon in ['None', 'Jacobi']:
+            Counted_CSR.products = 0
+            x = conjugate_gradient(A, b, use_c_cg=True, precon=precon)
+
+            assert num.allclose(x, xe)
+            assert Counted_CSR.products == 0
+
+            x, stats = conjugate_gradient(A, b, use_c_cg=True, precon=precon,
+                                          output_stats=True)
+
+            assert num.allclose(x, xe)
+            assert Counted_CSR.products == 2
+
 ################################################################################
 
 if __name__ == "__main__":
@@ -7,6 +7,7 @@ import sys
 from anuga.utilities.file_utils import copy_code_files, get_all_swwfiles
 from anuga.utilities.file_utils import del_dir
 from anuga.utilities.sww_merge import sww_merge, _sww_merge
+from anuga.utilities.sww_merge import sww_merge_parallel
 
 
 class Test_FileUtils(unittest.TestCase):
@@ -147,7 +148,118 @@ class Test_FileUtils(unittest.TestCase):
 			os.remove('test2.sww')
 			os.remove(outfile)      
         
-        
+
+    def test_merge_parallel_swwfiles_chunked(self):
+        """Merging a few timesteps at a time, or with worker processes,
+        gives the same file as merging all timesteps at once, and that
+        file has the values stored by the processors.
+        """
+
+        import numpy as num
+        import anuga
+        from anuga.file.netcdf import NetCDFFile
+        from anuga.parallel.sequential_distribute import \
+             sequential_distribute_dump, sequential_distribute_load_pickle_file
+
+        work_dir = tempfile.mkdtemp()
+
+        for smooth in [True, False]:
+            domain = anuga.rectangular_cross_domain(6, 4)
+            domain.set_name('merge')
+            domain.set_quantity('elevation', lambda x, y: -x)
+            domain.set_store_vertices_uniquely(not smooth)
+
+            sequential_distribute_dump(domain, 3, partition_dir=work_dir)
+
+            # Write the sww files of a parallel run, processor by processor
+            for p in range(3):
+                pickle_name = os.path.join(work_dir, 'merge_P3_%d.pickle' % p)
+                pdomain = sequential_distribute_load_pickle_file(pickle_name, np=3)
+                pdomain.set_datadir(work_dir)
+                pdomain.initialise_storage()
+                for i in range(5):
+                    pdomain.set_time(float(i))
+                    pdomain.set_quantity('stage', lambda x, y: 0.1*i + x + y)
+                    pdomain.store_timestep()
+
+            global_name = os.path.join(work_dir, 'merge')
+            output = global_name + '.sww'
+
+            sww_merge_parallel(global_name, 3)
+            fid = NetCDFFile(output)
+            expected = dict((q, num.array(fid.variables[q][:]))
+                            for q in fid.variables)
+            fid.close()
+
+            # Stage = 0.1*t + x + y at the centroids, and at every vertex
+            # of the unsmoothed output
+            x = expected['x']
+            y = expected['y']
+            x_c = x[expected['volumes']].mean(axis=1)
+            y_c = y[expected['volumes']].mean(axis=1)
+            assert num.allclose(expected['time'], range(5))
+            assert num.allclose(expected['elevation_c'], -x_c)
+            for i in range(5):
+                if not smooth:
+                    assert num.allclose(expected['stage'][i], 0.1*i + x + y)
+                assert num.allclose(expected['stage_c'][i],
+                                    0.1*i + x_c + y_c)
+                assert num.allclose(expected['xmomentum'][i], 0.0)
+
+            sww_merge_parallel(global_name, 3, chunk_size=2)
+            fid = NetCDFFile(output)
+            for q in expected:
+                assert num.allclose(fid.variables[q][:], expected[q]), q
+            fid.close()
+
+            # Using worker processes
+            sww_merge_parallel(global_name, 3, chunk_size=2, processes=2)
+            fid = NetCDFFile(output)
+            for q in expected:
+                assert num.allclose(fid.variables[q][:], expected[q]), q
+
+            fid.close()
+
+            # Using worker processes and the default chunk_size
+            sww_merge_parallel(global_name, 3, processes=2)
+            fid = NetCDFFile(output)
+            for q in expected:
+                assert num.allclose(fid.variables[q][:], expected[q]), q
+            fid.close()
+
+        shutil.rmtree(work_dir)
+
+    def test_merge_imap_bounded(self):
+        """The worker pool of a parallel merge has at most max_pending
+        results waiting.
+        """
+
+        from anuga.utilities.sww_merge import _imap_bounded
+
+        class Result:
+            def __init__(self, pool, value):
+                self.pool = pool
+                self.value = value
+            def get(self):
+                self.pool.pending -= 1
+                return self.value
+
+        class Pool:
+            def __init__(self):
+                self.pending = 0
+                self.max_pending = 0
+            def apply_async(self, function, args):
+                self.pending += 1
+                self.max_pending = max(self.max_pending, self.pending)
+                return Result(self, function(*args))
+
+        pool = Pool()
+        results = _imap_bounded(pool, lambda x: 2*x, range(10), 3)
+
+        assert list(results) == [2*x for x in range(10)]
+        assert pool.max_pending == 3
+        assert pool.pending == 0
+
 
 #-------------------------------------------------------------
 